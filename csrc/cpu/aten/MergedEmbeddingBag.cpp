@@ -23,6 +23,33 @@ std::vector<Tensor> merged_embeddingbag_forward_cpu(
       kCPU, weights, indices, offsets, pooling_mode, include_last_offsets);
 }
 
+IPEX_DEFINE_DISPATCH(
+    merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_stub);
+
+std::vector<Tensor> merged_embeddingbag_rowwise_quantized_forward_cpu(
+    const TensorList& qweights,
+    const TensorList& scale_bias,
+    const TensorList& indices,
+    const TensorList& offsets,
+    const IntArrayRef bits,
+    const int64_t pooling_mode,
+    const bool include_last_offsets) {
+  /*
+  pointer to merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_impl(
+      qweights, scale_bias, indices, offsets, bits, pooling_mode,
+      include_last_offsets);
+  */
+  return merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_stub(
+      kCPU,
+      qweights,
+      scale_bias,
+      indices,
+      offsets,
+      bits,
+      pooling_mode,
+      include_last_offsets);
+}
+
 } // namespace cpu
 } // namespace torch_ipex
 
@@ -64,6 +91,12 @@ TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
       "merged_embeddingbag_forward",
       c10::DispatchKey::AutocastCPU,
       torch_ipex::autocast::merged_embeddingbag_forward);
+  m.def(
+      "merged_embeddingbag_rowwise_quantized_forward(Tensor[] qweights, Tensor[] scale_bias, Tensor[] indices, Tensor[] offsets, int[] bits, int pooling_mode, bool include_last_offsets) -> Tensor[]");
+  m.impl(
+      "merged_embeddingbag_rowwise_quantized_forward",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::merged_embeddingbag_rowwise_quantized_forward_cpu);
 }
 
 } // namespace
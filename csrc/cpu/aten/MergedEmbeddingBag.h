@@ -191,6 +191,16 @@ std::vector<Tensor> merged_embeddingbag_forward_cpu_kernel_impl(
     const int64_t pooling_mode,
     const bool include_last_offsets);
 
+std::vector<Tensor>
+merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_impl(
+    const TensorList& qweights,
+    const TensorList& scale_bias,
+    const TensorList& indices,
+    const TensorList& offsets,
+    const IntArrayRef bits,
+    const int64_t pooling_mode,
+    const bool include_last_offsets);
+
 std::vector<Tensor> merged_embeddingbag_backward_cpu_kernel_impl(
     const TensorList& grad_outs_,
     const TensorList& weights,
@@ -271,6 +281,19 @@ IPEX_DECLARE_DISPATCH(
     merged_embeddingbag_forward_cpu_kernel_fn,
     merged_embeddingbag_forward_cpu_kernel_stub);
 
+using merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_fn =
+    std::vector<Tensor> (*)(
+        const TensorList&,
+        const TensorList&,
+        const TensorList&,
+        const TensorList&,
+        const IntArrayRef,
+        const int64_t,
+        const bool);
+IPEX_DECLARE_DISPATCH(
+    merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_fn,
+    merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_stub);
+
 using merged_embeddingbag_backward_cpu_kernel_fn = std::vector<Tensor> (*)(
     const TensorList&,
     const TensorList&,
@@ -8,6 +8,9 @@ namespace cpu {
 IPEX_DEFINE_DISPATCH(mixtral_moe_tpp_kernel_stub);
 IPEX_DEFINE_DISPATCH(mixtral_moe_woq_kernel_stub);
 IPEX_DEFINE_DISPATCH(mixtral_moe_kernel_stub);
+IPEX_DEFINE_DISPATCH(grouped_mixtral_moe_tpp_kernel_stub);
+IPEX_DEFINE_DISPATCH(grouped_mixtral_moe_woq_kernel_stub);
+IPEX_DEFINE_DISPATCH(grouped_mixtral_moe_kernel_stub);
 
 at::Tensor mixtral_moe_tpp(
     const at::Tensor& hidden_states,
@@ -98,6 +101,88 @@ at::Tensor mixtral_moe_woq(
       output,
       is_distributed);
 }
+
+/*
+ * Grouped variants of the mixtral MoE ops above. Instead of being called once
+ * per expert from python, they take the router outputs (selected_experts,
+ * routing_weights) together with the weights of all experts, bucket the
+ * tokens by expert in a single pass and only run the experts which received
+ * tokens.
+ */
+at::Tensor grouped_mixtral_moe_tpp(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool tpp_fallback,
+    bool is_distributed) {
+  RECORD_FUNCTION(
+      "ipex::grouped_mixtral_moe_tpp", c10::ArrayRef<c10::IValue>({}));
+
+  return grouped_mixtral_moe_tpp_kernel_stub(
+      kCPU,
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis,
+      up_weis,
+      down_weis,
+      tpp_fallback,
+      is_distributed);
+}
+
+at::Tensor grouped_mixtral_moe(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList gate_op_ctxs,
+    at::TensorList up_weis,
+    at::TensorList up_op_ctxs,
+    at::TensorList down_weis,
+    at::TensorList down_op_ctxs,
+    bool use_dnnl,
+    bool is_distributed) {
+  RECORD_FUNCTION("ipex::grouped_mixtral_moe", c10::ArrayRef<c10::IValue>({}));
+
+  return grouped_mixtral_moe_kernel_stub(
+      kCPU,
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis,
+      gate_op_ctxs,
+      up_weis,
+      up_op_ctxs,
+      down_weis,
+      down_op_ctxs,
+      use_dnnl,
+      is_distributed);
+}
+
+at::Tensor grouped_mixtral_moe_woq(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool is_distributed) {
+  RECORD_FUNCTION(
+      "ipex::grouped_mixtral_moe_woq", c10::ArrayRef<c10::IValue>({}));
+
+  return grouped_mixtral_moe_woq_kernel_stub(
+      kCPU,
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis,
+      up_weis,
+      down_weis,
+      is_distributed);
+}
 } // namespace cpu
 } // namespace torch_ipex
 
@@ -124,5 +209,30 @@ TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
       "mixtral_moe_woq",
       c10::DispatchKey::CPU,
       torch_ipex::cpu::mixtral_moe_woq);
+  m.def(
+      "grouped_mixtral_moe_tpp(Tensor hidden_states, Tensor selected_experts, \
+      Tensor routing_weights, Tensor[] gate_weis, Tensor[] up_weis, \
+      Tensor[] down_weis, bool tpp_fallback, bool is_distributed) -> Tensor");
+  m.impl(
+      "grouped_mixtral_moe_tpp",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::grouped_mixtral_moe_tpp);
+  m.def(
+      "grouped_mixtral_moe(Tensor hidden_states, Tensor selected_experts, \
+      Tensor routing_weights, Tensor[] gate_weis, Tensor[] gate_op_ctxs, \
+      Tensor[] up_weis, Tensor[] up_op_ctxs, Tensor[] down_weis, \
+      Tensor[] down_op_ctxs, bool use_dnnl, bool is_distributed) -> Tensor");
+  m.impl(
+      "grouped_mixtral_moe",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::grouped_mixtral_moe);
+  m.def(
+      "grouped_mixtral_moe_woq(Tensor hidden_states, Tensor selected_experts, \
+      Tensor routing_weights, Tensor[] gate_weis, Tensor[] up_weis, \
+      Tensor[] down_weis, bool is_distributed) -> Tensor");
+  m.impl(
+      "grouped_mixtral_moe_woq",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::grouped_mixtral_moe_woq);
 }
 } // namespace
\ No newline at end of file
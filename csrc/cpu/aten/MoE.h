@@ -75,8 +75,75 @@ using mixtral_moe_kernel_fn = at::Tensor (*)(
     const at::Tensor& routing_weights,
     at::Tensor& output,
     bool is_distributed);
+at::Tensor grouped_mixtral_moe_tpp(
+    const at::Tensor&,
+    const at::Tensor&,
+    const at::Tensor&,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    bool,
+    bool);
+at::Tensor grouped_mixtral_moe_woq(
+    const at::Tensor&,
+    const at::Tensor&,
+    const at::Tensor&,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    bool);
+at::Tensor grouped_mixtral_moe(
+    const at::Tensor&,
+    const at::Tensor&,
+    const at::Tensor&,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    bool,
+    bool);
+using grouped_mixtral_moe_tpp_kernel_fn = at::Tensor (*)(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool tpp_fallback,
+    bool is_distributed);
+using grouped_mixtral_moe_woq_kernel_fn = at::Tensor (*)(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool is_distributed);
+using grouped_mixtral_moe_kernel_fn = at::Tensor (*)(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList gate_op_ctxs,
+    at::TensorList up_weis,
+    at::TensorList up_op_ctxs,
+    at::TensorList down_weis,
+    at::TensorList down_op_ctxs,
+    bool use_dnnl,
+    bool is_distributed);
 IPEX_DECLARE_DISPATCH(mixtral_moe_tpp_kernel_fn, mixtral_moe_tpp_kernel_stub);
 IPEX_DECLARE_DISPATCH(mixtral_moe_woq_kernel_fn, mixtral_moe_woq_kernel_stub);
 IPEX_DECLARE_DISPATCH(mixtral_moe_kernel_fn, mixtral_moe_kernel_stub);
+IPEX_DECLARE_DISPATCH(
+    grouped_mixtral_moe_tpp_kernel_fn,
+    grouped_mixtral_moe_tpp_kernel_stub);
+IPEX_DECLARE_DISPATCH(
+    grouped_mixtral_moe_woq_kernel_fn,
+    grouped_mixtral_moe_woq_kernel_stub);
+IPEX_DECLARE_DISPATCH(
+    grouped_mixtral_moe_kernel_fn,
+    grouped_mixtral_moe_kernel_stub);
 } // namespace cpu
 } // namespace torch_ipex
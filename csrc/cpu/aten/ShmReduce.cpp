@@ -0,0 +1,9 @@
+#include "ShmReduce.h"
+
+namespace torch_ipex {
+namespace cpu {
+
+IPEX_DEFINE_DISPATCH(shm_reduce_add_kernel_stub);
+
+} // namespace cpu
+} // namespace torch_ipex
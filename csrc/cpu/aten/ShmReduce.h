@@ -0,0 +1,20 @@
+#pragma once
+
+#include <ATen/ATen.h>
+#include <dyndisp/DispatchStub.h>
+
+#include <vector>
+
+namespace torch_ipex {
+namespace cpu {
+
+// Sums the tensors of inputs element-wise into out, accumulating in fp32.
+// All the tensors are contiguous and of the same numel and dtype (float,
+// bfloat16 or half). out may alias one of inputs.
+using shm_reduce_add_kernel_fn =
+    void (*)(at::Tensor& out, const std::vector<at::Tensor>& inputs);
+
+IPEX_DECLARE_DISPATCH(shm_reduce_add_kernel_fn, shm_reduce_add_kernel_stub);
+
+} // namespace cpu
+} // namespace torch_ipex
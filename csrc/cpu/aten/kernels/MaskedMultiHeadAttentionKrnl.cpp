@@ -1370,6 +1370,74 @@ first_token_masked_mha(
   return std::make_tuple(
       attn_outputs, attn_weights, key_cache, value_cache, beam_idx);
 }
+/*
+ *Processes several new tokens on top of the cached ones, e.g., to verify the
+ *draft tokens of speculative decoding in one forward. The key/value of the new
+ *tokens are stored to the cache and the past ones are gathered following the
+ *beam path, the same as the single token kernel does.
+ */
+std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor>
+multi_token_masked_mha(
+    at::Tensor query,
+    at::Tensor key,
+    at::Tensor value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& beam_idx,
+    const int64_t offset,
+    const double scale_attn,
+    at::Tensor attention_mask) {
+  RECORD_FUNCTION(
+      "ipex::multi_token_masked_mha", c10::ArrayRef<c10::IValue>({}));
+  auto bs = query.size(0);
+  auto cur_len = query.size(1);
+  auto seq_len = offset + cur_len;
+  TORCH_CHECK(
+      bs == beam_idx.size(1),
+      "ipex::masked_multihead_self_attention only supports several new tokens when the batch size equals to beam_idx.size(1)");
+  key_cache.slice(0, offset, seq_len).copy_(key.transpose(0, 1));
+  value_cache.slice(0, offset, seq_len).copy_(value.transpose(0, 1));
+  // according to the last decoded token to get the target beam for the past
+  // token
+  auto beam_path = at::arange(bs, beam_idx.options()).repeat({seq_len, 1});
+  if (bs > 1) {
+    auto path_access = beam_path.accessor<long, 2>();
+    auto beam_idx_access = beam_idx.accessor<long, 2>();
+    for (auto i = 0; i < bs; i++) {
+      path_access[offset - 1][i] = beam_idx_access[offset - 1][i];
+      for (auto j = offset - 2; j >= 0; j--) {
+        path_access[j][i] = beam_idx_access[j][path_access[j + 1][i]];
+      }
+    }
+  }
+  auto gather_cache = [&](const at::Tensor& cache) {
+    auto index = beam_path.view({seq_len, bs, 1, 1})
+                     .expand({seq_len, bs, cache.size(2), cache.size(3)});
+    auto past = cache.slice(0, 0, seq_len).gather(1, index);
+    // [seq_len, bs, kv_head, head_size] -> [bs, head_num, seq_len, head_size]
+    past = past.permute({1, 2, 0, 3}).to(at::kFloat);
+    if (query.size(2) != past.size(1)) {
+      past = past.repeat_interleave(query.size(2) / past.size(1), 1);
+    }
+    return past;
+  };
+  auto past_key = gather_cache(key_cache);
+  auto past_value = gather_cache(value_cache);
+  auto attn_weights =
+      query.transpose(1, 2).to(at::kFloat).matmul(past_key.transpose(-1, -2));
+  attn_weights = attn_weights.div(scale_attn);
+  // the new tokens only attend to the past tokens and the new ones before them
+  auto causal_mask =
+      at::full({cur_len, seq_len}, -10000.0f, attn_weights.options())
+          .triu(offset + 1);
+  attn_weights = attn_weights + attention_mask.to(at::kFloat) + causal_mask;
+  attn_weights = attn_weights.softmax(-1);
+  auto attn_outputs =
+      attn_weights.matmul(past_value).to(value.scalar_type()).contiguous();
+  return std::make_tuple(
+      attn_outputs, at::Tensor(), key_cache, value_cache, beam_idx);
+}
+
 std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor>
 masked_multihead_self_attention_kernel_impl(
     at::Tensor& query,
@@ -1409,13 +1477,31 @@ masked_multihead_self_attention_kernel_impl(
   auto cache_size = key_cache.size(0);
   auto cur_len = query.size(1);
   if (offset == 0) {
+    // The first dim of the beam_idx placeholder passed with the first token
+    // is the expected max length of the sequence (prompt + max_new_tokens),
+    // which takes precedence over the static max_positions. A placeholder
+    // with a single row means there is no hint.
+    if (beam_idx.size(0) > 1) {
+      max_positions = beam_idx.size(0);
+    }
     max_positions =
         max_positions > cur_len ? max_positions : max_positions + cur_len;
-    key_cache = at::empty(
-        {max_positions, beam_batch, key.size(2), key.size(3)}, key.options());
-    value_cache = at::empty(
-        {max_positions, beam_batch, value.size(2), value.size(3)},
-        value.options());
+    // Reuse the key/value buffers passed in (e.g., kept from a previous
+    // request) if they are large enough, otherwise allocate new ones.
+    auto reusable = [&](const at::Tensor& cache, const at::Tensor& t) {
+      return cache.dim() == 4 && cache.size(0) >= max_positions &&
+          cache.size(1) == beam_batch && cache.size(2) == t.size(2) &&
+          cache.size(3) == t.size(3) &&
+          cache.scalar_type() == t.scalar_type() && cache.is_contiguous();
+    };
+    if (!reusable(key_cache, key) || !reusable(value_cache, value)) {
+      key_cache = at::empty(
+          {max_positions, beam_batch, key.size(2), key.size(3)}, key.options());
+      value_cache = at::empty(
+          {max_positions, beam_batch, value.size(2), value.size(3)},
+          value.options());
+    }
+    max_positions = key_cache.size(0);
     beam_idx = at::empty({max_positions, beam_batch}, beam_idx.options());
     auto beam_idx_access = beam_idx.accessor<long, 2>();
 #pragma omp parallel for collapse(2)
@@ -1430,7 +1516,7 @@ masked_multihead_self_attention_kernel_impl(
       }
     }
   } else if (offset > 0 && offset + cur_len > cache_size) {
-    auto new_cache_size = cache_size * 2;
+    auto new_cache_size = std::max<int64_t>(cache_size * 2, offset + cur_len);
     auto new_key_cache = at::empty(
         {new_cache_size, beam_batch, key.size(2), key.size(3)}, key.options());
     auto new_value_cache = at::empty(
@@ -1452,7 +1538,18 @@ masked_multihead_self_attention_kernel_impl(
     value_cache = new_value_cache;
     beam_idx = new_beam_idx;
   }
-  if (offset > 0) {
+  if (offset > 0 && cur_len > 1) {
+    return multi_token_masked_mha(
+        query,
+        key,
+        value,
+        key_cache,
+        value_cache,
+        beam_idx,
+        offset,
+        scale_attn,
+        attention_mask_v);
+  } else if (offset > 0) {
     return zero_copy_kv_cache_masked_multihead_self_attention_kernel_impl(
         query,
         key,
@@ -22,14 +22,14 @@ template <typename data_t>
 inline void copy_dense(
     const int64_t bs_bgein,
     const int64_t bs_end,
-    const int64_t num_emb,
-    int64_t emb_dim,
+    const int64_t row_dim,
+    int64_t dense_dim,
     const data_t* dense,
     data_t* result) {
   for (int64_t b = bs_bgein; b < bs_end; ++b) {
-    memcpy(result, dense, emb_dim * sizeof(data_t));
-    result += (num_emb + 1) * emb_dim;
-    dense += emb_dim;
+    memcpy(result, dense, dense_dim * sizeof(data_t));
+    result += row_dim;
+    dense += dense_dim;
   }
 }
 
@@ -383,7 +383,10 @@ void merged_embeddingbag_cat(
     data_t* d_ptr,
     int64_t num_batch,
     int64_t num_emb,
-    int64_t emb_dim,
+    int64_t dense_dim,
+    const std::vector<int64_t>& emb_dims,
+    const std::vector<int64_t>& col_offsets,
+    int64_t row_dim,
     std::vector<int64_t> last_offsets) {
   constexpr int64_t b_block = 128;
   const int64_t n_b_blocks = (num_batch - 1) / b_block + 1;
@@ -392,14 +395,14 @@ void merged_embeddingbag_cat(
     for (int64_t n = 0; n < (num_emb + 1); ++n) {
       const int64_t bs_begin = b * b_block;
       const int64_t bs_end = std::min(num_batch, (b + 1) * b_block);
-      data_t* r = &o_ptr[b * b_block * (num_emb + 1) * emb_dim + n * emb_dim];
+      data_t* r = &o_ptr[b * b_block * row_dim + col_offsets[n]];
       if (n == 0) {
         copy_dense(
             bs_begin,
             bs_end,
-            num_emb,
-            emb_dim,
-            &d_ptr[b * b_block * emb_dim],
+            row_dim,
+            dense_dim,
+            &d_ptr[b * b_block * dense_dim],
             r);
       } else {
         const int64_t m = n - 1;
@@ -409,13 +412,13 @@ void merged_embeddingbag_cat(
             bs_begin,
             bs_end,
             num_emb,
-            emb_dim,
+            emb_dims[m],
             last_offset,
             indices_ptr[m],
             offsets_ptr[m],
             w_ptr[m],
             r,
-            /*result_stride=*/(num_emb + 1) * emb_dim,
+            /*result_stride=*/row_dim,
             SUM);
       }
     }
@@ -429,7 +432,7 @@ Tensor merged_embedding_cat_fw_impl(
     const Tensor& dense) {
   RECORD_FUNCTION(__FUNCTION__, c10::ArrayRef<c10::IValue>({}));
   int64_t batch_size = dense.size(0);
-  int64_t emb_dim = dense.size(1);
+  int64_t dense_dim = dense.size(1);
   int64_t num_emb = weights.size();
 
   TORCH_INTERNAL_ASSERT_DEBUG_ONLY(num_emb > 0);
@@ -441,6 +444,12 @@ Tensor merged_embedding_cat_fw_impl(
   auto data_type = dense.scalar_type();
 
   std::vector<int64_t> last_offsets(num_emb, -1);
+  // the tables may have different dims, each of them is written to its own
+  // columns of the single concatenated output [dense, emb_0, emb_1, ...]
+  std::vector<int64_t> emb_dims(num_emb);
+  std::vector<int64_t> col_offsets(num_emb + 1);
+  col_offsets[0] = 0;
+  int64_t row_dim = dense_dim;
 
   for (int i = 0; i < num_emb; i++) {
     TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
@@ -449,13 +458,15 @@ Tensor merged_embedding_cat_fw_impl(
         offsets[i].is_contiguous() && offsets[i].scalar_type() == index_type);
     TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
         weights[i].is_contiguous() && weights[i].scalar_type() == data_type);
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
-        weights[i].dim() == 2 && weights[i].size(1) == emb_dim);
+    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(weights[i].dim() == 2);
+    emb_dims[i] = weights[i].size(1);
+    col_offsets[i + 1] = row_dim;
+    row_dim += emb_dims[i];
     // handle last offsets
     last_offsets[i] = indices[i].numel();
   }
 
-  Tensor output = zeros({batch_size, (num_emb + 1) * emb_dim}, dense.options());
+  Tensor output = zeros({batch_size, row_dim}, dense.options());
 
   AT_DISPATCH_FLOATING_TYPES_AND2(
       at::kBFloat16,
@@ -483,23 +494,206 @@ Tensor merged_embedding_cat_fw_impl(
                   dense_ptr,
                   batch_size,
                   num_emb,
-                  emb_dim,
+                  dense_dim,
+                  emb_dims,
+                  col_offsets,
+                  row_dim,
                   last_offsets);
             });
       });
   return output;
 }
 
-template <typename data_t, typename index_t>
+template <typename index_t>
 void merged_embeddingbag(
-    data_t** o_ptr,
-    data_t** w_ptr,
+    void** o_ptr,
+    void** w_ptr,
     index_t** indices_ptr,
     index_t** offsets_ptr,
     int64_t num_batch,
     int64_t num_emb,
-    int64_t emb_dim,
-    std::vector<int64_t> last_offsets,
+    const std::vector<int64_t>& emb_dims,
+    const std::vector<ScalarType>& data_types,
+    const std::vector<int64_t>& last_offsets,
+    int64_t pooling_mode) {
+  constexpr int64_t b_block = 128;
+  const int64_t n_b_blocks = (num_batch - 1) / b_block + 1;
+  // The tables may have different dims and dtypes, the dtype of each table is
+  // dispatched inside the loop so that all tables share one parallel region.
+#pragma omp parallel for collapse(2)
+  for (int64_t b = 0; b < n_b_blocks; ++b) {
+    for (int64_t m = 0; m < num_emb; ++m) {
+      const int64_t bs_begin = b * b_block;
+      const int64_t bs_end = std::min(num_batch, (b + 1) * b_block);
+      const int64_t emb_dim = emb_dims[m];
+      // avoid offsets not include last batch
+      const index_t last_offset = bs_end == num_batch ? last_offsets[m] : -1;
+      AT_DISPATCH_FLOATING_TYPES_AND2(
+          at::kBFloat16, at::kHalf, data_types[m], "merged_embeddingbag", [&] {
+            scalar_t* r =
+                static_cast<scalar_t*>(o_ptr[m]) + b * b_block * emb_dim;
+            embeddingbag_kern(
+                bs_begin,
+                bs_end,
+                num_emb,
+                emb_dim,
+                last_offset,
+                indices_ptr[m],
+                offsets_ptr[m],
+                static_cast<const scalar_t*>(w_ptr[m]),
+                r,
+                /*result_stride=*/emb_dim,
+                pooling_mode);
+          });
+    }
+  }
+}
+
+std::vector<Tensor> merged_embeddingbag_forward_cpu_kernel_impl(
+    const std::vector<Tensor>& weights,
+    const TensorList& indices,
+    const TensorList& offsets,
+    const int64_t pooling_mode,
+    const bool include_last_offsets) {
+  RECORD_FUNCTION(__FUNCTION__, c10::ArrayRef<c10::IValue>({}));
+
+  int64_t num_emb = weights.size();
+
+  TORCH_INTERNAL_ASSERT_DEBUG_ONLY(num_emb > 0);
+  int64_t batch_size = offsets[0].size(0);
+  if (include_last_offsets) {
+    batch_size -= 1;
+  }
+  TORCH_INTERNAL_ASSERT_DEBUG_ONLY(num_emb == indices.size());
+  TORCH_INTERNAL_ASSERT_DEBUG_ONLY(num_emb == offsets.size());
+
+  auto index_type = indices[0].scalar_type();
+
+  std::vector<int64_t> last_offsets(num_emb, -1);
+  std::vector<int64_t> emb_dims(num_emb);
+  std::vector<ScalarType> data_types(num_emb);
+  std::vector<Tensor> outputs;
+
+  for (int i = 0; i < num_emb; i++) {
+    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
+        indices[i].is_contiguous() && indices[i].scalar_type() == index_type);
+    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
+        offsets[i].is_contiguous() && offsets[i].scalar_type() == index_type);
+    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
+        weights[i].is_contiguous() && weights[i].dim() == 2);
+    // tables can have different dims and dtypes, checked here since the dtype
+    // is dispatched inside the parallel region which must not throw
+    TORCH_CHECK(
+        weights[i].scalar_type() == at::kFloat ||
+            weights[i].scalar_type() == at::kDouble ||
+            weights[i].scalar_type() == at::kBFloat16 ||
+            weights[i].scalar_type() == at::kHalf,
+        "merged_embeddingbag: unsupported dtype ",
+        weights[i].scalar_type());
+    emb_dims[i] = weights[i].size(1);
+    data_types[i] = weights[i].scalar_type();
+    // handle last offsets
+    last_offsets[i] = indices[i].numel();
+    outputs.emplace_back(
+        empty({batch_size, emb_dims[i]}, weights[i].options()));
+  }
+
+  AT_DISPATCH_INDEX_TYPES(index_type, "merged_embeddingbag", [&] {
+    void* weights_ptr[num_emb];
+    void* outputs_ptr[num_emb];
+    index_t* indices_ptr[num_emb];
+    index_t* offsets_ptr[num_emb];
+    for (int i = 0; i < num_emb; i++) {
+      weights_ptr[i] = weights[i].data_ptr();
+      outputs_ptr[i] = outputs[i].data_ptr();
+      indices_ptr[i] = indices[i].data_ptr<index_t>();
+      offsets_ptr[i] = offsets[i].data_ptr<index_t>();
+    }
+    merged_embeddingbag<index_t>(
+        outputs_ptr,
+        weights_ptr,
+        indices_ptr,
+        offsets_ptr,
+        batch_size,
+        num_emb,
+        emb_dims,
+        data_types,
+        last_offsets,
+        pooling_mode);
+  });
+
+  return outputs;
+}
+
+/**
+ * Pooling of row-wise quantized tables. Each row is stored as uint8 codes
+ * (int8: one code per byte, int4: two codes per byte with the even element in
+ * the low nibble) with a fp32 (scale, bias) pair, i.e. w = scale * q + bias.
+ * The rows are dequantized on the fly and accumulated in fp32, the bias of a
+ * bag is the sum of the biases of its rows and is added once.
+ */
+template <typename index_t>
+inline void rowwise_quantized_embeddingbag_kern(
+    const int64_t bs_begin,
+    const int64_t bs_end,
+    const int64_t emb_dim,
+    const int64_t bits,
+    const index_t last_offset,
+    const index_t* indices,
+    const index_t* offsets,
+    const uint8_t* qweight,
+    const float* scale_bias,
+    float* result,
+    const int64_t pooling_mode) {
+  const int64_t row_bytes = bits == 8 ? emb_dim : emb_dim / 2;
+  for (int64_t b = bs_begin; b < bs_end; ++b) {
+    int64_t start_idx = offsets[b];
+    int64_t end_idx =
+        ((b + 1) == bs_end && last_offset != -1) ? last_offset : offsets[b + 1];
+    std::fill(result, result + emb_dim, 0.f);
+    float bias = 0.f;
+    for (int64_t j = start_idx; j < end_idx; ++j) {
+      const int64_t row = indices[j];
+      const float scale = scale_bias[row * 2];
+      bias += scale_bias[row * 2 + 1];
+      const uint8_t* q = &qweight[row * row_bytes];
+      if (bits == 8) {
+#pragma omp simd
+        for (int64_t i = 0; i < emb_dim; ++i) {
+          result[i] += scale * float(q[i]);
+        }
+      } else {
+#pragma omp simd
+        for (int64_t i = 0; i < row_bytes; ++i) {
+          result[2 * i] += scale * float(q[i] & 0xF);
+          result[2 * i + 1] += scale * float(q[i] >> 4);
+        }
+      }
+    }
+    float factor = 1.f;
+    if (pooling_mode == MEAN && end_idx > start_idx) {
+      factor = 1.f / (end_idx - start_idx);
+    }
+#pragma omp simd
+    for (int64_t i = 0; i < emb_dim; ++i) {
+      result[i] = (result[i] + bias) * factor;
+    }
+    result += emb_dim;
+  }
+}
+
+template <typename index_t>
+void merged_embeddingbag_rowwise_quantized(
+    float** o_ptr,
+    uint8_t** w_ptr,
+    float** sb_ptr,
+    index_t** indices_ptr,
+    index_t** offsets_ptr,
+    int64_t num_batch,
+    int64_t num_emb,
+    const std::vector<int64_t>& emb_dims,
+    const IntArrayRef bits,
+    const std::vector<int64_t>& last_offsets,
     int64_t pooling_mode) {
   constexpr int64_t b_block = 128;
   const int64_t n_b_blocks = (num_batch - 1) / b_block + 1;
@@ -508,48 +702,52 @@ void merged_embeddingbag(
     for (int64_t m = 0; m < num_emb; ++m) {
       const int64_t bs_begin = b * b_block;
       const int64_t bs_end = std::min(num_batch, (b + 1) * b_block);
-      data_t* r = &o_ptr[m][b * b_block * emb_dim];
+      float* r = &o_ptr[m][b * b_block * emb_dims[m]];
       // avoid offsets not include last batch
       const index_t last_offset = bs_end == num_batch ? last_offsets[m] : -1;
-      embeddingbag_kern(
+      rowwise_quantized_embeddingbag_kern(
           bs_begin,
           bs_end,
-          num_emb,
-          emb_dim,
+          emb_dims[m],
+          bits[m],
           last_offset,
           indices_ptr[m],
           offsets_ptr[m],
           w_ptr[m],
+          sb_ptr[m],
           r,
-          /*result_stride=*/emb_dim,
           pooling_mode);
     }
   }
 }
 
-std::vector<Tensor> merged_embeddingbag_forward_cpu_kernel_impl(
-    const std::vector<Tensor>& weights,
+std::vector<Tensor>
+merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_impl(
+    const TensorList& qweights,
+    const TensorList& scale_bias,
     const TensorList& indices,
     const TensorList& offsets,
+    const IntArrayRef bits,
     const int64_t pooling_mode,
     const bool include_last_offsets) {
   RECORD_FUNCTION(__FUNCTION__, c10::ArrayRef<c10::IValue>({}));
 
-  int64_t num_emb = weights.size();
+  int64_t num_emb = qweights.size();
 
   TORCH_INTERNAL_ASSERT_DEBUG_ONLY(num_emb > 0);
   int64_t batch_size = offsets[0].size(0);
   if (include_last_offsets) {
     batch_size -= 1;
   }
-  int64_t emb_dim = weights[0].size(1);
-  TORCH_INTERNAL_ASSERT_DEBUG_ONLY(num_emb == indices.size());
-  TORCH_INTERNAL_ASSERT_DEBUG_ONLY(num_emb == offsets.size());
+  TORCH_CHECK(
+      num_emb == scale_bias.size() && num_emb == bits.size() &&
+          num_emb == indices.size() && num_emb == offsets.size(),
+      "merged_embeddingbag_rowwise_quantized: expect same number of tables, scale_bias, bits, indices and offsets");
 
   auto index_type = indices[0].scalar_type();
-  auto data_type = weights[0].scalar_type();
 
   std::vector<int64_t> last_offsets(num_emb, -1);
+  std::vector<int64_t> emb_dims(num_emb);
   std::vector<Tensor> outputs;
 
   for (int i = 0; i < num_emb; i++) {
@@ -557,44 +755,51 @@ std::vector<Tensor> merged_embeddingbag_forward_cpu_kernel_impl(
         indices[i].is_contiguous() && indices[i].scalar_type() == index_type);
     TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
         offsets[i].is_contiguous() && offsets[i].scalar_type() == index_type);
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
-        weights[i].is_contiguous() && weights[i].scalar_type() == data_type);
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
-        weights[i].dim() == 2 && weights[i].size(1) == emb_dim);
+    TORCH_CHECK(
+        bits[i] == 8 || bits[i] == 4,
+        "merged_embeddingbag_rowwise_quantized: only support 8 or 4 bits");
+    TORCH_CHECK(
+        qweights[i].is_contiguous() && qweights[i].dim() == 2 &&
+            qweights[i].scalar_type() == at::kByte,
+        "merged_embeddingbag_rowwise_quantized: expect contiguous 2D uint8 qweights");
+    TORCH_CHECK(
+        scale_bias[i].is_contiguous() &&
+            scale_bias[i].scalar_type() == at::kFloat &&
+            scale_bias[i].numel() == qweights[i].size(0) * 2,
+        "merged_embeddingbag_rowwise_quantized: expect fp32 scale_bias of shape [num_embeddings, 2]");
+    emb_dims[i] = bits[i] == 8 ? qweights[i].size(1) : qweights[i].size(1) * 2;
     // handle last offsets
     last_offsets[i] = indices[i].numel();
-    outputs.emplace_back(empty({batch_size, emb_dim}, weights[i].options()));
+    outputs.emplace_back(empty(
+        {batch_size, emb_dims[i]}, qweights[i].options().dtype(at::kFloat)));
   }
 
-  AT_DISPATCH_FLOATING_TYPES_AND2(
-      at::kBFloat16,
-      at::kHalf,
-      weights[0].scalar_type(),
-      "merged_embeddingbag",
-      [&] {
-        AT_DISPATCH_INDEX_TYPES(
-            indices[0].scalar_type(), "merged_embeddingbag", [&] {
-              scalar_t* weights_ptr[num_emb];
-              scalar_t* outputs_ptr[num_emb];
-              index_t* indices_ptr[num_emb];
-              index_t* offsets_ptr[num_emb];
-              for (int i = 0; i < num_emb; i++) {
-                weights_ptr[i] = weights[i].data_ptr<scalar_t>();
-                outputs_ptr[i] = outputs[i].data_ptr<scalar_t>();
-                indices_ptr[i] = indices[i].data_ptr<index_t>();
-                offsets_ptr[i] = offsets[i].data_ptr<index_t>();
-              }
-              merged_embeddingbag<scalar_t, index_t>(
-                  outputs_ptr,
-                  weights_ptr,
-                  indices_ptr,
-                  offsets_ptr,
-                  batch_size,
-                  num_emb,
-                  emb_dim,
-                  last_offsets,
-                  pooling_mode);
-            });
+  AT_DISPATCH_INDEX_TYPES(
+      index_type, "merged_embeddingbag_rowwise_quantized", [&] {
+        uint8_t* weights_ptr[num_emb];
+        float* scale_bias_ptr[num_emb];
+        float* outputs_ptr[num_emb];
+        index_t* indices_ptr[num_emb];
+        index_t* offsets_ptr[num_emb];
+        for (int i = 0; i < num_emb; i++) {
+          weights_ptr[i] = qweights[i].data_ptr<uint8_t>();
+          scale_bias_ptr[i] = scale_bias[i].data_ptr<float>();
+          outputs_ptr[i] = outputs[i].data_ptr<float>();
+          indices_ptr[i] = indices[i].data_ptr<index_t>();
+          offsets_ptr[i] = offsets[i].data_ptr<index_t>();
+        }
+        merged_embeddingbag_rowwise_quantized<index_t>(
+            outputs_ptr,
+            weights_ptr,
+            scale_bias_ptr,
+            indices_ptr,
+            offsets_ptr,
+            batch_size,
+            num_emb,
+            emb_dims,
+            bits,
+            last_offsets,
+            pooling_mode);
       });
 
   return outputs;
@@ -904,6 +1109,9 @@ void mergedemb_distribute_forward_merge_kernel_impl(
 IPEX_REGISTER_DISPATCH(
     merged_embeddingbag_forward_cpu_kernel_stub,
     &merged_embeddingbag_forward_cpu_kernel_impl);
+IPEX_REGISTER_DISPATCH(
+    merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_stub,
+    &merged_embeddingbag_rowwise_quantized_forward_cpu_kernel_impl);
 IPEX_REGISTER_DISPATCH(
     merged_embeddingbag_cat_fw_stub,
     &merged_embedding_cat_fw_impl);
@@ -8,6 +8,7 @@
 #include <immintrin.h>
 #include <torch/csrc/autograd/function.h>
 #include <algorithm>
+#include <vector>
 #include "tpp/kernels/TPPGEMMKrnl.h"
 
 namespace torch_ipex {
@@ -24,6 +25,70 @@ at::Tensor call_AllReduce(const at::Tensor& self) {
   return ret;
 }
 
+at::Tensor mixtral_moe_tpp_expert_forward(
+    const at::Tensor& curr_state,
+    const at::Tensor& gate_wei,
+    const at::Tensor& up_wei,
+    const at::Tensor& down_wei,
+    bool tpp_fallback) {
+  if (tpp_fallback) {
+    return at::linear(
+        at::silu(at::linear(curr_state, gate_wei)) *
+            at::linear(curr_state, up_wei),
+        down_wei);
+  }
+  auto gate_up = tpp_fused_gate_up_proj_forward_cpu(
+      curr_state,
+      gate_wei,
+      at::empty(0, curr_state.options()),
+      up_wei,
+      at::empty(0, curr_state.options()),
+      c10::nullopt);
+  return tpp_linear_nobias_forward_cpu(gate_up, down_wei, c10::nullopt);
+}
+
+at::Tensor mixtral_moe_expert_forward(
+    const at::Tensor& curr_state,
+    const at::Tensor& gate_wei,
+    const at::Tensor& gate_op_ctx,
+    const at::Tensor& up_wei,
+    const at::Tensor& up_op_ctx,
+    const at::Tensor& down_wei,
+    const at::Tensor& down_op_ctx,
+    bool use_dnnl) {
+  if (use_dnnl) {
+    return ipex_linear(
+        at::silu(ipex_linear(
+            curr_state, gate_wei, c10::nullopt, gate_op_ctx, c10::nullopt)) *
+            ipex_linear(
+                curr_state, up_wei, c10::nullopt, up_op_ctx, c10::nullopt),
+        down_wei,
+        c10::nullopt,
+        down_op_ctx,
+        c10::nullopt);
+  }
+  return mkl_sgemm_forward(
+      at::silu(mkl_sgemm_forward(
+          curr_state, gate_wei, c10::nullopt, gate_op_ctx, c10::nullopt)) *
+          mkl_sgemm_forward(
+              curr_state, up_wei, c10::nullopt, up_op_ctx, c10::nullopt),
+      down_wei,
+      c10::nullopt,
+      down_op_ctx,
+      c10::nullopt);
+}
+
+at::Tensor mixtral_moe_woq_expert_forward(
+    const at::Tensor& curr_state,
+    const at::Tensor& gate_wei,
+    const at::Tensor& up_wei,
+    const at::Tensor& down_wei) {
+  return woq_linear_forward(
+      at::silu(woq_linear_forward(curr_state, gate_wei)) *
+          woq_linear_forward(curr_state, up_wei),
+      down_wei);
+}
+
 at::Tensor mixtral_moe_tpp_kernl_impl(
     const at::Tensor& hidden_states,
     const at::Tensor& top_x,
@@ -37,22 +102,8 @@ at::Tensor mixtral_moe_tpp_kernl_impl(
     bool is_distributed) {
   auto curr_state = hidden_states.index({top_x}).unsqueeze(0);
   auto routing_w = routing_weights.index({top_x, idx}).unsqueeze(-1);
-  if (tpp_fallback) {
-    curr_state = at::linear(
-        at::silu(at::linear(curr_state, gate_wei)) *
-            at::linear(curr_state, up_wei),
-        down_wei);
-  } else {
-    curr_state = tpp_fused_gate_up_proj_forward_cpu(
-        curr_state,
-        gate_wei,
-        at::empty(0, curr_state.options()),
-        up_wei,
-        at::empty(0, curr_state.options()),
-        c10::nullopt);
-    curr_state =
-        tpp_linear_nobias_forward_cpu(curr_state, down_wei, c10::nullopt);
-  }
+  curr_state = mixtral_moe_tpp_expert_forward(
+      curr_state, gate_wei, up_wei, down_wei, tpp_fallback);
   if (is_distributed) {
     call_AllReduce(curr_state);
   }
@@ -78,27 +129,15 @@ at::Tensor mixtral_moe_kernl_impl(
     bool is_distributed) {
   auto curr_state = hidden_states.index({top_x}).unsqueeze(0);
   auto routing_w = routing_weights.index({top_x, idx}).unsqueeze(-1);
-  if (use_dnnl) {
-    curr_state = ipex_linear(
-        at::silu(ipex_linear(
-            curr_state, gate_wei, c10::nullopt, gate_op_ctx, c10::nullopt)) *
-            ipex_linear(
-                curr_state, up_wei, c10::nullopt, up_op_ctx, c10::nullopt),
-        down_wei,
-        c10::nullopt,
-        down_op_ctx,
-        c10::nullopt);
-  } else {
-    curr_state = mkl_sgemm_forward(
-        at::silu(mkl_sgemm_forward(
-            curr_state, gate_wei, c10::nullopt, gate_op_ctx, c10::nullopt)) *
-            mkl_sgemm_forward(
-                curr_state, up_wei, c10::nullopt, up_op_ctx, c10::nullopt),
-        down_wei,
-        c10::nullopt,
-        down_op_ctx,
-        c10::nullopt);
-  }
+  curr_state = mixtral_moe_expert_forward(
+      curr_state,
+      gate_wei,
+      gate_op_ctx,
+      up_wei,
+      up_op_ctx,
+      down_wei,
+      down_op_ctx,
+      use_dnnl);
   if (is_distributed) {
     call_AllReduce(curr_state);
   }
@@ -120,10 +159,8 @@ at::Tensor mixtral_moe_woq_kernl_impl(
     bool is_distributed) {
   auto curr_state = hidden_states.index({top_x}).unsqueeze(0);
   auto routing_w = routing_weights.index({top_x, idx}).unsqueeze(-1);
-  curr_state = woq_linear_forward(
-      at::silu(woq_linear_forward(curr_state, gate_wei)) *
-          woq_linear_forward(curr_state, up_wei),
-      down_wei);
+  curr_state =
+      mixtral_moe_woq_expert_forward(curr_state, gate_wei, up_wei, down_wei);
 
   if (is_distributed) {
     call_AllReduce(curr_state);
@@ -133,6 +170,156 @@ at::Tensor mixtral_moe_woq_kernl_impl(
 
   return output;
 }
+
+/*
+ * Bucket the (token, top-k slot) pairs of selected_experts by expert with a
+ * counting sort, then run expert_forward only on experts which received
+ * tokens. Tokens of one expert are gathered into a single GEMM, so the
+ * expert GEMMs run on all cores. The partial results are reduced into one
+ * output, so in the distributed case a single all-reduce is issued per layer
+ * instead of one per active expert.
+ */
+template <typename ExpertForward>
+at::Tensor grouped_mixtral_moe_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    int64_t num_experts,
+    bool is_distributed,
+    const ExpertForward& expert_forward) {
+  TORCH_CHECK(
+      hidden_states.dim() == 2,
+      "grouped_mixtral_moe: expect hidden_states to be [num_tokens, hidden_size]");
+  TORCH_CHECK(
+      selected_experts.dim() == 2 &&
+          selected_experts.size(0) == hidden_states.size(0),
+      "grouped_mixtral_moe: expect selected_experts to be [num_tokens, top_k]");
+  auto output = at::zeros_like(hidden_states);
+  auto experts = selected_experts.to(at::kLong).contiguous();
+  int64_t top_k = experts.size(1);
+  int64_t num_pairs = experts.numel();
+  auto experts_ptr = experts.data_ptr<int64_t>();
+
+  // Expert index -1 marks the (token, expert) pairs routed to the experts
+  // owned by the other ranks under tensor parallel, which are skipped.
+  std::vector<int64_t> offsets(num_experts + 1, 0);
+  for (int64_t i = 0; i < num_pairs; i++) {
+    auto e = experts_ptr[i];
+    TORCH_CHECK(
+        e >= -1 && e < num_experts,
+        "grouped_mixtral_moe: expert index out of range");
+    if (e >= 0) {
+      offsets[e + 1]++;
+    }
+  }
+  for (int64_t e = 0; e < num_experts; e++) {
+    offsets[e + 1] += offsets[e];
+  }
+  auto top_x = at::empty({offsets[num_experts]}, experts.options());
+  auto idx = at::empty({offsets[num_experts]}, experts.options());
+  auto top_x_ptr = top_x.data_ptr<int64_t>();
+  auto idx_ptr = idx.data_ptr<int64_t>();
+  std::vector<int64_t> cursor(offsets.begin(), offsets.end() - 1);
+  for (int64_t i = 0; i < num_pairs; i++) {
+    if (experts_ptr[i] < 0) {
+      continue;
+    }
+    auto pos = cursor[experts_ptr[i]]++;
+    top_x_ptr[pos] = i / top_k;
+    idx_ptr[pos] = i % top_k;
+  }
+
+  for (int64_t e = 0; e < num_experts; e++) {
+    auto count = offsets[e + 1] - offsets[e];
+    if (count == 0) {
+      continue;
+    }
+    auto expert_top_x = top_x.narrow(0, offsets[e], count);
+    auto expert_idx = idx.narrow(0, offsets[e], count);
+    auto curr_state = hidden_states.index({expert_top_x}).unsqueeze(0);
+    auto routing_w =
+        routing_weights.index({expert_top_x, expert_idx}).unsqueeze(-1);
+    curr_state = expert_forward(e, curr_state) * routing_w;
+    output.index_add_(
+        0, expert_top_x, curr_state.squeeze(0).to(hidden_states.dtype()));
+  }
+  if (is_distributed) {
+    call_AllReduce(output);
+  }
+  return output;
+}
+
+at::Tensor grouped_mixtral_moe_tpp_kernl_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool tpp_fallback,
+    bool is_distributed) {
+  return grouped_mixtral_moe_impl(
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis.size(),
+      is_distributed,
+      [&](int64_t e, const at::Tensor& curr_state) {
+        return mixtral_moe_tpp_expert_forward(
+            curr_state, gate_weis[e], up_weis[e], down_weis[e], tpp_fallback);
+      });
+}
+
+at::Tensor grouped_mixtral_moe_kernl_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList gate_op_ctxs,
+    at::TensorList up_weis,
+    at::TensorList up_op_ctxs,
+    at::TensorList down_weis,
+    at::TensorList down_op_ctxs,
+    bool use_dnnl,
+    bool is_distributed) {
+  return grouped_mixtral_moe_impl(
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis.size(),
+      is_distributed,
+      [&](int64_t e, const at::Tensor& curr_state) {
+        return mixtral_moe_expert_forward(
+            curr_state,
+            gate_weis[e],
+            gate_op_ctxs[e],
+            up_weis[e],
+            up_op_ctxs[e],
+            down_weis[e],
+            down_op_ctxs[e],
+            use_dnnl);
+      });
+}
+
+at::Tensor grouped_mixtral_moe_woq_kernl_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool is_distributed) {
+  return grouped_mixtral_moe_impl(
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis.size(),
+      is_distributed,
+      [&](int64_t e, const at::Tensor& curr_state) {
+        return mixtral_moe_woq_expert_forward(
+            curr_state, gate_weis[e], up_weis[e], down_weis[e]);
+      });
+}
 } // anonymous namespace
 
 IPEX_REGISTER_DISPATCH(
@@ -142,6 +329,15 @@ IPEX_REGISTER_DISPATCH(
     mixtral_moe_woq_kernel_stub,
     &mixtral_moe_woq_kernl_impl);
 IPEX_REGISTER_DISPATCH(mixtral_moe_kernel_stub, &mixtral_moe_kernl_impl);
+IPEX_REGISTER_DISPATCH(
+    grouped_mixtral_moe_tpp_kernel_stub,
+    &grouped_mixtral_moe_tpp_kernl_impl);
+IPEX_REGISTER_DISPATCH(
+    grouped_mixtral_moe_woq_kernel_stub,
+    &grouped_mixtral_moe_woq_kernl_impl);
+IPEX_REGISTER_DISPATCH(
+    grouped_mixtral_moe_kernel_stub,
+    &grouped_mixtral_moe_kernl_impl);
 
 } // namespace cpu
 } // namespace torch_ipex
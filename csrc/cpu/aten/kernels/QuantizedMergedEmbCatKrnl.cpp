@@ -429,8 +429,11 @@ Tensor qmerged_embedding_cat_fw_impl(
         offsets[i].is_contiguous() && offsets[i].scalar_type() == index_type);
     TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
         qweights[i].is_contiguous() && qweights[i].scalar_type() == int8_type);
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(
-        qweights[i].dim() == 2 && qweights[i].size(1) == emb_dim);
+    // unlike the fp path, the int8 kernel needs the tables and the dense
+    // feature to share one dim
+    TORCH_CHECK(
+        qweights[i].dim() == 2 && qweights[i].size(1) == emb_dim,
+        "qmerged_embeddingbag_cat: expect all tables have the dim of the dense feature");
     // handle last offsets
     last_offsets[i] = indices[i].numel();
     w_scale[i] = native::q_scale_quant(qweights[i]);
@@ -0,0 +1,63 @@
+#include <ATen/ATen.h>
+#include <aten/ShmReduce.h>
+#include <torch/all.h>
+#include "vec/vec.h"
+
+namespace torch_ipex {
+namespace cpu {
+
+namespace {
+
+template <typename T>
+void shm_reduce_add_impl(
+    at::Tensor& out,
+    const std::vector<at::Tensor>& inputs) {
+  constexpr int64_t block_size = 512;
+  int64_t size = out.numel();
+  int64_t nblocks = (size + block_size - 1) / block_size;
+  int64_t ninputs = inputs.size();
+  std::vector<T*> in_ptrs;
+  for (auto& input : inputs) {
+    in_ptrs.push_back(input.data_ptr<T>());
+  }
+  T* out_ptr = out.data_ptr<T>();
+#pragma omp parallel for
+  for (int64_t b = 0; b < nblocks; b++) {
+    int64_t offset = b * block_size;
+    int64_t len = std::min(block_size, size - offset);
+    // accumulate in fp32 so that bf16/fp16 are rounded only once
+    float acc[block_size];
+    torch_ipex::cpu::kernel::move_ker<float, T>(acc, in_ptrs[0] + offset, len);
+    for (int64_t i = 1; i < ninputs; i++) {
+      torch_ipex::cpu::kernel::add_ker<float, T>(acc, in_ptrs[i] + offset, len);
+    }
+    torch_ipex::cpu::kernel::move_ker<T, float>(out_ptr + offset, acc, len);
+  }
+}
+
+void shm_reduce_add_kernel_impl(
+    at::Tensor& out,
+    const std::vector<at::Tensor>& inputs) {
+  RECORD_FUNCTION("ipex::shm_reduce_add", c10::ArrayRef<c10::IValue>({}));
+  auto dtype = out.scalar_type();
+  if (dtype == at::ScalarType::BFloat16) {
+    shm_reduce_add_impl<at::BFloat16>(out, inputs);
+  } else if (dtype == at::ScalarType::Half) {
+    shm_reduce_add_impl<at::Half>(out, inputs);
+  } else if (dtype == at::ScalarType::Float) {
+    shm_reduce_add_impl<float>(out, inputs);
+  } else {
+    TORCH_CHECK(
+        false,
+        "shm_reduce_add: data type ",
+        dtype,
+        " is not supported, expect float, bfloat16 or half");
+  }
+}
+
+} // anonymous namespace
+
+IPEX_REGISTER_DISPATCH(shm_reduce_add_kernel_stub, &shm_reduce_add_kernel_impl);
+
+} // namespace cpu
+} // namespace torch_ipex
@@ -19,6 +19,8 @@ void adam_fused_step_kernel(
     const at::Tensor& grad,
     const at::Tensor& param2,
     bool amsgrad,
+    bool decoupled_weight_decay,
+    double grad_scale_double,
     double beta2_double,
     double learning_rate_double,
     double weight_decay_double,
@@ -37,6 +39,9 @@ void adam_fused_step_kernel(
   scalar_t beta2 = scalar_t(beta2_double);
   scalar_t learning_rate = scalar_t(learning_rate_double);
   scalar_t weight_decay = scalar_t(weight_decay_double);
+  scalar_t grad_scale = scalar_t(grad_scale_double);
+  scalar_t param_decay =
+      scalar_t(1 - learning_rate_double * weight_decay_double);
   scalar_t eps = scalar_t(eps_double);
   scalar_t step_size = scalar_t(step_size_double);
   scalar_t bias_correction2_sqrt = scalar_t(bias_correction2_sqrt_double);
@@ -64,10 +69,19 @@ void adam_fused_step_kernel(
         for (; d < size - (size % Vec::size()); d += Vec::size()) {
           Vec param_vec = Vec::loadu(param_ptr + d);
           Vec grad_vec = Vec::loadu(grad_ptr + d);
+          if (grad_scale != 1.f) {
+            // unscale and clip the grad inside the update
+            grad_vec = grad_vec * Vec(grad_scale);
+          }
           if (weight_decay != 0.f) {
-            // only accumulate weight decay when weight_decay != 0 to avoid NaN
-            // propagation from param to grad
-            grad_vec += param_vec * Vec(weight_decay);
+            if (decoupled_weight_decay) {
+              // AdamW: param.mul_(1 - lr * weight_decay)
+              param_vec = param_vec * Vec(param_decay);
+            } else {
+              // only accumulate weight decay when weight_decay != 0 to avoid
+              // NaN propagation from param to grad
+              grad_vec += param_vec * Vec(weight_decay);
+            }
           }
 
           Vec exp_avg_vec = Vec::loadu(exp_avg_ptr + d);
@@ -101,10 +115,17 @@ void adam_fused_step_kernel(
         }
         for (; d < size; d++) {
           scalar_t grad_val = grad_ptr[d];
+          if (grad_scale != 1.f) {
+            grad_val = grad_val * grad_scale;
+          }
           if (weight_decay != 0.f) {
-            // only accumulate weight decay when weight_decay != 0 to avoid NaN
-            // propagation from param to grad
-            grad_val += param_ptr[d] * weight_decay;
+            if (decoupled_weight_decay) {
+              param_ptr[d] = param_ptr[d] * param_decay;
+            } else {
+              // only accumulate weight decay when weight_decay != 0 to avoid
+              // NaN propagation from param to grad
+              grad_val += param_ptr[d] * weight_decay;
+            }
           }
           // exp_avg.lerp_(grad, 1 - beta1)
           // exactly match
@@ -143,6 +164,8 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
     const at::Tensor& grad,
     const at::Tensor& param2,
     bool amsgrad,
+    bool decoupled_weight_decay,
+    double grad_scale_double,
     double beta2_double,
     double learning_rate_double,
     double weight_decay_double,
@@ -181,6 +204,8 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
   float beta2 = float(beta2_double);
   float learning_rate = float(learning_rate_double);
   float weight_decay = float(weight_decay_double);
+  float grad_scale = float(grad_scale_double);
+  float param_decay = float(1 - learning_rate_double * weight_decay_double);
   float eps = float(eps_double);
   float step_size = float(step_size_double);
   float bias_correction2_sqrt = float(bias_correction2_sqrt_double);
@@ -210,6 +235,11 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
           bVec grad_bvec = bVec::loadu(grad_ptr + d);
           fVec grad_fvec, grad_fvec2;
           std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
+          if (grad_scale != 1.f) {
+            // unscale and clip the grad inside the update
+            grad_fvec = grad_fvec * fVec(grad_scale);
+            grad_fvec2 = grad_fvec2 * fVec(grad_scale);
+          }
           // load param vec
           bVec param_bvec = bVec::loadu(param_ptr + d);
           bVec param2_bvec = bVec::loadu(param2_ptr + d);
@@ -218,10 +248,16 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
               at::vec::pack_bfloat16_float(param_bvec, param2_bvec);
           // weight decay
           if (weight_decay != 0.f) {
-            // only accumulate weight decay when weight_decay != 0 to avoid NaN
-            // propagation from param to grad
-            grad_fvec = grad_fvec + param_fvec * fVec(weight_decay);
-            grad_fvec2 = grad_fvec2 + param_fvec2 * fVec(weight_decay);
+            if (decoupled_weight_decay) {
+              // AdamW: param.mul_(1 - lr * weight_decay)
+              param_fvec = param_fvec * fVec(param_decay);
+              param_fvec2 = param_fvec2 * fVec(param_decay);
+            } else {
+              // only accumulate weight decay when weight_decay != 0 to avoid
+              // NaN propagation from param to grad
+              grad_fvec = grad_fvec + param_fvec * fVec(weight_decay);
+              grad_fvec2 = grad_fvec2 + param_fvec2 * fVec(weight_decay);
+            }
           }
 
           // update exp_avg, exp_avg_sq
@@ -283,10 +319,17 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
           float param_val =
               at::vec::pack_bfloat16_float(param_ptr[d], param2_ptr[d]);
           float grad_val = grad_ptr[d];
+          if (grad_scale != 1.f) {
+            grad_val = grad_val * grad_scale;
+          }
           if (weight_decay != 0.f) {
-            // only accumulate weight decay when weight_decay != 0 to avoid NaN
-            // propagation from param to grad
-            grad_val = grad_val + param_val * weight_decay;
+            if (decoupled_weight_decay) {
+              param_val = param_val * param_decay;
+            } else {
+              // only accumulate weight decay when weight_decay != 0 to avoid
+              // NaN propagation from param to grad
+              grad_val = grad_val + param_val * weight_decay;
+            }
           }
           // exp_avg.lerp_(grad, 1 - beta1)
           // exactly match
@@ -327,6 +370,8 @@ void adam_fused_step_kernel<float, at::BFloat16>(
     const at::Tensor& grad,
     const at::Tensor& param2,
     bool amsgrad,
+    bool decoupled_weight_decay,
+    double grad_scale_double,
     double beta2_double,
     double learning_rate_double,
     double weight_decay_double,
@@ -365,6 +410,8 @@ void adam_fused_step_kernel<float, at::BFloat16>(
   float beta2 = float(beta2_double);
   float learning_rate = float(learning_rate_double);
   float weight_decay = float(weight_decay_double);
+  float grad_scale = float(grad_scale_double);
+  float param_decay = float(1 - learning_rate_double * weight_decay_double);
   float eps = float(eps_double);
   float step_size = float(step_size_double);
   float bias_correction2_sqrt = float(bias_correction2_sqrt_double);
@@ -394,15 +441,26 @@ void adam_fused_step_kernel<float, at::BFloat16>(
           bVec grad_bvec = bVec::loadu(grad_ptr + d);
           fVec grad_fvec, grad_fvec2;
           std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
+          if (grad_scale != 1.f) {
+            // unscale and clip the grad inside the update
+            grad_fvec = grad_fvec * fVec(grad_scale);
+            grad_fvec2 = grad_fvec2 * fVec(grad_scale);
+          }
           // load param vec
           fVec param_fvec = fVec::loadu(param_ptr + d);
           fVec param_fvec2 = fVec::loadu(param_ptr + d + fVec::size());
           // weight decay
           if (weight_decay != 0.f) {
-            // only accumulate weight decay when weight_decay != 0 to avoid NaN
-            // propagation from param to grad
-            grad_fvec = grad_fvec + param_fvec * fVec(weight_decay);
-            grad_fvec2 = grad_fvec2 + param_fvec2 * fVec(weight_decay);
+            if (decoupled_weight_decay) {
+              // AdamW: param.mul_(1 - lr * weight_decay)
+              param_fvec = param_fvec * fVec(param_decay);
+              param_fvec2 = param_fvec2 * fVec(param_decay);
+            } else {
+              // only accumulate weight decay when weight_decay != 0 to avoid
+              // NaN propagation from param to grad
+              grad_fvec = grad_fvec + param_fvec * fVec(weight_decay);
+              grad_fvec2 = grad_fvec2 + param_fvec2 * fVec(weight_decay);
+            }
           }
           // update exp_avg, exp_avg_sq
           // exp_avg.lerp_(grad, 1 - beta1)
@@ -462,10 +520,17 @@ void adam_fused_step_kernel<float, at::BFloat16>(
         }
         for (; d < size; d++) {
           float grad_val = grad_ptr[d];
+          if (grad_scale != 1.f) {
+            grad_val = grad_val * grad_scale;
+          }
           if (weight_decay != 0.f) {
-            // only accumulate weight decay when weight_decay != 0 to avoid NaN
-            // propagation from param to grad
-            grad_val = grad_val + param_ptr[d] * weight_decay;
+            if (decoupled_weight_decay) {
+              param_ptr[d] = param_ptr[d] * param_decay;
+            } else {
+              // only accumulate weight decay when weight_decay != 0 to avoid
+              // NaN propagation from param to grad
+              grad_val = grad_val + param_ptr[d] * weight_decay;
+            }
           }
           // exp_avg.lerp_(grad, 1 - beta1)
           // exactly match
@@ -504,6 +569,8 @@ void adam_fused_step_kernel_impl(
     const at::Tensor& grad_,
     const at::Tensor& param2_,
     bool amsgrad,
+    bool decoupled_weight_decay,
+    double grad_scale,
     double step,
     double beta1,
     double beta2,
@@ -537,6 +604,8 @@ void adam_fused_step_kernel_impl(
         grad,
         param2,
         amsgrad,
+        decoupled_weight_decay,
+        grad_scale,
         beta2,
         learning_rate,
         weight_decay,
@@ -554,6 +623,8 @@ void adam_fused_step_kernel_impl(
         grad,
         param2,
         amsgrad,
+        decoupled_weight_decay,
+        grad_scale,
         beta2,
         learning_rate,
         weight_decay,
@@ -573,6 +644,8 @@ void adam_fused_step_kernel_impl(
         grad,
         param2,
         amsgrad,
+        decoupled_weight_decay,
+        grad_scale,
         beta2,
         learning_rate,
         weight_decay,
@@ -592,6 +665,8 @@ void adam_fused_step_kernel_impl(
         grad,
         param2,
         amsgrad,
+        decoupled_weight_decay,
+        grad_scale,
         beta2,
         learning_rate,
         weight_decay,
@@ -0,0 +1,125 @@
+#include <ATen/Parallel.h>
+#include <aten/optimizer/optimizer.h>
+#include "vec/vec.h"
+
+#include <torch/all.h>
+#include <torch/csrc/autograd/function.h>
+
+namespace torch_ipex {
+namespace cpu {
+
+namespace {
+
+using namespace at::vec;
+
+// number of elements reduced by one task
+constexpr int64_t kGradNormChunkSize = 16384;
+
+template <typename scalar_t>
+double sum_square(const scalar_t* data, int64_t size) {
+  using Vec = at::vec::Vectorized<scalar_t>;
+  Vec acc_vec = Vec(scalar_t(0));
+  int64_t d = 0;
+  for (; d < size - (size % Vec::size()); d += Vec::size()) {
+    Vec data_vec = Vec::loadu(data + d);
+    acc_vec = fmadd(data_vec, data_vec, acc_vec);
+  }
+  double acc =
+      vec_reduce_all<scalar_t>([](Vec& x, Vec& y) { return x + y; }, acc_vec);
+  for (; d < size; d++) {
+    acc += double(data[d]) * double(data[d]);
+  }
+  return acc;
+}
+
+// accumulated in float, reduced chunk by chunk in double
+template <typename scalar_t>
+double sum_square_reduced_float(const scalar_t* data, int64_t size) {
+  using bVec = at::vec::Vectorized<scalar_t>;
+  using fVec = at::vec::Vectorized<float>;
+  fVec acc_fvec = fVec(0.f);
+  fVec acc_fvec2 = fVec(0.f);
+  int64_t d = 0;
+  for (; d < size - (size % bVec::size()); d += bVec::size()) {
+    fVec data_fvec, data_fvec2;
+    std::tie(data_fvec, data_fvec2) =
+        convert_to_float<scalar_t>(bVec::loadu(data + d));
+    acc_fvec = fmadd(data_fvec, data_fvec, acc_fvec);
+    acc_fvec2 = fmadd(data_fvec2, data_fvec2, acc_fvec2);
+  }
+  fVec acc_sum = acc_fvec + acc_fvec2;
+  double acc =
+      vec_reduce_all<float>([](fVec& x, fVec& y) { return x + y; }, acc_sum);
+  for (; d < size; d++) {
+    float val = float(data[d]);
+    acc += double(val) * double(val);
+  }
+  return acc;
+}
+
+double chunk_sum_square(const at::Tensor& grad, int64_t begin, int64_t end) {
+  switch (grad.scalar_type()) {
+    case at::kDouble:
+      return sum_square<double>(grad.data_ptr<double>() + begin, end - begin);
+    case at::kFloat:
+      return sum_square<float>(grad.data_ptr<float>() + begin, end - begin);
+    case at::kBFloat16:
+      return sum_square_reduced_float<at::BFloat16>(
+          grad.data_ptr<at::BFloat16>() + begin, end - begin);
+    case at::kHalf:
+      return sum_square_reduced_float<at::Half>(
+          grad.data_ptr<at::Half>() + begin, end - begin);
+    default:
+      TORCH_CHECK(false, "expect double, float, bfloat16 or half grads");
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor> grad_norm_and_found_inf_kernel_impl(
+    at::TensorList grads_) {
+  // split all the grads into chunks, so that the many small grads and the few
+  // large ones are reduced by one parallel loop
+  std::vector<at::Tensor> grads;
+  std::vector<std::tuple<int64_t, int64_t, int64_t>> chunks;
+  for (const auto& grad_ : grads_) {
+    if (grad_.numel() == 0) {
+      continue;
+    }
+    int64_t idx = grads.size();
+    grads.push_back(grad_.contiguous());
+    for (int64_t begin = 0; begin < grad_.numel();
+         begin += kGradNormChunkSize) {
+      chunks.emplace_back(
+          idx, begin, std::min(begin + kGradNormChunkSize, grad_.numel()));
+    }
+  }
+
+  // per chunk partial sums, added in order to be deterministic
+  std::vector<double> scratchpad(chunks.size(), 0.0);
+  at::parallel_for(0, chunks.size(), 1, [&](int64_t begin, int64_t end) {
+    for (int64_t i = begin; i < end; i++) {
+      int64_t idx, chunk_begin, chunk_end;
+      std::tie(idx, chunk_begin, chunk_end) = chunks[i];
+      scratchpad[i] = chunk_sum_square(grads[idx], chunk_begin, chunk_end);
+    }
+  });
+  double total_sum_square = 0.0;
+  for (const auto& partial : scratchpad) {
+    total_sum_square += partial;
+  }
+
+  // inf or NaN in any grad makes the sum of squares inf or NaN, the squares
+  // of the finite grads (|grad| < 1e19) don't overflow the float chunk sums
+  bool found_inf = !std::isfinite(total_sum_square);
+  return std::make_tuple(
+      at::scalar_tensor(std::sqrt(total_sum_square), at::kFloat),
+      at::full({1}, found_inf ? 1.f : 0.f, at::kFloat));
+}
+
+} // anonymous namespace
+
+IPEX_REGISTER_DISPATCH(
+    grad_norm_and_found_inf_kernel_stub,
+    &grad_norm_and_found_inf_kernel_impl);
+
+} // namespace cpu
+} // namespace torch_ipex
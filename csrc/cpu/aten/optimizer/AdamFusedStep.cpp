@@ -9,7 +9,9 @@ namespace cpu {
 
 IPEX_DEFINE_DISPATCH(adam_fused_step_kernel_stub);
 
-void adam_fused_step(
+namespace {
+
+void adam_fused_step_impl(
     const at::Tensor& param_,
     const at::Tensor& exp_avg_,
     const at::Tensor& exp_avg_sq_,
@@ -22,10 +24,9 @@ void adam_fused_step(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps) {
-  RECORD_FUNCTION(
-      "torch_ipex::adam_fused_step", c10::ArrayRef<c10::IValue>({}));
-
+    double eps,
+    bool decoupled_weight_decay,
+    double grad_scale) {
   TORCH_CHECK(
       learning_rate >= 0, "Expect learning rate >= 0.0, got ", learning_rate);
   TORCH_CHECK(eps >= 0, "Expect eps >= 0.0, got ", eps);
@@ -76,6 +77,8 @@ void adam_fused_step(
       grad_,
       param2_,
       amsgrad,
+      decoupled_weight_decay,
+      grad_scale,
       step,
       beta1,
       beta2,
@@ -92,6 +95,8 @@ void adam_fused_step(
       grad_,
       param2_,
       amsgrad,
+      decoupled_weight_decay,
+      grad_scale,
       step,
       beta1,
       beta2,
@@ -100,6 +105,116 @@ void adam_fused_step(
       eps);
 }
 
+} // namespace
+
+void adam_fused_step(
+    const at::Tensor& param_,
+    const at::Tensor& exp_avg_,
+    const at::Tensor& exp_avg_sq_,
+    const at::Tensor& max_exp_avg_sq_,
+    const at::Tensor& grad_,
+    const at::Tensor& param2_,
+    bool amsgrad,
+    double step,
+    double beta1,
+    double beta2,
+    double learning_rate,
+    double weight_decay,
+    double eps) {
+  RECORD_FUNCTION(
+      "torch_ipex::adam_fused_step", c10::ArrayRef<c10::IValue>({}));
+  adam_fused_step_impl(
+      param_,
+      exp_avg_,
+      exp_avg_sq_,
+      max_exp_avg_sq_,
+      grad_,
+      param2_,
+      amsgrad,
+      step,
+      beta1,
+      beta2,
+      learning_rate,
+      weight_decay,
+      eps,
+      /* decoupled_weight_decay */ false,
+      /* grad_scale */ 1.0);
+}
+
+// AdamW, the weight decay is applied to param directly instead of grad
+void adamw_fused_step(
+    const at::Tensor& param_,
+    const at::Tensor& exp_avg_,
+    const at::Tensor& exp_avg_sq_,
+    const at::Tensor& max_exp_avg_sq_,
+    const at::Tensor& grad_,
+    const at::Tensor& param2_,
+    bool amsgrad,
+    double step,
+    double beta1,
+    double beta2,
+    double learning_rate,
+    double weight_decay,
+    double eps) {
+  RECORD_FUNCTION(
+      "torch_ipex::adamw_fused_step", c10::ArrayRef<c10::IValue>({}));
+  adam_fused_step_impl(
+      param_,
+      exp_avg_,
+      exp_avg_sq_,
+      max_exp_avg_sq_,
+      grad_,
+      param2_,
+      amsgrad,
+      step,
+      beta1,
+      beta2,
+      learning_rate,
+      weight_decay,
+      eps,
+      /* decoupled_weight_decay */ true,
+      /* grad_scale */ 1.0);
+}
+
+// Adam (or AdamW if decoupled_weight_decay) with the grad multiplied by
+// grad_scale, e.g., the inverse of the loss scale times the clip coefficient
+void adam_fused_step_with_grad_scale(
+    const at::Tensor& param_,
+    const at::Tensor& exp_avg_,
+    const at::Tensor& exp_avg_sq_,
+    const at::Tensor& max_exp_avg_sq_,
+    const at::Tensor& grad_,
+    const at::Tensor& param2_,
+    bool amsgrad,
+    double step,
+    double beta1,
+    double beta2,
+    double learning_rate,
+    double weight_decay,
+    double eps,
+    bool decoupled_weight_decay,
+    double grad_scale) {
+  RECORD_FUNCTION(
+      "torch_ipex::adam_fused_step_with_grad_scale",
+      c10::ArrayRef<c10::IValue>({}));
+  adam_fused_step_impl(
+      param_,
+      exp_avg_,
+      exp_avg_sq_,
+      max_exp_avg_sq_,
+      grad_,
+      param2_,
+      amsgrad,
+      step,
+      beta1,
+      beta2,
+      learning_rate,
+      weight_decay,
+      eps,
+      decoupled_weight_decay,
+      grad_scale);
+}
+
 } // namespace cpu
 } // namespace torch_ipex
 
@@ -110,6 +225,14 @@ IPEX_LIBRARY_FRAGMENT() {
       "adam_fused_step",
       torch_ipex::cpu::adam_fused_step,
       at::DispatchKey::CPU);
+  IPEX_OP_REGISTER_DISPATCH(
+      "adamw_fused_step",
+      torch_ipex::cpu::adamw_fused_step,
+      at::DispatchKey::CPU);
+  IPEX_OP_REGISTER_DISPATCH(
+      "adam_fused_step_with_grad_scale",
+      torch_ipex::cpu::adam_fused_step_with_grad_scale,
+      at::DispatchKey::CPU);
 }
 
 } // namespace
@@ -0,0 +1,56 @@
+#include "optimizer.h"
+
+#include <torch/all.h>
+#include <torch/csrc/autograd/function.h>
+#include "csrc/utils/CustomOperatorRegistration.h"
+
+namespace torch_ipex {
+namespace cpu {
+
+IPEX_DEFINE_DISPATCH(grad_norm_and_found_inf_kernel_stub);
+
+/**
+ * L2 norm of the grads as if they were concatenated into a single vector, and
+ * whether any of them has inf or NaN, computed in one parallel pass over the
+ * grads. Used to unscale and clip the grads inside the fused update.
+ *@param grads Grads to reduce, Double, Float, BFloat16 or Half.
+ *@return (norm, found_inf), the Float norm of the grads and a Float tensor of
+ *shape (1,) which is 1.0 if any inf or NaN is found else 0.0, as the found_inf
+ *of GradScaler.
+ */
+std::tuple<at::Tensor, at::Tensor> grad_norm_and_found_inf(
+    at::TensorList grads) {
+  RECORD_FUNCTION(
+      "torch_ipex::grad_norm_and_found_inf", c10::ArrayRef<c10::IValue>({}));
+
+  for (const auto& grad : grads) {
+    TORCH_CHECK(
+        grad.layout() == at::kStrided,
+        "grad_norm_and_found_inf: expect dense grads");
+    TORCH_CHECK(
+        grad.scalar_type() == at::kDouble || grad.scalar_type() == at::kFloat ||
+            grad.scalar_type() == at::kBFloat16 ||
+            grad.scalar_type() == at::kHalf,
+        "grad_norm_and_found_inf: expect double, float, bfloat16 or half grads, got ",
+        grad.scalar_type());
+  }
+
+  /*
+  pointer to grad_norm_and_found_inf_kernel_impl(grads);
+  */
+  return grad_norm_and_found_inf_kernel_stub(kCPU, grads);
+}
+
+} // namespace cpu
+} // namespace torch_ipex
+
+namespace {
+
+IPEX_LIBRARY_FRAGMENT() {
+  IPEX_OP_REGISTER_DISPATCH(
+      "grad_norm_and_found_inf",
+      torch_ipex::cpu::grad_norm_and_found_inf,
+      at::DispatchKey::CPU);
+}
+
+} // namespace
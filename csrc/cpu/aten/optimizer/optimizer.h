@@ -56,6 +56,8 @@ void adam_fused_step_kernel_impl(
     const at::Tensor& grad_,
     const at::Tensor& param2_,
     bool amsgrad,
+    bool decoupled_weight_decay,
+    double grad_scale,
     double step,
     double beta1,
     double beta2,
@@ -118,6 +120,8 @@ using adam_fused_step_kernel_fn = void (*)(
     const at::Tensor&,
     const at::Tensor&,
     bool,
+    bool,
+    double,
     double,
     double,
     double,
@@ -126,6 +130,12 @@ using adam_fused_step_kernel_fn = void (*)(
     double);
 IPEX_DECLARE_DISPATCH(adam_fused_step_kernel_fn, adam_fused_step_kernel_stub);
 
+using grad_norm_and_found_inf_kernel_fn =
+    std::tuple<at::Tensor, at::Tensor> (*)(at::TensorList);
+IPEX_DECLARE_DISPATCH(
+    grad_norm_and_found_inf_kernel_fn,
+    grad_norm_and_found_inf_kernel_stub);
+
 using lars_norm_kernel_fn = float (*)(const at::Tensor&);
 
 IPEX_DECLARE_DISPATCH(lars_norm_kernel_fn, lars_norm_kernel_stub);
@@ -0,0 +1,346 @@
+#include "shm_comm.h"
+
+#include <aten/ShmReduce.h>
+#include <fcntl.h>
+#include <immintrin.h>
+#include <sched.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <sys/syscall.h>
+#include <torch/all.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cerrno>
+#include <chrono>
+#include <cstring>
+#include <thread>
+#include <utility>
+
+namespace torch_ipex {
+namespace cpu {
+
+namespace {
+
+constexpr uint64_t kShmCommMagic = 0x69706578736d6301; // "ipexsmc" + version
+constexpr size_t kPageSize = 4096;
+constexpr int64_t kPartitionAlign = 32;
+constexpr int kAttachTimeoutSeconds = 300;
+// MPOL_PREFERRED of <numaif.h>, not included to avoid depending on libnuma
+constexpr int kMpolPreferred = 1;
+
+size_t round_up(size_t size, size_t align) {
+  return (size + align - 1) / align * align;
+}
+
+int current_numa_node() {
+  unsigned cpu = 0, node = 0;
+  if (syscall(SYS_getcpu, &cpu, &node, nullptr) != 0) {
+    return -1;
+  }
+  return (int)node;
+}
+
+// Prefers the pages of [addr, addr + size) on numa_node. Placement is a
+// hint, the range falls back to the first touch policy if mbind fails.
+void prefer_numa_node(void* addr, size_t size, int numa_node) {
+  if (numa_node < 0 || numa_node >= 1024) {
+    return;
+  }
+  unsigned long nodemask[1024 / (8 * sizeof(unsigned long))] = {0};
+  nodemask[numa_node / (8 * sizeof(unsigned long))] |= 1UL
+      << (numa_node % (8 * sizeof(unsigned long)));
+  syscall(SYS_mbind, addr, size, kMpolPreferred, nodemask, 1024 + 1, 0);
+}
+
+} // anonymous namespace
+
+ShmCommunicator& ShmCommunicator::getInstance() {
+  static ShmCommunicator instance;
+  return instance;
+}
+
+ShmCommunicator::~ShmCommunicator() {
+  destroy();
+}
+
+void* ShmCommunicator::slot(int64_t rank, int64_t buffer) {
+  return slots_ + (buffer * world_size_ + rank) * buffer_size_;
+}
+
+void ShmCommunicator::init(
+    int64_t rank,
+    int64_t world_size,
+    const std::string& name,
+    int64_t buffer_size,
+    int64_t numa_node) {
+  TORCH_CHECK(
+      !isInitialized(), "shm communicator has already been initialized");
+  TORCH_CHECK(
+      world_size >= 1 && rank >= 0 && rank < world_size,
+      "shm communicator: invalid rank ",
+      rank,
+      " of world size ",
+      world_size);
+  TORCH_CHECK(buffer_size > 0, "shm communicator: buffer_size must be > 0");
+  rank_ = rank;
+  world_size_ = world_size;
+  buffer_size_ = round_up(buffer_size, kPageSize);
+  size_t counters_size = round_up(world_size * sizeof(Counter), kPageSize);
+  total_size_ = kPageSize + counters_size + 2 * world_size * buffer_size_;
+
+  int fd = -1;
+  if (rank == 0) {
+    // remove the segment left by a crashed run of the same name
+    shm_unlink(name.c_str());
+    fd = shm_open(name.c_str(), O_CREAT | O_EXCL | O_RDWR, S_IRUSR | S_IWUSR);
+    TORCH_CHECK(
+        fd != -1,
+        "shm communicator: failed to create ",
+        name,
+        ": ",
+        strerror(errno));
+    TORCH_CHECK(
+        ftruncate(fd, total_size_) == 0,
+        "shm communicator: failed to allocate ",
+        total_size_,
+        " bytes: ",
+        strerror(errno));
+  } else {
+    auto deadline = std::chrono::steady_clock::now() +
+        std::chrono::seconds(kAttachTimeoutSeconds);
+    while (true) {
+      fd = shm_open(name.c_str(), O_RDWR, S_IRUSR | S_IWUSR);
+      if (fd != -1) {
+        struct stat st;
+        if (fstat(fd, &st) == 0 && (size_t)st.st_size == total_size_) {
+          break;
+        }
+        close(fd);
+        fd = -1;
+      }
+      TORCH_CHECK(
+          std::chrono::steady_clock::now() < deadline,
+          "shm communicator: timeout to attach to ",
+          name,
+          " created by rank 0");
+      std::this_thread::sleep_for(std::chrono::milliseconds(1));
+    }
+  }
+  void* addr =
+      mmap(NULL, total_size_, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+  close(fd);
+  TORCH_CHECK(
+      addr != MAP_FAILED,
+      "shm communicator: failed to map ",
+      name,
+      ": ",
+      strerror(errno));
+  header_ = (Header*)addr;
+  counters_ = (Counter*)((uint8_t*)addr + kPageSize);
+  slots_ = (uint8_t*)addr + kPageSize + counters_size;
+
+  if (rank == 0) {
+    header_->world_size = world_size;
+    header_->buffer_size = buffer_size_;
+    header_->attached.store(0, std::memory_order_relaxed);
+    header_->magic.store(kShmCommMagic, std::memory_order_release);
+  } else {
+    while (header_->magic.load(std::memory_order_acquire) != kShmCommMagic) {
+      _mm_pause();
+    }
+    TORCH_CHECK(
+        header_->world_size == world_size &&
+            header_->buffer_size == buffer_size_,
+        "shm communicator: world size or buffer size of rank ",
+        rank,
+        " does not match the ones of rank 0");
+  }
+
+  // The slots of a rank are only written by it, keep them on its NUMA node.
+  // The first touch places the pages if mbind is not available.
+  if (numa_node < 0) {
+    numa_node = current_numa_node();
+  }
+  for (int64_t buffer = 0; buffer < 2; buffer++) {
+    prefer_numa_node(slot(rank, buffer), buffer_size_, numa_node);
+    memset(slot(rank, buffer), 0, buffer_size_);
+  }
+
+  header_->attached.fetch_add(1, std::memory_order_acq_rel);
+  while (header_->attached.load(std::memory_order_acquire) < world_size) {
+    std::this_thread::sleep_for(std::chrono::microseconds(100));
+  }
+  if (rank == 0) {
+    // all the ranks have mapped the segment, the name is not needed anymore
+    // and the memory is released once the last rank unmaps it
+    shm_unlink(name.c_str());
+  }
+  seq_ = 0;
+  calls_ = 0;
+}
+
+void ShmCommunicator::destroy() {
+  if (!isInitialized()) {
+    return;
+  }
+  munmap(header_, total_size_);
+  header_ = nullptr;
+  counters_ = nullptr;
+  slots_ = nullptr;
+  rank_ = 0;
+  world_size_ = 1;
+}
+
+void ShmCommunicator::sync() {
+  seq_++;
+  counters_[rank_].value.store(seq_, std::memory_order_release);
+  for (int64_t r = 0; r < world_size_; r++) {
+    while (counters_[r].value.load(std::memory_order_acquire) < seq_) {
+      _mm_pause();
+    }
+  }
+}
+
+void ShmCommunicator::barrier() {
+  TORCH_CHECK(isInitialized(), "shm communicator is not initialized");
+  if (world_size_ > 1) {
+    sync();
+  }
+}
+
+void ShmCommunicator::allReduceChunk(at::Tensor chunk) {
+  // Two sets of slots are used in turn, so the slots of this call are not
+  // overwritten before all the ranks have passed the first sync of the next
+  // call, i.e., finished reading them.
+  int64_t buffer = calls_++ % 2;
+  int64_t numel = chunk.numel();
+  auto options = chunk.options();
+  at::from_blob(slot(rank_, buffer), {numel}, options).copy_(chunk);
+  sync();
+
+  int64_t per_rank =
+      round_up((numel + world_size_ - 1) / world_size_, kPartitionAlign);
+  auto partition = [&](int64_t r) {
+    int64_t start = std::min(r * per_rank, numel);
+    return std::make_pair(start, std::min(per_rank, numel - start));
+  };
+  auto part = partition(rank_);
+  if (part.second > 0) {
+    std::vector<at::Tensor> inputs;
+    for (int64_t r = 0; r < world_size_; r++) {
+      inputs.push_back(at::from_blob(
+          (uint8_t*)slot(r, buffer) + part.first * chunk.element_size(),
+          {part.second},
+          options));
+    }
+    shm_reduce_add_kernel_stub(kCPU, inputs[rank_], inputs);
+  }
+  sync();
+
+  for (int64_t r = 0; r < world_size_; r++) {
+    auto p = partition(r);
+    if (p.second == 0) {
+      continue;
+    }
+    chunk.narrow(0, p.first, p.second)
+        .copy_(at::from_blob(
+            (uint8_t*)slot(r, buffer) + p.first * chunk.element_size(),
+            {p.second},
+            options));
+  }
+}
+
+at::Tensor ShmCommunicator::allReduceAdd(at::Tensor& t_in) {
+  TORCH_CHECK(isInitialized(), "shm communicator is not initialized");
+  if (world_size_ == 1) {
+    return t_in;
+  }
+  auto t = t_in.contiguous();
+  auto flat = t.view({-1});
+  int64_t chunk_numel = buffer_size_ / t.element_size();
+  for (int64_t offset = 0; offset < flat.numel(); offset += chunk_numel) {
+    allReduceChunk(
+        flat.narrow(0, offset, std::min(chunk_numel, flat.numel() - offset)));
+  }
+  if (!t.is_same(t_in)) {
+    t_in.copy_(t);
+  }
+  return t_in;
+}
+
+at::Tensor ShmCommunicator::allGather(
+    const at::Tensor& t_in,
+    const std::vector<int64_t>& cols_per_rank) {
+  TORCH_CHECK(isInitialized(), "shm communicator is not initialized");
+  if (world_size_ == 1) {
+    return t_in;
+  }
+  TORCH_CHECK(
+      (int64_t)cols_per_rank.size() == world_size_ + 1,
+      "shm allgather: expect world_size + 1 entries in cols_per_rank");
+  auto t = t_in.contiguous();
+  TORCH_CHECK(
+      (int64_t)(t.numel() * t.element_size()) <= buffer_size_,
+      "shm allgather: the input of ",
+      t.numel() * t.element_size(),
+      " bytes exceeds the buffer of ",
+      buffer_size_,
+      " bytes, set a larger IPEX_SHM_COMM_BUFFER_SIZE");
+  int64_t buffer = calls_++ % 2;
+  at::from_blob(slot(rank_, buffer), t.sizes(), t.options()).copy_(t);
+  sync();
+  std::vector<at::Tensor> outputs;
+  auto shape = t.sizes().vec();
+  for (int64_t r = 0; r < world_size_; r++) {
+    shape.back() = cols_per_rank[r + 1] - cols_per_rank[r];
+    outputs.push_back(at::from_blob(slot(r, buffer), shape, t.options()));
+  }
+  return at::cat(outputs, -1);
+}
+
+int64_t shm_comm_get_rank() {
+  return ShmCommunicator::getInstance().getRank();
+}
+
+int64_t shm_comm_get_world_size() {
+  return ShmCommunicator::getInstance().getSize();
+}
+
+void shm_comm_barrier() {
+  ShmCommunicator::getInstance().barrier();
+}
+
+at::Tensor shm_all_reduce_add(at::Tensor t_in) {
+  RECORD_FUNCTION("ipex::shm_all_reduce_add", c10::ArrayRef<c10::IValue>({}));
+  return ShmCommunicator::getInstance().allReduceAdd(t_in);
+}
+
+at::Tensor shm_allgather(
+    at::Tensor t_in,
+    std::vector<int64_t> cols_per_rank,
+    int64_t world_size) {
+  RECORD_FUNCTION("ipex::shm_allgather", c10::ArrayRef<c10::IValue>({}));
+  TORCH_CHECK(
+      world_size == ShmCommunicator::getInstance().getSize(),
+      "shm allgather: world_size does not match the shm communicator");
+  return ShmCommunicator::getInstance().allGather(t_in, cols_per_rank);
+}
+
+} // namespace cpu
+} // namespace torch_ipex
+
+namespace {
+
+TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
+  m.def("shm_all_reduce_add(Tensor(a!) t_in)-> (Tensor)");
+  m.impl(
+      "shm_all_reduce_add",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::shm_all_reduce_add);
+  m.def(
+      "shm_allgather(Tensor input, int[] output, int world_size) -> (Tensor)");
+  m.impl(
+      "shm_allgather", c10::DispatchKey::CPU, torch_ipex::cpu::shm_allgather);
+}
+} // namespace
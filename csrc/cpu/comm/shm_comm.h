@@ -0,0 +1,90 @@
+#pragma once
+
+#include <ATen/ATen.h>
+
+#include <atomic>
+#include <cstdint>
+#include <string>
+#include <vector>
+
+namespace torch_ipex {
+namespace cpu {
+
+/**
+ * Communicator of the ranks on one host over POSIX shared memory, which does
+ * not depend on oneCCL or MPI. Each rank owns two slots (double buffered) of
+ * buffer_size bytes in the shared segment, placed on the NUMA node of the
+ * rank. A collective copies the local data into the slot of the rank, then
+ * each rank reduces its own partition of all the slots and at last gathers
+ * the reduced partitions, with one barrier after each of the first two
+ * steps. Tensors larger than buffer_size are reduced chunk by chunk.
+ */
+class ShmCommunicator {
+ public:
+  static ShmCommunicator& getInstance();
+
+  /**
+   * Creates (rank 0) or attaches to (other ranks) the shared segment name.
+   * Returns after all the ranks have attached. numa_node -1 takes the node
+   * of the CPU the rank is running on.
+   */
+  void init(
+      int64_t rank,
+      int64_t world_size,
+      const std::string& name,
+      int64_t buffer_size,
+      int64_t numa_node);
+  void destroy();
+  bool isInitialized() const {
+    return header_ != nullptr;
+  }
+  int64_t getRank() const {
+    return rank_;
+  }
+  int64_t getSize() const {
+    return world_size_;
+  }
+
+  void barrier();
+  at::Tensor allReduceAdd(at::Tensor& t_in);
+  at::Tensor allGather(
+      const at::Tensor& t_in,
+      const std::vector<int64_t>& cols_per_rank);
+
+ private:
+  ShmCommunicator() = default;
+  ~ShmCommunicator();
+  ShmCommunicator(const ShmCommunicator&) = delete;
+  ShmCommunicator& operator=(const ShmCommunicator&) = delete;
+
+  struct alignas(64) Counter {
+    std::atomic<uint64_t> value;
+  };
+  struct Header {
+    std::atomic<uint64_t> magic;
+    std::atomic<int64_t> attached;
+    int64_t world_size;
+    int64_t buffer_size;
+  };
+
+  void* slot(int64_t rank, int64_t buffer);
+  void sync();
+  void allReduceChunk(at::Tensor chunk);
+
+  int64_t rank_ = 0;
+  int64_t world_size_ = 1;
+  int64_t buffer_size_ = 0;
+  size_t total_size_ = 0;
+  uint64_t seq_ = 0;
+  uint64_t calls_ = 0;
+  Header* header_ = nullptr;
+  Counter* counters_ = nullptr;
+  uint8_t* slots_ = nullptr;
+};
+
+int64_t shm_comm_get_rank();
+int64_t shm_comm_get_world_size();
+void shm_comm_barrier();
+
+} // namespace cpu
+} // namespace torch_ipex
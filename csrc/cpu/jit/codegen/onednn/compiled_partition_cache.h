@@ -0,0 +1,196 @@
+#pragma once
+
+#include <array>
+#include <atomic>
+#include <list>
+#include <memory>
+#include <mutex>
+#include <unordered_map>
+#include <vector>
+
+namespace std {
+template <>
+struct hash<std::vector<int64_t>> {
+  size_t operator()(const std::vector<int64_t>& key) const {
+    size_t total = key.size();
+    size_t sum = 0;
+    if (total < 64) {
+      for (size_t i = 0; i < total; i++) {
+        sum += key[i] << i;
+      }
+    } else {
+      size_t batch = total / 64;
+      size_t remain = total % 64;
+      for (size_t bs = 0; bs < batch; bs++) {
+        for (size_t i = 0; i < 64; i++) {
+          sum += key[bs * 64 + i] << i;
+        }
+      }
+      for (size_t i = 0; i < remain; i++) {
+        sum += key[batch * 64 + i] << i;
+      }
+    }
+    return sum;
+  }
+};
+
+} // namespace std
+
+namespace torch_ipex {
+namespace jit {
+namespace fuser {
+namespace onednn {
+
+struct CompiledPartitionCacheStats {
+  int64_t hits = 0;
+  int64_t misses = 0;
+  int64_t evictions = 0;
+  // total time spent on compiling the partitions of the misses
+  int64_t compileTimeUs = 0;
+  int64_t size = 0;
+  int64_t capacity = 0;
+};
+
+// LRU cache of compiled partitions shared by all the threads of the process,
+// so that the threads running the same TorchScript model, e.g. the streams of
+// MultiStreamModule, compile each partition once per input shape.
+// The keys are spread over kNumStripes stripes, each being an LRU list guarded
+// by its own mutex, so the threads looking up different partitions rarely
+// contend. Each stripe holds at most capacity / kNumStripes (rounded up)
+// entries, the least recently used entry of a stripe is evicted first. The
+// values are shared_ptr, so an entry evicted by one thread stays alive while
+// another thread is executing it.
+template <typename Value>
+class CompiledPartitionCache {
+ public:
+  using Key = std::vector<int64_t>;
+  using ValuePtr = std::shared_ptr<const Value>;
+
+  explicit CompiledPartitionCache(int64_t capacity) : capacity_(capacity) {}
+
+  // Returns the cached value of the key and marks it as the most recently
+  // used one, or nullptr if the key is not cached.
+  ValuePtr find(const Key& key) {
+    auto& stripe = getStripe(key);
+    std::lock_guard<std::mutex> lock(stripe.mutex);
+    auto iter = stripe.map.find(key);
+    if (iter == stripe.map.end()) {
+      return nullptr;
+    }
+    stripe.items.splice(stripe.items.begin(), stripe.items, iter->second);
+    return iter->second->second;
+  }
+
+  // Caches the value of the key, evicting the least recently used entries of
+  // the stripe over capacity. Returns the value already cached if another
+  // thread has cached the key in the meantime.
+  ValuePtr insert(const Key& key, ValuePtr value) {
+    auto& stripe = getStripe(key);
+    std::lock_guard<std::mutex> lock(stripe.mutex);
+    auto iter = stripe.map.find(key);
+    if (iter != stripe.map.end()) {
+      return iter->second->second;
+    }
+    stripe.items.emplace_front(key, std::move(value));
+    stripe.map[key] = stripe.items.begin();
+    auto cached = stripe.items.front().second;
+    evict(stripe, stripeCapacity());
+    return cached;
+  }
+
+  void recordHit() {
+    hits_++;
+  }
+
+  void recordMiss(int64_t compileTimeUs) {
+    misses_++;
+    compileTimeUs_ += compileTimeUs;
+  }
+
+  int64_t capacity() const {
+    return capacity_;
+  }
+
+  void setCapacity(int64_t capacity) {
+    capacity_ = capacity;
+    auto newStripeCapacity = stripeCapacity();
+    for (auto& stripe : stripes_) {
+      std::lock_guard<std::mutex> lock(stripe.mutex);
+      evict(stripe, newStripeCapacity);
+    }
+  }
+
+  void clear() {
+    for (auto& stripe : stripes_) {
+      std::lock_guard<std::mutex> lock(stripe.mutex);
+      stripe.map.clear();
+      stripe.items.clear();
+    }
+  }
+
+  CompiledPartitionCacheStats stats() {
+    CompiledPartitionCacheStats stats;
+    stats.hits = hits_;
+    stats.misses = misses_;
+    stats.evictions = evictions_;
+    stats.compileTimeUs = compileTimeUs_;
+    stats.capacity = capacity_;
+    for (auto& stripe : stripes_) {
+      std::lock_guard<std::mutex> lock(stripe.mutex);
+      stats.size += stripe.map.size();
+    }
+    return stats;
+  }
+
+  void resetStats() {
+    hits_ = 0;
+    misses_ = 0;
+    evictions_ = 0;
+    compileTimeUs_ = 0;
+  }
+
+ private:
+  static constexpr size_t kNumStripes = 16;
+
+  using key_value_pair_t = std::pair<Key, ValuePtr>;
+  using list_iterator_t = typename std::list<key_value_pair_t>::iterator;
+
+  struct Stripe {
+    std::mutex mutex;
+    std::list<key_value_pair_t> items;
+    std::unordered_map<Key, list_iterator_t> map;
+  };
+
+  Stripe& getStripe(const Key& key) {
+    // std::hash<std::vector<int64_t>> is a plain shifted sum, mix it before
+    // taking the stripe from the high bits
+    uint64_t hash = std::hash<Key>()(key) * 0x9E3779B97F4A7C15ULL;
+    return stripes_[hash >> 60];
+  }
+
+  size_t stripeCapacity() const {
+    int64_t capacity = capacity_;
+    return capacity <= 0 ? 0 : (capacity + kNumStripes - 1) / kNumStripes;
+  }
+
+  void evict(Stripe& stripe, size_t capacity) {
+    while (stripe.map.size() > capacity) {
+      stripe.map.erase(stripe.items.back().first);
+      stripe.items.pop_back();
+      evictions_++;
+    }
+  }
+
+  static_assert(kNumStripes == 16, "the stripe is taken from the top 4 bits");
+  std::array<Stripe, kNumStripes> stripes_;
+  std::atomic<int64_t> capacity_;
+  std::atomic<int64_t> hits_{0};
+  std::atomic<int64_t> misses_{0};
+  std::atomic<int64_t> evictions_{0};
+  std::atomic<int64_t> compileTimeUs_{0};
+};
+
+} // namespace onednn
+} // namespace fuser
+} // namespace jit
+} // namespace torch_ipex
@@ -105,6 +105,26 @@ bool getLlgaWeightCacheEnabled() {
   return dnnl::graph::get_constant_tensor_cache();
 }
 
+CompiledPartitionCacheStats getLlgaCompiledPartitionCacheStats() {
+  return LlgaKernel::getCacheStats();
+}
+
+void resetLlgaCompiledPartitionCacheStats() {
+  LlgaKernel::resetCacheStats();
+}
+
+int64_t getLlgaCompiledPartitionCacheCapacity() {
+  return LlgaKernel::getCacheCapacity();
+}
+
+void setLlgaCompiledPartitionCacheCapacity(int64_t capacity) {
+  LlgaKernel::setCacheCapacity(capacity);
+}
+
+void clearLlgaCompiledPartitionCache() {
+  LlgaKernel::clearCache();
+}
+
 } // namespace onednn
 } // namespace fuser
 
@@ -3,6 +3,7 @@
 #include <Macros.h>
 #include <torch/csrc/jit/ir/ir.h>
 #include <torch/csrc/jit/passes/pass_manager.h>
+#include "compiled_partition_cache.h"
 
 namespace torch_ipex {
 namespace jit {
@@ -25,6 +26,16 @@ IPEX_API void setLlgaWeightCacheEnabled(bool enabled);
 
 IPEX_API bool getLlgaWeightCacheEnabled();
 
+IPEX_API CompiledPartitionCacheStats getLlgaCompiledPartitionCacheStats();
+
+IPEX_API void resetLlgaCompiledPartitionCacheStats();
+
+IPEX_API int64_t getLlgaCompiledPartitionCacheCapacity();
+
+IPEX_API void setLlgaCompiledPartitionCacheCapacity(int64_t capacity);
+
+IPEX_API void clearLlgaCompiledPartitionCache();
+
 } // namespace onednn
 } // namespace fuser
 
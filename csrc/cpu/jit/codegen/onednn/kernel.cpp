@@ -1,4 +1,5 @@
 #include <omp.h>
+#include <chrono>
 
 #include "graph_helper.h"
 #include "kernel.h"
@@ -19,12 +20,34 @@ using namespace dnnl::graph;
 
 using data_type = dnnl::graph::logical_tensor::data_type;
 
-thread_local std::list<LlgaKernel::key_value_pair_t>
-    LlgaKernel::cache_items_list_;
-thread_local std::
-    unordered_map<std::vector<int64_t>, LlgaKernel::list_iterator_t>
-        LlgaKernel::cache_items_map_;
-thread_local int LlgaKernel::capacity_ = 7500;
+CompiledPartitionCache<LlgaKernel::cp_entry>& LlgaKernel::getCache() {
+  static CompiledPartitionCache<cp_entry> cache(/* capacity */ 7500);
+  return cache;
+}
+
+CompiledPartitionCacheStats LlgaKernel::getCacheStats() {
+  return getCache().stats();
+}
+
+void LlgaKernel::resetCacheStats() {
+  getCache().resetStats();
+}
+
+int64_t LlgaKernel::getCacheCapacity() {
+  return getCache().capacity();
+}
+
+void LlgaKernel::setCacheCapacity(int64_t capacity) {
+  TORCH_CHECK(
+      capacity >= 0,
+      "LLGA compiled partition cache capacity should be non-negative, but got ",
+      capacity);
+  getCache().setCapacity(capacity);
+}
+
+void LlgaKernel::clearCache() {
+  getCache().clear();
+}
 
 LlgaKernel::LlgaKernel(const Node* fusionNode)
     : fusionNode_(fusionNode),
@@ -196,37 +219,44 @@ void LlgaKernel::prepareAndCacheRunArgs(
     const TensorArgs& inputs,
     TensorArgs& outputs,
     ArgSpecs& inputSpecs,
-    ArgSpecs& outputSpecs) {
+    cp_entry& entry) {
   auto sizeOfRunArgsIdx = runArgsIdx_.size();
   auto numOfConstantInputs = constantInputs_.size();
   runInputs.reserve(sizeOfRunArgsIdx + numOfConstantInputs);
   runOutputs.reserve(nOutputs_);
+  entry.inputLogicalTensors_.reserve(sizeOfRunArgsIdx + numOfConstantInputs);
+  entry.outputLogicalTensors_.reserve(nOutputs_);
 
   for (size_t i = 0; i < sizeOfRunArgsIdx; i++) {
     auto& spec = inputSpecs[i];
     auto& input = inputs[runArgsIdx_[i]];
+    entry.inputLogicalTensors_.push_back(spec.logical_tensor());
     runInputs.push_back(
-        {spec.logical_tensor(), Engine::getEngine(), input.data_ptr()});
+        {entry.inputLogicalTensors_.back(),
+         Engine::getEngine(),
+         input.data_ptr()});
   }
 
   for (size_t i = 0; i < numOfConstantInputs; i++) {
     // constantInputSpecs are placed after graphInputSpecs
     auto constantInputSpecIdx = nGraphInputs_ + i;
     auto& constantInputSpec = inputSpecs[constantInputSpecIdx];
+    entry.inputLogicalTensors_.push_back(constantInputSpec.logical_tensor());
     runInputs.push_back(
-        {constantInputSpec.logical_tensor(),
+        {entry.inputLogicalTensors_.back(),
          Engine::getEngine(),
          constantInputs_[i].data_ptr()});
   }
 
-  outputTensorTypes_.reserve(nOutputs_);
-  std::fill(outputTensorTypes_.begin(), outputTensorTypes_.end(), undefined);
+  auto& outputTensorTypes = entry.outputTensorTypes_;
+  outputTensorTypes.assign(nOutputs_, undefined);
   for (size_t i = 0; i < nOutputs_; i++) {
-    auto& spec = outputSpecs[i];
+    auto& spec = entry.outputSpecs_[i];
     auto opt = c10::TensorOptions(spec.aten_scalar_type()).device(device_);
+    entry.outputLogicalTensors_.push_back(spec.logical_tensor());
 
     auto outputId = spec.tid();
-    auto inputOffset = inplacePairOffsets_[i];
+    auto inputOffset = entry.inplacePairOffsets_[i];
     if ((inputOffset != INT16_MIN) && inputValueIsNotUsedLater(inputOffset)) {
       // output reuses one of input tensors
 #ifdef GRAPH_DEBUG_ENABLED
@@ -250,11 +280,11 @@ void LlgaKernel::prepareAndCacheRunArgs(
           case data_type::f32:
           case data_type::bf16:
             inputTensor = LlgaTensorImpl::llga_to_aten_tensor(llgaImpl);
-            outputTensorTypes_[i] = unquantizedInplaceCompute;
+            outputTensorTypes[i] = unquantizedInplaceCompute;
             break;
           case data_type::s8:
           case data_type::u8:
-            outputTensorTypes_[i] = quantizedInplaceCompute;
+            outputTensorTypes[i] = quantizedInplaceCompute;
             inputTensor = LlgaTensorImpl::llga_to_aten_tensor(
                 llgaImpl, spec.get_quantizer());
             break;
@@ -264,7 +294,7 @@ void LlgaKernel::prepareAndCacheRunArgs(
                 false, "Invalid data type ", static_cast<size_t>(dataType));
         }
       } else {
-        outputTensorTypes_[i] = unwrappedInplaceCompute;
+        outputTensorTypes[i] = unwrappedInplaceCompute;
       }
       outputs.push_back(inputTensor);
       runOutputs.push_back(
@@ -279,7 +309,7 @@ void LlgaKernel::prepareAndCacheRunArgs(
       auto tensor = empty_llga(spec, opt);
       outputs.push_back(tensor);
       runOutputs.push_back(llga_from_aten_tensor(tensor));
-      outputTensorTypes_[i] = betweenPartitions;
+      outputTensorTypes[i] = betweenPartitions;
     } else {
 #ifdef GRAPH_DEBUG_ENABLED
       GRAPH_DEBUG("Neither opaque nor inplace");
@@ -297,20 +327,20 @@ void LlgaKernel::prepareAndCacheRunArgs(
         outputs.push_back(qtensor);
         runOutputs.push_back(
             {spec.logical_tensor(), Engine::getEngine(), qtensor.data_ptr()});
-        outputTensorTypes_[i] = quantizedInputToFW;
+        outputTensorTypes[i] = quantizedInputToFW;
       } else {
         auto tensor = at::empty_strided(spec.sizes(), spec.strides(), opt);
         outputs.push_back(tensor);
         runOutputs.push_back(
             {spec.logical_tensor(), Engine::getEngine(), tensor.data_ptr()});
-        outputTensorTypes_[i] = unquantizedInputToFW;
+        outputTensorTypes[i] = unquantizedInputToFW;
       }
     }
   }
   TORCH_CHECK(
       std::find(
-          outputTensorTypes_.begin(), outputTensorTypes_.end(), undefined) ==
-          outputTensorTypes_.end(),
+          outputTensorTypes.begin(), outputTensorTypes.end(), undefined) ==
+          outputTensorTypes.end(),
       "outputTensorTypes_ elements should not be undefined");
 }
 
@@ -319,70 +349,89 @@ void LlgaKernel::prepareRunArgs(
     RunArgs& runOutputs,
     const TensorArgs& inputs,
     TensorArgs& outputs,
-    ArgSpecs& outputSpecs) {
+    const cp_entry& entry) {
   auto sizeOfRunArgsIdx = runArgsIdx_.size();
+  auto numOfConstantInputs = constantInputs_.size();
+  runInputs.reserve(sizeOfRunArgsIdx + numOfConstantInputs);
+  runOutputs.reserve(nOutputs_);
   for (size_t i = 0; i < sizeOfRunArgsIdx; i++) {
     auto& input = inputs[runArgsIdx_[i]];
-    runInputs[i].set_data_handle(input.data_ptr());
+    runInputs.push_back(
+        {entry.inputLogicalTensors_[i], Engine::getEngine(), input.data_ptr()});
+  }
+
+  for (size_t i = 0; i < numOfConstantInputs; i++) {
+    runInputs.push_back(
+        {entry.inputLogicalTensors_[sizeOfRunArgsIdx + i],
+         Engine::getEngine(),
+         constantInputs_[i].data_ptr()});
   }
 
   for (size_t i = 0; i < nOutputs_; i++) {
-    auto typeOfOutput = static_cast<int64_t>(outputTensorTypes_[i]);
-    auto& spec = outputSpecs[i];
+    auto typeOfOutput = static_cast<int64_t>(entry.outputTensorTypes_[i]);
+    auto& spec = entry.outputSpecs_[i];
+    auto& outputLogicalTensor = entry.outputLogicalTensors_[i];
     auto opt = c10::TensorOptions(spec.aten_scalar_type()).device(device_);
 
     switch (typeOfOutput) {
       case unwrappedInplaceCompute: {
-        auto inputTensor = inputs[inplacePairOffsets_[i]];
-        runOutputs[i].set_data_handle(inputTensor.data_ptr());
+        auto inputTensor = inputs[entry.inplacePairOffsets_[i]];
+        runOutputs.push_back(
+            {outputLogicalTensor, Engine::getEngine(), inputTensor.data_ptr()});
         outputs.push_back(std::move(inputTensor));
         break;
       }
       case quantizedInplaceCompute: {
-        auto inputTensor = inputs[inplacePairOffsets_[i]];
+        auto inputTensor = inputs[entry.inplacePairOffsets_[i]];
         auto llgaImpl =
             static_cast<LlgaTensorImpl*>(inputTensor.unsafeGetTensorImpl());
         inputTensor =
             LlgaTensorImpl::llga_to_aten_tensor(llgaImpl, spec.get_quantizer());
-        runOutputs[i].set_data_handle(inputTensor.data_ptr());
+        runOutputs.push_back(
+            {outputLogicalTensor, Engine::getEngine(), inputTensor.data_ptr()});
         outputs.push_back(std::move(inputTensor));
         break;
       }
       case unquantizedInplaceCompute: {
-        auto inputTensor = inputs[inplacePairOffsets_[i]];
+        auto inputTensor = inputs[entry.inplacePairOffsets_[i]];
         auto llgaImpl =
             static_cast<LlgaTensorImpl*>(inputTensor.unsafeGetTensorImpl());
         inputTensor = LlgaTensorImpl::llga_to_aten_tensor(llgaImpl);
-        runOutputs[i].set_data_handle(inputTensor.data_ptr());
+        runOutputs.push_back(
+            {outputLogicalTensor, Engine::getEngine(), inputTensor.data_ptr()});
         outputs.push_back(std::move(inputTensor));
         break;
       }
       case betweenPartitions: {
         outputs.emplace_back(empty_llga(spec, opt));
-        runOutputs[i].set_data_handle(outputs[i].data_ptr());
+        runOutputs.push_back(
+            {outputLogicalTensor, Engine::getEngine(), outputs[i].data_ptr()});
         break;
       }
       case quantizedInputToFW: {
         at::QuantizerPtr quantizer = spec.get_quantizer();
         outputs.emplace_back(at::new_qtensor(spec.sizes(), opt, quantizer)
                                  .as_strided_(spec.sizes(), spec.strides()));
-        runOutputs[i].set_data_handle(outputs[i].data_ptr());
+        runOutputs.push_back(
+            {outputLogicalTensor, Engine::getEngine(), outputs[i].data_ptr()});
         break;
       }
       case unquantizedInputToFW: {
         outputs.emplace_back(
             at::empty_strided(spec.sizes(), spec.strides(), opt));
-        runOutputs[i].set_data_handle(outputs[i].data_ptr());
+        runOutputs.push_back(
+            {outputLogicalTensor, Engine::getEngine(), outputs[i].data_ptr()});
         break;
       }
     }
   }
 }
 
-std::pair<compiled_partition, ArgSpecs> LlgaKernel::compile(
+void LlgaKernel::compile(
     const partition& partition,
     const TensorArgs& inputs,
-    ArgSpecs& inputSpecs) {
+    ArgSpecs& inputSpecs,
+    cp_entry& entry) {
   RECORD_FUNCTION("LLGA_bridge::compileKernel", c10::ArrayRef<c10::IValue>({}));
   auto inputLogicalTensors = fmap(inputSpecs, toLogicalTensor);
   auto outputSpecs = initializeOutputSpecs(inputs);
@@ -424,8 +473,8 @@ std::pair<compiled_partition, ArgSpecs> LlgaKernel::compile(
         outputSpecs[i].update_desc(compilation.query_logical_tensor(tid));
   }
 
-  inplacePairOffsets_.resize(nOutputs_);
-  std::fill(inplacePairOffsets_.begin(), inplacePairOffsets_.end(), INT16_MIN);
+  auto& inplacePairOffsets = entry.inplacePairOffsets_;
+  inplacePairOffsets.assign(nOutputs_, INT16_MIN);
 
   // Build static mapping from output offset to input offset
   // in accordance with available inplace options
@@ -445,14 +494,17 @@ std::pair<compiled_partition, ArgSpecs> LlgaKernel::compile(
     TORCH_CHECK(
         outputSpecIter != outputSpecs.end(), "In-place output not found");
     auto outputOffset = outputSpecIter - outputSpecs.begin();
-    inplacePairOffsets_[outputOffset] = inputOffset;
+    inplacePairOffsets[outputOffset] = inputOffset;
   }
 
-  return std::make_pair(compilation, outputSpecs);
+  entry.cp_ = std::move(compilation);
+  entry.outputSpecs_ = std::move(outputSpecs);
 }
 
-LlgaKernel::cp_entry& LlgaKernel::compileAndCache(
+std::shared_ptr<const LlgaKernel::cp_entry> LlgaKernel::compileAndCache(
     Stack& stack,
+    RunArgs& runInputs,
+    RunArgs& runOutputs,
     TensorArgs& outputs) {
   RECORD_FUNCTION("LLGA_bridge::prepareKernel", c10::ArrayRef<c10::IValue>({}));
   // Grab input values from stack
@@ -476,64 +528,54 @@ LlgaKernel::cp_entry& LlgaKernel::compileAndCache(
     auto shape_vec = in.sizes().vec();
     key.insert(key.end(), shape_vec.begin(), shape_vec.end());
   }
-  auto iter = cache_items_map_.find(key);
-  if (iter == cache_items_map_.end()) {
-    GRAPH_DEBUG("Compiling partition");
-    cp_entry compiledPartitionEntry;
-    auto input_shape = inputs[0].sizes().vec();
-    auto inputSpecs = initializeInputSpecs(inputs);
-    auto compilationOutput = compile(partition_, inputs, inputSpecs);
-    compiledPartitionEntry.outputSpecs_ = std::move(compilationOutput.second);
-    compiledPartitionEntry.cp_ = std::move(compilationOutput.first);
-    prepareAndCacheRunArgs(
-        compiledPartitionEntry.inputLLGATensors_,
-        compiledPartitionEntry.outputLLGATensors_,
-        inputs,
-        outputs,
-        inputSpecs,
-        compiledPartitionEntry.outputSpecs_);
-    cache_items_list_.push_front(
-        key_value_pair_t(key, std::move(compiledPartitionEntry)));
-    cache_items_map_[key] = cache_items_list_.begin();
-    if (cache_items_map_.size() > capacity_) {
-      auto last = cache_items_list_.end();
-      last--;
-      cache_items_map_.erase(last->first);
-      cache_items_list_.pop_back();
+  auto& cache = getCache();
+  auto cached = cache.find(key);
+  if (!cached) {
+    std::lock_guard<std::mutex> lock(compileMutex_);
+    // another thread may have compiled it while waiting for the lock
+    cached = cache.find(key);
+    if (!cached) {
+      GRAPH_DEBUG("Compiling partition");
+      auto start = std::chrono::steady_clock::now();
+      auto compiledPartitionEntry = std::make_shared<cp_entry>();
+      auto inputSpecs = initializeInputSpecs(inputs);
+      compile(partition_, inputs, inputSpecs, *compiledPartitionEntry);
+      prepareAndCacheRunArgs(
+          runInputs,
+          runOutputs,
+          inputs,
+          outputs,
+          inputSpecs,
+          *compiledPartitionEntry);
+      cache.recordMiss(std::chrono::duration_cast<std::chrono::microseconds>(
+                           std::chrono::steady_clock::now() - start)
+                           .count());
+      return cache.insert(key, std::move(compiledPartitionEntry));
     }
-    // If hash computation cost is higher than copying this struct,
-    // then remove std::move above & return compiledPartitionEntry instead
-    return cache_items_map_[key]->second;
-  } else {
+  }
 #ifdef GRAPH_DEBUG_ENABLED
-    GRAPH_DEBUG("Cached compiled partition is available");
+  GRAPH_DEBUG("Cached compiled partition is available");
 #endif
-    cache_items_list_.splice(
-        cache_items_list_.begin(), cache_items_list_, iter->second);
-    prepareRunArgs(
-        iter->second->second.inputLLGATensors_,
-        iter->second->second.outputLLGATensors_,
-        inputs,
-        outputs,
-        iter->second->second.outputSpecs_);
-    return iter->second->second;
-  }
+  cache.recordHit();
+  prepareRunArgs(runInputs, runOutputs, inputs, outputs, *cached);
+  return cached;
 }
 
 void LlgaKernel::run(Stack& stack) {
   GRAPH_DEBUG("In ", debugName(), "\n");
   TensorArgs outputs;
   outputs.reserve(nOutputs_);
+  RunArgs runInputs;
+  RunArgs runOutputs;
 
-  auto& compiledPartitionEntry = compileAndCache(stack, outputs);
+  auto compiledPartitionEntry =
+      compileAndCache(stack, runInputs, runOutputs, outputs);
 
 #ifdef GRAPH_DEBUG_ENABLED
   GRAPH_DEBUG("Executing partition");
 #endif
-  compiledPartitionEntry.cp_.execute(
-      Stream::getStream(),
-      compiledPartitionEntry.inputLLGATensors_,
-      compiledPartitionEntry.outputLLGATensors_);
+  compiledPartitionEntry->cp_.execute(
+      Stream::getStream(), runInputs, runOutputs);
 
 #ifdef GRAPH_DEBUG_ENABLED
   GRAPH_DEBUG("Partition executed");
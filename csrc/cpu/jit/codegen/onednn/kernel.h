@@ -1,8 +1,11 @@
 #pragma once
 
+#include <memory>
+#include <mutex>
 #include <unordered_map>
 #include <vector>
 #include "codegen/LlgaTensorImpl.h"
+#include "compiled_partition_cache.h"
 #include "graph_helper.h"
 #include "utils/rw_lock.h"
 
@@ -11,34 +14,6 @@
 #include <torch/csrc/jit/jit_log.h>
 #include <torch/csrc/jit/runtime/interpreter.h>
 
-namespace std {
-template <>
-struct hash<std::vector<int64_t>> {
-  size_t operator()(const std::vector<int64_t>& key) const {
-    size_t total = key.size();
-    size_t sum = 0;
-    if (total < 64) {
-      for (size_t i = 0; i < total; i++) {
-        sum += key[i] << i;
-      }
-    } else {
-      size_t batch = total / 64;
-      size_t remain = total % 64;
-      for (size_t bs = 0; bs < batch; bs++) {
-        for (size_t i = 0; i < 64; i++) {
-          sum += key[bs * 64 + i] << i;
-        }
-      }
-      for (size_t i = 0; i < remain; i++) {
-        sum += key[batch * 64 + i] << i;
-      }
-    }
-    return sum;
-  }
-};
-
-} // namespace std
-
 namespace torch_ipex {
 namespace jit {
 namespace fuser {
@@ -64,6 +39,17 @@ class LlgaKernel {
     return profileName_;
   }
 
+  // The compiled partition cache shared by all the LlgaKernels and threads
+  static CompiledPartitionCacheStats getCacheStats();
+
+  static void resetCacheStats();
+
+  static int64_t getCacheCapacity();
+
+  static void setCacheCapacity(int64_t capacity);
+
+  static void clearCache();
+
  private:
   bool useOpaqueLayout(size_t offset) const;
 
@@ -79,11 +65,15 @@ class LlgaKernel {
     unquantizedInputToFW
   };
 
+  // Read-only once cached, as it's shared by the threads. The run args of
+  // each call are created from the logical tensors.
   struct cp_entry {
     dnnl::graph::compiled_partition cp_;
-    RunArgs inputLLGATensors_;
-    RunArgs outputLLGATensors_;
+    std::vector<dnnl::graph::logical_tensor> inputLogicalTensors_;
+    std::vector<dnnl::graph::logical_tensor> outputLogicalTensors_;
     ArgSpecs outputSpecs_;
+    std::vector<TypeOfOutputTensor> outputTensorTypes_;
+    std::vector<short> inplacePairOffsets_;
   };
 
   // Get the scale, zp and dtype from the node on the graph
@@ -104,19 +94,24 @@ class LlgaKernel {
       const TensorArgs& inputs,
       bool convertDimsToUnknown);
 
-  std::pair<dnnl::graph::compiled_partition, ArgSpecs> compile(
+  void compile(
       const dnnl::graph::partition& partition,
       const TensorArgs& inputs,
-      ArgSpecs& inputSpecs);
+      ArgSpecs& inputSpecs,
+      cp_entry& entry);
 
-  cp_entry& compileAndCache(torch::jit::Stack& stack, TensorArgs& outputs);
+  std::shared_ptr<const cp_entry> compileAndCache(
+      torch::jit::Stack& stack,
+      RunArgs& inputLlgaTensors,
+      RunArgs& outputLlgaTensors,
+      TensorArgs& outputs);
 
   void prepareRunArgs(
       RunArgs& inputLlgaTensors,
       RunArgs& outputLlgaTensors,
       const TensorArgs& inputs,
       TensorArgs& outputs,
-      ArgSpecs& outputSpecs);
+      const cp_entry& entry);
 
   void prepareAndCacheRunArgs(
       RunArgs& inputLlgaTensors,
@@ -124,7 +119,7 @@ class LlgaKernel {
       const TensorArgs& inputs,
       TensorArgs& outputs,
       ArgSpecs& inputSpecs,
-      ArgSpecs& outputSpecs);
+      cp_entry& entry);
 
   static std::string genDebugName() {
     static size_t debugId = 0;
@@ -165,25 +160,18 @@ class LlgaKernel {
   std::vector<torch::jit::Value*> constantValues_;
   TensorArgs constantInputs_;
 
-  // We'll do LRU without helper functions to minimize calls to the hash
-  // function. Adopted from
-  // https://github.com/lamerman/cpp-lru-cache/blob/master/include/lrucache.hpp
-  // LRU cache is per-thread, so as to enable weight sharing among groups of
-  // threads.
-  using key_value_pair_t = std::pair<std::vector<int64_t>, cp_entry>;
-  using list_iterator_t = std::list<key_value_pair_t>::iterator;
-  static thread_local std::list<key_value_pair_t> cache_items_list_;
-  static thread_local std::unordered_map<std::vector<int64_t>, list_iterator_t>
-      cache_items_map_;
-  static thread_local int capacity_;
+  // Compiled partitions of all the LlgaKernels, keyed by the number of
+  // threads, the kernel and the input shapes
+  static CompiledPartitionCache<cp_entry>& getCache();
+  // Serializes the compilation of the partition on the cache misses of the
+  // threads, so that a partition is compiled once per key
+  std::mutex compileMutex_;
   std::vector<std::vector<int64_t>> tracedInputShapes_;
   std::vector<std::vector<int64_t>> tracedInputStrides_;
   std::string debugName_;
   std::string profileName_;
-  std::vector<TypeOfOutputTensor> outputTensorTypes_;
   std::once_flag constantSpecInitializedFlag_;
   std::once_flag tracedInputShapesInitialized_;
-  std::vector<short> inplacePairOffsets_;
 };
 
 } // namespace onednn
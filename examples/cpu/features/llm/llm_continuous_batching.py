@@ -0,0 +1,222 @@
+import argparse
+import random
+import time
+
+import torch
+import intel_extension_for_pytorch as ipex
+from intel_extension_for_pytorch.llm.serving import (
+    ContinuousBatchingEngine,
+    PagedKVCache,
+    PagedLlamaAdapter,
+    paged_attention,
+)
+
+# Synthetic load generator for the continuous batching engine of
+# ipex.llm.serving. Requests with random prompt/output lengths arrive as a
+# Poisson process and are served by a LLaMA model optimized by
+# ipex.llm.optimize, whose attention runs on the paged attention kernels
+# through PagedLlamaAdapter (--model llama, randomly initialized unless
+# --model-id is given), or by a minimal llama-like decoder written against the
+# paged step contract (--model llama-like). Throughput and per-token latency
+# percentiles are reported at the end.
+
+parser = argparse.ArgumentParser("Continuous batching load generator")
+parser.add_argument("--num-requests", default=64, type=int)
+parser.add_argument(
+    "--request-rate", default=8.0, type=float, help="mean arrivals per second"
+)
+parser.add_argument("--min-prompt-len", default=16, type=int)
+parser.add_argument("--max-prompt-len", default=512, type=int)
+parser.add_argument("--min-new-tokens", default=8, type=int)
+parser.add_argument("--max-new-tokens", default=128, type=int)
+parser.add_argument(
+    "--model", type=str, choices=["llama", "llama-like"], default="llama"
+)
+parser.add_argument(
+    "--model-id",
+    type=str,
+    default=None,
+    help="LLaMA checkpoint to load for --model llama, "
+    + "a random model of the sizes below is used if not given",
+)
+parser.add_argument("--num-layers", default=4, type=int)
+parser.add_argument("--hidden-size", default=1024, type=int)
+parser.add_argument("--num-heads", default=16, type=int)
+parser.add_argument("--num-kv-heads", default=4, type=int)
+parser.add_argument("--vocab-size", default=32000, type=int)
+parser.add_argument("--num-blocks", default=1024, type=int)
+parser.add_argument("--block-size", default=16, type=int)
+parser.add_argument("--max-num-seqs", default=32, type=int)
+parser.add_argument("--max-num-batched-tokens", default=4096, type=int)
+parser.add_argument(
+    "--dtype", type=str, choices=["float32", "bfloat16"], default="float32"
+)
+parser.add_argument("--seed", default=0, type=int)
+args = parser.parse_args()
+print(args)
+
+
+class PagedLlamaLikeDecoder(torch.nn.Module):
+    def __init__(self, args):
+        super().__init__()
+        self.num_heads = args.num_heads
+        self.num_kv_heads = args.num_kv_heads
+        self.head_size = args.hidden_size // args.num_heads
+        hidden_size = args.hidden_size
+        self.embed = torch.nn.Embedding(args.vocab_size, hidden_size)
+        self.pos_embed = torch.nn.Embedding(
+            args.max_prompt_len + args.max_new_tokens, hidden_size
+        )
+        self.layers = torch.nn.ModuleList()
+        for _ in range(args.num_layers):
+            layer = torch.nn.Module()
+            layer.input_norm = ipex.llm.modules.RMSNorm(hidden_size)
+            layer.q = torch.nn.Linear(hidden_size, hidden_size, bias=False)
+            layer.k = torch.nn.Linear(
+                hidden_size, self.num_kv_heads * self.head_size, bias=False
+            )
+            layer.v = torch.nn.Linear(
+                hidden_size, self.num_kv_heads * self.head_size, bias=False
+            )
+            layer.o = torch.nn.Linear(hidden_size, hidden_size, bias=False)
+            layer.post_norm = ipex.llm.modules.RMSNorm(hidden_size)
+            layer.gate = torch.nn.Linear(hidden_size, hidden_size * 3, bias=False)
+            layer.up = torch.nn.Linear(hidden_size, hidden_size * 3, bias=False)
+            layer.down = torch.nn.Linear(hidden_size * 3, hidden_size, bias=False)
+            self.layers.append(layer)
+        self.norm = ipex.llm.modules.RMSNorm(hidden_size)
+        self.lm_head = torch.nn.Linear(hidden_size, args.vocab_size, bias=False)
+
+    def forward(self, input_ids, positions, kv_caches, metadata):
+        hidden_states = self.embed(input_ids) + self.pos_embed(positions)
+        num_tokens = hidden_states.size(0)
+        for layer, (key_cache, value_cache) in zip(self.layers, kv_caches):
+            x = layer.input_norm(hidden_states)
+            attn_output = paged_attention(
+                layer.q(x).view(num_tokens, self.num_heads, self.head_size),
+                layer.k(x).view(num_tokens, self.num_kv_heads, self.head_size),
+                layer.v(x).view(num_tokens, self.num_kv_heads, self.head_size),
+                key_cache,
+                value_cache,
+                metadata,
+                self.head_size**-0.5,
+            )
+            hidden_states = hidden_states + layer.o(attn_output.view(num_tokens, -1))
+            x = layer.post_norm(hidden_states)
+            hidden_states = hidden_states + layer.down(
+                ipex.llm.functional.silu_mul(layer.gate(x), layer.up(x))
+            )
+        return self.lm_head(self.norm(hidden_states))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+random.seed(args.seed)
+torch.manual_seed(args.seed)
+dtype = getattr(torch, args.dtype)
+if args.model == "llama":
+    import transformers
+
+    if args.model_id is not None:
+        llama = transformers.AutoModelForCausalLM.from_pretrained(
+            args.model_id, torch_dtype=dtype
+        )
+        args.vocab_size = llama.config.vocab_size
+    else:
+        config = transformers.LlamaConfig(
+            vocab_size=args.vocab_size,
+            hidden_size=args.hidden_size,
+            intermediate_size=args.hidden_size * 3,
+            num_hidden_layers=args.num_layers,
+            num_attention_heads=args.num_heads,
+            num_key_value_heads=args.num_kv_heads,
+            max_position_embeddings=args.max_prompt_len + args.max_new_tokens,
+            architectures=["LlamaForCausalLM"],
+        )
+        llama = transformers.LlamaForCausalLM(config).to(dtype)
+    llama = ipex.llm.optimize(
+        llama.eval(), dtype=dtype, deployment_mode=False, inplace=True
+    )
+    model = PagedLlamaAdapter(llama)
+    kv_cache = model.get_kv_cache(args.num_blocks, args.block_size, dtype)
+else:
+    model = PagedLlamaLikeDecoder(args).eval().to(dtype)
+    kv_cache = PagedKVCache(
+        args.num_layers,
+        args.num_blocks,
+        args.block_size,
+        args.num_kv_heads,
+        args.hidden_size // args.num_heads,
+        dtype,
+    )
+engine = ContinuousBatchingEngine(
+    model, kv_cache, args.max_num_seqs, args.max_num_batched_tokens
+)
+print(
+    "KV cache pool: {} blocks x {} tokens, {:.1f} MB".format(
+        args.num_blocks, args.block_size, kv_cache.get_memory_size() / 1024**2
+    )
+)
+
+# warm up the kernels
+engine.generate([[1] * args.min_prompt_len], args.min_new_tokens)
+
+arrivals = []
+t = 0.0
+for _ in range(args.num_requests):
+    t += random.expovariate(args.request_rate)
+    prompt = [
+        random.randint(0, args.vocab_size - 1)
+        for _ in range(random.randint(args.min_prompt_len, args.max_prompt_len))
+    ]
+    arrivals.append(
+        (t, prompt, random.randint(args.min_new_tokens, args.max_new_tokens))
+    )
+
+requests = []
+start = time.perf_counter()
+next_arrival = 0
+while next_arrival < len(arrivals) or engine.has_unfinished_requests():
+    now = time.perf_counter() - start
+    while next_arrival < len(arrivals) and arrivals[next_arrival][0] <= now:
+        arrival_time, prompt, max_new_tokens = arrivals[next_arrival]
+        requests.append(
+            engine.add_request(
+                prompt, max_new_tokens, arrival_time=start + arrival_time
+            )
+        )
+        next_arrival += 1
+    if engine.has_unfinished_requests():
+        engine.step()
+    else:
+        time.sleep(max(0.0, arrivals[next_arrival][0] - now))
+elapsed = time.perf_counter() - start
+
+num_tokens = sum(len(r.output_token_ids) for r in requests)
+first_token_latencies = [r.get_token_latencies()[0] for r in requests]
+next_token_latencies = [
+    latency for r in requests for latency in r.get_token_latencies()[1:]
+]
+print("requests: {}, generated tokens: {}".format(len(requests), num_tokens))
+print(
+    "elapsed: {:.2f} s, throughput: {:.2f} tokens/s".format(
+        elapsed, num_tokens / elapsed
+    )
+)
+print(
+    "first token latency p50: {:.2f} ms, p99: {:.2f} ms".format(
+        percentile(first_token_latencies, 50) * 1000,
+        percentile(first_token_latencies, 99) * 1000,
+    )
+)
+if next_token_latencies:
+    print(
+        "next token latency p50: {:.2f} ms, p99: {:.2f} ms".format(
+            percentile(next_token_latencies, 50) * 1000,
+            percentile(next_token_latencies, 99) * 1000,
+        )
+    )
+print("preemptions: {}".format(sum(r.num_preemptions for r in requests)))
@@ -1,14 +1,140 @@
+import os
 import torch
 import intel_extension_for_pytorch._C as torch_ipex_cpp
 
+# Communication backends of the tensor parallel on CPU:
+#   "ccl": oneCCL (and MPI), available when IPEX is built with oneCCL.
+#   "shm": POSIX shared memory among the ranks of one host, always built.
+# The backend is selected by IPEX_COMM_BACKEND, or by set_backend(). By
+# default, oneCCL is used if it is built, otherwise the shared memory backend
+# is used if the process is launched as one of several ranks.
+_backend = None
+
 
 def has_ccl():
     return hasattr(torch.ops.torch_ipex, "all_reduce_add")
 
 
-if has_ccl():
-    get_world_size = torch_ipex_cpp.get_world_size
-    get_rank = torch_ipex_cpp.get_rank
-    barrier = torch_ipex_cpp.barrier
-    allreduce_add = torch.ops.torch_ipex.all_reduce_add
-    allgather = torch.ops.torch_ipex.allgather
+def has_shm():
+    return hasattr(torch.ops.torch_ipex, "shm_all_reduce_add")
+
+
+def _env_rank_and_world_size():
+    # rank and world size set by the launchers, e.g., torchrun, mpirun and
+    # intel_extension_for_pytorch.cpu.launch
+    for rank_name, size_name in [
+        ("LOCAL_RANK", "LOCAL_WORLD_SIZE"),
+        ("RANK", "WORLD_SIZE"),
+        ("PMI_RANK", "PMI_SIZE"),
+        ("OMPI_COMM_WORLD_RANK", "OMPI_COMM_WORLD_SIZE"),
+        ("MPI_LOCALRANKID", "MPI_LOCALNRANKS"),
+    ]:
+        if rank_name in os.environ and size_name in os.environ:
+            return int(os.environ[rank_name]), int(os.environ[size_name])
+    return 0, 1
+
+
+def _default_shm_name():
+    # the name must be the same on all the ranks of a job and differ between
+    # the jobs running on the host at the same time
+    if "IPEX_SHM_COMM_NAME" in os.environ:
+        return os.environ["IPEX_SHM_COMM_NAME"]
+    job = os.environ.get(
+        "MASTER_PORT",
+        os.environ.get("PMI_ID", os.environ.get("SLURM_JOB_ID", str(os.getppid()))),
+    )
+    return "/ipex_shm_comm_{}_{}".format(os.getuid(), job)
+
+
+def init_shm(rank=None, world_size=None, name=None, buffer_size=None, numa_node=-1):
+    r"""
+    Initializes the shared memory backend and selects it. All the ranks of
+    the host must call it, it returns once all of them have attached.
+
+    Args:
+        rank (int): rank of this process, from the env of the launcher by default.
+        world_size (int): number of ranks, from the env of the launcher by default.
+        name (str): name of the shared memory segment, the same on all the ranks.
+            By default, ``IPEX_SHM_COMM_NAME`` or a name derived from the job.
+        buffer_size (int): bytes of the buffer of each rank, larger tensors are
+            reduced chunk by chunk. By default, ``IPEX_SHM_COMM_BUFFER_SIZE`` or
+            16 MB.
+        numa_node (int): NUMA node to place the buffers of this rank, -1 to take
+            the node of the CPU this rank runs on. Bind the ranks to their
+            cores before initializing.
+    """
+    global _backend
+    env_rank, env_world_size = _env_rank_and_world_size()
+    rank = env_rank if rank is None else rank
+    world_size = env_world_size if world_size is None else world_size
+    name = _default_shm_name() if name is None else name
+    if buffer_size is None:
+        buffer_size = int(os.environ.get("IPEX_SHM_COMM_BUFFER_SIZE", 16 * 1024 * 1024))
+    if not torch_ipex_cpp.shm_comm_is_initialized():
+        torch_ipex_cpp.shm_comm_init(rank, world_size, name, buffer_size, numa_node)
+    _backend = "shm"
+
+
+def set_backend(backend):
+    r"""
+    Selects the communication backend, ``"ccl"`` or ``"shm"``.
+    """
+    global _backend
+    if backend == "ccl":
+        assert has_ccl(), "IPEX is not built with oneCCL"
+        _backend = backend
+    elif backend == "shm":
+        init_shm()
+    else:
+        raise ValueError("unsupported communication backend {}".format(backend))
+
+
+def get_backend():
+    if _backend is None:
+        backend = os.environ.get("IPEX_COMM_BACKEND", None)
+        if backend is None:
+            if has_ccl():
+                backend = "ccl"
+            elif has_shm() and _env_rank_and_world_size()[1] > 1:
+                backend = "shm"
+        if backend is not None:
+            set_backend(backend)
+    return _backend
+
+
+def is_available():
+    return get_backend() is not None
+
+
+def get_world_size():
+    if get_backend() == "shm":
+        return torch_ipex_cpp.shm_comm_get_world_size()
+    if get_backend() == "ccl":
+        return torch_ipex_cpp.get_world_size()
+    return 1
+
+
+def get_rank():
+    if get_backend() == "shm":
+        return torch_ipex_cpp.shm_comm_get_rank()
+    if get_backend() == "ccl":
+        return torch_ipex_cpp.get_rank()
+    return 0
+
+
+def barrier():
+    if get_backend() == "shm":
+        return torch_ipex_cpp.shm_comm_barrier()
+    return torch_ipex_cpp.barrier()
+
+
+def allreduce_add(t_in):
+    if get_backend() == "shm":
+        return torch.ops.torch_ipex.shm_all_reduce_add(t_in)
+    return torch.ops.torch_ipex.all_reduce_add(t_in)
+
+
+def allgather(t_in, cols_per_rank, world_size):
+    if get_backend() == "shm":
+        return torch.ops.torch_ipex.shm_allgather(t_in, cols_per_rank, world_size)
+    return torch.ops.torch_ipex.allgather(t_in, cols_per_rank, world_size)
@@ -3,11 +3,13 @@ import torch
 from torch._dynamo.backends.common import fake_tensor_unsupported
 from torch.jit._trace import TracerWarning
 
+from collections import OrderedDict
 from enum import IntEnum
 from typing import List
 
 import functools
 import threading
+import time
 import warnings
 from ..utils._logger import logger, WarningType
 
@@ -19,14 +21,210 @@ class RunMethods(IntEnum):
     EagerTrain = 4
 
 
+def _round_up(size, rounding):
+    if rounding == "pow2":
+        return 1 if size <= 1 else 1 << (size - 1).bit_length()
+    return (size + rounding - 1) // rounding * rounding
+
+
 class GraphCapture(object):
-    def __init__(self, model, train, dtype, weights_prepack):
+    r"""
+    Captures the graphs of the model for inference. Frozen graphs are cached
+    per input signature, i.e., the shapes (padded to their bucket if
+    ``pad_to_bucket``), dtypes of the tensor inputs and the layout of the
+    kwargs. Each new signature is
+    JIT traced, or falls back to TorchDynamo and then to eager mode, and the
+    least recently used graphs are evicted once there are more than
+    ``cache_size`` of them.
+
+    The GraphCapture object of a model optimized with ``graph_mode=True`` is
+    accessible as ``model.forward.graph_capture`` to tune the knobs below and
+    to read the counters of ``cache_stats()``.
+
+    Args:
+        cache_size (int): max number of cached graphs.
+        bucket_dims (dict): maps a dim of the tensor inputs to its rounding,
+            either ``"pow2"`` to round the size up to the next power of two, or
+            an int to round it up to a multiple of it. With ``pad_to_bucket``,
+            inputs of the same bucket share a graph. E.g., ``{1: "pow2"}`` for
+            the sequence dim. Without padding, the sizes baked into a graph
+            may not match other sizes of its bucket, so each shape keeps its
+            own graph.
+        pad_to_bucket (bool): pad the inputs to the bucket size with
+            ``pad_value`` before running the graph, and narrow the dims of the
+            outputs matching a padded size back. Only valid for models whose
+            outputs are not affected by the padded elements.
+        pad_value (float): value of the padded elements.
+        background_compile (bool): compile the graph of a new signature in a
+            background thread and serve the requests of that signature in
+            eager mode until it is ready.
+    """
+
+    def __init__(
+        self,
+        model,
+        train,
+        dtype,
+        weights_prepack,
+        cache_size=8,
+        bucket_dims=None,
+        pad_to_bucket=False,
+        pad_value=0,
+        background_compile=False,
+    ):
         self.model = copy.deepcopy(model)
         self.train = train
         self.dtype = dtype
         self.weights_prepack = weights_prepack
         self.method = None
         self.lock = threading.Lock()
+        self.cache_size = cache_size
+        self.bucket_dims = bucket_dims if bucket_dims is not None else {}
+        self.pad_to_bucket = pad_to_bucket
+        self.pad_value = pad_value
+        self.background_compile = background_compile
+        self.graphs = OrderedDict()
+        self.pending = set()
+        self.dynamo_model = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "compiles": 0,
+            "compile_time": 0.0,
+        }
+
+    def cache_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self.graphs)
+        return stats
+
+    def _bucket_shape(self, t):
+        shape = list(t.shape)
+        for dim, rounding in self.bucket_dims.items():
+            if -t.dim() <= dim < t.dim():
+                shape[dim] = _round_up(shape[dim], rounding)
+        return tuple(shape)
+
+    def _signature(self, x):
+        if isinstance(x, torch.Tensor):
+            # the padded inputs already have the shape of their bucket, the
+            # others are run by the graph of their exact shape
+            return ("Tensor", tuple(x.shape), x.dtype)
+        if isinstance(x, (list, tuple)):
+            return (type(x).__name__,) + tuple(self._signature(i) for i in x)
+        if isinstance(x, dict):
+            return ("dict",) + tuple(
+                (k, self._signature(x[k])) for k in sorted(x.keys())
+            )
+        try:
+            hash(x)
+            return (type(x).__name__, x)
+        except TypeError:
+            return (type(x).__name__,)
+
+    def _pad(self, x, padded_sizes):
+        if isinstance(x, torch.Tensor):
+            bucket_shape = self._bucket_shape(x)
+            if bucket_shape == tuple(x.shape):
+                return x
+            for dim in range(x.dim()):
+                if bucket_shape[dim] != x.size(dim):
+                    padded_sizes[(dim, bucket_shape[dim])] = x.size(dim)
+            padded = x.new_full(bucket_shape, self.pad_value)
+            padded[tuple(slice(0, s) for s in x.shape)] = x
+            return padded
+        if isinstance(x, (list, tuple)):
+            return type(x)(self._pad(i, padded_sizes) for i in x)
+        if isinstance(x, dict):
+            return {k: self._pad(v, padded_sizes) for k, v in x.items()}
+        return x
+
+    def _unpad(self, x, padded_sizes):
+        if isinstance(x, torch.Tensor):
+            for (dim, bucket_size), size in padded_sizes.items():
+                if dim < x.dim() and x.size(dim) == bucket_size:
+                    x = x.narrow(dim, 0, size)
+            return x
+        if isinstance(x, (list, tuple)):
+            return type(x)(self._unpad(i, padded_sizes) for i in x)
+        if isinstance(x, dict):
+            return {k: self._unpad(v, padded_sizes) for k, v in x.items()}
+        return x
+
+    def _compile(self, input, kwargs, compiler):
+        # Once both JIT and TorchDynamo failed, the next signatures run in eager mode.
+        if self.method == RunMethods.EagerInfer:
+            return RunMethods.EagerInfer, self.model, self.model(*input, **kwargs)
+        try:
+            if self.dynamo_model is not None:
+                raise RuntimeError("JIT trace has failed for this model.")
+            # Try JIT trace.
+            # Tracing only records operations done when the given function is run on the given
+            # tensors. Therefore, the returned ScriptModule will always run the same traced graph
+            # on any input. This has some important implications when your module is expected
+            # to run different sets of operations, depending on the input and/or the module state.
+            # In cases like these, tracing would not be appropriate, and the tracer will try to
+            # emit warnings when doing something that may cause an incorrect trace to be produced.
+            # Therefore, we catch these warnings and treat them as errors, and let TorchDynamo
+            # handle such models appropriately.
+            with warnings.catch_warnings():
+                warnings.filterwarnings("error", category=TracerWarning)
+                traced_model = torch.jit.trace(self.model.eval(), input).eval()
+                traced_model = torch.jit.freeze(traced_model)
+                output = traced_model(*input, **kwargs)
+                logger.debug("generate graph by JIT trace.")
+                return RunMethods.JIT, traced_model, output
+        except BaseException:
+            try:
+                # JIT trace failed, try torchdynamo with JIT trace backend.
+                # The dynamo model is dynamic and shared by all the signatures.
+                if self.dynamo_model is None:
+                    torch._dynamo.reset()
+                    self.dynamo_model = torch._dynamo.optimize(compiler, dynamic=True)(
+                        self.model
+                    )
+                output = self.dynamo_model(*input, **kwargs)
+                logger.debug("generate graph by TorchDynamo.")
+                return RunMethods.TorchDynamo, self.dynamo_model, output
+            except BaseException:
+                logger.warning(
+                    "Both JIT and TorchDynamo failed, fallback to original model.",
+                    _type=WarningType.NotSupported,
+                )
+                self.dynamo_model = None
+                torch._dynamo.reset()
+                return RunMethods.EagerInfer, self.model, self.model(*input, **kwargs)
+
+    def _insert(self, signature, method, graph, compile_time):
+        self.graphs[signature] = (method, graph)
+        self.method = method
+        self.stats["compiles"] += 1
+        self.stats["compile_time"] += compile_time
+        while len(self.graphs) > max(self.cache_size, 1):
+            self.graphs.popitem(last=False)
+            self.stats["evictions"] += 1
+        logger.debug(
+            "captured graph for input signature {} in {:.3f} s".format(
+                signature, compile_time
+            )
+        )
+
+    def _background_compile(self, signature, input, kwargs, compiler, grad_enabled):
+        try:
+            with torch.set_grad_enabled(grad_enabled), torch.cpu.amp.autocast(
+                enabled=(self.dtype == torch.bfloat16 or self.dtype == torch.half),
+                dtype=self.dtype,
+            ):
+                start = time.time()
+                method, graph, _ = self._compile(input, kwargs, compiler)
+                compile_time = time.time() - start
+            with self.lock:
+                self._insert(signature, method, graph, compile_time)
+        finally:
+            with self.lock:
+                self.pending.discard(signature)
 
     def __call__(self, func):
         @fake_tensor_unsupported
@@ -51,69 +249,55 @@ class GraphCapture(object):
                 enabled=(self.dtype == torch.bfloat16 or self.dtype == torch.half),
                 dtype=self.dtype,
             ):
-                if self.method:
-                    if self.train:
-                        return func(*input, **kwargs)
+                if self.train:
+                    if self.method is None:
+                        logger.warning(
+                            "graph capture does not support training yet.",
+                            _type=WarningType.NotSupported,
+                        )
+                        self.method = RunMethods.EagerTrain
+                    return func(*input, **kwargs)
+                padded_sizes = {}
+                if self.pad_to_bucket and self.bucket_dims:
+                    input = self._pad(input, padded_sizes)
+                    kwargs = self._pad(kwargs, padded_sizes)
+                signature = (self._signature(input), self._signature(kwargs))
+                with self.lock:
+                    entry = self.graphs.get(signature, None)
+                    if entry is not None:
+                        self.graphs.move_to_end(signature)
+                        self.stats["hits"] += 1
                     else:
-                        return self.model(*input, **kwargs)
-                else:
-                    # Lock the graph generation process to avoid multiple threads generating graph simultaneously.
+                        self.stats["misses"] += 1
+                if entry is not None:
+                    return self._unpad(entry[1](*input, **kwargs), padded_sizes)
+                if self.background_compile:
                     with self.lock:
-                        if self.method:
-                            if self.train:
-                                return func(*input, **kwargs)
-                            else:
-                                return self.model(*input, **kwargs)
-                        if self.train:
-                            logger.warning(
-                                "graph capture does not support training yet.",
-                                _type=WarningType.NotSupported,
-                            )
-                            self.method = RunMethods.EagerTrain
-                            return func(*input, **kwargs)
-                        else:
-                            try:
-                                # Try JIT trace.
-                                # Tracing only records operations done when the given function is run on the given
-                                # tensors. Therefore, the returned ScriptModule will always run the same traced graph
-                                # on any input. This has some important implications when your module is expected
-                                # to run different sets of operations, depending on the input and/or the module state.
-                                # In cases like these, tracing would not be appropriate, and the tracer will try to
-                                # emit warnings when doing something that may cause an incorrect trace to be produced.
-                                # Therefore, we catch these warnings and treat them as errors, and let TorchDynamo
-                                # handle such models appropriately.
-                                with warnings.catch_warnings():
-                                    warnings.filterwarnings(
-                                        "error", category=TracerWarning
-                                    )
-                                    traced_model = torch.jit.trace(
-                                        self.model.eval(), input
-                                    ).eval()
-                                    traced_model = torch.jit.freeze(traced_model)
-                                    output = traced_model(*input, **kwargs)
-                                    self.model = traced_model
-                                    self.method = RunMethods.JIT
-                                    logger.debug("generate graph by JIT trace.")
-                                    return output
-                            except BaseException:
-                                try:
-                                    # JIT trace failed, try torchdynamo with JIT trace backend.
-                                    torch._dynamo.reset()
-                                    dynamo_model = torch._dynamo.optimize(
-                                        compiler, dynamic=True
-                                    )(self.model)
-                                    output = dynamo_model(*input, **kwargs)
-                                    self.model = dynamo_model
-                                    self.method = RunMethods.TorchDynamo
-                                    logger.debug("generate graph by TorchDynamo.")
-                                    return output
-                                except BaseException:
-                                    logger.warning(
-                                        "Both JIT and TorchDynamo failed, fallback to original model.",
-                                        _type=WarningType.NotSupported,
-                                    )
-                                    self.method = RunMethods.EagerInfer
-                                    torch._dynamo.reset()
-                                    return self.model(*input, **kwargs)
+                        start_compile = signature not in self.pending
+                        self.pending.add(signature)
+                    if start_compile:
+                        threading.Thread(
+                            target=self._background_compile,
+                            args=(
+                                signature,
+                                input,
+                                kwargs,
+                                compiler,
+                                torch.is_grad_enabled(),
+                            ),
+                            daemon=True,
+                        ).start()
+                    return self._unpad(self.model(*input, **kwargs), padded_sizes)
+                # Lock the graph generation process to avoid multiple threads generating graph simultaneously.
+                with self.lock:
+                    entry = self.graphs.get(signature, None)
+                    if entry is not None:
+                        output = entry[1](*input, **kwargs)
+                    else:
+                        start = time.time()
+                        method, graph, output = self._compile(input, kwargs, compiler)
+                        self._insert(signature, method, graph, time.time() - start)
+                return self._unpad(output, padded_sizes)
 
+        forward.graph_capture = self
         return forward
@@ -1,3 +1,4 @@
+import torch
 import intel_extension_for_pytorch._C as core
 
 
@@ -24,3 +25,61 @@ def enable_onednn_fusion(enabled):
         core.enable_jit_opt()
     else:
         core.disable_jit_opt()
+
+
+def warm_up_llga_partitions(model, example_inputs, num_threads=None, profiling_count=2):
+    r"""
+    Precompiles the oneDNN Graph (LLGA) partitions of a TorchScript model for
+    each of the example inputs before serving. The compiled partitions are
+    cached in a cache shared by all the threads of the process, so the
+    inference threads running the model, e.g., the streams of
+    ``MultiStreamModule``, use them without compiling at the first requests.
+
+    A partition is compiled per input shape and per number of OpenMP threads,
+    thus the example inputs should cover the input shapes of the requests, and
+    ``num_threads`` should cover the numbers of threads of the inference
+    threads (e.g., the number of cores per stream of ``MultiStreamModule``).
+
+    The capacity of the cache is set by
+    ``ipex._C._jit_set_llga_compiled_partition_cache_capacity``, its hits,
+    misses, evictions and compilation time are read from
+    ``ipex._C._jit_llga_compiled_partition_cache_stats``.
+
+    Args:
+        model (torch.jit.ScriptModule): the traced or scripted model, with
+            the oneDNN Graph fusion.
+        example_inputs (list): the example inputs, each item is a tuple of
+            the inputs of the model or a tensor.
+        num_threads (int or list of int): the numbers of OpenMP threads to
+            compile the partitions for. Default: the current number.
+        profiling_count (int): the runs of each example input, the profiling
+            executor optimizes the graph for the input shape after the
+            profiling runs. Default: 2.
+
+    Returns:
+        The stats of the compiled partition cache.
+
+    Examples:
+
+        >>> traced = torch.jit.freeze(torch.jit.trace(model, x))
+        >>> ipex.cpu.onednn_fusion.warm_up_llga_partitions(
+        ...     traced, [torch.rand(bs, 3, 224, 224) for bs in [1, 8, 32]]
+        ... )
+    """
+    if num_threads is None:
+        num_threads = [torch.get_num_threads()]
+    elif isinstance(num_threads, int):
+        num_threads = [num_threads]
+    orig_num_threads = torch.get_num_threads()
+    try:
+        with torch.no_grad():
+            for n in num_threads:
+                torch.set_num_threads(n)
+                for inputs in example_inputs:
+                    if not isinstance(inputs, (tuple, list)):
+                        inputs = (inputs,)
+                    for _ in range(profiling_count):
+                        model(*inputs)
+    finally:
+        torch.set_num_threads(orig_num_threads)
+    return core._jit_llga_compiled_partition_cache_stats()
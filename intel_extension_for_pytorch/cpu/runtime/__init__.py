@@ -1,4 +1,4 @@
-from .task import Task
+from .task import Task, AsyncTaskPool
 from .cpupool import pin, CPUPool, is_runtime_ext_enabled
 from .multi_stream import (
     MultiStreamModule,
@@ -7,3 +7,4 @@ from .multi_stream import (
     _MultiStreamBenchmarkModule,
 )
 from .runtime_utils import get_core_list_of_node_id
+from .dynamic_batching import DynamicBatchingModule
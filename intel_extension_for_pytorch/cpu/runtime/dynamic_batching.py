@@ -0,0 +1,381 @@
+import collections
+import threading
+import time
+import torch
+from concurrent.futures import Future
+from typing import Union
+from .cpupool import CPUPool
+from .task import Task
+from .multi_stream import (
+    MultiStreamModuleHint,
+    default_multi_stream_module_split_hint,
+    default_multi_stream_module_concat_hint,
+    get_default_num_streams,
+)
+from ...utils._logger import logger, WarningType
+
+
+def _batch_key(hint, obj):
+    # Requests can only be batched together if the inputs which are not split
+    # are the same objects and the split inputs only differ along the split dim.
+    if isinstance(hint, (list, tuple)):
+        return tuple(_batch_key(h, obj[i]) for i, h in enumerate(hint))
+    if isinstance(hint, dict):
+        return tuple((k, _batch_key(hint[k], obj[k])) for k in hint)
+    if hint is None:
+        try:
+            hash(obj)
+            return (type(obj).__name__, obj)
+        except TypeError:
+            return (type(obj).__name__, id(obj))
+    shape = list(obj.shape)
+    del shape[hint]
+    return (tuple(shape), obj.dtype)
+
+
+def _gather(hint, objs):
+    # Concat the inputs of the requests along the split dims of the hint.
+    if isinstance(hint, (list, tuple)):
+        return type(objs[0])(
+            _gather(h, [obj[i] for obj in objs]) for i, h in enumerate(hint)
+        )
+    if isinstance(hint, dict):
+        return {k: _gather(hint[k], [obj[k] for obj in objs]) for k in hint}
+    if hint is None:
+        return objs[0]
+    return torch.cat(objs, dim=hint)
+
+
+def _scatter(hint, obj, sizes):
+    # Split the output of a batch back to the requests along the concat dims of the hint.
+    if isinstance(hint, (list, tuple)):
+        parts = [_scatter(h, obj[i], sizes) for i, h in enumerate(hint)]
+        return [type(obj)(part[r] for part in parts) for r in range(len(sizes))]
+    if isinstance(hint, dict):
+        parts = {k: _scatter(hint[k], obj[k], sizes) for k in hint}
+        return [{k: parts[k][r] for k in hint} for r in range(len(sizes))]
+    if hint is None:
+        return [obj] * len(sizes)
+    return list(torch.split(obj, sizes, dim=hint))
+
+
+class _Request(object):
+    def __init__(self, args, kwargs, size, key):
+        self.args = args
+        self.kwargs = kwargs
+        self.size = size
+        self.key = key
+        self.future = Future()
+        self.arrival_time = time.time()
+
+
+class DynamicBatchingModule(object):
+    r"""
+    DynamicBatchingModule is a request queue front-end for online inference
+    with multi-stream throughput mode. Each call submits one request
+    (usually of batchsize 1) and returns a ``concurrent.futures.Future``.
+    Concurrent requests are collected into a batch until there are
+    ``batch_size`` of them or the oldest one has waited for ``max_wait_time``,
+    the batch runs on the next idle stream, and its output is split back to
+    the futures of the requests.
+
+    The cores of ``cpu_pool`` are allocated to the streams in the same way as
+    ``MultiStreamModule``. The inputs of the requests are concatenated along
+    the dims given by ``input_split_hint``, and the inputs with ``None`` hint
+    must be the same objects to be batched together. The output is split
+    along the dims given by ``output_concat_hint``.
+
+    The batch size adapts to the observed latency: it grows by one when a full
+    batch is served within ``latency_target`` and it is halved when the moving
+    average of the request latency exceeds ``latency_target``. With
+    ``latency_target`` set, the wait time of a batch is also bounded by the
+    latency budget left after the average compute time.
+
+    Args:
+        model (torch.jit.ScriptModule or torch.nn.Module): The input model.
+        num_streams (Union[int, str]): Number of instances (int) or "AUTO" (str).
+        cpu_pool (intel_extension_for_pytorch.cpu.runtime.CPUPool): An
+            intel_extension_for_pytorch.cpu.runtime.CPUPool object, contains
+            all CPU cores used to run the inference.
+        max_batch_size (int): max number of samples in a batch.
+        max_wait_time (float): max time in seconds a request waits for the
+            batch to be filled.
+        latency_target (float): target of the request latency in seconds.
+            ``None`` means the batch size grows up to ``max_batch_size``.
+        input_split_hint (MultiStreamModuleHint): Hint about how to concat the
+            inputs of the requests.
+        output_concat_hint (MultiStreamModuleHint): Hint about how to split the
+            output of a batch.
+
+    Returns:
+        intel_extension_for_pytorch.cpu.runtime.DynamicBatchingModule: Generated
+        intel_extension_for_pytorch.cpu.runtime.DynamicBatchingModule object.
+
+    :meta public:
+    """
+
+    def __init__(
+        self,
+        model,
+        num_streams: Union[int, str] = "AUTO",
+        cpu_pool: CPUPool = CPUPool(),
+        max_batch_size: int = 32,
+        max_wait_time: float = 0.005,
+        latency_target: float = None,
+        input_split_hint: MultiStreamModuleHint = default_multi_stream_module_split_hint,
+        output_concat_hint: MultiStreamModuleHint = default_multi_stream_module_concat_hint,
+    ):
+        assert (
+            type(cpu_pool) is CPUPool
+        ), "Input of cpu_pool must be provided with type of ipex.cpu.runtime.CPUPool"
+        assert max_batch_size >= 1, "max_batch_size must be a positive number"
+        if not isinstance(model, torch.jit.ScriptModule):
+            logger.warning(
+                "Creating DynamicBatchingModule on an nn.Module. This can be slow due "
+                + "to Python Global Interpreter Lock (GIL). Suggest to use JIT ScriptModule for better performance.",
+                _type=WarningType.WrongArgument,
+            )
+        self.cpu_pool = cpu_pool
+        self.core_list = cpu_pool.core_ids
+        if isinstance(num_streams, str):
+            assert (
+                num_streams.upper() == "AUTO"
+            ), 'Input of num_streams must be Number of instances or string "AUTO"'
+            self.num_streams = get_default_num_streams(cpu_pool)
+        else:
+            assert isinstance(
+                num_streams, int
+            ), 'Input of num_streams must be Number of instances or string "AUTO"'
+            self.num_streams = num_streams
+        if self.num_streams > self.core_list.__len__():
+            self.num_streams = self.core_list.__len__()
+            logger.warning(
+                f"The number of streams is larger than number of cores. The number of streams changes to {self.num_streams}.",
+                _type=WarningType.WrongArgument,
+            )
+
+        cores_per_instance = self.core_list.__len__() // self.num_streams
+        num_stream_allocated_extra_core = self.core_list.__len__() % self.num_streams
+        self.tasks = []
+        start_core_list_idx = 0
+        end_core_list_idx = 0
+        for j in range(self.num_streams):
+            end_core_list_idx += cores_per_instance + (
+                1 if j < num_stream_allocated_extra_core else 0
+            )
+            self.tasks.append(
+                Task(
+                    model,
+                    CPUPool(self.core_list[start_core_list_idx:end_core_list_idx]),
+                )
+            )
+            start_core_list_idx = end_core_list_idx
+
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        self.latency_target = latency_target
+        self.input_split_hint = input_split_hint
+        self.output_concat_hint = output_concat_hint
+        self.output_hint = (
+            output_concat_hint.args[0]
+            if output_concat_hint.args
+            else output_concat_hint.kwargs
+        )
+        # Start from small batches and let the latency feedback grow them.
+        self.batch_size = 1
+
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        # Only one idle stream forms a batch at a time, the others wait for their turn.
+        self.batch_forming_lock = threading.Lock()
+        self.closed = False
+        self.ewma_latency = None
+        self.ewma_compute_time = None
+        self.start_time = time.time()
+        self.num_requests = 0
+        self.num_batches = 0
+        self.batch_size_histogram = collections.Counter()
+        self.stream_busy_time = [0.0] * self.num_streams
+        self.workers = []
+        for stream_id in range(self.num_streams):
+            worker = threading.Thread(
+                target=self._worker_loop, args=(stream_id,), daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def __call__(self, *args, **kwargs):
+        return self.submit(*args, **kwargs)
+
+    def submit(self, *args, **kwargs):
+        r"""
+        Submits a request and returns a ``concurrent.futures.Future`` of its output.
+        """
+        args = list(args)
+        size = self._request_size(self.input_split_hint.args, args)
+        if size is None:
+            size = self._request_size(self.input_split_hint.kwargs, kwargs)
+        assert size is not None, "No input of the request is split by input_split_hint"
+        key = (
+            _batch_key(self.input_split_hint.args, args),
+            _batch_key(self.input_split_hint.kwargs, kwargs),
+        )
+        request = _Request(args, kwargs, size, key)
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("DynamicBatchingModule has been closed")
+            self.queue.append(request)
+            self.cond.notify_all()
+        return request.future
+
+    def _request_size(self, hint, obj):
+        if isinstance(hint, (list, tuple)):
+            for i, h in enumerate(hint):
+                size = self._request_size(h, obj[i])
+                if size is not None:
+                    return size
+            return None
+        if isinstance(hint, dict):
+            for k in hint:
+                size = self._request_size(hint[k], obj[k])
+                if size is not None:
+                    return size
+            return None
+        if hint is None:
+            return None
+        return obj.size(hint)
+
+    def _wait_time(self):
+        if self.latency_target is None or self.ewma_compute_time is None:
+            return self.max_wait_time
+        budget = self.latency_target - self.ewma_compute_time
+        return max(0.0, min(self.max_wait_time, budget))
+
+    def _next_batch(self):
+        # Called with self.cond held. Returns None once closed and drained.
+        while not self.queue:
+            if self.closed:
+                return None
+            self.cond.wait()
+        while not self.closed:
+            num_samples = sum(r.size for r in self.queue)
+            remaining = self.queue[0].arrival_time + self._wait_time() - time.time()
+            if num_samples >= self.batch_size or remaining <= 0:
+                break
+            self.cond.wait(remaining)
+        # Take the compatible requests in arrival order up to the batch size.
+        batch = []
+        num_samples = 0
+        key = self.queue[0].key
+        for request in list(self.queue):
+            if request.key != key:
+                continue
+            if batch and num_samples + request.size > self.batch_size:
+                break
+            batch.append(request)
+            num_samples += request.size
+        for request in batch:
+            self.queue.remove(request)
+        return batch
+
+    def _run_batch(self, stream_id, batch):
+        # Requests cancelled by the caller while queued still run with the
+        # batch, only their futures are left untouched.
+        running = [r.future.set_running_or_notify_cancel() for r in batch]
+        sizes = [r.size for r in batch]
+        if len(batch) == 1:
+            args, kwargs = batch[0].args, batch[0].kwargs
+        else:
+            args = _gather(self.input_split_hint.args, [r.args for r in batch])
+            kwargs = _gather(self.input_split_hint.kwargs, [r.kwargs for r in batch])
+        start = time.time()
+        try:
+            output = self.tasks[stream_id](*args, **kwargs).get()
+            outputs = (
+                [output]
+                if len(batch) == 1
+                else _scatter(self.output_hint, output, sizes)
+            )
+        except BaseException as e:
+            for request, is_running in zip(batch, running):
+                if is_running:
+                    request.future.set_exception(e)
+            outputs = None
+        end = time.time()
+        if outputs is not None:
+            for request, is_running, out in zip(batch, running, outputs):
+                if is_running:
+                    request.future.set_result(out)
+        self._update(stream_id, batch, sum(sizes), start, end)
+
+    def _update(self, stream_id, batch, num_samples, start, end):
+        latency = max(end - r.arrival_time for r in batch)
+        with self.cond:
+            self.num_requests += len(batch)
+            self.num_batches += 1
+            self.batch_size_histogram[num_samples] += 1
+            self.stream_busy_time[stream_id] += end - start
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+                self.ewma_compute_time = end - start
+            else:
+                self.ewma_latency = 0.8 * self.ewma_latency + 0.2 * latency
+                self.ewma_compute_time = 0.8 * self.ewma_compute_time + 0.2 * (
+                    end - start
+                )
+            # Additive increase while full batches meet the target, multiplicative
+            # decrease once the target is missed.
+            if (
+                self.latency_target is not None
+                and self.ewma_latency > self.latency_target
+            ):
+                self.batch_size = max(1, self.batch_size // 2)
+            elif num_samples >= self.batch_size:
+                self.batch_size = min(self.max_batch_size, self.batch_size + 1)
+
+    def _worker_loop(self, stream_id):
+        while True:
+            with self.batch_forming_lock:
+                with self.cond:
+                    batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(stream_id, batch)
+
+    def stats(self):
+        r"""
+        Returns the metrics of the module: the queue depth, current batch
+        size, histogram of the number of samples per batch, number of
+        requests and batches served, moving average of the request latency
+        and utilization of each stream since its creation.
+        """
+        with self.cond:
+            elapsed = max(time.time() - self.start_time, 1e-9)
+            return {
+                "queue_depth": len(self.queue),
+                "batch_size": self.batch_size,
+                "batch_size_histogram": dict(self.batch_size_histogram),
+                "requests": self.num_requests,
+                "batches": self.num_batches,
+                "latency": self.ewma_latency,
+                "stream_utilization": [t / elapsed for t in self.stream_busy_time],
+            }
+
+    def close(self):
+        r"""
+        Stops accepting requests, serves the queued ones and stops the streams.
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_stream_number(self):
+        return self.num_streams
@@ -5,6 +5,7 @@ import intel_extension_for_pytorch._C as core
 from .cpupool import CPUPool
 from .task import Task
 import copy
+import threading
 from ...utils._logger import logger, WarningType
 
 
@@ -64,6 +65,13 @@ class MultiStreamModule(nn.Module):
     as "AUTO", we suggest to set inputs' batchsize larger than and divisible by
     number of cores.
 
+    With ``work_stealing`` on, the batch is split into ``chunks_per_stream``
+    times ``num_streams`` micro-chunks instead, and each stream pulls the next
+    micro-chunk once it finishes the previous one. It balances the load when
+    the cost of the samples varies, such as different sequence lengths, at the
+    cost of smaller batches per model invoking. The outputs are still
+    concatenated in the original order of the inputs.
+
     Args:
         model (torch.jit.ScriptModule or torch.nn.Module): The input model.
         num_streams (Union[int, str]): Number of instances (int) or "AUTO" (str). "AUTO" means the stream number
@@ -81,6 +89,13 @@ class MultiStreamModule(nn.Module):
             how to split the inputs.
         output_concat_hint (MultiStreamModuleHint): Hint to MultiStreamModule about
             how to concat the outputs.
+        work_stealing (bool): A flag indicates whether the streams pull
+            micro-chunks of the inputs dynamically instead of running one
+            static split each. The default value is False. Note: if
+            ``concat_output`` is False, the raw output is a list of each
+            micro-chunk's output.
+        chunks_per_stream (int): Number of micro-chunks per stream with
+            ``work_stealing`` on. The default value is 4.
 
     Returns:
         intel_extension_for_pytorch.cpu.runtime.MultiStreamModule: Generated
@@ -97,6 +112,8 @@ class MultiStreamModule(nn.Module):
         concat_output: bool = True,
         input_split_hint: MultiStreamModuleHint = default_multi_stream_module_split_hint,
         output_concat_hint: MultiStreamModuleHint = default_multi_stream_module_concat_hint,
+        work_stealing: bool = False,
+        chunks_per_stream: int = 4,
     ):
         super(MultiStreamModule, self).__init__()
         assert (
@@ -133,6 +150,14 @@ class MultiStreamModule(nn.Module):
                 _type=WarningType.WrongArgument,
             )
 
+        self.work_stealing = work_stealing and self.num_streams > 1
+        if self.work_stealing:
+            assert chunks_per_stream >= 1, "chunks_per_stream must be a positive number"
+            # The inputs are split into micro-chunks instead of one split per stream.
+            self.num_splits = self.num_streams * chunks_per_stream
+        else:
+            self.num_splits = self.num_streams
+
         if self.num_streams == 1:
             # Sync execution path if num_stream is 1.
             self.model = model
@@ -153,11 +178,18 @@ class MultiStreamModule(nn.Module):
                     end_core_list_idx += self.cores_per_instance
                 self.tasks.append(
                     Task(
-                        model,
+                        # With work stealing, each stream runs a loop pulling the micro-chunks
+                        # on its own cores and invokes the model for each of them.
+                        (
+                            _MicroChunkRunner(self, model)
+                            if self.work_stealing
+                            else model
+                        ),
                         CPUPool(self.core_list[start_core_list_idx:end_core_list_idx]),
                     )
                 )
                 start_core_list_idx = end_core_list_idx
+            self.micro_chunk_lock = threading.Lock()
         self.concat_output = concat_output
         self.input_split_hint = input_split_hint
         self.output_concat_hint = output_concat_hint
@@ -166,7 +198,7 @@ class MultiStreamModule(nn.Module):
         # Each streams_input will be recursively visited and set to the split value in place.
         self.args_streams_input = []
         self.kwargs_streams_input = []
-        for _ in range(self.num_streams):
+        for _ in range(self.num_splits):
             self.args_streams_input.append(copy.deepcopy(self.input_split_hint.args))
             self.kwargs_streams_input.append(
                 copy.deepcopy(self.input_split_hint.kwargs)
@@ -185,12 +217,15 @@ class MultiStreamModule(nn.Module):
         #   * split_size: will be calculated by input batch size and num_streams.
         #   * used_num_streams: is the num_streams actually used by this forward invoking.
         #       It may less than self.num_streams when bs is less than self.num_streams.
+        #       With work stealing, it is the number of micro-chunks actually used instead.
         #   * current_split_start_idx: used to record the split start idx for current stream.
         #   * current_split_end_idx: used to record the split end idx for current stream.
         self.split_size = None
         self.used_num_streams = self.num_streams
         self.current_split_start_idx = 0
         self.current_split_end_idx = 0
+        self.next_micro_chunk = 0
+        self.micro_chunk_outputs = []
 
     def update_split_idx(self, stream_id):
         # Set current_split_start_idx to last current_split_end_idx
@@ -212,13 +247,13 @@ class MultiStreamModule(nn.Module):
         # This function should be invoke only once at each forward
         self.split_size = split_size
         # Ensure each instance has input offload
-        self.batch_per_instance = self.split_size // self.num_streams
+        self.batch_per_instance = self.split_size // self.num_splits
         if self.batch_per_instance >= 1:
             # The input batchsize larger or equal to num_streams.
-            self.used_num_streams = self.num_streams
+            self.used_num_streams = self.num_splits
             # If input batchsize larger than num_streams and not divisible,
             # the first remainder streams will have (mini_batch + 1) input size.
-            self.instance_need_extra_input = self.split_size % self.num_streams
+            self.instance_need_extra_input = self.split_size % self.num_splits
         else:
             # The input batchsize less than num_streams,
             # only the first batchsize stream will have mini_batch(1) input.
@@ -496,6 +531,9 @@ class MultiStreamModule(nn.Module):
         # Split the raw input to generate input for each stream
         self._get_input_for_each_stream(self.input_split_hint, *args, **kwargs)
 
+        if self.work_stealing:
+            return self._forward_work_stealing()
+
         results_raw_future = []
         results_raw = []
         for stream_id in range(self.used_num_streams):
@@ -523,10 +561,47 @@ class MultiStreamModule(nn.Module):
             self._concat_output_for_each_stream() if self.concat_output else results_raw
         )
 
+    def _run_micro_chunks(self, model):
+        # Invoked inside the Task of each stream. Pull the next micro-chunk until all are taken.
+        while True:
+            with self.micro_chunk_lock:
+                chunk_id = self.next_micro_chunk
+                if chunk_id >= self.used_num_streams:
+                    return None
+                self.next_micro_chunk += 1
+            self.micro_chunk_outputs[chunk_id] = model(
+                *(self.args_streams_input[chunk_id]),
+                **(self.kwargs_streams_input[chunk_id]),
+            )
+
+    def _forward_work_stealing(self):
+        self.micro_chunk_outputs = [None] * self.used_num_streams
+        results_raw_future = []
+        for stream_id in range(min(self.num_streams, self.used_num_streams)):
+            results_raw_future.append(self.tasks[stream_id]())
+        for future in results_raw_future:
+            future.get()
+        if not self.concat_output:
+            return self.micro_chunk_outputs
+        # Generate and concat the outputs in the original order of the micro-chunks.
+        for chunk_id in range(self.used_num_streams):
+            self._generate_outputs([self.micro_chunk_outputs[chunk_id]], chunk_id)
+        return self._concat_output_for_each_stream()
+
     def get_stream_number(self):
         return self.num_streams
 
 
+class _MicroChunkRunner(object):
+    # Callable run by the Task of each stream in work stealing mode of MultiStreamModule.
+    def __init__(self, multi_stream_module, model):
+        self.multi_stream_module = multi_stream_module
+        self.model = model
+
+    def __call__(self):
+        return self.multi_stream_module._run_micro_chunks(self.model)
+
+
 class _MultiStreamBenchmarkModule(nn.Module):
     # Here is an internal Module for weight sharing benchmark
     # The diffence with MultiStreamModule:
@@ -1,3 +1,4 @@
+import asyncio
 import torch
 import intel_extension_for_pytorch as ipex
 from .cpupool import CPUPool
@@ -34,3 +35,90 @@ class Task(object):
     def run_sync(self, *args, **kwargs):
         # sync execution
         return self._task.run_sync(*args, **kwargs)
+
+    def run_async_aio(self, *args, **kwargs):
+        r"""
+        Submits the computation asynchronously and returns an
+        ``asyncio.Future`` of its result, which is bound to the running event
+        loop. The executor of the Task notifies the event loop once the result
+        is ready, so no thread is blocked while waiting.
+        """
+        loop = asyncio.get_running_loop()
+        aio_future = loop.create_future()
+        # The callback may be invoked before run_async_with_callback returns,
+        # but _resolve only runs on the event loop thread after this method.
+        cpp_future = []
+
+        def _resolve():
+            try:
+                result = cpp_future[0].get()
+            except BaseException as e:
+                if not aio_future.cancelled():
+                    aio_future.set_exception(e)
+                return
+            if not aio_future.cancelled():
+                aio_future.set_result(result)
+
+        def _done_callback():
+            # Invoked on the executor thread of the Task.
+            loop.call_soon_threadsafe(_resolve)
+
+        cpp_future.append(
+            self._task.run_async_with_callback(_done_callback, *args, **kwargs)
+        )
+        return aio_future
+
+
+class AsyncTaskPool(object):
+    r"""
+    An asyncio-friendly pool of Tasks on several CPUPools. The computation
+    submitted by ``run`` is dispatched to the next idle Task, so that one
+    event loop keeps many core-pinned executors busy without blocking any
+    thread.
+
+    Args:
+        module (torch.jit.ScriptModule or torch.nn.Module): The input module.
+        cpu_pools (list): A list of
+            intel_extension_for_pytorch.cpu.runtime.CPUPool objects, one Task
+            is created on each of them.
+        max_inflight_per_task (int): Max number of computations submitted to
+            each Task at the same time. The extra ones wait in the pool for an
+            idle Task.
+
+    Returns:
+        intel_extension_for_pytorch.cpu.runtime.AsyncTaskPool: Generated
+        intel_extension_for_pytorch.cpu.runtime.AsyncTaskPool object.
+    """
+
+    def __init__(self, module, cpu_pools: list, max_inflight_per_task: int = 1):
+        assert len(cpu_pools) > 0, "cpu_pools should contain at least one CPUPool"
+        assert max_inflight_per_task >= 1, "max_inflight_per_task must be positive"
+        self.tasks = [Task(module, cpu_pool) for cpu_pool in cpu_pools]
+        self.max_inflight_per_task = max_inflight_per_task
+        self._idle_tasks = None
+        self._loop = None
+
+    def _get_idle_tasks(self):
+        # The queue is created in the running event loop it is used by.
+        loop = asyncio.get_running_loop()
+        if self._idle_tasks is None or self._loop is not loop:
+            self._loop = loop
+            self._idle_tasks = asyncio.Queue()
+            for _ in range(self.max_inflight_per_task):
+                for task in self.tasks:
+                    self._idle_tasks.put_nowait(task)
+        return self._idle_tasks
+
+    async def run(self, *args, **kwargs):
+        r"""
+        Runs the computation on the next idle Task and returns its result.
+        """
+        idle_tasks = self._get_idle_tasks()
+        task = await idle_tasks.get()
+        try:
+            return await task.run_async_aio(*args, **kwargs)
+        finally:
+            idle_tasks.put_nowait(task)
+
+    def __call__(self, *args, **kwargs):
+        return self.run(*args, **kwargs)
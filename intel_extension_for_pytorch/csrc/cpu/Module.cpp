@@ -37,6 +37,7 @@
 #include "TaskModule.h"
 #include "aten/EmbeddingBag.h"
 #include "comm/comm.h"
+#include "comm/shm_comm.h"
 #include "runtime/CPUPool.h"
 #include "runtime/TaskExecutor.h"
 #include "toolkit/sklearn.h"
@@ -146,6 +147,30 @@ void InitIpexModuleBindings(py::module m) {
   m.def(
       "_jit_llga_weight_cache_enabled",
       &torch_ipex::jit::fuser::onednn::getLlgaWeightCacheEnabled);
+  m.def("_jit_llga_compiled_partition_cache_stats", []() {
+    auto stats =
+        torch_ipex::jit::fuser::onednn::getLlgaCompiledPartitionCacheStats();
+    auto py_dict = py::dict();
+    py_dict["hits"] = stats.hits;
+    py_dict["misses"] = stats.misses;
+    py_dict["evictions"] = stats.evictions;
+    py_dict["compile_time_us"] = stats.compileTimeUs;
+    py_dict["size"] = stats.size;
+    py_dict["capacity"] = stats.capacity;
+    return py_dict;
+  });
+  m.def(
+      "_jit_reset_llga_compiled_partition_cache_stats",
+      &torch_ipex::jit::fuser::onednn::resetLlgaCompiledPartitionCacheStats);
+  m.def(
+      "_jit_llga_compiled_partition_cache_capacity",
+      &torch_ipex::jit::fuser::onednn::getLlgaCompiledPartitionCacheCapacity);
+  m.def(
+      "_jit_set_llga_compiled_partition_cache_capacity",
+      &torch_ipex::jit::fuser::onednn::setLlgaCompiledPartitionCacheCapacity);
+  m.def(
+      "_jit_clear_llga_compiled_partition_cache",
+      &torch_ipex::jit::fuser::onednn::clearLlgaCompiledPartitionCache);
 
   m.def("enable_jit_opt", []() {
     AutoOptConfig::singleton().set_jit_fuse(true);
@@ -223,6 +248,17 @@ void InitIpexModuleBindings(py::module m) {
             // Depending on this being ScriptModule of nn.Module we will release
             // the GIL or not further down in the stack
             return self.run_async(std::move(args), std::move(kwargs));
+          })
+      .def(
+          "run_async_with_callback",
+          [](torch_ipex::runtime::TaskModule& self,
+             const py::object& done_callback,
+             py::args& args,
+             py::kwargs& kwargs) {
+            // done_callback is invoked with the GIL by the executor thread
+            // once the result is ready, and FutureTensor.get won't block then
+            return self.run_async(
+                std::move(args), std::move(kwargs), done_callback);
           });
 
   m.def(
@@ -273,6 +309,25 @@ void InitIpexModuleBindings(py::module m) {
   m.def("get_rank", &torch_ipex::cpu::get_rank);
   m.def("get_world_size", &torch_ipex::cpu::get_world_size);
   m.def("barrier", &torch_ipex::cpu::barrier);
+  m.def(
+      "shm_comm_init",
+      [](int64_t rank,
+         int64_t world_size,
+         const std::string& name,
+         int64_t buffer_size,
+         int64_t numa_node) {
+        torch_ipex::cpu::ShmCommunicator::getInstance().init(
+            rank, world_size, name, buffer_size, numa_node);
+      });
+  m.def("shm_comm_destroy", []() {
+    torch_ipex::cpu::ShmCommunicator::getInstance().destroy();
+  });
+  m.def("shm_comm_is_initialized", []() {
+    return torch_ipex::cpu::ShmCommunicator::getInstance().isInitialized();
+  });
+  m.def("shm_comm_get_rank", &torch_ipex::cpu::shm_comm_get_rank);
+  m.def("shm_comm_get_world_size", &torch_ipex::cpu::shm_comm_get_world_size);
+  m.def("shm_comm_barrier", &torch_ipex::cpu::shm_comm_barrier);
 
   // Module version
   m.def("_get_mkl_version", []() {
@@ -3,6 +3,49 @@
 namespace torch_ipex {
 namespace runtime {
 
+namespace {
+// The Python callback is invoked and released by the executor thread, which
+// doesn't hold the GIL, so the deleter acquires the GIL before releasing it.
+std::shared_ptr<py::object> make_done_callback(const py::object& callback) {
+  if (callback.is_none()) {
+    return nullptr;
+  }
+  return std::shared_ptr<py::object>(
+      new py::object(callback), [](py::object* callback) {
+        pybind11::gil_scoped_acquire gil_guard;
+        delete callback;
+      });
+}
+
+// The inputs of each call are owned by its task, so the calls submitted to
+// the same TaskModule before the previous ones run don't overwrite each
+// other's inputs. They are released by the executor thread, which doesn't hold
+// the GIL, so the deleter acquires the GIL before releasing them.
+std::shared_ptr<std::pair<py::args, py::kwargs>> make_inputs(
+    py::args&& args,
+    py::kwargs&& kwargs) {
+  return std::shared_ptr<std::pair<py::args, py::kwargs>>(
+      new std::pair<py::args, py::kwargs>(std::move(args), std::move(kwargs)),
+      [](std::pair<py::args, py::kwargs>* inputs) {
+        pybind11::gil_scoped_acquire gil_guard;
+        delete inputs;
+      });
+}
+
+void notify_done(const std::shared_ptr<py::object>& callback) {
+  if (!callback) {
+    return;
+  }
+  pybind11::gil_scoped_acquire gil_guard;
+  try {
+    (*callback)();
+  } catch (py::error_already_set& e) {
+    // There is no caller to propagate the exception of the callback to.
+    e.discard_as_unraisable(__func__);
+  }
+}
+} // namespace
+
 py::object FutureTensor::get() {
   CHECK(this->script_module_initialized_ ^ this->module_initialized_);
   if (this->script_module_initialized_) {
@@ -45,8 +88,10 @@ TaskModule::~TaskModule() {
 
 std::unique_ptr<FutureTensor> TaskModule::run_async(
     py::args&& args,
-    py::kwargs&& kwargs) {
+    py::kwargs&& kwargs,
+    const py::object& done_callback) {
   CHECK(this->script_module_initialized_ ^ this->module_initialized_);
+  auto callback = make_done_callback(done_callback);
   // FutureTensor is going to return
   std::unique_ptr<FutureTensor> future_tensor_result =
       std::make_unique<FutureTensor>();
@@ -84,28 +129,29 @@ std::unique_ptr<FutureTensor> TaskModule::run_async(
         if (this->task_executor->is_stop())
           throw std::runtime_error(
               "submit TaskModule(py::object) on stopped ThreadPool");
-        this->task_executor->get_tasks().emplace([task, grad_mode]() {
+        this->task_executor->get_tasks().emplace([task, grad_mode, callback]() {
           // set the thread local status, such as the grad mode before
           // execuating the status
           at::GradMode::set_enabled(grad_mode);
           // execuate the task
           (*task)();
+          // notify the submitter that the result is ready
+          notify_done(callback);
         });
       }
       this->task_executor->get_condition().notify_one();
     }
   } else {
     CHECK(this->module_initialized_);
-    this->args = args;
-    this->kwargs = kwargs;
+    auto inputs = make_inputs(std::move(args), std::move(kwargs));
 
     typedef std::function<py::object()> SubmitFunctionType;
     typedef decltype(SubmitFunctionType()()) return_type;
     auto task = std::make_shared<std::packaged_task<return_type()>>(
-        [&, this]() -> py::object {
+        [this, inputs]() -> py::object {
           {
             pybind11::gil_scoped_acquire gil_guard;
-            return this->module_(*(this->args), **(this->kwargs));
+            return this->module_(*(inputs->first), **(inputs->second));
           }
         });
 
@@ -118,12 +164,14 @@ std::unique_ptr<FutureTensor> TaskModule::run_async(
       if (this->task_executor->is_stop())
         throw std::runtime_error(
             "submit TaskModule(py::object) on stopped ThreadPool");
-      this->task_executor->get_tasks().emplace([task, grad_mode]() {
+      this->task_executor->get_tasks().emplace([task, grad_mode, callback]() {
         // set the thread local status, such as the grad mode before execuating
         // the status
         at::GradMode::set_enabled(grad_mode);
         // execuate the task
         (*task)();
+        // notify the submitter that the result is ready
+        notify_done(callback);
       });
     }
     this->task_executor->get_condition().notify_one();
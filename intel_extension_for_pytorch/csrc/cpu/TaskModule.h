@@ -46,7 +46,10 @@ class TaskModule {
   py::object run_sync(py::args&& args, py::kwargs&& kwargs); /*sync execution*/
   std::unique_ptr<FutureTensor> run_async(
       py::args&& args,
-      py::kwargs&& kwargs); /*async execution in threadpool*/
+      py::kwargs&& kwargs,
+      const py::object& done_callback =
+          py::none()); /*async execution in threadpool, done_callback is
+                          invoked by the executor once the result is ready*/
  private:
   // Script module input
   torch::jit::Module script_module_;
@@ -57,8 +60,6 @@ class TaskModule {
 
   // TaskExecutor
   std::shared_ptr<TaskExecutor> task_executor;
-  py::args args;
-  py::kwargs kwargs;
 };
 
 } // namespace runtime
@@ -311,9 +311,10 @@ class VarlenAttention(nn.Module):
     Args:
         query (torch.Tensor): shape [query_tokens, num_head, head_size],
             where tokens is total sequence length among batch size.
-        key (torch.Tensor):  shape [key_tokens, num_head, head_size],
-            where tokens is total sequence length among batch size.
-        value (torch.Tensor): shape [value_tokens, num_head, head_size],
+        key (torch.Tensor):  shape [key_tokens, num_head_k, head_size],
+            where tokens is total sequence length among batch size,
+            num_head should be a multiple of num_head_k (GQA/MQA).
+        value (torch.Tensor): shape [value_tokens, num_head_k, head_size],
             where tokens is total sequence length among batch size.
         out (torch.Tensor): buffer to get the results, the shape is the same as query.
         seqlen_q (torch.Tensor): shape [batch_size + 1], points the
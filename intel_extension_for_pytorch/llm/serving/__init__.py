@@ -0,0 +1,10 @@
+from .block_manager import BlockAllocator, BlockManager
+from .scheduler import Request, RequestStatus, Scheduler, SchedulerOutput
+from .engine import (
+    PagedKVCache,
+    PagedAttentionMetadata,
+    paged_attention,
+    greedy_sampler,
+    ContinuousBatchingEngine,
+)
+from .models import PagedLlamaAdapter
@@ -0,0 +1,102 @@
+from typing import Dict, List
+
+
+class BlockAllocator:
+    r"""
+    Free list of the physical blocks of a pre-allocated paged KV cache pool.
+
+    Args:
+        num_blocks (int): number of physical blocks in the pool.
+    """
+
+    def __init__(self, num_blocks: int):
+        self.num_blocks = num_blocks
+        # pop from the tail so that low block ids are handed out first
+        self.free_blocks: List[int] = list(range(num_blocks - 1, -1, -1))
+
+    def allocate(self) -> int:
+        if not self.free_blocks:
+            raise RuntimeError("out of memory: no free block in the KV cache pool")
+        return self.free_blocks.pop()
+
+    def free(self, block: int):
+        self.free_blocks.append(block)
+
+    def get_num_free_blocks(self) -> int:
+        return len(self.free_blocks)
+
+
+class BlockManager:
+    r"""
+    Maps the logical token positions of every sequence to slots of the paged
+    KV cache, following the layout used by
+    ``ipex.llm.modules.PagedAttention``: slot ``s`` lives in block
+    ``s // block_size`` at offset ``s % block_size``.
+
+    Args:
+        num_blocks (int): number of physical blocks in the KV cache pool.
+        block_size (int): number of tokens stored in one block.
+        watermark (int): number of free blocks kept in reserve when admitting
+            new sequences, so that running sequences can keep decoding
+            without being preempted right away. Default: 0.
+    """
+
+    def __init__(self, num_blocks: int, block_size: int, watermark: int = 0):
+        self.block_size = block_size
+        self.watermark = watermark
+        self.allocator = BlockAllocator(num_blocks)
+        self.block_tables: Dict[int, List[int]] = {}
+
+    def _num_required_blocks(self, num_tokens: int) -> int:
+        return (num_tokens + self.block_size - 1) // self.block_size
+
+    def can_allocate(self, num_tokens: int) -> bool:
+        return (
+            self.allocator.get_num_free_blocks() - self._num_required_blocks(num_tokens)
+            >= self.watermark
+        )
+
+    def allocate(self, seq_id: int, num_tokens: int) -> List[int]:
+        r"""
+        Allocates blocks for the ``num_tokens`` prompt tokens of a new
+        sequence and returns their slots.
+        """
+        assert seq_id not in self.block_tables, f"sequence {seq_id} is allocated"
+        self.block_tables[seq_id] = [
+            self.allocator.allocate()
+            for _ in range(self._num_required_blocks(num_tokens))
+        ]
+        return [self.get_slot(seq_id, pos) for pos in range(num_tokens)]
+
+    def can_append_slot(self, seq_id: int, position: int) -> bool:
+        return (
+            position < len(self.block_tables[seq_id]) * self.block_size
+            or self.allocator.get_num_free_blocks() > 0
+        )
+
+    def append_slot(self, seq_id: int, position: int) -> int:
+        r"""
+        Returns the slot of token ``position`` of sequence ``seq_id``,
+        allocating a new block when the last one is full.
+        """
+        block_table = self.block_tables[seq_id]
+        if position >= len(block_table) * self.block_size:
+            block_table.append(self.allocator.allocate())
+        return self.get_slot(seq_id, position)
+
+    def get_slot(self, seq_id: int, position: int) -> int:
+        block = self.block_tables[seq_id][position // self.block_size]
+        return block * self.block_size + position % self.block_size
+
+    def get_block_table(self, seq_id: int) -> List[int]:
+        return self.block_tables[seq_id]
+
+    def free(self, seq_id: int):
+        for block in self.block_tables.pop(seq_id, []):
+            self.allocator.free(block)
+
+    def get_num_free_blocks(self) -> int:
+        return self.allocator.get_num_free_blocks()
+
+    def get_num_total_slots(self) -> int:
+        return self.allocator.num_blocks * self.block_size
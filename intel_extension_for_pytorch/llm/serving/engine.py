@@ -0,0 +1,327 @@
+import itertools
+import time
+from typing import Callable, List, Optional, Tuple
+
+import torch
+
+from ..modules import PagedAttention, VarlenAttention
+from .block_manager import BlockManager
+from .scheduler import Request, Scheduler, SchedulerOutput
+
+
+class PagedKVCache:
+    r"""
+    Pre-allocated key/value cache pool of every decoder layer, in the layout of
+    ``ipex.llm.modules.PagedAttention``:
+    [num_blocks, num_kv_heads, block_size, head_size].
+
+    Args:
+        num_layers (int): number of decoder layers.
+        num_blocks (int): number of blocks in the pool.
+        block_size (int): number of tokens stored in one block.
+        num_kv_heads (int): number of key/value heads.
+        head_size (int): head dimension.
+        dtype (torch.dtype): dtype of the cache. Default: torch.float.
+    """
+
+    def __init__(
+        self,
+        num_layers: int,
+        num_blocks: int,
+        block_size: int,
+        num_kv_heads: int,
+        head_size: int,
+        dtype: torch.dtype = torch.float,
+    ):
+        self.num_blocks = num_blocks
+        self.block_size = block_size
+        shape = (num_blocks, num_kv_heads, block_size, head_size)
+        self.kv_caches: List[Tuple[torch.Tensor, torch.Tensor]] = [
+            (torch.zeros(shape, dtype=dtype), torch.zeros(shape, dtype=dtype))
+            for _ in range(num_layers)
+        ]
+
+    def get_memory_size(self) -> int:
+        return sum(
+            k.numel() * k.element_size() + v.numel() * v.element_size()
+            for k, v in self.kv_caches
+        )
+
+
+class PagedAttentionMetadata:
+    r"""
+    Batch information consumed by :func:`paged_attention`, built by
+    :class:`ContinuousBatchingEngine` for every step.
+
+    Args:
+        is_prompt (bool): True for prefill steps, where tokens of every
+            sequence are packed into the batch, False for decode steps,
+            where there is one token per sequence.
+        slot_mapping (torch.Tensor): [num_tokens], cache slot of every token.
+        cu_seqlens (torch.Tensor): [num_seqs + 1], cumulative prompt lengths.
+        max_seqlen (int): max prompt length of the batch.
+        block_tables (torch.Tensor): [num_seqs, max_num_blocks_per_seq].
+        context_lens (torch.Tensor): [num_seqs], number of cached tokens of
+            every sequence, including the current one.
+        max_context_len (int): max of context_lens.
+        block_size (int): number of tokens stored in one block.
+    """
+
+    def __init__(
+        self,
+        is_prompt: bool,
+        slot_mapping: torch.Tensor,
+        cu_seqlens: torch.Tensor,
+        max_seqlen: int,
+        block_tables: torch.Tensor,
+        context_lens: torch.Tensor,
+        max_context_len: int,
+        block_size: int,
+    ):
+        self.is_prompt = is_prompt
+        self.slot_mapping = slot_mapping
+        self.cu_seqlens = cu_seqlens
+        self.max_seqlen = max_seqlen
+        self.block_tables = block_tables
+        self.context_lens = context_lens
+        self.max_context_len = max_context_len
+        self.block_size = block_size
+
+
+def paged_attention(
+    query: torch.Tensor,
+    key: torch.Tensor,
+    value: torch.Tensor,
+    key_cache: torch.Tensor,
+    value_cache: torch.Tensor,
+    metadata: PagedAttentionMetadata,
+    scale: float,
+    head_mapping: Optional[torch.Tensor] = None,
+    alibi_slopes: Optional[torch.Tensor] = None,
+):
+    r"""
+    Attention of one decoder layer over the paged KV cache. The key/value of
+    the current tokens are written into the cache; prompts are computed with
+    ``ipex.llm.modules.VarlenAttention`` on the packed tokens and decode
+    steps with ``PagedAttention.single_query_cached_kv_attention``.
+
+    Args:
+        query (torch.Tensor): [num_tokens, num_heads, head_size].
+        key (torch.Tensor): [num_tokens, num_kv_heads, head_size].
+        value (torch.Tensor): [num_tokens, num_kv_heads, head_size].
+        key_cache (torch.Tensor): key cache of the layer.
+        value_cache (torch.Tensor): value cache of the layer.
+        metadata (PagedAttentionMetadata): batch information of the step.
+        scale (float): scale applied before softmax.
+        head_mapping (torch.Tensor): [num_heads], kv head of every query head.
+            Default: query heads are evenly grouped on the kv heads.
+        alibi_slopes (torch.Tensor): [num_heads], only used by decode steps.
+
+    Return:
+        attn_output: [num_tokens, num_heads, head_size].
+    """
+    PagedAttention.reshape_and_cache(
+        key, value, key_cache, value_cache, metadata.slot_mapping
+    )
+    output = torch.empty_like(query)
+    if metadata.is_prompt:
+        VarlenAttention.apply_function(
+            query,
+            key,
+            value,
+            output,
+            metadata.cu_seqlens,
+            metadata.cu_seqlens,
+            metadata.max_seqlen,
+            metadata.max_seqlen,
+            0.0,
+            scale,
+            False,
+            True,
+            False,
+            None,
+        )
+        return output
+    if head_mapping is None:
+        num_kv_heads = key.size(1)
+        head_mapping = torch.repeat_interleave(
+            torch.arange(num_kv_heads, dtype=torch.int32),
+            query.size(1) // num_kv_heads,
+        )
+    PagedAttention.single_query_cached_kv_attention(
+        output,
+        query,
+        key_cache,
+        value_cache,
+        head_mapping,
+        scale,
+        metadata.block_tables,
+        metadata.context_lens,
+        metadata.block_size,
+        metadata.max_context_len,
+        alibi_slopes,
+    )
+    return output
+
+
+def greedy_sampler(logits: torch.Tensor, requests: List[Request]) -> List[int]:
+    return logits.argmax(dim=-1).tolist()
+
+
+class ContinuousBatchingEngine:
+    r"""
+    In-process continuous batching generation loop over a paged KV cache.
+
+    Requests are admitted and retired at token granularity by a
+    :class:`Scheduler`, and their KV cache blocks are allocated from a
+    pre-allocated :class:`PagedKVCache` pool, so a finished request frees its
+    slot in the batch for a waiting one right away instead of waiting for the
+    whole batch to finish.
+
+    `model` is called once per step as
+    ``model(input_ids, positions, kv_caches, metadata)``, where ``input_ids``
+    and ``positions`` are [num_tokens] tensors with the tokens of all the
+    sequences of the batch packed together, ``kv_caches`` is the list of
+    (key_cache, value_cache) of every layer and ``metadata`` is a
+    :class:`PagedAttentionMetadata` to be forwarded to :func:`paged_attention`.
+    It returns logits of shape [num_tokens, vocab_size] or [num_seqs,
+    vocab_size] (logits of the last token of every sequence).
+    :class:`PagedLlamaAdapter` runs an optimized LLaMA model this way.
+
+    Args:
+        model (Callable): the model as described above.
+        kv_cache (PagedKVCache): the KV cache pool.
+        max_num_seqs (int): max number of requests running concurrently.
+        max_num_batched_tokens (int): max number of prompt tokens per step.
+        sampler (Callable): ``sampler(logits, requests)`` returns the next
+            token id of every request. Default: greedy.
+        watermark (int): number of free blocks kept in reserve when
+            admitting new requests. Default: 0.
+    """
+
+    def __init__(
+        self,
+        model: Callable,
+        kv_cache: PagedKVCache,
+        max_num_seqs: int = 64,
+        max_num_batched_tokens: int = 4096,
+        sampler: Callable = greedy_sampler,
+        watermark: int = 0,
+    ):
+        self.model = model
+        self.kv_cache = kv_cache
+        self.block_manager = BlockManager(
+            kv_cache.num_blocks, kv_cache.block_size, watermark
+        )
+        self.scheduler = Scheduler(
+            self.block_manager, max_num_seqs, max_num_batched_tokens
+        )
+        self.sampler = sampler
+        self.request_counter = itertools.count()
+
+    def add_request(
+        self,
+        prompt_token_ids: List[int],
+        max_new_tokens: int,
+        eos_token_id: Optional[int] = None,
+        arrival_time: Optional[float] = None,
+    ) -> Request:
+        request = Request(
+            next(self.request_counter),
+            prompt_token_ids,
+            max_new_tokens,
+            eos_token_id,
+            arrival_time,
+        )
+        self.scheduler.add_request(request)
+        return request
+
+    def has_unfinished_requests(self) -> bool:
+        return self.scheduler.has_unfinished_requests()
+
+    def _prepare_inputs(self, scheduler_output: SchedulerOutput):
+        block_manager = self.block_manager
+        input_ids = []
+        positions = []
+        slot_mapping = []
+        seqlens = []
+        context_lens = []
+        block_tables = []
+        for request in scheduler_output.requests:
+            request_id = request.request_id
+            if scheduler_output.is_prompt:
+                tokens = request.get_token_ids()
+                input_ids.extend(tokens)
+                positions.extend(range(len(tokens)))
+                slot_mapping.extend(
+                    block_manager.get_slot(request_id, pos)
+                    for pos in range(len(tokens))
+                )
+                seqlens.append(len(tokens))
+            else:
+                position = request.get_len() - 1
+                input_ids.append(request.get_token_ids()[-1])
+                positions.append(position)
+                slot_mapping.append(block_manager.get_slot(request_id, position))
+                seqlens.append(1)
+                context_lens.append(position + 1)
+                block_tables.append(block_manager.get_block_table(request_id))
+        if block_tables:
+            max_num_blocks = max(len(t) for t in block_tables)
+            block_tables = [t + [0] * (max_num_blocks - len(t)) for t in block_tables]
+        cu_seqlens = torch.tensor([0] + seqlens, dtype=torch.int32).cumsum(0)
+        metadata = PagedAttentionMetadata(
+            scheduler_output.is_prompt,
+            torch.tensor(slot_mapping, dtype=torch.int32),
+            cu_seqlens.to(torch.int32),
+            max(seqlens),
+            torch.tensor(block_tables, dtype=torch.int32),
+            torch.tensor(context_lens, dtype=torch.int32),
+            max(context_lens) if context_lens else 0,
+            block_manager.block_size,
+        )
+        return (
+            torch.tensor(input_ids, dtype=torch.long),
+            torch.tensor(positions, dtype=torch.long),
+            metadata,
+        )
+
+    def step(self) -> List[Request]:
+        r"""
+        Runs one prefill or decode step and returns the requests which
+        finished in this step.
+        """
+        scheduler_output = self.scheduler.schedule()
+        if scheduler_output.is_empty():
+            if self.scheduler.waiting and not self.scheduler.running:
+                raise RuntimeError(
+                    "the waiting request does not fit into the KV cache pool"
+                )
+            return []
+        input_ids, positions, metadata = self._prepare_inputs(scheduler_output)
+        with torch.no_grad():
+            logits = self.model(input_ids, positions, self.kv_cache.kv_caches, metadata)
+        num_seqs = len(scheduler_output.requests)
+        if logits.size(0) != num_seqs:
+            logits = logits.index_select(0, metadata.cu_seqlens[1:].long() - 1)
+        next_tokens = self.sampler(logits, scheduler_output.requests)
+        now = time.perf_counter()
+        for request, token in zip(scheduler_output.requests, next_tokens):
+            request.append_token(token, now)
+        return self.scheduler.free_finished()
+
+    def generate(
+        self,
+        prompts: List[List[int]],
+        max_new_tokens: int,
+        eos_token_id: Optional[int] = None,
+    ) -> List[List[int]]:
+        r"""
+        Generates all the prompts and returns their output token ids in order.
+        """
+        requests = [
+            self.add_request(prompt, max_new_tokens, eos_token_id) for prompt in prompts
+        ]
+        while self.has_unfinished_requests():
+            self.step()
+        return [request.output_token_ids for request in requests]
@@ -0,0 +1,197 @@
+from typing import List, Optional, Tuple
+
+import torch
+
+from .engine import PagedAttentionMetadata, PagedKVCache, paged_attention
+
+
+class PagedLlamaAdapter(torch.nn.Module):
+    r"""
+    Runs a LLaMA model optimized by ``ipex.llm.optimize`` (with
+    ``deployment_mode=False``) as the model of a
+    :class:`ContinuousBatchingEngine`. The fused modules of the optimized
+    decoder layers (concat QKV linear, RoPE, linear + add, linear + silu + mul)
+    are reused as they are, only the attention over the IAKV cache is replaced
+    by :func:`paged_attention` over the paged KV cache of the engine. The
+    tokens of all the sequences of a step are packed into a batch of one.
+
+    Args:
+        model (torch.nn.Module): the optimized ``LlamaForCausalLM``.
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        config = model.config
+        architectures = getattr(config, "architectures", None) or [None]
+        if architectures[0] != "LlamaForCausalLM":
+            raise ValueError(
+                "PagedLlamaAdapter only supports LlamaForCausalLM, got {}".format(
+                    architectures[0]
+                )
+            )
+        if not all(hasattr(layer, "linear_silu_mul") for layer in model.model.layers):
+            raise ValueError(
+                "PagedLlamaAdapter expects a model optimized by ipex.llm.optimize"
+            )
+        self.model = model
+        self.config = config
+        attn = model.model.layers[0].self_attn
+        self.num_layers = len(model.model.layers)
+        self.num_heads = attn.num_heads
+        self.num_kv_heads = attn.num_key_value_heads
+        self.head_size = attn.head_dim
+        self.scale = self.head_size**-0.5
+
+    def get_kv_cache(
+        self, num_blocks: int, block_size: int, dtype: Optional[torch.dtype] = None
+    ) -> PagedKVCache:
+        r"""
+        Allocates a :class:`PagedKVCache` pool matching the decoder layers.
+        """
+        if dtype is None:
+            dtype = self.model.model.embed_tokens.weight.dtype
+        return PagedKVCache(
+            self.num_layers,
+            num_blocks,
+            block_size,
+            self.num_kv_heads,
+            self.head_size,
+            dtype,
+        )
+
+    def _attention(
+        self,
+        attn: torch.nn.Module,
+        hidden_states: torch.Tensor,
+        position_ids: torch.Tensor,
+        seq_len: int,
+        key_cache: torch.Tensor,
+        value_cache: torch.Tensor,
+        metadata: PagedAttentionMetadata,
+    ):
+        # same QKV projection and RoPE as _LlamaAttention_forward
+        num_tokens = hidden_states.size(1)
+        concat_qkv = None
+        if hasattr(attn, "concat_qkv"):
+            concat_qkv = attn.concat_qkv(hidden_states)
+        else:
+            query = attn.q_proj(hidden_states)
+            key = attn.k_proj(hidden_states)
+            value = attn.v_proj(hidden_states)
+        if concat_qkv is not None and type(concat_qkv) is not tuple:
+            query, key, value = attn._IPEXROPE(
+                concat_qkv,
+                position_ids,
+                attn.num_heads,
+                attn.head_dim,
+                attn.head_dim // 2,
+                attn.head_dim,
+                seq_len,
+                attn.concat_qkv.num_concat,
+            )
+        else:
+            if concat_qkv is not None:
+                query, key, value = concat_qkv
+            query = query.view(1, num_tokens, attn.num_heads, attn.head_dim)
+            key = key.view(1, num_tokens, attn.num_key_value_heads, attn.head_dim)
+            value = value.view(1, num_tokens, attn.num_key_value_heads, attn.head_dim)
+            key = attn._IPEXROPE(
+                key,
+                position_ids,
+                attn.num_key_value_heads,
+                attn.head_dim,
+                attn.head_dim // 2,
+                attn.head_dim,
+                seq_len,
+            )
+            query = attn._IPEXROPE(
+                query,
+                position_ids,
+                attn.num_heads,
+                attn.head_dim,
+                attn.head_dim // 2,
+                attn.head_dim,
+                seq_len,
+            )
+        attn_output = paged_attention(
+            query.reshape(num_tokens, attn.num_heads, attn.head_dim).contiguous(),
+            key.reshape(
+                num_tokens, attn.num_key_value_heads, attn.head_dim
+            ).contiguous(),
+            value.reshape(
+                num_tokens, attn.num_key_value_heads, attn.head_dim
+            ).contiguous(),
+            key_cache,
+            value_cache,
+            metadata,
+            self.scale,
+        )
+        return attn_output.view(1, num_tokens, attn.num_heads * attn.head_dim)
+
+    def _decoder_layer(
+        self,
+        layer: torch.nn.Module,
+        hidden_states: torch.Tensor,
+        position_ids: torch.Tensor,
+        seq_len: int,
+        key_cache: torch.Tensor,
+        value_cache: torch.Tensor,
+        metadata: PagedAttentionMetadata,
+    ):
+        # same as LlamaDecoderLayer_forward with the paged attention
+        residual = hidden_states
+        hidden_states = layer.input_layernorm(hidden_states)
+        hidden_states = self._attention(
+            layer.self_attn,
+            hidden_states,
+            position_ids,
+            seq_len,
+            key_cache,
+            value_cache,
+            metadata,
+        )
+        if not layer.distributed:
+            hidden_states = layer.mha_linear_add(hidden_states, residual)
+        else:
+            hidden_states = layer.self_attn.o_proj(hidden_states)
+            hidden_states = residual + hidden_states
+
+        residual = hidden_states
+        hidden_states = layer.post_attention_layernorm(hidden_states)
+        mlp_gate = layer.linear_silu_mul(hidden_states)
+        if not layer.distributed:
+            hidden_states = layer.mlp_linear_add(mlp_gate, residual)
+        else:
+            hidden_states = layer.mlp.down_proj(mlp_gate)
+            hidden_states = residual + hidden_states
+        return hidden_states
+
+    def forward(
+        self,
+        input_ids: torch.Tensor,
+        positions: torch.Tensor,
+        kv_caches: List[Tuple[torch.Tensor, torch.Tensor]],
+        metadata: PagedAttentionMetadata,
+    ):
+        model = self.model.model
+        hidden_states = model.embed_tokens(input_ids).unsqueeze(0)
+        position_ids = positions.unsqueeze(0)
+        seq_len = int(positions.max()) + 1
+        for layer, (key_cache, value_cache) in zip(model.layers, kv_caches):
+            hidden_states = self._decoder_layer(
+                layer,
+                hidden_states,
+                position_ids,
+                seq_len,
+                key_cache,
+                value_cache,
+                metadata,
+            )
+        hidden_states = hidden_states[0]
+        if metadata.is_prompt:
+            # only the logits of the last token of every prompt are sampled
+            hidden_states = hidden_states.index_select(
+                0, metadata.cu_seqlens[1:].long() - 1
+            )
+        hidden_states = model.norm(hidden_states)
+        return self.model.lm_head(hidden_states)
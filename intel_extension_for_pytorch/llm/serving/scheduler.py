@@ -0,0 +1,204 @@
+import time
+from collections import deque
+from enum import Enum
+from typing import Deque, List, Optional
+
+from .block_manager import BlockManager
+
+
+class RequestStatus(Enum):
+    WAITING = 1
+    RUNNING = 2
+    FINISHED = 3
+
+
+class Request:
+    r"""
+    A generation request tracked by the :class:`Scheduler`.
+
+    Args:
+        request_id (int): unique id of the request.
+        prompt_token_ids (List[int]): token ids of the prompt.
+        max_new_tokens (int): max number of tokens to generate.
+        eos_token_id (int): generation stops once this token is sampled.
+            Default: None.
+        arrival_time (float): ``time.perf_counter()`` timestamp when the
+            request arrived. Default: the time of creation.
+    """
+
+    def __init__(
+        self,
+        request_id: int,
+        prompt_token_ids: List[int],
+        max_new_tokens: int,
+        eos_token_id: Optional[int] = None,
+        arrival_time: Optional[float] = None,
+    ):
+        assert len(prompt_token_ids) > 0, "prompt should not be empty"
+        assert max_new_tokens > 0, "max_new_tokens should be positive"
+        self.request_id = request_id
+        self.prompt_token_ids = list(prompt_token_ids)
+        self.output_token_ids: List[int] = []
+        self.max_new_tokens = max_new_tokens
+        self.eos_token_id = eos_token_id
+        self.arrival_time = (
+            arrival_time if arrival_time is not None else time.perf_counter()
+        )
+        # timestamp of every generated token, used for latency statistics
+        self.token_times: List[float] = []
+        self.status = RequestStatus.WAITING
+        self.num_preemptions = 0
+
+    def get_token_ids(self) -> List[int]:
+        return self.prompt_token_ids + self.output_token_ids
+
+    def get_len(self) -> int:
+        return len(self.prompt_token_ids) + len(self.output_token_ids)
+
+    def append_token(self, token_id: int, timestamp: float):
+        self.output_token_ids.append(token_id)
+        self.token_times.append(timestamp)
+        if len(self.output_token_ids) >= self.max_new_tokens or (
+            self.eos_token_id is not None and token_id == self.eos_token_id
+        ):
+            self.status = RequestStatus.FINISHED
+
+    def is_finished(self) -> bool:
+        return self.status == RequestStatus.FINISHED
+
+    def get_token_latencies(self) -> List[float]:
+        r"""
+        Returns the latency of every generated token: the first one is
+        measured from the arrival of the request, the others from the
+        previous token.
+        """
+        times = [self.arrival_time] + self.token_times
+        return [times[i + 1] - times[i] for i in range(len(self.token_times))]
+
+
+class SchedulerOutput:
+    r"""
+    The batch of requests to run in one engine step.
+
+    Args:
+        requests (List[Request]): requests of the batch.
+        is_prompt (bool): True if the batch runs the prompts of newly
+            admitted requests, False if it decodes one token per request.
+        num_preempted (int): number of running requests which were preempted
+            to make room for the batch.
+    """
+
+    def __init__(self, requests: List[Request], is_prompt: bool, num_preempted=0):
+        self.requests = requests
+        self.is_prompt = is_prompt
+        self.num_preempted = num_preempted
+
+    def is_empty(self) -> bool:
+        return len(self.requests) == 0
+
+
+class Scheduler:
+    r"""
+    Admits and retires requests at token granularity on top of a
+    :class:`BlockManager`.
+
+    Every step either runs the prompts of the waiting requests which fit into
+    the KV cache pool and the batch budget, or decodes one token for all the
+    running requests. When the pool runs out of blocks during decoding, the
+    latest admitted requests are preempted: their blocks are released and
+    they are put back to the front of the waiting queue, to be recomputed
+    from their prompt plus the tokens generated so far.
+
+    Args:
+        block_manager (BlockManager): the block manager of the KV cache pool.
+        max_num_seqs (int): max number of requests running concurrently.
+        max_num_batched_tokens (int): max number of prompt tokens run in one
+            prefill step.
+    """
+
+    def __init__(
+        self,
+        block_manager: BlockManager,
+        max_num_seqs: int = 64,
+        max_num_batched_tokens: int = 4096,
+    ):
+        self.block_manager = block_manager
+        self.max_num_seqs = max_num_seqs
+        self.max_num_batched_tokens = max_num_batched_tokens
+        self.waiting: Deque[Request] = deque()
+        self.running: List[Request] = []
+
+    def add_request(self, request: Request):
+        max_len = request.get_len() + request.max_new_tokens - 1
+        assert (
+            max_len <= self.max_num_batched_tokens
+        ), "prompt plus max_new_tokens is longer than max_num_batched_tokens"
+        assert (
+            max_len <= self.block_manager.get_num_total_slots()
+        ), "prompt plus max_new_tokens does not fit into the KV cache pool"
+        self.waiting.append(request)
+
+    def has_unfinished_requests(self) -> bool:
+        return len(self.waiting) > 0 or len(self.running) > 0
+
+    def get_num_unfinished_requests(self) -> int:
+        return len(self.waiting) + len(self.running)
+
+    def _preempt(self, request: Request):
+        self.block_manager.free(request.request_id)
+        request.status = RequestStatus.WAITING
+        request.num_preemptions += 1
+        self.waiting.appendleft(request)
+
+    def schedule(self) -> SchedulerOutput:
+        # admit waiting requests first so that new requests join the batch
+        # as soon as there is room for them
+        admitted = []
+        num_batched_tokens = 0
+        while self.waiting:
+            request = self.waiting[0]
+            num_tokens = request.get_len()
+            if (
+                len(self.running) + len(admitted) >= self.max_num_seqs
+                or num_batched_tokens + num_tokens > self.max_num_batched_tokens
+                or not self.block_manager.can_allocate(num_tokens)
+            ):
+                break
+            self.waiting.popleft()
+            self.block_manager.allocate(request.request_id, num_tokens)
+            request.status = RequestStatus.RUNNING
+            admitted.append(request)
+            num_batched_tokens += num_tokens
+        if admitted:
+            self.running.extend(admitted)
+            return SchedulerOutput(admitted, is_prompt=True)
+
+        # decode one token for every running request, the new token is
+        # stored at position get_len() - 1
+        num_preempted = 0
+        scheduled = []
+        running = list(self.running)
+        while running:
+            request = running.pop(0)
+            position = request.get_len() - 1
+            while not self.block_manager.can_append_slot(request.request_id, position):
+                if running:
+                    self._preempt(running.pop())
+                else:
+                    self._preempt(request)
+                    request = None
+                num_preempted += 1
+                if request is None:
+                    break
+            if request is not None:
+                self.block_manager.append_slot(request.request_id, position)
+                scheduled.append(request)
+        self.running = scheduled
+        return SchedulerOutput(scheduled, is_prompt=False, num_preempted=num_preempted)
+
+    def free_finished(self) -> List[Request]:
+        finished = [r for r in self.running if r.is_finished()]
+        for request in finished:
+            self.block_manager.free(request.request_id)
+        self.running = [r for r in self.running if not r.is_finished()]
+        return finished
@@ -8,6 +8,11 @@ if has_cpu():
     from .merged_embeddingbag import MergedEmbeddingBagWithCat
     from .merged_embeddingbag import MergedEmbeddingBagWithAdaGrad
     from .merged_embeddingbag import DistMergeEmbeddingBagWithAdaGrad
+    from .merged_embeddingbag import EmbeddingSpec
+    from .merged_embeddingbag import save_mmap_tables
+    from .merged_embeddingbag import RowwiseQuantizedMergedEmbeddingBag
+    from .merged_embeddingbag import quantize_rowwise
+    from .merged_embeddingbag import dequantize_rowwise
     from ...cpu.nn.linear_fuse_eltwise import IPEXLinearEltwise
 
 from .weight_only_quantization import WeightOnlyQuantizedLinear
@@ -3,6 +3,9 @@ from torch import nn
 from torch.autograd import Function
 from typing import List, Optional, NamedTuple
 import enum
+import json
+import os
+import threading
 
 
 class PoolingMode(enum.IntEnum):
@@ -31,9 +34,285 @@ class EmbeddingSpec(NamedTuple):
     weight: Optional[torch.Tensor]
     sparse: bool
     include_last_offset: bool
+    # Back the table by a raw row-major file of (num_embeddings, embedding_dim) dtype
+    # elements, see `save_mmap_tables`. mmap_mode is "r" (read-only, for inference)
+    # or "c" (copy-on-write, for fine-tuning, updates never reach the file).
+    mmap_file: Optional[str] = None
+    mmap_mode: str = "r"
+
+
+def _map_table(spec: EmbeddingSpec):
+    assert spec.mmap_mode in (
+        "r",
+        "c",
+    ), "mmap_mode of EmbeddingSpec should be 'r' or 'c'"
+    numel = spec.num_embeddings * spec.embedding_dim
+    nbytes = numel * torch.empty((), dtype=spec.dtype).element_size()
+    assert (
+        os.path.getsize(spec.mmap_file) == nbytes
+    ), "size of {} does not match a ({}, {}) {} table".format(
+        spec.mmap_file, spec.num_embeddings, spec.embedding_dim, spec.dtype
+    )
+    # A private mapping: pages are read from the file on demand and the writes
+    # are copy-on-write, so the lookup kernels gather directly from the mapping.
+    weight = torch.from_file(spec.mmap_file, shared=False, size=numel, dtype=spec.dtype)
+    return weight.view(spec.num_embeddings, spec.embedding_dim)
+
+
+def save_mmap_tables(module, directory: str):
+    r"""
+    Exports the tables of a `MergedEmbeddingBag` to ``directory`` in the mmap
+    format: a raw row-major file per table and a ``meta.json`` describing
+    them, to be loaded by `MergedEmbeddingBag.from_mmap_tables`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tables = []
+    for i, weight in enumerate(module.weights):
+        weight = weight.detach().contiguous()
+        file = "table{}.bin".format(i)
+        path = os.path.join(directory, file)
+        with open(path, "wb") as f:
+            f.truncate(weight.numel() * weight.element_size())
+        # copy through a shared mapping instead of serializing the whole table in memory
+        mapped = torch.from_file(
+            path, shared=True, size=weight.numel(), dtype=weight.dtype
+        )
+        mapped.copy_(weight.view(-1))
+        del mapped
+        tables.append(
+            {
+                "file": file,
+                "num_embeddings": weight.shape[0],
+                "embedding_dim": weight.shape[1],
+                "dtype": str(weight.dtype).split(".")[-1],
+            }
+        )
+    meta = {
+        "tables": tables,
+        "pooling_mode": "sum" if module.pooling_mode == PoolingMode.SUM else "mean",
+        "include_last_offset": module.include_last_offset,
+    }
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
 
 
-def merged_embeddingbag(weights, indices, offsets, pooling_mode, include_last_offset):
+class HotRowCache(object):
+    r"""
+    In-memory cache of the hot rows of an embedding table whose weight lives
+    in slower memory (e.g., a memory mapped file or a far memory tier). It
+    keeps up to ``capacity`` rows in a contiguous buffer and evicts the least
+    recently used (``policy="lru"``) or least frequently used (``policy="lfu"``)
+    rows on misses. The counters of ``stats()`` report the hit rate.
+
+    Args:
+        num_embeddings (int): number of rows of the table.
+        capacity (int): max number of cached rows.
+        policy (str): eviction policy, ``"lru"`` or ``"lfu"``.
+    """
+
+    def __init__(self, num_embeddings: int, capacity: int, policy: str = "lru"):
+        assert policy in ("lru", "lfu"), "HotRowCache only support lru or lfu policy"
+        assert capacity > 0, "capacity of HotRowCache should be positive"
+        self.capacity = capacity
+        self.policy = policy
+        self.buffer = None
+        self.slot_of_row = torch.full((num_embeddings,), -1, dtype=torch.int64)
+        self.row_of_slot = torch.full((capacity,), -1, dtype=torch.int64)
+        # last access step for lru, access count for lfu
+        self.score = torch.zeros(capacity, dtype=torch.int64)
+        self.step = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "size": int((self.row_of_slot >= 0).sum()),
+        }
+
+    def clear(self):
+        self.slot_of_row.fill_(-1)
+        self.row_of_slot.fill_(-1)
+        self.score.zero_()
+
+    def gather(self, weight: torch.Tensor, rows: torch.Tensor):
+        r"""
+        Returns the ``rows`` (unique) of ``weight``, served from the cache for
+        the cached rows. The missed rows are read from ``weight`` and replace
+        the rows chosen by the eviction policy. Also returns the cache slot of
+        each row (-1 for the rows not cached).
+        """
+        if self.buffer is None or self.buffer.dtype != weight.dtype:
+            self.buffer = weight.new_empty((self.capacity, weight.shape[1]))
+            self.clear()
+        self.step += 1
+        slots = self.slot_of_row[rows]
+        hit = slots >= 0
+        num_hits = int(hit.sum())
+        self.hits += num_hits
+        self.misses += rows.numel() - num_hits
+        miss = (~hit).nonzero().view(-1)
+        if miss.numel() > 0:
+            # the slots hit in this lookup are not evictable
+            score = self.score.clone()
+            score[slots[hit]] = torch.iinfo(torch.int64).max
+            num_insert = min(miss.numel(), self.capacity - num_hits)
+            if num_insert > 0:
+                victims = torch.topk(score, num_insert, largest=False).indices
+                evicted_rows = self.row_of_slot[victims]
+                evicted_rows = evicted_rows[evicted_rows >= 0]
+                self.evictions += evicted_rows.numel()
+                self.slot_of_row[evicted_rows] = -1
+                inserted = miss[:num_insert]
+                self.buffer[victims] = weight[rows[inserted]]
+                self.slot_of_row[rows[inserted]] = victims
+                self.row_of_slot[victims] = rows[inserted]
+                self.score[victims] = 0
+                slots[inserted] = victims
+        cached = slots >= 0
+        if self.policy == "lru":
+            self.score[slots[cached]] = self.step
+        else:
+            self.score[slots[cached]] += 1
+        out = self.buffer.new_empty((rows.numel(), self.buffer.shape[1]))
+        out[cached] = self.buffer[slots[cached]]
+        out[~cached] = weight[rows[~cached]]
+        return out, slots
+
+    def update(self, slots: torch.Tensor, values: torch.Tensor):
+        # Write through the updated rows to the cached copies.
+        cached = slots >= 0
+        self.buffer[slots[cached]] = values[cached]
+
+
+class _DedupLookup(object):
+    # Unique-then-expand stage of the lookup: the rows of each table are
+    # deduplicated and gathered into compact tables, which are looked up with the
+    # inverse indices. Fused optimizers then update each unique row once on the
+    # compact tables, which are written back to the tables.
+    def __init__(self, weights, indices, caches=None):
+        self.uniques = []
+        self.indices = []
+        self.compacts = []
+        self.slots = []
+        for i, (weight, index) in enumerate(zip(weights, indices)):
+            unique, inverse = torch.unique(index, return_inverse=True)
+            self.uniques.append(unique)
+            self.indices.append(inverse.to(index.dtype))
+            cache = caches[i] if caches is not None else None
+            if cache is not None:
+                compact, slots = cache.gather(weight.detach(), unique.long())
+            else:
+                compact, slots = weight.detach().index_select(0, unique), None
+            self.compacts.append(compact)
+            self.slots.append(slots)
+        self.caches = caches
+
+    def compact_states(self, states):
+        return [
+            state.index_select(0, unique) if state.numel() > 0 else state
+            for state, unique in zip(states, self.uniques)
+        ]
+
+    def write_back(self, weights):
+        with torch.no_grad():
+            for i, (weight, unique) in enumerate(zip(weights, self.uniques)):
+                weight.index_copy_(0, unique.long(), self.compacts[i])
+                if self.slots[i] is not None:
+                    self.caches[i].update(self.slots[i], self.compacts[i])
+
+    def write_back_states(self, states, compact_states):
+        for state, compact, unique in zip(states, compact_states, self.uniques):
+            if state.numel() > 0:
+                state.index_copy_(0, unique.long(), compact)
+
+
+def _table_groups(weights):
+    # Indices of the tables of each (embedding_dim, dtype) in order of first appearance.
+    groups = {}
+    for i, weight in enumerate(weights):
+        groups.setdefault((weight.shape[1], weight.dtype), []).append(i)
+    return list(groups.values())
+
+
+def _grouped_backward(
+    op,
+    grad_out,
+    weights,
+    indices,
+    offsets,
+    pooling_mode,
+    include_last_offset,
+    states=(),
+    args=(),
+):
+    # The forward kernel looks up all the tables at once, while the backward
+    # kernels expect tables of one dim and dtype, so they run once per group.
+    # `states` are per table lists like the bf16 trails, `args` are scalars.
+    groups = _table_groups(weights)
+    if len(groups) == 1:
+        return op(
+            grad_out,
+            weights,
+            indices,
+            offsets,
+            pooling_mode,
+            include_last_offset,
+            *states,
+            *args,
+        )
+    outputs = [None] * len(weights)
+    for group in groups:
+        result = op(
+            [grad_out[i] for i in group],
+            [weights[i] for i in group],
+            [indices[i] for i in group],
+            [offsets[i] for i in group],
+            pooling_mode,
+            include_last_offset,
+            *[[state[i] for i in group] for state in states],
+            *args,
+        )
+        if result is not None:
+            for i, r in zip(group, result):
+                outputs[i] = r
+    return outputs
+
+
+def merged_embeddingbag(
+    weights,
+    indices,
+    offsets,
+    pooling_mode,
+    include_last_offset,
+    dedup=False,
+    caches=None,
+):
+    if dedup:
+        if torch.is_grad_enabled():
+            # The compact tables are gathered by autograd ops to get the dense
+            # gradients of the tables. The cache can't see the updates of the
+            # optimizer, so it is bypassed and invalidated.
+            if caches is not None:
+                for cache in caches:
+                    if cache is not None:
+                        cache.clear()
+            uniques, inverses = [], []
+            for index in indices:
+                unique, inverse = torch.unique(index, return_inverse=True)
+                uniques.append(unique)
+                inverses.append(inverse.to(index.dtype))
+            compacts = [w.index_select(0, u) for w, u in zip(weights, uniques)]
+            return MergedEmbeddingBagFunc.apply(
+                inverses, offsets, pooling_mode, include_last_offset, *compacts
+            )
+        lookup = _DedupLookup(weights, indices, caches)
+        weights, indices = lookup.compacts, lookup.indices
     if torch.is_grad_enabled():
         return MergedEmbeddingBagFunc.apply(
             indices, offsets, pooling_mode, include_last_offset, *weights
@@ -59,8 +338,16 @@ def merged_embeddingbag_with_cat(
 
 
 def merged_embeddingbag_sgd(
-    weights, indices, offsets, pooling_mode, include_last_offset, sgd_args
+    weights,
+    indices,
+    offsets,
+    pooling_mode,
+    include_last_offset,
+    sgd_args,
+    dedup=False,
+    caches=None,
 ):
+    lookup = _DedupLookup(weights, indices, caches) if dedup else None
     if torch.is_grad_enabled():
         return MergedEmbeddingBagSGDFunc.apply(
             indices,
@@ -68,16 +355,27 @@ def merged_embeddingbag_sgd(
             pooling_mode,
             include_last_offset,
             sgd_args,
+            lookup,
             *weights,
         )
+    if lookup is not None:
+        weights, indices = lookup.compacts, lookup.indices
     return torch.ops.torch_ipex.merged_embeddingbag_forward(
         weights, indices, offsets, pooling_mode, include_last_offset
     )
 
 
 def merged_embeddingbag_adagrad(
-    weights, indices, offsets, pooling_mode, include_last_offset, adagrad_args
+    weights,
+    indices,
+    offsets,
+    pooling_mode,
+    include_last_offset,
+    adagrad_args,
+    dedup=False,
+    caches=None,
 ):
+    lookup = _DedupLookup(weights, indices, caches) if dedup else None
     if torch.is_grad_enabled():
         return MergedEmbeddingBagAdaGradFunc.apply(
             indices,
@@ -85,8 +383,11 @@ def merged_embeddingbag_adagrad(
             pooling_mode,
             include_last_offset,
             adagrad_args,
+            lookup,
             *weights,
         )
+    if lookup is not None:
+        weights, indices = lookup.compacts, lookup.indices
     return torch.ops.torch_ipex.merged_embeddingbag_forward(
         weights, indices, offsets, pooling_mode, include_last_offset
     )
@@ -112,7 +413,8 @@ class MergedEmbeddingBagFunc(Function):
         indices = ctx.indices
         pooling_mode = ctx.pooling_mode
         include_last_offset = ctx.include_last_offset
-        grad_list = torch.ops.torch_ipex.merged_embeddingbag_backward_cpu(
+        grad_list = _grouped_backward(
+            torch.ops.torch_ipex.merged_embeddingbag_backward_cpu,
             grad_out,
             weights,
             indices,
@@ -120,7 +422,7 @@ class MergedEmbeddingBagFunc(Function):
             pooling_mode,
             include_last_offset,
         )
-        output = [None] * 4 + grad_list
+        output = [None] * 4 + list(grad_list)
         return tuple(output)
 
 
@@ -133,14 +435,19 @@ class MergedEmbeddingBagSGDFunc(Function):
         pooling_mode,
         include_last_offset,
         sgd_args,
+        lookup,
         *weights,
     ):
+        ctx.weights = weights
+        ctx.lookup = lookup
+        if lookup is not None:
+            # run on the compact tables of the unique rows
+            weights, indices = lookup.compacts, lookup.indices
         output = torch.ops.torch_ipex.merged_embeddingbag_forward(
             weights, indices, offsets, pooling_mode, include_last_offset
         )
         ctx.indices = indices
         ctx.offsets = offsets
-        ctx.weights = weights
         ctx.pooling_mode = pooling_mode
         ctx.include_last_offset = include_last_offset
         ctx.sgd_args = sgd_args
@@ -157,18 +464,35 @@ class MergedEmbeddingBagSGDFunc(Function):
         bf16_trail = sgd_args.bf16_trail
         weight_decay = sgd_args.weight_decay
         lr = sgd_args.lr
-        grad_list = torch.ops.torch_ipex.merged_embeddingbag_backward_sgd(
-            grad_out,
-            weights,
-            indices,
-            offsets,
-            pooling_mode,
-            include_last_offset,
-            bf16_trail,
-            weight_decay,
-            lr,
-        )
-        output = [None] * (5 + len(weights))
+        lookup = ctx.lookup
+        if lookup is not None:
+            compact_trail = lookup.compact_states(bf16_trail)
+            _grouped_backward(
+                torch.ops.torch_ipex.merged_embeddingbag_backward_sgd,
+                grad_out,
+                lookup.compacts,
+                indices,
+                offsets,
+                pooling_mode,
+                include_last_offset,
+                states=(compact_trail,),
+                args=(weight_decay, lr),
+            )
+            lookup.write_back(weights)
+            lookup.write_back_states(bf16_trail, compact_trail)
+        else:
+            _grouped_backward(
+                torch.ops.torch_ipex.merged_embeddingbag_backward_sgd,
+                grad_out,
+                weights,
+                indices,
+                offsets,
+                pooling_mode,
+                include_last_offset,
+                states=(bf16_trail,),
+                args=(weight_decay, lr),
+            )
+        output = [None] * (6 + len(weights))
         return tuple(output)
 
 
@@ -181,14 +505,19 @@ class MergedEmbeddingBagAdaGradFunc(Function):
         pooling_mode,
         include_last_offset,
         adagrad_args,
+        lookup,
         *weights,
     ):
+        ctx.weights = weights
+        ctx.lookup = lookup
+        if lookup is not None:
+            # run on the compact tables of the unique rows
+            weights, indices = lookup.compacts, lookup.indices
         output = torch.ops.torch_ipex.merged_embeddingbag_forward(
             weights, indices, offsets, pooling_mode, include_last_offset
         )
         ctx.indices = indices
         ctx.offsets = offsets
-        ctx.weights = weights
         ctx.pooling_mode = pooling_mode
         ctx.include_last_offset = include_last_offset
         ctx.adagrad_args = adagrad_args
@@ -206,19 +535,37 @@ class MergedEmbeddingBagAdaGradFunc(Function):
         hessian = adagrad_args.hessian
         eps = adagrad_args.eps
         lr = adagrad_args.lr
-        grad_list = torch.ops.torch_ipex.merged_embeddingbag_backward_adagrad(
-            grad_out,
-            weights,
-            indices,
-            offsets,
-            pooling_mode,
-            include_last_offset,
-            hessian,
-            bf16_trail,
-            eps,
-            lr,
-        )
-        output = [None] * (5 + len(weights))
+        lookup = ctx.lookup
+        if lookup is not None:
+            compact_hessian = lookup.compact_states(hessian)
+            compact_trail = lookup.compact_states(bf16_trail)
+            _grouped_backward(
+                torch.ops.torch_ipex.merged_embeddingbag_backward_adagrad,
+                grad_out,
+                lookup.compacts,
+                indices,
+                offsets,
+                pooling_mode,
+                include_last_offset,
+                states=(compact_hessian, compact_trail),
+                args=(eps, lr),
+            )
+            lookup.write_back(weights)
+            lookup.write_back_states(hessian, compact_hessian)
+            lookup.write_back_states(bf16_trail, compact_trail)
+        else:
+            _grouped_backward(
+                torch.ops.torch_ipex.merged_embeddingbag_backward_adagrad,
+                grad_out,
+                weights,
+                indices,
+                offsets,
+                pooling_mode,
+                include_last_offset,
+                states=(hessian, bf16_trail),
+                args=(eps, lr),
+            )
+        output = [None] * (6 + len(weights))
         return tuple(output)
 
 
@@ -231,8 +578,20 @@ class MergedEmbeddingBag(nn.Module):
 
     `MergedEmbeddingBag` assumes to be constructed from `nn.EmbeddingBag` with `sparse=False`, returns dense gradients.
 
+    Tables too big for memory can be backed by memory mapped files with `mmap_file` of `EmbeddingSpec`, see
+    `save_mmap_tables` and `from_mmap_tables`. The lookup reads their rows from the mapping on demand, and
+    `prefetch_rows` reads the rows of the next batch ahead in background.
+
+    For inference, `RowwiseQuantizedMergedEmbeddingBag.from_merged_embeddingbag` converts the tables to row-wise
+    quantized int8 or int4 tables, which are dequantized inside the pooling kernel.
+
     `MergedEmbeddingBagWithSGD` does not return gradients, backward step and weights update step are fused.
 
+    The tables can have different `embedding_dim` and `dtype`, e.g., 16/32/64/128 dims and fp32 or bf16 tables in one
+    module, while they share the pooling mode and `include_last_offset`. The forward looks up all tables in one
+    parallel kernel and returns the outputs in the order of the tables, the backward and the fused weight updates
+    run once per group of tables with the same `embedding_dim` and `dtype`.
+
     Native usage of multiple `EmbeddingBag` objects is:
 
         >>> EmbLists = torch.nn.Modulist(emb1, emb2, emb3, ..., emb_m)
@@ -258,6 +617,14 @@ class MergedEmbeddingBag(nn.Module):
 
     Now `MergedEmbeddingBagWithSGD` is the only option running with an optimizer. We plan to add more optimizer support
     in the future. Visit `MergedEmbeddingBagWithSGD` for introduction of `MergedEmbeddingBagWith[Optimizer]`.
+
+    With power law distributed indices, the same rows are gathered many times in a batch. `enable_index_dedup` looks
+    up each unique row once, and the fused optimizers update each unique row once with its accumulated gradient.
+    For tables too big for fast memory, `enable_hot_row_cache` keeps the hot rows in an in-memory `HotRowCache`:
+
+        >>> merged_emb.enable_hot_row_cache(capacity=100000, policy="lfu")
+        >>> outputs = merged_emb(indices, offsets)
+        >>> merged_emb.cache_stats()
     """
 
     embedding_specs: List[EmbeddingSpec]
@@ -269,14 +636,16 @@ class MergedEmbeddingBag(nn.Module):
         super(MergedEmbeddingBag, self).__init__()
         self.n_tables = len(embedding_specs)
         assert self.n_tables > 0, "MergedEmbeddingBag at least have 1 table"
-        self.embedding_dim = embedding_specs[0].embedding_dim
-        assert all(
-            specs.embedding_dim == self.embedding_dim for specs in embedding_specs
-        ), "expect all tables have same embedding_dim"
-        self.dtype = embedding_specs[0].dtype
-        assert all(
-            specs.dtype == self.dtype for specs in embedding_specs
-        ), "expect all tables have same dtype"
+        # Tables can have different embedding_dim and dtype, embedding_dim and
+        # dtype are None if they are not the same for all tables.
+        self.embedding_dims = [specs.embedding_dim for specs in embedding_specs]
+        self.embedding_dim = (
+            self.embedding_dims[0]
+            if all(dim == self.embedding_dims[0] for dim in self.embedding_dims)
+            else None
+        )
+        dtypes = [specs.dtype for specs in embedding_specs]
+        self.dtype = dtypes[0] if all(t == dtypes[0] for t in dtypes) else None
         self.pooling_mode = embedding_specs[0].pooling_mode
         assert self.pooling_mode in (
             "sum",
@@ -302,12 +671,124 @@ class MergedEmbeddingBag(nn.Module):
             [nn.Parameter(torch.Tensor()) for _ in range(len(embedding_specs))]
         )
 
+        self.mmap_files = [spec.mmap_file for spec in embedding_specs]
+        self.mmap_modes = [spec.mmap_mode for spec in embedding_specs]
         for i, spec in enumerate(embedding_specs):
-            num_embeddings, embedding_dim, _, dtype, weight, _, _ = spec
+            if spec.mmap_file is not None:
+                self.weights[i] = nn.Parameter(
+                    _map_table(spec), requires_grad=spec.mmap_mode == "c"
+                )
+                continue
+            weight = spec.weight
             if weight is None:
-                weight = torch.empty((num_embeddings, embedding_dim), dtype=dtype)
+                weight = torch.empty(
+                    (spec.num_embeddings, spec.embedding_dim), dtype=spec.dtype
+                )
             self.weights[i] = nn.Parameter(weight)
 
+        self.dedup = False
+        self.hot_row_caches = None
+        self._prefetch_thread = None
+
+    @classmethod
+    def from_mmap_tables(cls, directory: str, mmap_mode: str = "r", **kwargs):
+        r"""
+        Creates the module from the tables exported by `save_mmap_tables`,
+        each backed by a memory mapped file instead of being loaded in memory.
+
+        Args:
+            directory (str): directory of the exported tables.
+            mmap_mode (str): ``"r"`` for read-only tables for inference, or
+                ``"c"`` for copy-on-write tables for fine-tuning.
+            kwargs: other args of the module, e.g., ``lr``.
+        """
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        embedding_specs = [
+            EmbeddingSpec(
+                num_embeddings=table["num_embeddings"],
+                embedding_dim=table["embedding_dim"],
+                pooling_mode=meta["pooling_mode"],
+                dtype=getattr(torch, table["dtype"]),
+                weight=None,
+                sparse=False,
+                include_last_offset=meta["include_last_offset"],
+                mmap_file=os.path.join(directory, table["file"]),
+                mmap_mode=mmap_mode,
+            )
+            for table in meta["tables"]
+        ]
+        return cls(embedding_specs, **kwargs)
+
+    def _check_fused_update(self):
+        # The fused optimizers update the weights in place during backward.
+        if torch.is_grad_enabled() and any(
+            mmap_file is not None and mmap_mode == "r"
+            for mmap_file, mmap_mode in zip(self.mmap_files, self.mmap_modes)
+        ):
+            raise RuntimeError(
+                "read-only memory mapped tables can't be trained, use mmap_mode='c' for fine-tuning"
+            )
+
+    def prefetch_rows(self, indices):
+        r"""
+        Reads the rows of the next batch of the memory mapped tables in a
+        background thread, so that their pages are resident when the lookup of
+        that batch runs.
+        """
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
+        tables = [
+            (weight.detach(), index)
+            for weight, index, mmap_file in zip(self.weights, indices, self.mmap_files)
+            if mmap_file is not None
+        ]
+        if not tables:
+            return
+
+        def _touch_rows():
+            with torch.no_grad():
+                for weight, index in tables:
+                    weight.index_select(0, torch.unique(index))
+
+        self._prefetch_thread = threading.Thread(target=_touch_rows, daemon=True)
+        self._prefetch_thread.start()
+
+    def enable_index_dedup(self, enable: bool = True):
+        r"""
+        Deduplicate the indices of each table before the lookup, so that each
+        unique row is gathered (and updated by the fused optimizers) once.
+        """
+        self.dedup = enable
+        if not enable:
+            self.hot_row_caches = None
+
+    def enable_hot_row_cache(self, capacity, policy: str = "lru"):
+        r"""
+        Serve the lookups of the hot rows from a `HotRowCache` of each table.
+        It implies index deduplication.
+
+        Args:
+            capacity (int or List[int]): max number of cached rows of each table.
+            policy (str): eviction policy, ``"lru"`` or ``"lfu"``.
+        """
+        if isinstance(capacity, int):
+            capacity = [capacity] * self.n_tables
+        assert len(capacity) == self.n_tables, "expect one capacity for each table"
+        self.dedup = True
+        self.hot_row_caches = [
+            HotRowCache(w.shape[0], c, policy) for w, c in zip(self.weights, capacity)
+        ]
+
+    def cache_stats(self):
+        r"""
+        Returns the counters of the `HotRowCache` of each table.
+        """
+        if self.hot_row_caches is None:
+            return []
+        return [cache.stats() for cache in self.hot_row_caches]
+
     @classmethod
     def from_embeddingbag_list(
         cls,
@@ -355,7 +836,13 @@ class MergedEmbeddingBag(nn.Module):
         """
         assert self.dense
         return merged_embeddingbag(
-            self.weights, indices, offsets, self.pooling_mode, self.include_last_offset
+            self.weights,
+            indices,
+            offsets,
+            self.pooling_mode,
+            self.include_last_offset,
+            self.dedup,
+            self.hot_row_caches,
         )
 
 
@@ -467,6 +954,7 @@ class MergedEmbeddingBagWithSGD(MergedEmbeddingBag):
         Returns:
             List[Tensor] output shape of `(batch_size, embedding_dim)` which length = num of tables.
         """
+        self._check_fused_update()
         return merged_embeddingbag_sgd(
             self.weights,
             indices,
@@ -474,6 +962,8 @@ class MergedEmbeddingBagWithSGD(MergedEmbeddingBag):
             self.pooling_mode,
             self.include_last_offset,
             self.sgd_args,
+            self.dedup,
+            self.hot_row_caches,
         )
 
     @classmethod
@@ -572,6 +1062,7 @@ class MergedEmbeddingBagWithAdaGrad(MergedEmbeddingBag):
         Returns:
             List[Tensor] output shape of `(batch_size, embedding_dim)` which length = num of tables.
         """
+        self._check_fused_update()
         return merged_embeddingbag_adagrad(
             self.weights,
             indices,
@@ -579,6 +1070,8 @@ class MergedEmbeddingBagWithAdaGrad(MergedEmbeddingBag):
             self.pooling_mode,
             self.include_last_offset,
             self.adagrad_args,
+            self.dedup,
+            self.hot_row_caches,
         )
 
     @classmethod
@@ -635,6 +1128,7 @@ class MergedEmbeddingBagWithCat(MergedEmbeddingBag):
         embedding_specs: List[EmbeddingSpec],
     ):
         super(MergedEmbeddingBagWithCat, self).__init__(embedding_specs)
+        assert self.dtype is not None, "expect all tables have same dtype"
 
     def forward(self, indices, offsets, dense_feature):
         r"""
@@ -643,7 +1137,8 @@ class MergedEmbeddingBagWithCat(MergedEmbeddingBag):
             offsets (Tensor): a list of offsets for all tables
             dense_feature (Tensor): dense feature to be cat
         Returns:
-            output shape of `(batch_size, feature_size)` which feature_size = emb_dim * (num of tables + 1).
+            output shape of `(batch_size, feature_size)` which feature_size = dense dim + sum of the table dims.
+            All of them are written to a single preallocated output, the tables can have different dims.
         """
         return merged_embeddingbag_with_cat(
             self.weights,
@@ -653,39 +1148,373 @@ class MergedEmbeddingBagWithCat(MergedEmbeddingBag):
         )
 
 
+def quantize_rowwise(weight: torch.Tensor, bits: int = 8, chunk_size: int = 65536):
+    r"""
+    Row-wise asymmetric quantization of an embedding table, each row is stored
+    as ``bits`` (8 or 4) bits codes with a fp32 scale and bias, i.e.
+    ``w = scale * q + bias``. 4 bits codes are packed 2 per byte with the even
+    element in the low nibble.
+
+    Args:
+        weight (Tensor): the ``(num_embeddings, embedding_dim)`` table.
+        bits (int): 8 or 4.
+        chunk_size (int): rows quantized at once, bounds the peak memory.
+
+    Returns:
+        the uint8 codes of shape ``(num_embeddings, embedding_dim * bits / 8)``
+        and the fp32 ``(num_embeddings, 2)`` scale and bias.
+    """
+    assert bits in (8, 4), "quantize_rowwise only support 8 or 4 bits"
+    num_embeddings, embedding_dim = weight.shape
+    assert (
+        bits == 8 or embedding_dim % 2 == 0
+    ), "expect even embedding_dim for 4 bits tables"
+    qmax = (1 << bits) - 1
+    qweight = torch.empty(
+        (num_embeddings, embedding_dim * bits // 8), dtype=torch.uint8
+    )
+    scale_bias = torch.empty((num_embeddings, 2), dtype=torch.float)
+    for begin in range(0, num_embeddings, chunk_size):
+        end = min(begin + chunk_size, num_embeddings)
+        w = weight[begin:end].detach().float()
+        w_min = w.min(dim=1).values
+        scale = (w.max(dim=1).values - w_min) / qmax
+        # constant rows are all zero codes
+        scale = torch.where(scale > 0, scale, torch.ones_like(scale))
+        q = torch.clamp(
+            torch.round((w - w_min.unsqueeze(1)) / scale.unsqueeze(1)), 0, qmax
+        ).to(torch.uint8)
+        if bits == 4:
+            q = q[:, 0::2] | (q[:, 1::2] << 4)
+        qweight[begin:end] = q
+        scale_bias[begin:end, 0] = scale
+        scale_bias[begin:end, 1] = w_min
+    return qweight, scale_bias
+
+
+def dequantize_rowwise(qweight: torch.Tensor, scale_bias: torch.Tensor, bits: int):
+    r"""
+    Returns the fp32 table of the codes and scale and bias of `quantize_rowwise`.
+    """
+    q = qweight
+    if bits == 4:
+        q = torch.stack([qweight & 0xF, qweight >> 4], dim=2).view(qweight.size(0), -1)
+    return q.float() * scale_bias[:, :1] + scale_bias[:, 1:]
+
+
+class RowwiseQuantizedMergedEmbeddingBag(nn.Module):
+    r"""
+    Inference-only `MergedEmbeddingBag` with row-wise quantized tables, see
+    `quantize_rowwise`. The rows are dequantized inside the sum/mean pooling
+    kernel, so the tables take 4x (int8) or 8x (int4) less memory than fp32
+    and the lookup reads less memory. The outputs are fp32.
+
+    Create it from a trained `MergedEmbeddingBag` (or its subclasses):
+
+        >>> qmerged_emb = RowwiseQuantizedMergedEmbeddingBag.from_merged_embeddingbag(merged_emb, bits=4)
+        >>> outputs = qmerged_emb(indices, offsets)
+
+    Args:
+        qweights (List[Tensor]): uint8 codes of each table.
+        scale_biases (List[Tensor]): fp32 ``(num_embeddings, 2)`` scale and bias of each table.
+        bits (List[int]): 8 or 4 for each table.
+        pooling_mode (PoolingMode): sum or mean.
+        include_last_offset (bool): see `nn.EmbeddingBag`.
+    """
+
+    def __init__(
+        self,
+        qweights: List[torch.Tensor],
+        scale_biases: List[torch.Tensor],
+        bits: List[int],
+        pooling_mode: PoolingMode,
+        include_last_offset: bool,
+    ):
+        super(RowwiseQuantizedMergedEmbeddingBag, self).__init__()
+        self.n_tables = len(qweights)
+        assert self.n_tables > 0, "MergedEmbeddingBag at least have 1 table"
+        assert (
+            len(scale_biases) == self.n_tables and len(bits) == self.n_tables
+        ), "expect one scale_bias and bits for each table"
+        assert all(b in (8, 4) for b in bits), "only support 8 or 4 bits"
+        self.bits = list(bits)
+        self.pooling_mode = pooling_mode
+        self.include_last_offset = include_last_offset
+        for i in range(self.n_tables):
+            self.register_buffer("qweight{}".format(i), qweights[i].contiguous())
+            self.register_buffer(
+                "scale_bias{}".format(i), scale_biases[i].float().contiguous()
+            )
+
+    @property
+    def qweights(self):
+        return [getattr(self, "qweight{}".format(i)) for i in range(self.n_tables)]
+
+    @property
+    def scale_biases(self):
+        return [getattr(self, "scale_bias{}".format(i)) for i in range(self.n_tables)]
+
+    @classmethod
+    def from_merged_embeddingbag(cls, module: MergedEmbeddingBag, bits=8):
+        r"""
+        Quantizes the tables of a trained `MergedEmbeddingBag`.
+
+        Args:
+            module (MergedEmbeddingBag): the float module.
+            bits (int or List[int]): 8 or 4, for all tables or for each table.
+        """
+        assert (
+            len(module.weights) == module.n_tables
+        ), "do not support DistMergeEmbeddingBagWithAdaGrad"
+        if isinstance(bits, int):
+            bits = [bits] * module.n_tables
+        qweights, scale_biases = [], []
+        for weight, b in zip(module.weights, bits):
+            qweight, scale_bias = quantize_rowwise(weight, b)
+            qweights.append(qweight)
+            scale_biases.append(scale_bias)
+        return cls(
+            qweights,
+            scale_biases,
+            bits,
+            module.pooling_mode,
+            module.include_last_offset,
+        )
+
+    @classmethod
+    def from_embeddingbag_list(cls, tables: List[torch.nn.EmbeddingBag], bits=8):
+        return cls.from_merged_embeddingbag(
+            MergedEmbeddingBag.from_embeddingbag_list(tables), bits
+        )
+
+    def extra_repr(self) -> str:
+        s = "number of tables={}\n".format(self.n_tables)
+        for i in range(self.n_tables):
+            qweight = getattr(self, "qweight{}".format(i))
+            s += "table{}: {}, {}, {}, int{}".format(
+                i,
+                qweight.shape[0],
+                qweight.shape[1] * 8 // self.bits[i],
+                self.pooling_mode,
+                self.bits[i],
+            )
+            if i != self.n_tables - 1:
+                s += "\n"
+        return s
+
+    def forward(self, indices, offsets):
+        r"""
+        Args:
+            indices (List[Tensor]):
+                See https://pytorch.org/docs/stable/generated/torch.nn.EmbeddingBag.html#torch.nn.EmbeddingBag.forward
+            offsets (List[Tensor]):
+                See https://pytorch.org/docs/stable/generated/torch.nn.EmbeddingBag.html#torch.nn.EmbeddingBag.forward
+        Returns:
+            List[Tensor] fp32 output shape of `(batch_size, embedding_dim)` which length = num of tables.
+        """
+        return torch.ops.torch_ipex.merged_embeddingbag_rowwise_quantized_forward(
+            self.qweights,
+            self.scale_biases,
+            indices,
+            offsets,
+            self.bits,
+            self.pooling_mode,
+            self.include_last_offset,
+        )
+
+
 import torch.distributed as dist
 
 
-def sparse_all2all(
+def _align(nbytes: int):
+    # Each tensor packed in the all to all buffer starts at an 8 bytes boundary,
+    # so that it can be viewed back as its dtype in place.
+    return (nbytes + 7) // 8 * 8
+
+
+class _SparseAll2AllBufferPool(object):
+    # Reusable byte buffers for the send/recv payloads of sparse all to all,
+    # instead of allocating (and zero-filling) new ones on every forward and backward.
+    def __init__(self):
+        self.free = []
+
+    def get(self, nbytes: int):
+        for i, buf in enumerate(self.free):
+            if buf.numel() >= nbytes:
+                return self.free.pop(i)
+        if self.free:
+            # None is large enough, drop the largest one and grow it
+            self.free.sort(key=lambda buf: buf.numel())
+            nbytes = max(nbytes, self.free.pop().numel() * 2)
+        return torch.empty(nbytes, dtype=torch.uint8)
+
+    def put(self, buf: torch.Tensor):
+        self.free.append(buf)
+
+
+class SparseAll2AllHandle(object):
+    r"""
+    Handle of an in-flight sparse all to all started by ``sparse_all2all_async``.
+    ``wait()`` returns the received idx, val and ofs tensors of each rank, which
+    are views of a pooled recv buffer until ``release()`` is called.
+    """
+
+    def __init__(self, work, send, recv, recv_layout, pool):
+        self.work = work
+        self.send = send
+        self.recv = recv
+        self.recv_layout = recv_layout
+        self.pool = pool
+        self.result = None
+
+    def wait(self):
+        assert self.recv is not None, "the recv buffer has been released"
+        if self.result is not None:
+            return self.result
+        self.work.wait()
+        self.pool.put(self.send)
+        recv_idx, recv_buf, recv_ofs = [], [], []
+        pos = 0
+        for (
+            num_rows,
+            (ofs_bytes, buf_bytes, idx_bytes),
+            (
+                ofs_size,
+                emb_dim,
+                index_type,
+                val_type,
+            ),
+        ) in self.recv_layout:
+            recv_ofs.append(self.recv[pos : pos + ofs_size * 8].view(torch.int64))
+            pos += ofs_bytes
+            buf_nbytes = num_rows * emb_dim * _element_size(val_type)
+            recv_buf.append(
+                self.recv[pos : pos + buf_nbytes].view(val_type).view(num_rows, emb_dim)
+            )
+            pos += buf_bytes
+            idx_nbytes = num_rows * _element_size(index_type)
+            recv_idx.append(self.recv[pos : pos + idx_nbytes].view(index_type))
+            pos += idx_bytes
+        self.result = (recv_idx, recv_buf, recv_ofs)
+        return self.result
+
+    def release(self):
+        # Return the recv buffer to the pool once the received tensors are consumed.
+        if self.recv is None:
+            return
+        self.wait()
+        self.pool.put(self.recv)
+        self.result = None
+        self.recv = None
+
+
+def _element_size(dtype: torch.dtype):
+    return torch.empty((), dtype=dtype).element_size()
+
+
+def _segment_bytes(
+    num_rows: int,
+    ofs_size: int,
+    emb_dim: int,
+    index_type: torch.dtype,
+    val_type: torch.dtype,
+):
+    return (
+        _align(ofs_size * 8),
+        _align(num_rows * emb_dim * _element_size(val_type)),
+        _align(num_rows * _element_size(index_type)),
+    )
+
+
+def sparse_all2all_async(
     world_size: int,
     send_idx: List[torch.Tensor],
     send_buf: List[torch.Tensor],
     send_ofs: List[torch.Tensor],
+    pool: Optional[_SparseAll2AllBufferPool] = None,
 ):
-    # the first thing to know is the recv tensor sizes
-    # this requires an all to all
-    is_buffers = [torch.empty(1, dtype=torch.int64) for _ in range(world_size)]
-    for i in range(world_size):
-        is_buffers[i][0] = send_idx[i].shape[0]
-    os_buffers = [torch.empty(1, dtype=torch.int64) for _ in range(world_size)]
-    dist.all_to_all(os_buffers, is_buffers)
-    dist.barrier()
-
-    # init received buffers sizes
+    r"""
+    Starts the sparse all to all of the idx, val and ofs tensors of each rank
+    and returns a ``SparseAll2AllHandle``. The row counts are exchanged first by
+    one small all to all, then the three payloads of all ranks are packed into
+    one byte buffer and exchanged by one asynchronous all to all, so that the
+    caller can overlap its work with the exchange until ``wait()``.
+    """
+    if pool is None:
+        pool = _SparseAll2AllBufferPool()
     index_type = send_idx[0].dtype
     val_type = send_buf[0].dtype
     emb_dim = send_buf[0].shape[1]
     ofs_size = send_ofs[0].shape[0]
-    recv_idx = [torch.zeros(os_buffers[i], dtype=index_type) for i in range(world_size)]
-    recv_buf = [
-        torch.zeros((os_buffers[i], emb_dim), dtype=val_type) for i in range(world_size)
-    ]
-    recv_ofs = [torch.zeros((ofs_size,), dtype=torch.int64) for i in range(world_size)]
-    dist.all_to_all(recv_idx, send_idx)
-    dist.all_to_all(recv_buf, send_buf)
-    dist.all_to_all(recv_ofs, send_ofs)
-    dist.barrier()
-    return recv_idx, recv_buf, recv_ofs
+
+    # the first thing to know is the recv tensor sizes
+    send_counts = torch.tensor([t.shape[0] for t in send_idx], dtype=torch.int64)
+    recv_counts = torch.empty(world_size, dtype=torch.int64)
+    dist.all_to_all_single(recv_counts, send_counts, async_op=True).wait()
+
+    send_sizes = []
+    for i in range(world_size):
+        send_sizes.append(
+            sum(
+                _segment_bytes(
+                    send_idx[i].shape[0], ofs_size, emb_dim, index_type, val_type
+                )
+            )
+        )
+    send = pool.get(sum(send_sizes))
+    pos = 0
+    for i in range(world_size):
+        for t in (send_ofs[i], send_buf[i], send_idx[i]):
+            data = t.contiguous().view(-1).view(torch.uint8)
+            send[pos : pos + data.numel()].copy_(data)
+            pos += _align(data.numel())
+
+    recv_layout = []
+    recv_sizes = []
+    for num_rows in recv_counts.tolist():
+        segment = _segment_bytes(num_rows, ofs_size, emb_dim, index_type, val_type)
+        recv_layout.append(
+            (num_rows, segment, (ofs_size, emb_dim, index_type, val_type))
+        )
+        recv_sizes.append(sum(segment))
+    recv = pool.get(sum(recv_sizes))
+    work = dist.all_to_all_single(
+        recv[: sum(recv_sizes)],
+        send[: sum(send_sizes)],
+        output_split_sizes=recv_sizes,
+        input_split_sizes=send_sizes,
+        async_op=True,
+    )
+    return SparseAll2AllHandle(work, send, recv, recv_layout, pool)
+
+
+def sparse_all2all(
+    world_size: int,
+    send_idx: List[torch.Tensor],
+    send_buf: List[torch.Tensor],
+    send_ofs: List[torch.Tensor],
+):
+    return sparse_all2all_async(world_size, send_idx, send_buf, send_ofs).wait()
+
+
+def _distribute_forward_start(
+    weight: torch.Tensor,
+    row_offset: List[int],
+    indices: List[torch.Tensor],
+    offsets: List[torch.Tensor],
+    rank: int,
+    world_size: int,
+    include_last_offsets: bool,
+    pool: _SparseAll2AllBufferPool,
+):
+    (
+        send_idx,
+        send_buf,
+        send_ofs,
+    ) = torch.ops.torch_ipex.mergedemb_distribute_forward_local(
+        weight, row_offset, indices, offsets, rank, world_size, include_last_offsets
+    )
+    return sparse_all2all_async(world_size, send_idx, send_buf, send_ofs, pool)
 
 
 class DistMergeEmbeddingBagFunc(Function):
@@ -700,6 +1529,8 @@ class DistMergeEmbeddingBagFunc(Function):
         world_size: int,
         include_last_offsets: bool,
         adagrad_args: AdaGradArgs,
+        pool: _SparseAll2AllBufferPool,
+        prefetched: Optional[SparseAll2AllHandle] = None,
     ):
         global_bs = offsets[0].size(0)
         if include_last_offsets:
@@ -713,22 +1544,27 @@ class DistMergeEmbeddingBagFunc(Function):
         ctx.adagrad_args = adagrad_args
         ctx.rank = rank
         ctx.world_size = world_size
+        ctx.pool = pool
         num_emb = len(indices)
         emb_dim = weight.shape[1]
-        (
-            send_idx,
-            send_buf,
-            send_ofs,
-        ) = torch.ops.torch_ipex.mergedemb_distribute_forward_local(
-            weight, row_offset, indices, offsets, rank, world_size, include_last_offsets
-        )
-        recv_idx, recv_buf, recv_ofs = sparse_all2all(
-            world_size, send_idx, send_buf, send_ofs
-        )
+        handle = prefetched
+        if handle is None:
+            handle = _distribute_forward_start(
+                weight,
+                row_offset,
+                indices,
+                offsets,
+                rank,
+                world_size,
+                include_last_offsets,
+                pool,
+            )
         output = torch.empty((local_bs, num_emb, emb_dim), dtype=weight.dtype)
+        recv_idx, recv_buf, recv_ofs = handle.wait()
         torch.ops.torch_ipex.mergedemb_distribute_forward_merge(
             output, recv_idx, recv_buf, recv_ofs, num_emb
         )
+        handle.release()
         return output
 
     @staticmethod
@@ -746,8 +1582,8 @@ class DistMergeEmbeddingBagFunc(Function):
         ) = torch.ops.torch_ipex.mergedemb_distribute_backward_local(
             grad, row_offset, indices, offsets, rank, world_size, include_last_offsets
         )
-        recv_idx, recv_buf, recv_ofs = sparse_all2all(
-            world_size, send_idx, send_buf, send_ofs
+        handle = sparse_all2all_async(
+            world_size, send_idx, send_buf, send_ofs, ctx.pool
         )
         weight = ctx.weight
         adagrad_args = ctx.adagrad_args
@@ -755,10 +1591,12 @@ class DistMergeEmbeddingBagFunc(Function):
         hessian = adagrad_args.hessian
         lr = adagrad_args.lr
         eps = adagrad_args.eps
+        recv_idx, recv_buf, recv_ofs = handle.wait()
         torch.ops.torch_ipex.mergedemb_distribute_backward_merge_adagrad_update(
             recv_idx, recv_buf, recv_ofs, weight, trail[0], hessian[0], lr, eps
         )
-        return None, None, None, None, None, None, None, None
+        handle.release()
+        return None, None, None, None, None, None, None, None, None, None
 
 
 class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
@@ -775,6 +1613,21 @@ class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
         >>> dist.init_process_group("ccl", world_size=world_size, rank=rank)
         >>> distributed_emb = DistMergeEmbeddingBagWithAdaGrad.from_embeddingbag_list(EmbLists)
         >>> out = distributed_emb(indices, offsets)
+
+    ``prefetch`` runs the local part of the forward of the next mini-batch and
+    starts its all to all, so that the exchange overlaps with the work done
+    until the forward of that mini-batch is called:
+
+        >>> distributed_emb.prefetch(indices[0], offsets[0])
+        >>> for i in range(num_batches):
+        >>>     out = distributed_emb(indices[i], offsets[i])
+        >>>     if i + 1 < num_batches:
+        >>>         distributed_emb.prefetch(indices[i + 1], offsets[i + 1])
+        >>>     ...
+
+    Note that the prefetched mini-batch reads the weights at the time of
+    ``prefetch``. In training it misses the update of the backward runs in
+    between (one step staleness), while it is exact for inference.
     """
 
     def __init__(
@@ -787,6 +1640,9 @@ class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
         assert (
             self.pooling_mode == PoolingMode.SUM
         ), "only support SUM for DistMergeEmbeddingBagWithAdaGrad"
+        assert (
+            self.embedding_dim is not None and self.dtype is not None
+        ), "expect all tables have same embedding_dim and dtype for DistMergeEmbeddingBagWithAdaGrad"
         self._rank = dist.get_rank()
         self._size = dist.get_world_size()
         # create row_offset
@@ -815,8 +1671,45 @@ class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
         else:
             self.adagrad_args.bf16_trail.append(torch.empty(0, dtype=torch.bfloat16))
             self.adagrad_args.hessian.append(torch.zeros_like(weight_allin1))
+        self._buffer_pool = _SparseAll2AllBufferPool()
+        self._prefetched = None
+
+    def prefetch(self, indices: List[torch.Tensor], offset: List[torch.Tensor]):
+        r"""
+        Runs the local part of the forward of ``indices`` and ``offset`` and
+        starts its all to all, to be consumed by the next forward with the same
+        ``indices`` and ``offset``. All ranks must prefetch the same mini-batches.
+        """
+        self._drop_prefetched()
+        with torch.no_grad():
+            handle = _distribute_forward_start(
+                self.weights[0],
+                self._row_offset,
+                indices,
+                offset,
+                self._rank,
+                self._size,
+                self.include_last_offset,
+                self._buffer_pool,
+            )
+        self._prefetched = (indices, offset, handle)
+
+    def _drop_prefetched(self):
+        if self._prefetched is not None:
+            self._prefetched[2].release()
+            self._prefetched = None
 
     def forward(self, indices: List[torch.Tensor], offset: List[torch.Tensor]):
+        prefetched = None
+        if (
+            self._prefetched is not None
+            and self._prefetched[0] is indices
+            and self._prefetched[1] is offset
+        ):
+            prefetched = self._prefetched[2]
+            self._prefetched = None
+        else:
+            self._drop_prefetched()
         out = DistMergeEmbeddingBagFunc.apply(
             self.weights[0],
             self._row_offset,
@@ -826,6 +1719,8 @@ class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
             self._size,
             self.include_last_offset,
             self.adagrad_args,
+            self._buffer_pool,
+            prefetched,
         )
         return out
 
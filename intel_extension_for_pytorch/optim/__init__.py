@@ -1,5 +1,7 @@
 from ..utils.utils import has_xpu
 from ._lars import Lars
+from ._flat_arena import enable_flat_arena
+from ._fused_unscale_clip import enable_fused_unscale_clip
 
 if has_xpu():
     from .xpu.ResourceApplyMomentum import FusedResourceApplyMomentum
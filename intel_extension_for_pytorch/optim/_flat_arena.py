@@ -0,0 +1,320 @@
+import types
+import torch
+from collections import OrderedDict
+from ._functional import is_master_weight, get_param2
+from ..utils._logger import logger, WarningType
+
+# fused step op of the optimizers supporting the flat arena
+_FLAT_ARENA_FUSED_STEP_OPS = {
+    torch.optim.Adam: "adam_fused_step",
+    torch.optim.AdamW: "adamw_fused_step",
+}
+
+
+def _grad_holder(p, params_attr):
+    # the tensor autograd accumulates the grad of p into, it is the bf16
+    # parameter of the module for the master weight training
+    return params_attr[p].parameter if is_master_weight(p, params_attr) else p
+
+
+def _can_pack(p, params_attr):
+    if (
+        not p.requires_grad
+        or p.device.type != "cpu"
+        or p.layout != torch.strided
+        or not p.is_contiguous()
+    ):
+        return False
+    if p in params_attr:
+        attr = params_attr[p]
+        if attr.op_ctx is not None:
+            # the prepacked weight shares the storage with its op context
+            return False
+        if (
+            attr.parameter is not None
+            and attr.parameter is not p
+            and not is_master_weight(p, params_attr)
+        ):
+            return False
+    holder = _grad_holder(p, params_attr)
+    # the params without grad on the step building the buckets are skipped
+    # by the per-tensor fused step, as torch does
+    return (
+        holder.grad is not None
+        and not holder.grad.is_sparse
+        and holder.is_contiguous()
+        and get_param2(p, params_attr).is_contiguous()
+    )
+
+
+def _zero_grad(t, set_to_none):
+    if t.grad is None:
+        return
+    if set_to_none:
+        t.grad = None
+    else:
+        if t.grad.grad_fn is not None:
+            t.grad.detach_()
+        else:
+            t.grad.requires_grad_(False)
+        t.grad.zero_()
+
+
+class _ArenaBucket(object):
+    r"""
+    The params of a param group having the same dtypes and step, with their
+    grads and states, packed in flat buffers. The tensors of the params,
+    grads and states are re-pointed to the views of the buffers, so one call
+    of the fused step op updates all of them.
+    """
+
+    def __init__(self, params, holders, params2, states, step, amsgrad):
+        self.holders = holders
+        numel = sum(p.numel() for p in params)
+        state_dtype = torch.float64 if params[0].dtype is torch.float64 else torch.float
+        self.param = torch.empty(numel, dtype=params[0].dtype)
+        self.param2 = (
+            torch.empty(numel, dtype=params2[0].dtype)
+            if params2[0].numel() > 0
+            else torch.Tensor()
+        )
+        self.grad = torch.zeros(numel, dtype=holders[0].dtype)
+        self.exp_avg = torch.zeros(numel, dtype=state_dtype)
+        self.exp_avg_sq = torch.zeros(numel, dtype=state_dtype)
+        self.max_exp_avg_sq = (
+            torch.zeros(numel, dtype=state_dtype) if amsgrad else torch.Tensor()
+        )
+        self.step_t = torch.tensor(step)
+        self.grads = []
+
+        state_keys = ["exp_avg", "exp_avg_sq"]
+        if amsgrad:
+            state_keys.append("max_exp_avg_sq")
+        offset = 0
+        for p, holder, param2, state in zip(params, holders, params2, states):
+            size = p.size()
+            end = offset + p.numel()
+            self.param[offset:end].view(size).copy_(p)
+            p.data = self.param[offset:end].view(size)
+            if param2.numel() > 0:
+                self.param2[offset:end].view(size).copy_(param2)
+                param2.data = self.param2[offset:end].view(size)
+            grad = self.grad[offset:end].view(size)
+            grad.copy_(holder.grad)
+            holder.grad = grad
+            self.grads.append(grad)
+            for key in state_keys:
+                state_view = getattr(self, key)[offset:end].view(size)
+                if key in state:
+                    state_view.copy_(state[key])
+                state[key] = state_view
+            state["step"] = self.step_t
+            offset = end
+
+    def sync_grads(self):
+        if all(h.grad is g for h, g in zip(self.holders, self.grads)):
+            return
+        # the grads replaced or set to None out of the optimizer
+        for holder, grad in zip(self.holders, self.grads):
+            if holder.grad is grad:
+                continue
+            if holder.grad is None:
+                grad.zero_()
+            else:
+                grad.copy_(holder.grad)
+            holder.grad = grad
+
+    def update(self, fused_step, group, decoupled_weight_decay, grad_scale):
+        self.sync_grads()
+        self.step_t += 1
+        beta1, beta2 = group["betas"]
+        args = (
+            self.param,
+            self.exp_avg,
+            self.exp_avg_sq,
+            self.max_exp_avg_sq,
+            self.grad if not group["maximize"] else -self.grad,
+            self.param2,
+            group["amsgrad"],
+            self.step_t.item(),
+            beta1,
+            beta2,
+            group["lr"],
+            group["weight_decay"],
+            group["eps"],
+        )
+        if grad_scale == 1.0:
+            fused_step(*args)
+        else:
+            torch.ops.torch_ipex.adam_fused_step_with_grad_scale(
+                *args, decoupled_weight_decay, grad_scale
+            )
+
+
+class FlatArena(object):
+    r"""
+    Packs the params of each param group of a fused Adam / AdamW optimizer
+    into ``_ArenaBucket``, the params which can't be packed (e.g., the
+    prepacked weights) are left to the per-tensor fused step.
+
+    The buckets are built lazily on the first step, and rebuilt after the
+    state dict of the optimizer is loaded or a param group is added.
+    """
+
+    def __init__(self, optimizer):
+        self.optimizer = optimizer
+        self.fused_step = getattr(
+            torch.ops.torch_ipex, _FLAT_ARENA_FUSED_STEP_OPS[type(optimizer)]
+        )
+        self.decoupled_weight_decay = type(optimizer) is torch.optim.AdamW
+        self.buckets = None
+        self.loose_params = None
+
+    def build(self):
+        optimizer = self.optimizer
+        params_attr = optimizer.params_attr
+        self.buckets = []
+        self.loose_params = []
+        for group in optimizer.param_groups:
+            bucketed = OrderedDict()
+            loose_params = []
+            for p in group["params"]:
+                if not _can_pack(p, params_attr):
+                    loose_params.append(p)
+                    continue
+                holder = _grad_holder(p, params_attr)
+                param2 = get_param2(p, params_attr)
+                state = optimizer.state[p]
+                step = state["step"].item() if "step" in state else 0.0
+                key = (
+                    p.dtype,
+                    param2.dtype if param2.numel() > 0 else None,
+                    holder.dtype,
+                    step,
+                )
+                if key not in bucketed:
+                    bucketed[key] = ([], [], [], [])
+                for t, tensors in zip((p, holder, param2, state), bucketed[key]):
+                    tensors.append(t)
+            with torch.no_grad():
+                self.buckets.append(
+                    [
+                        _ArenaBucket(*tensors, key[-1], group["amsgrad"])
+                        for key, tensors in bucketed.items()
+                    ]
+                )
+            self.loose_params.append(loose_params)
+
+    def invalidate(self):
+        self.buckets = None
+        self.loose_params = None
+
+    def _maybe_build(self):
+        if self.buckets is None or len(self.buckets) != len(
+            self.optimizer.param_groups
+        ):
+            self.build()
+
+    def step(self, grad_scale=1.0):
+        self._maybe_build()
+        for group, buckets in zip(self.optimizer.param_groups, self.buckets):
+            for bucket in buckets:
+                bucket.update(
+                    self.fused_step, group, self.decoupled_weight_decay, grad_scale
+                )
+
+    def grads(self):
+        r"""
+        Returns the grads read by the step, the flat grads of the buckets and
+        the grads of the params left to the per-tensor step.
+        """
+        self._maybe_build()
+        params_attr = self.optimizer.params_attr
+        grads = []
+        for buckets in self.buckets:
+            for bucket in buckets:
+                bucket.sync_grads()
+                grads.append(bucket.grad)
+        for loose_params in self.loose_params:
+            for p in loose_params:
+                grad = _grad_holder(p, params_attr).grad
+                if grad is not None:
+                    grads.append(grad)
+        return grads
+
+    def zero_grad(self, set_to_none):
+        if self.buckets is None:
+            self.optimizer._flat_arena_original_zero_grad(set_to_none)
+            return
+        params_attr = self.optimizer.params_attr
+        for buckets in self.buckets:
+            for bucket in buckets:
+                bucket.grad.zero_()
+        for loose_params in self.loose_params:
+            for p in loose_params:
+                holder = _grad_holder(p, params_attr)
+                _zero_grad(holder, set_to_none)
+                if holder is not p:
+                    _zero_grad(p, set_to_none)
+
+
+def enable_flat_arena(optimizer):
+    r"""
+    Packs the params, grads and states of each param group of a CPU Adam /
+    AdamW optimizer into contiguous flat buffers, and updates each param
+    group with one call of the fused step op instead of one call per param.
+    The params of the model, their grads and the states of the optimizer are
+    kept as views of the buffers. It reduces the step time of the models with
+    many small params, e.g., the LLM fine-tuning.
+
+    Call it on the optimizer returned by ``ipex.optimize``, both the fp32 and
+    the bf16 (master weight or split master weight) training are supported.
+    The buffers are built on the first step. The prepacked weights, the params
+    not contiguous and the params without grad on the first step are updated
+    per param as before.
+
+    .. note::
+
+        The grads of the packed params are zeroed in place by ``zero_grad``
+        instead of being set to None, so that the backward accumulates into
+        the buffers. A packed param whose grad is set to None out of the
+        optimizer is updated with zero grad, rather than skipped.
+
+    Args:
+        optimizer (torch.optim.Adam or torch.optim.AdamW): the optimizer.
+
+    Returns:
+        The optimizer with the flat arena enabled.
+    """
+    if type(optimizer) not in _FLAT_ARENA_FUSED_STEP_OPS:
+        logger.warning(
+            "Flat arena is not supported for "
+            + str(type(optimizer))
+            + ", will use the original step",
+            _type=WarningType.NotSupported,
+        )
+        return optimizer
+    if hasattr(optimizer, "flat_arena"):
+        return optimizer
+    if not getattr(optimizer, "fused", False):
+        from ._optimizer_utils import optimizer_fusion
+
+        optimizer = optimizer_fusion(optimizer, "cpu", True)
+
+    def zero_grad(self, set_to_none: bool = True):
+        self.flat_arena.zero_grad(set_to_none)
+
+    def load_state_dict(self, state_dict):
+        self._flat_arena_original_load_state_dict(state_dict)
+        self.flat_arena.invalidate()
+
+    setattr(optimizer, "flat_arena", FlatArena(optimizer))  # noqa: B010
+    setattr(  # noqa: B010
+        optimizer, "_flat_arena_original_zero_grad", optimizer.zero_grad
+    )
+    setattr(  # noqa: B010
+        optimizer, "_flat_arena_original_load_state_dict", optimizer.load_state_dict
+    )
+    optimizer.zero_grad = types.MethodType(zero_grad, optimizer)
+    optimizer.load_state_dict = types.MethodType(load_state_dict, optimizer)
+    return optimizer
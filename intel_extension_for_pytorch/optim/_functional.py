@@ -828,19 +828,26 @@ def lamb_step(self, closure=None):
 
 
 @torch.no_grad()
-def adam_step(self, closure=None):
+def adam_step(self, closure=None, grad_scale=1.0):
     """Performs a single optimization step.
 
     Args:
         closure (callable, optional): A closure that reevaluates the model
             and returns the loss.
+        grad_scale (float, optional): Factor applied to the grads inside the
+            fused update, e.g., to unscale and clip them on CPU.
     """
     loss = None
     if closure is not None:
         with torch.enable_grad():
             loss = closure()
 
-    for group in self.param_groups:
+    # the params packed by the flat arena are updated by one call per bucket
+    flat_arena = getattr(self, "flat_arena", None)
+    if flat_arena is not None:
+        flat_arena.step(grad_scale)
+
+    for i, group in enumerate(self.param_groups):
         params_with_grad = []
         params2 = []
         grads = []
@@ -850,7 +857,7 @@ def adam_step(self, closure=None):
         state_steps = []
         beta1, beta2 = group["betas"]
 
-        for p in group["params"]:
+        for p in group["params"] if flat_arena is None else flat_arena.loose_params[i]:
             grad = (
                 get_bf16_grad(p, self.params_attr)
                 if is_master_weight(p, self.params_attr)
@@ -910,6 +917,7 @@ def adam_step(self, closure=None):
             eps=group["eps"],
             maximize=group["maximize"],
             foreach=group["foreach"],
+            grad_scale=grad_scale,
         )
 
     return loss
@@ -933,7 +941,8 @@ def adam(
     lr: float,
     weight_decay: float,
     eps: float,
-    maximize: bool
+    maximize: bool,
+    grad_scale: float = 1.0
 ):
     r"""Functional API that performs Adam algorithm computation.
     See :class:`~torch.optim.Adam` for details.
@@ -971,6 +980,7 @@ def adam(
         weight_decay=weight_decay,
         eps=eps,
         maximize=maximize,
+        grad_scale=grad_scale,
     )
 
 
@@ -989,7 +999,8 @@ def _single_tensor_adam(
     lr: float,
     weight_decay: float,
     eps: float,
-    maximize: bool
+    maximize: bool,
+    grad_scale: float = 1.0
 ):
     for i, param in enumerate(params):
         grad = grads[i] if not maximize else -grads[i]
@@ -1005,7 +1016,7 @@ def _single_tensor_adam(
         step_t += 1
         step = step_t.item()
 
-        torch.ops.torch_ipex.adam_fused_step(
+        args = (
             param,
             exp_avg,
             exp_avg_sq,
@@ -1020,6 +1031,13 @@ def _single_tensor_adam(
             weight_decay,
             eps,
         )
+        if grad_scale == 1.0:
+            torch.ops.torch_ipex.adam_fused_step(*args)
+        else:
+            # unscale and clip the grad inside the update, CPU only
+            torch.ops.torch_ipex.adam_fused_step_with_grad_scale(
+                *args, False, grad_scale
+            )
 
 
 def _multi_tensor_adam(
@@ -1037,7 +1055,8 @@ def _multi_tensor_adam(
     lr: float,
     weight_decay: float,
     eps: float,
-    maximize: bool
+    maximize: bool,
+    grad_scale: float = 1.0
 ):
     if len(params) == 0:
         return
@@ -1060,6 +1079,7 @@ def _multi_tensor_adam(
         weight_decay=weight_decay,
         eps=eps,
         maximize=maximize,
+        grad_scale=grad_scale,
     )
 
 
@@ -1081,7 +1101,8 @@ def adamw(
     lr: float,
     weight_decay: float,
     eps: float,
-    maximize: bool
+    maximize: bool,
+    grad_scale: float = 1.0
 ):
     r"""Functional API that performs Adam algorithm computation.
     See :class:`~torch.optim.Adam` for details.
@@ -1120,6 +1141,7 @@ def adamw(
         weight_decay=weight_decay,
         eps=eps,
         maximize=maximize,
+        grad_scale=grad_scale,
     )
 
 
@@ -1138,7 +1160,8 @@ def _single_tensor_adamw(
     lr: float,
     weight_decay: float,
     eps: float,
-    maximize: bool
+    maximize: bool,
+    grad_scale: float = 1.0
 ):
     for i, param in enumerate(params):
         grad = grads[i] if not maximize else -grads[i]
@@ -1154,7 +1177,7 @@ def _single_tensor_adamw(
         step_t += 1
         step = step_t.item()
 
-        torch.ops.torch_ipex.adamw_fused_step(
+        args = (
             param,
             exp_avg,
             exp_avg_sq,
@@ -1169,6 +1192,13 @@ def _single_tensor_adamw(
             weight_decay,
             eps,
         )
+        if grad_scale == 1.0:
+            torch.ops.torch_ipex.adamw_fused_step(*args)
+        else:
+            # unscale and clip the grad inside the update, CPU only
+            torch.ops.torch_ipex.adam_fused_step_with_grad_scale(
+                *args, True, grad_scale
+            )
 
 
 def _multi_tensor_adamw(
@@ -1186,7 +1216,8 @@ def _multi_tensor_adamw(
     lr: float,
     weight_decay: float,
     eps: float,
-    maximize: bool
+    maximize: bool,
+    grad_scale: float = 1.0
 ):
     if len(params) == 0:
         return
@@ -1209,23 +1240,31 @@ def _multi_tensor_adamw(
         weight_decay=weight_decay,
         eps=eps,
         maximize=maximize,
+        grad_scale=grad_scale,
     )
 
 
 @torch.no_grad()
-def adamw_step(self, closure=None):
+def adamw_step(self, closure=None, grad_scale=1.0):
     """Performs a single optimization step.
 
     Args:
         closure (callable, optional): A closure that reevaluates the model
             and returns the loss.
+        grad_scale (float, optional): Factor applied to the grads inside the
+            fused update, e.g., to unscale and clip them on CPU.
     """
     loss = None
     if closure is not None:
         with torch.enable_grad():
             loss = closure()
 
-    for group in self.param_groups:
+    # the params packed by the flat arena are updated by one call per bucket
+    flat_arena = getattr(self, "flat_arena", None)
+    if flat_arena is not None:
+        flat_arena.step(grad_scale)
+
+    for i, group in enumerate(self.param_groups):
         # fp32 master weight and fp32 weight(some layer no need cast)
         params_with_grad = []
         # bf16 weight(mapped to fp32 master weight) and empty tensor(empty means no need casted layer's weight)
@@ -1237,7 +1276,7 @@ def adamw_step(self, closure=None):
         state_steps = []
         beta1, beta2 = group["betas"]
 
-        for p in group["params"]:
+        for p in group["params"] if flat_arena is None else flat_arena.loose_params[i]:
             # params_attr: {'layer.master_weight(fp32)': {'bf16_param': 'layer.weight(bf16)'}}
             grad = (
                 get_bf16_grad(p, self.params_attr)
@@ -1255,11 +1294,17 @@ def adamw_step(self, closure=None):
                 state = self.state[p]
                 # Lazy state initialization
                 if len(state) == 0:
-                    buffer_dtype = p.dtype
-                    if p.dtype is not torch.float:
-                        raise RuntimeError(
-                            "parameter in optimizer(Adamw) is not FP32, need check"
+                    if p.device.type == "cpu":
+                        # fp32 states for the bf16 split master weight on CPU
+                        buffer_dtype = (
+                            p.dtype if p.dtype is torch.float64 else torch.float
                         )
+                    else:
+                        buffer_dtype = p.dtype
+                        if p.dtype is not torch.float:
+                            raise RuntimeError(
+                                "parameter in optimizer(Adamw) is not FP32, need check"
+                            )
 
                     state["step"] = torch.tensor(0.0)
                     # Exponential moving average of gradient values
@@ -1303,6 +1348,7 @@ def adamw_step(self, closure=None):
             eps=group["eps"],
             maximize=group["maximize"],
             foreach=group["foreach"],
+            grad_scale=grad_scale,
         )
 
     return loss
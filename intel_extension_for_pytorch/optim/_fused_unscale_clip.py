@@ -0,0 +1,138 @@
+import types
+import torch
+from ._functional import adam_step, adamw_step
+from ._flat_arena import _grad_holder
+from ..utils._logger import logger, WarningType
+
+# the fused steps applying the grad scale inside the update kernel, the grads
+# of the other fused steps are multiplied before the step
+_FUSED_STEPS_WITH_GRAD_SCALE = [adam_step, adamw_step]
+
+
+def _step_grads(optimizer):
+    flat_arena = getattr(optimizer, "flat_arena", None)
+    if flat_arena is not None:
+        return flat_arena.grads()
+    grads = []
+    for group in optimizer.param_groups:
+        for p in group["params"]:
+            grad = _grad_holder(p, optimizer.params_attr).grad
+            if grad is not None:
+                grads.append(grad)
+    return grads
+
+
+def _fp16_master_weights(optimizer):
+    for k, v in optimizer.params_attr.items():
+        _param = v.parameter
+        if _param is not None and _param is not k and _param.dtype == torch.float16:
+            yield k, _param
+
+
+def _sync_grad_to_fp16_master_weight(optimizer):
+    # the fused step reads the grad of the fp32 master weight of the fp16
+    # params, the bf16 grads are read by the fused step directly
+    for k, _param in _fp16_master_weights(optimizer):
+        if _param.requires_grad and _param.grad is not None:
+            k.grad = _param.grad.detach().float()
+
+
+@torch.no_grad()
+def unscale_clip_step(self, closure=None, grad_scaler=None):
+    r"""
+    Unscales the grads by ``grad_scaler``, clips them by ``self.max_grad_norm``
+    and updates the params, reading the grads twice: once for the global grad
+    norm and the inf check, once for the fused update. The update is skipped if
+    inf or NaN is found in the grads.
+    """
+    loss = None
+    if closure is not None:
+        with torch.enable_grad():
+            loss = closure()
+
+    inv_scale = 1.0
+    optimizer_state = None
+    if grad_scaler is not None and grad_scaler.is_enabled():
+        optimizer_state = grad_scaler._per_optimizer_states[id(self)]
+        if optimizer_state["stage"].name == "UNSCALED":
+            # unscaled and synced by an explicit grad_scaler.unscale_(optimizer)
+            optimizer_state = None
+        else:
+            _scale, _ = grad_scaler._check_scale_growth_tracker("step")
+            # FP32 division can be imprecise for certain compile options, so we carry out the reciprocal in FP64.
+            inv_scale = _scale.double().reciprocal().float().item()
+            _sync_grad_to_fp16_master_weight(self)
+    else:
+        _sync_grad_to_fp16_master_weight(self)
+
+    grads = _step_grads(self)
+    norm, found_inf = torch.ops.torch_ipex.grad_norm_and_found_inf(
+        [grad.coalesce()._values() if grad.is_sparse else grad for grad in grads]
+    )
+    if optimizer_state is not None:
+        optimizer_state["found_inf_per_device"] = {found_inf.device: found_inf}
+    # the norm of the unscaled grads, as clip_grad_norm_ returns
+    self.grad_norm = norm * inv_scale
+    if found_inf.item():
+        return loss
+
+    grad_scale = inv_scale
+    if self.max_grad_norm is not None:
+        clip_coef = self.max_grad_norm / (self.grad_norm.item() + 1e-6)
+        grad_scale *= min(clip_coef, 1.0)
+    if self._unscale_clip_fused_step.__func__ in _FUSED_STEPS_WITH_GRAD_SCALE:
+        self._unscale_clip_fused_step(grad_scale=grad_scale)
+    else:
+        if grad_scale != 1.0:
+            torch._foreach_mul_(
+                [grad for grad in grads if not grad.is_sparse], grad_scale
+            )
+            for grad in grads:
+                if grad.is_sparse:
+                    grad.mul_(grad_scale)
+        self._unscale_clip_fused_step()
+    for k, _param in _fp16_master_weights(self):
+        torch.ops.torch_ipex.sync_master_weight_to_fp16(k, _param)
+    return loss
+
+
+def enable_fused_unscale_clip(optimizer, max_norm=None):
+    r"""
+    Replaces the unscale (``GradScaler.unscale_``), the grad clipping
+    (``torch.nn.utils.clip_grad_norm_``) and the fused step of a CPU optimizer
+    returned by ``ipex.optimize``, which walk all the grads one after another,
+    by one combined step. The global grad norm and the inf check are computed
+    in one parallel reduction, and the unscale and clip factor is applied
+    inside the fused update of Adam and AdamW (multiplied to the grads before
+    the step of the other fused optimizers). The update is skipped if inf or
+    NaN is found in the grads.
+
+    ``GradScaler.step(optimizer)`` calls the combined step for the fp16
+    training, ``optimizer.step()`` unscales nothing and clips the grads for
+    the bf16 or fp32 training. The L2 norm of the unscaled grads before
+    clipping is stored in ``optimizer.grad_norm`` after each step.
+
+    Args:
+        optimizer (torch.optim.Optimizer): the fused optimizer.
+        max_norm (float): max L2 norm of the grads, no clipping if None.
+
+    Returns:
+        The optimizer with the combined step.
+    """
+    if not getattr(optimizer, "fused", False):
+        logger.warning(
+            "Fused unscale and clip is only supported for the fused optimizers, "
+            + "will use the original step",
+            _type=WarningType.NotSupported,
+        )
+        return optimizer
+    if hasattr(optimizer, "_unscale_clip_fused_step"):
+        optimizer.max_grad_norm = max_norm
+        return optimizer
+    setattr(optimizer, "_unscale_clip_fused_step", optimizer.step)  # noqa: B010
+    setattr(optimizer, "max_grad_norm", max_norm)  # noqa: B010
+    setattr(optimizer, "grad_norm", None)  # noqa: B010
+    # GradScaler passes itself to the step instead of unscaling the grads
+    setattr(optimizer, "_step_supports_amp_scaling", True)  # noqa: B010
+    optimizer.step = types.MethodType(unscale_clip_step, optimizer)
+    return optimizer
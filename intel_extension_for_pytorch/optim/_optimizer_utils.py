@@ -21,6 +21,7 @@ IPEX_FUSED_OPTIMIZER_LIST_CPU = [
     torch.optim.SGD,
     torch.optim.Adagrad,
     torch.optim.Adam,
+    torch.optim.AdamW,
     Lamb,
     Lars,
 ]
@@ -37,6 +38,7 @@ OPTIMIZER_FUSED_STEP_MAPPING_CPU = {
     torch.optim.SGD: sgd_step,
     torch.optim.Adagrad: adagrad_step,
     torch.optim.Adam: adam_step,
+    torch.optim.AdamW: adamw_step,
     Lamb: lamb_step,
     Lars: lars_step,
 }
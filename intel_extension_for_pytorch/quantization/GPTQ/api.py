@@ -1,14 +1,116 @@
 import re
 import copy
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import time
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import torch.nn as nn
 from .gptq import GPTQ
 from .utils import find_layers, pack_weight
+from ...utils._logger import logger, WarningType
 
 QUANT_META = namedtuple("QUANT_META", ["scales", "zeros"])
 
 
+def _save_atomic(obj, path):
+    # Written to a temporary file and renamed, an interrupted run never leaves
+    # a partially written artifact behind.
+    tmp_path = path + ".tmp"
+    if path.endswith(".json"):
+        with open(tmp_path, "w") as f:
+            json.dump(obj, f)
+    else:
+        torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _activation_buffer(path, shape, dtype):
+    # Activations of all the calib samples, resident or memory-mapped to the file.
+    if path is None:
+        return torch.zeros(shape, dtype=dtype)
+    numel = 1
+    for size in shape:
+        numel *= size
+    with open(path, "ab") as f:
+        f.truncate(numel * torch.tensor([], dtype=dtype).element_size())
+    return torch.from_file(path, shared=True, size=numel, dtype=dtype).view(shape)
+
+
+def _pack_block(subset, prefix, results, wbits, group_size, pack_dtype, param_dtype):
+    # Packed weight, scales, zeros and g_idx of the quantized linears of a block.
+    state = {}
+    for name in subset:
+        scales, zeros, g_idx, _ = results[name]
+        qweight, scales, qzeros = pack_weight(
+            subset[name],
+            scales,
+            zeros,
+            wbits=wbits,
+            group_size=group_size,
+            pack_dtype=pack_dtype,
+        )
+        full_name = prefix + "." + name
+        state[full_name + ".qweight"] = qweight
+        state[full_name + ".scales"] = scales.to(param_dtype)
+        state[full_name + ".qzeros"] = qzeros
+        state[full_name + ".g_idx"] = g_idx
+    return state
+
+
+def _worker_pools(num_workers):
+    # Disjoint core pools of the workers running fasterquant concurrently.
+    if num_workers <= 1:
+        return []
+    from ...cpu.runtime import CPUPool, is_runtime_ext_enabled
+
+    if not is_runtime_ext_enabled():
+        logger.warning(
+            "Running fasterquant of the linears concurrently needs the runtime extension "
+            + "(Intel OpenMP preloaded), fallback to quantize them sequentially.",
+            _type=WarningType.NotSupported,
+        )
+        return []
+    cores = CPUPool().core_ids
+    num_workers = min(num_workers, len(cores))
+    step = len(cores) // num_workers
+    return [
+        CPUPool(core_ids=cores[i * step : (i + 1) * step]) for i in range(num_workers)
+    ]
+
+
+def _fasterquant(gptq, group_size, pools):
+    # The linears of a block are independent once their Hessians are collected,
+    # e.g., q/k/v and gate/up, so they are quantized concurrently on the pools.
+    if len(pools) <= 1 or len(gptq) <= 1:
+        return {
+            name: gptq[name].fasterquant(groupsize=group_size, name=name)
+            for name in gptq
+        }
+    from ...cpu.runtime import pin
+
+    free_pools = queue.Queue()
+    for pool in pools:
+        free_pools.put(pool)
+
+    def run(name):
+        pool = free_pools.get()
+        try:
+            with pin(pool), torch.no_grad():
+                return gptq[name].fasterquant(groupsize=group_size, name=name)
+        finally:
+            free_pools.put(pool)
+
+    # Largest linears first, so that the small ones fill the idle pools at the end.
+    names = sorted(gptq, key=lambda name: -gptq[name].layer.weight.numel())
+    with ThreadPoolExecutor(max_workers=len(pools)) as executor:
+        return dict(zip(names, executor.map(run, names)))
+
+
 @torch.no_grad()
 def _gptq(
     model,
@@ -20,6 +122,10 @@ def _gptq(
     group_size=-1,
     pack_dtype=torch.uint8,
     param_dtype=torch.float,
+    micro_batch_size=8,
+    num_workers=1,
+    work_dir=None,
+    offload_activations=False,
 ):
     r"""
     Apply Quantization to the given transformers model (nn.Module) using gptq method.
@@ -27,7 +133,8 @@ def _gptq(
 
     Args:
       model (torch.nn.Module): User model to apply [2, 3, 4] bits quantization.
-      dataset (iterable object):  Calib dataset, batch size should be 1.
+      dataset (iterable object):  Calib dataset, the first element of each sample is the input ids
+        of shape [batch size, seq len].
       quantized_ckpt (str): Quantized checkpoint name.
       wbits (int): Only works for [2, 3, 4], means quantize weight to int2, int3 or int4.
       perchannel (bool): Control quantization granularity. Default value is ``True``.
@@ -35,6 +142,18 @@ def _gptq(
       group_size (int): Group as a block along k dimension. Default value is ``-1``.
       pack_dtype (torch.dtype): Pack int2/int4/int3 to the type. Default value is ``torch.uint8``.
       param_dtype (torch.dtype): Determines the other weight's accuracy except quantized weight.
+      micro_batch_size (int): Number of calib samples captured and forwarded through each
+        transformer block at once. Default value is ``8``.
+      num_workers (int): Number of linears of a transformer block quantized concurrently, each on
+        a disjoint pool of the cores of the process. It needs the runtime extension, i.e., Intel
+        OpenMP preloaded. Default value is ``1``.
+      work_dir (str): Directory to persist the packed weight, scales, zeros and g_idx of each
+        quantized transformer block (``block_<i>.pt``) and the activations propagated through it,
+        so that an interrupted run resumes from the last completed block when called again with
+        the same model, dataset and options. Default value is ``None``, nothing is persisted.
+      offload_activations (bool): Keep the activations of the calib samples in memory-mapped
+        files under ``work_dir`` (or a temporary directory) instead of in memory.
+        Default value is ``False``.
 
     .. warning::
       We only support HuggingFace transformers model structure. If provide user-defined model,
@@ -49,17 +168,17 @@ def _gptq(
       >>> model.eval()
       >>> ipex.quantization._gptq(model, dataset, 'quantized_weight.pt', wbits=4)
     """
-    print("Starting ...")
+    logger.info("Starting ...")
+    start = time.time()
 
     new_model = copy.deepcopy(model)
     new_model = new_model.to(param_dtype)
     model_state = new_model.state_dict()
-    nsamples = len(dataset)
-    quant_meta = {}
 
-    model.seqlen = 2048
-    for sample in dataset:
-        model.seqlen = min(model.seqlen, sample[0].shape[-1])
+    samples = [sample[0] for sample in dataset]
+    model.seqlen = min([2048] + [sample.shape[-1] for sample in samples])
+    input_ids = torch.cat([sample[:, : model.seqlen] for sample in samples])
+    nsamples = input_ids.shape[0]
 
     # Disable kv cache.
     use_cache = model.config.use_cache
@@ -91,8 +210,69 @@ def _gptq(
     # Get transformer blocks module list.
     layers = eval("model." + transformer_name)
     dtype = next(iter(model.parameters())).dtype
-    inps = torch.zeros((nsamples, model.seqlen, model.config.hidden_size), dtype=dtype)
-    cache = {"i": 0}
+    shape = (nsamples, model.seqlen, model.config.hidden_size)
+
+    tmp_dir = None
+    if offload_activations and work_dir is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+    act_dir = work_dir if tmp_dir is None else tmp_dir.name
+    if work_dir is not None:
+        os.makedirs(work_dir, exist_ok=True)
+    progress_path = (
+        None if work_dir is None else os.path.join(work_dir, "progress.json")
+    )
+    # Completed blocks of a previous run are reused only for the same calibration.
+    run_config = {
+        "dataset": hashlib.sha256(input_ids.numpy().tobytes()).hexdigest(),
+        "shape": list(shape),
+        "dtype": str(dtype),
+        "num_layers": len(layers),
+        "wbits": wbits,
+        "perchannel": perchannel,
+        "symmetric": symmetric,
+        "group_size": group_size,
+        "pack_dtype": str(pack_dtype),
+        "param_dtype": str(param_dtype),
+        "offload_activations": offload_activations,
+    }
+    progress = {"config": run_config, "block": 0, "activations": None}
+    if progress_path is not None and os.path.exists(progress_path):
+        with open(progress_path) as f:
+            previous = json.load(f)
+        if previous["config"] == run_config:
+            progress = previous
+            logger.info(
+                "Resuming from block {}/{} in {}.".format(
+                    progress["block"], len(layers), work_dir
+                )
+            )
+        else:
+            logger.warning(
+                "The progress in {} is of another calibration, start over.".format(
+                    work_dir
+                ),
+                _type=WarningType.WrongArgument,
+            )
+    resume_block = progress["block"]
+
+    # The activations in and out of the transformer block, two buffers swapped
+    # after each block.
+    act_files = [None, None]
+    if offload_activations:
+        act_files = [os.path.join(act_dir, "activations_%d.bin" % k) for k in range(2)]
+    if resume_block > 0 and not offload_activations:
+        inps = torch.load(os.path.join(work_dir, progress["activations"]))
+        outs = torch.zeros_like(inps)
+    else:
+        current = 0
+        if resume_block > 0:
+            current = act_files.index(os.path.join(work_dir, progress["activations"]))
+        inps = _activation_buffer(act_files[current], shape, dtype)
+        outs = _activation_buffer(act_files[1 - current], shape, dtype)
+        act_files = [act_files[current], act_files[1 - current]]
+    # The kwargs of the transformer block, e.g., attention mask, per micro-batch.
+    caches = []
+    captured = {"i": 0}
 
     # Catch the input of transformer block.
     class Catcher(nn.Module):
@@ -101,27 +281,38 @@ def _gptq(
             self.module = module
 
         def forward(self, hidden_states, **kwargs):
-            inps[cache["i"]] = hidden_states
-            cache["i"] += 1
-            cache.update(kwargs)
+            # The inputs of the resumed block were persisted, only the kwargs are needed.
+            if resume_block == 0:
+                begin = captured["i"]
+                inps[begin : begin + hidden_states.shape[0]] = hidden_states
+            captured["i"] += hidden_states.shape[0]
+            caches.append(kwargs)
             raise ValueError
 
     layers[0] = Catcher(layers[0])
-    for sample in dataset:
+    for batch in input_ids.split(micro_batch_size):
         try:
-            model(sample[0][:, : model.seqlen])
+            model(batch)
         except ValueError:
             pass
 
     layers[0] = layers[0].module
 
-    outs = torch.zeros_like(inps)
-    del cache["i"]
+    pools = _worker_pools(num_workers)
+    micro_batches = [
+        (slice(k * micro_batch_size, (k + 1) * micro_batch_size), cache)
+        for k, cache in enumerate(caches)
+    ]
 
-    print("Ready.")
+    logger.info(
+        "Ready, captured {} samples in {} micro-batches in {:.2f} s.".format(
+            nsamples, len(caches), time.time() - start
+        )
+    )
 
-    for i in range(len(layers)):
-        print(f"Quantizing layer {i+1}/{len(layers)}..")
+    packed = {}
+    for i in range(resume_block, len(layers)):
+        layer_start = time.time()
 
         layer = layers[i]
         layer_name = names[i]
@@ -147,31 +338,60 @@ def _gptq(
         for name in subset:
             # Hook to obtain input and output of each linear.
             handles.append(subset[name].register_forward_hook(add_batch(name)))
-        for j in range(nsamples):
-            outs[j] = layer(inps[j].unsqueeze(0), **cache)[0]
+        for batch, cache in micro_batches:
+            layer(inps[batch], **cache)
         for h in handles:
             h.remove()
+        forward_time = time.time() - layer_start
 
+        quant_start = time.time()
+        results = _fasterquant(gptq, group_size, pools)
         for name in subset:
-            scales, zeros, _, _ = gptq[name].fasterquant(
-                groupsize=group_size, name=name
-            )
-            quant_meta[transformer_name + ".%d.%s" % (i, name)] = QUANT_META(
-                scales, zeros
+            logger.debug(
+                "{}.{}: error {:.4f}".format(layer_name, name, results[name][3])
             )
             gptq[name].free()
+        quant_time = time.time() - quant_start
+        packed[i] = _pack_block(
+            subset,
+            transformer_name + ".%d" % i,
+            results,
+            wbits,
+            group_size,
+            pack_dtype,
+            param_dtype,
+        )
 
         # We need re-run this block due to linear's weight has been changed.
-        for j in range(nsamples):
-            outs[j] = layer(inps[j].unsqueeze(0), **cache)[0]
+        for batch, cache in micro_batches:
+            outs[batch] = layer(inps[batch], **cache)[0]
 
         del layer
         del gptq
 
         inps, outs = outs, inps
+        act_files = [act_files[1], act_files[0]]
+
+        if work_dir is not None:
+            _save_atomic(packed[i], os.path.join(work_dir, "block_%d.pt" % i))
+            packed[i] = None
+            if offload_activations:
+                progress["activations"] = os.path.relpath(act_files[0], work_dir)
+            else:
+                progress["activations"] = "activations.pt"
+                _save_atomic(inps, os.path.join(work_dir, "activations.pt"))
+            # The progress is updated last, once all the artifacts of the block are persisted.
+            progress["block"] = i + 1
+            _save_atomic(progress, progress_path)
+
+        logger.info(
+            "Quantized layer {}/{} in {:.2f} s (forward {:.2f} s, fasterquant {:.2f} s).".format(
+                i + 1, len(layers), time.time() - layer_start, forward_time, quant_time
+            )
+        )
 
     # Quantize lm head.
-    print("Quantizing lm head..")
+    logger.info("Quantizing lm head..")
 
     lm_head = model.lm_head
     gptq_lmhead = GPTQ(lm_head)
@@ -186,29 +406,24 @@ def _gptq(
         return tmp
 
     lm_head.register_forward_hook(add_batch())
-    for j in range(nsamples):
-        _ = lm_head(inps[j].unsqueeze(0))
+    for batch, _ in micro_batches:
+        lm_head(inps[batch])
 
     scales, zeros, _, _ = gptq_lmhead.fasterquant(groupsize=group_size, name="lm_head")
-    quant_meta["lm_head"] = QUANT_META(scales, zeros)
+    quant_meta = {"lm_head": QUANT_META(scales, zeros)}
 
     model.config.use_cache = use_cache
-    for block in transformer_blocks:
-        for name in transformer_blocks[block]:
-            module = transformer_blocks[block][name]
-            qweight, scales, qzeros = pack_weight(
-                module,
-                quant_meta[name].scales,
-                quant_meta[name].zeros,
-                wbits=wbits,
-                group_size=group_size,
-                pack_dtype=pack_dtype,
-            )
-            del model_state[name + ".weight"]
+    for i in range(len(layers)):
+        if packed.get(i, None) is None:
+            packed[i] = torch.load(os.path.join(work_dir, "block_%d.pt" % i))
+        for key, value in packed[i].items():
+            name, attr = key.rsplit(".", 1)
+            if attr == "g_idx":
+                continue
             # Set model state.
-            model_state[name + ".qweight"] = qweight
-            model_state[name + ".scales"] = scales.to(param_dtype)
-            model_state[name + ".qzeros"] = qzeros
+            model_state.pop(name + ".weight", None)
+            model_state[key] = value
+        packed[i] = None
 
     qweight, scales, qzeros = pack_weight(
         lm_head,
@@ -224,5 +439,15 @@ def _gptq(
     model_state["lm_head.qzeros"] = qzeros
 
     # Save checkpoint.
-    print("Saving checkpoint..")
+    logger.info("Saving checkpoint..")
     torch.save(model_state, quantized_ckpt)
+    del inps, outs
+    if progress_path is not None:
+        # The run is complete, keep the block artifacts only.
+        os.remove(progress_path)
+        for path in [os.path.join(work_dir, "activations.pt")] + act_files:
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+    logger.info("GPTQ quantizing done in {:.2f} s.".format(time.time() - start))
@@ -1,5 +1,4 @@
 # This Python file uses the following encoding: utf-8
-import math
 import time
 
 import torch
@@ -92,12 +91,11 @@ class GPTQ:
             inp = unfold(inp)
             inp = inp.permute([1, 0, 2])
             inp = inp.flatten(1)
-        self.H *= self.nsamples / (self.nsamples + tmp)
+        beta = self.nsamples / (self.nsamples + tmp)
         self.nsamples += tmp
-        # inp = inp.float()
-        inp = math.sqrt(2 / self.nsamples) * inp.float()
-        # self.H += 2 / self.nsamples * inp.matmul(inp.t())
-        self.H += inp.matmul(inp.t())
+        inp = inp.float()
+        # H = beta * H + 2 / nsamples * X XT, one GEMM over all the tokens of the batch
+        self.H.addmm_(inp, inp.t(), beta=beta, alpha=2 / self.nsamples)
 
     def print_loss(self, name, q_weight, weight_error, timecost):
         from texttable import Texttable
@@ -1,4 +1,5 @@
 from ._quantize import prepare, convert
+from ._calibrate import calibrate
 from ._qconfig import (
     default_static_qconfig,
     default_dynamic_qconfig,
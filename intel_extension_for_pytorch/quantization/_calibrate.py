@@ -0,0 +1,458 @@
+import io
+import itertools
+import os
+import time
+import traceback
+from queue import Empty
+from typing import Any, Callable, Dict, List, Optional
+import torch
+import torch.multiprocessing as mp
+from torch.utils.data import DataLoader, IterableDataset, Sampler
+from torch.ao.quantization import (
+    HistogramObserver,
+    MinMaxObserver,
+    MovingAverageMinMaxObserver,
+    MovingAveragePerChannelMinMaxObserver,
+    PerChannelMinMaxObserver,
+    PlaceholderObserver,
+)
+
+from ..utils._logger import logger, WarningType
+from ._quantization_state_utils import set_tensor_info_dtype
+from ._smooth_quant import SmoothQuantActivationObserver, SmoothQuantWeightObserver
+
+
+def _default_run_fn(model, batch):
+    if isinstance(batch, dict):
+        return model(**batch)
+    if isinstance(batch, (tuple, list)):
+        return model(*batch)
+    return model(batch)
+
+
+def _iterate_observers(model):
+    # (key, observer) of all the observers of a prepared model, the key is the
+    # same on the copies of the model
+    for fqn, qstate in model._fqn_to_auto_quant_state_map.items():
+        for tensor_id, observer in qstate.tensor_id_to_observer.items():
+            yield (fqn, "act", tensor_id), observer
+        for tensor_id, observer in qstate.weight_tensor_id_to_observer.items():
+            yield (fqn, "weight", tensor_id), observer
+
+
+def _observer_states(model):
+    states = {}
+    for key, observer in _iterate_observers(model):
+        state = dict(observer.state_dict())
+        # the original weight kept by SmoothQuantWeightObserver to apply the
+        # scaling factors is not a buffer
+        w_orig = getattr(observer, "w_orig", None)
+        if w_orig is not None:
+            state["w_orig"] = w_orig
+        states[key] = state
+    return states
+
+
+def _merge_min_max(observer, min_val, max_val):
+    if min_val.numel() == 0:
+        return
+    if observer.min_val.numel() == 0:
+        # per-channel observer which has not run yet
+        observer.min_val.resize_(min_val.shape)
+        observer.max_val.resize_(max_val.shape)
+        observer.min_val.copy_(min_val)
+        observer.max_val.copy_(max_val)
+        return
+    # min/max are exact, so the result is the same as observing all the batches
+    observer.min_val.copy_(torch.min(observer.min_val, min_val))
+    observer.max_val.copy_(torch.max(observer.max_val, max_val))
+
+
+def _rebin_histogram(histogram, min_val, max_val, edges):
+    # spreads the count of each bin uniformly within the bin, and accumulates
+    # the counts into the bins between the edges
+    bins = histogram.numel()
+    if max_val == min_val:
+        result = torch.zeros(edges.numel() - 1, dtype=histogram.dtype)
+        idx = torch.searchsorted(edges, torch.tensor([min_val]), right=True) - 1
+        result[idx.clamp(0, result.numel() - 1)] = histogram.sum()
+        return result
+    cdf = torch.cat([torch.zeros(1, dtype=histogram.dtype), histogram.cumsum(0)])
+    pos = (edges.clamp(min_val, max_val) - min_val) / (max_val - min_val) * bins
+    lower = pos.floor().clamp(0, bins - 1).long()
+    values = cdf[lower] + (pos - lower) * histogram[lower]
+    return values[1:] - values[:-1]
+
+
+def _merge_histogram(observer, histogram, min_val, max_val):
+    if histogram.sum() == 0:
+        return
+    if observer.histogram.sum() == 0:
+        observer.histogram.resize_(histogram.shape)
+        observer.histogram.copy_(histogram)
+        observer.min_val.copy_(min_val)
+        observer.max_val.copy_(max_val)
+        return
+    new_min = min(observer.min_val.item(), min_val.item())
+    new_max = max(observer.max_val.item(), max_val.item())
+    edges = torch.linspace(new_min, new_max, observer.bins + 1, dtype=torch.float64)
+    merged = _rebin_histogram(
+        observer.histogram.double(),
+        observer.min_val.item(),
+        observer.max_val.item(),
+        edges,
+    ) + _rebin_histogram(histogram.double(), min_val.item(), max_val.item(), edges)
+    observer.histogram.copy_(merged)
+    observer.min_val.fill_(new_min)
+    observer.max_val.fill_(new_max)
+
+
+def _merge_observer(observer, state, prefix=""):
+    r"""
+    Merges the statistics of ``state``, the state of the same observer on a
+    copy of the model, into ``observer``, updating the buffers in place.
+    """
+    if isinstance(observer, SmoothQuantActivationObserver):
+        _merge_observer(observer.act_obs, state, prefix + "act_obs.")
+        _merge_observer(observer.ic_obs, state, prefix + "ic_obs.")
+    elif isinstance(observer, SmoothQuantWeightObserver):
+        _merge_observer(observer.oc_obs, state, prefix + "oc_obs.")
+        _merge_observer(observer.ic_obs, state, prefix + "ic_obs.")
+        if prefix + "w_orig" in state:
+            # the weight is the same on all the copies
+            observer.w_orig = state[prefix + "w_orig"]
+    elif isinstance(observer, PlaceholderObserver):
+        pass
+    elif isinstance(
+        observer, (MovingAverageMinMaxObserver, MovingAveragePerChannelMinMaxObserver)
+    ):
+        raise RuntimeError(
+            "{} depends on the order of the batches and can't be merged".format(
+                type(observer).__name__
+            )
+        )
+    elif isinstance(observer, HistogramObserver):
+        _merge_histogram(
+            observer,
+            state[prefix + "histogram"],
+            state[prefix + "min_val"],
+            state[prefix + "max_val"],
+        )
+    elif isinstance(observer, (MinMaxObserver, PerChannelMinMaxObserver)):
+        _merge_min_max(observer, state[prefix + "min_val"], state[prefix + "max_val"])
+    else:
+        raise RuntimeError(
+            "merging the statistics of {} is not supported".format(
+                type(observer).__name__
+            )
+        )
+
+
+def _sync_tensor_info_dtypes(qstate):
+    # what op_prepare_before_hook and op_prepare_after_hook do on the tensor
+    # infos of a model which runs calibration by itself
+    quantized_dtype = [torch.quint8, torch.qint8]
+    for seen_q_op_info in qstate.idx_to_seen_q_op_infos.values():
+        for i, tensor_info in enumerate(seen_q_op_info.input_tensor_infos):
+            if (
+                tensor_info is None
+                or str(tensor_info.id) not in qstate.tensor_id_to_observer
+            ):
+                continue
+            observer = qstate.tensor_id_to_observer[str(tensor_info.id)]
+            set_tensor_info_dtype(tensor_info, observer)
+            force_dtype = seen_q_op_info.input_tensor_force_inf_dtype[i]
+            if (
+                force_dtype in quantized_dtype
+                and force_dtype != tensor_info.orig_dtype
+                and force_dtype != observer.dtype
+            ):
+                seen_q_op_info.input_tensor_force_inf_dtype[i] = observer.dtype
+        for tensor_info in seen_q_op_info.weight_tensor_infos:
+            if tensor_info is None:
+                continue
+            key = str(seen_q_op_info.idx) + "_" + str(tensor_info.id)
+            if key in qstate.weight_tensor_id_to_observer:
+                set_tensor_info_dtype(
+                    tensor_info, qstate.weight_tensor_id_to_observer[key]
+                )
+        for tensor_info in seen_q_op_info.output_tensor_infos:
+            if str(tensor_info.id) in qstate.tensor_id_to_observer:
+                set_tensor_info_dtype(
+                    tensor_info, qstate.tensor_id_to_observer[str(tensor_info.id)]
+                )
+
+
+# seconds between two checks of the exit codes of the workers
+_WORKER_POLL_INTERVAL = 1.0
+
+
+class _ShardSampler(Sampler):
+    r"""
+    Keeps the indices (or index batches) ``rank, rank + num_workers, ...`` of
+    ``sampler``.
+    """
+
+    def __init__(self, sampler, rank, num_workers):
+        self.sampler = sampler
+        self.rank = rank
+        self.num_workers = num_workers
+
+    def __iter__(self):
+        return itertools.islice(self.sampler, self.rank, None, self.num_workers)
+
+    def __len__(self):
+        return max(0, len(self.sampler) - self.rank + self.num_workers - 1) // (
+            self.num_workers
+        )
+
+
+def _shard_dataset(calib_dataset, rank, num_workers):
+    # returns the batches of the worker, and whether the batches of the other
+    # workers are already left out
+    if num_workers == 1:
+        return calib_dataset, True
+    if isinstance(calib_dataset, (list, tuple)):
+        return calib_dataset[rank::num_workers], True
+    if isinstance(calib_dataset, DataLoader) and not isinstance(
+        calib_dataset.dataset, IterableDataset
+    ):
+        loader = calib_dataset
+        kwargs = {
+            "num_workers": loader.num_workers,
+            "collate_fn": loader.collate_fn,
+            "pin_memory": loader.pin_memory,
+            "timeout": loader.timeout,
+            "worker_init_fn": loader.worker_init_fn,
+        }
+        if loader.batch_sampler is not None:
+            batch_sampler = _ShardSampler(loader.batch_sampler, rank, num_workers)
+            return (
+                DataLoader(loader.dataset, batch_sampler=batch_sampler, **kwargs),
+                True,
+            )
+        sampler = _ShardSampler(loader.sampler, rank, num_workers)
+        return (
+            DataLoader(loader.dataset, batch_size=None, sampler=sampler, **kwargs),
+            True,
+        )
+    return calib_dataset, False
+
+
+def _calibrate_shard(model, calib_dataset, run_fn, rank, num_workers):
+    start = time.time()
+    num_batches = 0
+    batches, sharded = _shard_dataset(calib_dataset, rank, num_workers)
+    with torch.no_grad():
+        for i, batch in enumerate(batches):
+            if sharded or i % num_workers == rank:
+                run_fn(model, batch)
+                num_batches += 1
+    return time.time() - start, num_batches
+
+
+def _gather_results(workers, queue):
+    # a worker killed before it sends its result (e.g., by the OOM killer)
+    # would block queue.get() forever, so the exit codes of the workers are
+    # checked between the polls
+    results = {}
+    exited = []
+    while len(results) < len(workers):
+        try:
+            result = queue.get(timeout=_WORKER_POLL_INTERVAL)
+            results[result[0]] = result
+            continue
+        except Empty:
+            pass
+        # the result of a worker is flushed to the queue before it exits, so
+        # a worker which had exited before the last poll has sent nothing
+        for rank in exited:
+            if rank not in results:
+                for worker in workers:
+                    if worker.exitcode is None:
+                        worker.terminate()
+                    worker.join()
+                raise RuntimeError(
+                    "IPEX calibrate: worker {} exited with code {} ".format(
+                        rank, workers[rank].exitcode
+                    )
+                    + "before sending its statistics"
+                )
+        exited = [
+            rank
+            for rank, worker in enumerate(workers)
+            if rank not in results and worker.exitcode is not None
+        ]
+    return [results[rank] for rank in sorted(results)]
+
+
+def _calibration_worker(
+    rank, num_workers, model, calib_dataset, run_fn, cpu_pool, queue
+):
+    try:
+        core_ids = cpu_pool.core_ids
+        torch.set_num_threads(len(core_ids))
+        os.sched_setaffinity(0, core_ids)
+        from ..cpu.runtime import pin, is_runtime_ext_enabled
+
+        if is_runtime_ext_enabled():
+            with pin(cpu_pool):
+                elapsed, num_batches = _calibrate_shard(
+                    model, calib_dataset, run_fn, rank, num_workers
+                )
+        else:
+            elapsed, num_batches = _calibrate_shard(
+                model, calib_dataset, run_fn, rank, num_workers
+            )
+        # sent as bytes, the worker exits before the tensors would be received
+        # from its shared memory
+        buffer = io.BytesIO()
+        torch.save(_observer_states(model), buffer)
+        queue.put((rank, buffer.getvalue(), elapsed, num_batches, None))
+    except BaseException:
+        queue.put((rank, None, 0.0, 0, traceback.format_exc()))
+
+
+def _default_cpu_pools(num_workers):
+    import intel_extension_for_pytorch as ipex
+    from ..cpu.runtime import CPUPool
+    from ..cpu.runtime.runtime_utils import get_num_nodes
+
+    if num_workers is None:
+        # one worker per socket
+        return [CPUPool(node_id=node_id) for node_id in range(get_num_nodes())]
+    core_ids = ipex._C.get_process_available_cores()
+    assert (
+        len(core_ids) >= num_workers
+    ), "IPEX calibrate: num_workers {} is larger than the {} available cores".format(
+        num_workers, len(core_ids)
+    )
+    chunk = len(core_ids) // num_workers
+    return [
+        CPUPool(core_ids=core_ids[i * chunk : (i + 1) * chunk])
+        for i in range(num_workers)
+    ]
+
+
+def calibrate(
+    model: torch.nn.Module,
+    calib_dataset: Any,
+    run_fn: Optional[Callable] = None,
+    num_workers: Optional[int] = None,
+    cpu_pools: Optional[List[Any]] = None,
+) -> Dict[str, Any]:
+    r"""
+    Runs the calibration of a model prepared for static quantization (including
+    SmoothQuant) data-parallel in several worker processes, and merges the
+    statistics of the observers into the model before ``save_qconf_summary``
+    or ``convert``.
+
+    The workers are forked from the current process, so each one runs its own
+    copy of the prepared model, pinned to its own ``CPUPool``. Worker ``i``
+    runs the batches ``i, i + num_workers, ...`` of ``calib_dataset``. A list
+    or tuple of batches is sliced, and a ``DataLoader`` over a map-style
+    dataset is rebuilt on a sampler keeping the batches of the worker, so each
+    batch is only loaded once. Any other iterable (e.g., a generator or a
+    ``DataLoader`` over an ``IterableDataset``) is iterated in full by every
+    worker, which skips the batches of the others, so its data loading cost is
+    paid ``num_workers`` times. A worker which dies raises a ``RuntimeError``
+    with its rank instead of hanging the calibration. Min/max
+    observers (including the per-channel ones of SmoothQuant) are merged
+    exactly, so the result is bit-identical to running all the batches in one
+    process. Histogram observers are merged by re-binning the histograms into
+    their combined range, which is close to but not the same as the serial
+    calibration. Moving average observers can't be merged.
+
+    Args:
+        model (torch.nn.Module): The model returned by ``prepare`` for static
+            quantization. Its observers are updated in place.
+        calib_dataset (iterable): The calibration batches, e.g., a list or a
+            ``DataLoader``, sharded among the workers as described above.
+        run_fn (callable): ``run_fn(model, batch)`` runs one batch. By default,
+            a tuple/list batch is unpacked as the positional inputs, a dict as
+            the keyword inputs, and other batches are the only input.
+        num_workers (int): Number of worker processes. Ignored if ``cpu_pools``
+            is given. By default, one worker per socket.
+        cpu_pools (list of intel_extension_for_pytorch.cpu.runtime.CPUPool):
+            Disjoint CPU pools of the workers. By default, the cores available
+            to the current process are split evenly among the workers.
+
+    Returns:
+        dict: The wall-clock scaling of the calibration, ``num_workers``,
+        ``num_batches``, ``wall_time`` and ``worker_times`` in seconds,
+        ``serial_time``, the sum of the time of the workers which estimates the
+        time of the calibration in one process, and ``speedup``.
+    """
+    assert hasattr(
+        model, "_fqn_to_auto_quant_state_map"
+    ), "IPEX calibrate: the model should be prepared for static quantization"
+    run_fn = _default_run_fn if run_fn is None else run_fn
+    if cpu_pools is None:
+        cpu_pools = _default_cpu_pools(num_workers)
+    num_workers = len(cpu_pools)
+
+    start = time.time()
+    if num_workers == 1 or "fork" not in mp.get_all_start_methods():
+        if num_workers > 1:
+            logger.warning(
+                "IPEX calibrate: fork is not supported on this platform, "
+                + "run the calibration in the current process",
+                _type=WarningType.NotSupported,
+            )
+        elapsed, num_batches = _calibrate_shard(model, calib_dataset, run_fn, 0, 1)
+        results = [(0, None, elapsed, num_batches, None)]
+    else:
+        ctx = mp.get_context("fork")
+        queue = ctx.Queue()
+        workers = [
+            ctx.Process(
+                target=_calibration_worker,
+                args=(rank, num_workers, model, calib_dataset, run_fn, pool, queue),
+            )
+            for rank, pool in enumerate(cpu_pools)
+        ]
+        for worker in workers:
+            worker.start()
+        # drain the queue before joining, the workers block on large states
+        results = _gather_results(workers, queue)
+        for worker in workers:
+            worker.join()
+        for rank, _, _, _, error in results:
+            if error is not None:
+                raise RuntimeError(
+                    "IPEX calibrate: worker {} failed:\n{}".format(rank, error)
+                )
+        # merge in the order of the ranks, so that the histograms are the same
+        # on every run
+        observers = list(_iterate_observers(model))
+        for _, states, _, _, _ in results:
+            states = torch.load(io.BytesIO(states))
+            merged = set()
+            for key, observer in observers:
+                # the weight observers may be shared by several ops
+                if id(observer) in merged:
+                    continue
+                merged.add(id(observer))
+                _merge_observer(observer, states[key])
+        for qstate in model._fqn_to_auto_quant_state_map.values():
+            _sync_tensor_info_dtypes(qstate)
+    wall_time = time.time() - start
+
+    worker_times = [r[2] for r in results]
+    stats = {
+        "num_workers": num_workers,
+        "num_batches": sum(r[3] for r in results),
+        "wall_time": wall_time,
+        "worker_times": worker_times,
+        "serial_time": sum(worker_times),
+        "speedup": sum(worker_times) / wall_time if wall_time > 0 else 1.0,
+    }
+    logger.info(
+        "IPEX calibrate: {} batches by {} workers in {:.2f} s, ".format(
+            stats["num_batches"], num_workers, wall_time
+        )
+        + "{:.2f} s in one process, {:.2f}x speedup".format(
+            stats["serial_time"], stats["speedup"]
+        )
+    )
+    return stats
@@ -0,0 +1,277 @@
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import torch
+import torch.fx
+from torch.fx.node import map_aggregate
+from torch.nn.utils.rnn import PackedSequence
+from torch.overrides import TorchFunctionMode
+
+from ..utils._logger import logger, WarningType
+from ._utils import get_torch_function_hook_type, HookType
+from ._quantization_state import AutoQuantizationState
+from ._quantization_state_utils import ops_are_related, op_needs_quantization
+from ._quantize_utils import (
+    _nn_sequential_patched_forward,
+    _convert_PackedSequence_to_tuple_lstm,
+    _convert_tuple_to_PackedSequence_lstm,
+)
+
+# The (fqn, call index) of the module which owns a traced node, i.e., the module
+# whose AutoQuantizationState records the op in the interception path.
+_OWNER_META_KEY = "_ipex_calibration_owner"
+
+
+class _CalibrationTracer(torch.fx.Tracer):
+    r"""
+    Traces the prepared model down to the ops the interception path hooks.
+    Modules without an ``AutoQuantizationState`` and the quantizeable modules
+    are kept as leaves, and each node records the module owning it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.owner_stack: List[Tuple[str, int]] = [("", 0)]
+        self.num_calls: Dict[str, int] = {}
+
+    def is_leaf_module(self, m: torch.nn.Module, module_qualified_name: str) -> bool:
+        return "_auto_quant_state" not in m.__dict__ or op_needs_quantization(m)
+
+    def call_module(self, m, forward, args, kwargs):
+        module_qualified_name = self.path_of_module(m)
+        if self.is_leaf_module(m, module_qualified_name):
+            return super().call_module(m, forward, args, kwargs)
+        # the idx of the ops restarts on each call of a module, as
+        # AutoQuantizationState.reset_to_new_call does
+        call_idx = self.num_calls.get(module_qualified_name, 0)
+        self.num_calls[module_qualified_name] = call_idx + 1
+        self.owner_stack.append((module_qualified_name, call_idx))
+        try:
+            return super().call_module(m, forward, args, kwargs)
+        finally:
+            self.owner_stack.pop()
+
+    def create_node(self, kind, target, args, kwargs, name=None, type_expr=None):
+        node = super().create_node(kind, target, args, kwargs, name, type_expr)
+        node.meta[_OWNER_META_KEY] = self.owner_stack[-1]
+        return node
+
+
+class _TorchFunctionRecorder(TorchFunctionMode):
+    r"""
+    Records the torch functions called at the top level, which are the
+    functions the ``__torch_function__`` of the interception proxy sees.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls: List[Tuple[Callable, Tuple[Any, ...], Dict[str, Any]]] = []
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs if kwargs else {}
+        if func.__name__ != "__get__":
+            self.calls.append((func, args, kwargs))
+        return func(*args, **kwargs)
+
+
+def _flatten_tensors(x) -> List[torch.Tensor]:
+    tensors: List[torch.Tensor] = []
+    map_aggregate(
+        x, lambda a: tensors.append(a) if isinstance(a, torch.Tensor) else None
+    )
+    return tensors
+
+
+def _add_has_scalar_tensor_input(func, args) -> bool:
+    # the interception path doesn't quantize torch.add(tensor, scalar)
+    return func in [torch.add, torch.Tensor.add] and any(
+        not isinstance(arg, torch.Tensor) or arg.dim() == 0 for arg in args
+    )
+
+
+class _OpAttributor(torch.fx.Interpreter):
+    r"""
+    Runs the traced graph once and matches each node with the op the
+    interception path recorded for it, in the order the owning
+    ``AutoQuantizationState`` recorded them.
+    """
+
+    def __init__(self, gm: torch.fx.GraphModule, model: torch.nn.Module):
+        super().__init__(gm)
+        self.named_modules = dict(model.named_modules())
+        self.cur_call: Dict[str, int] = {}
+        self.node_to_op: Dict[torch.fx.Node, Tuple[AutoQuantizationState, int, Any]] = (
+            {}
+        )
+
+    def _match(self, node, qstate, op, type_is_module):
+        seen_q_op_info = qstate.idx_to_seen_q_op_infos.get(qstate.idx, None)
+        if seen_q_op_info is None or not ops_are_related(
+            op, seen_q_op_info.type, type_is_module
+        ):
+            raise RuntimeError(
+                "node {} doesn't match the op recorded at idx {} of {}".format(
+                    node.format_node(), qstate.idx, qstate.fqn
+                )
+            )
+        self.node_to_op[node] = (qstate, qstate.idx, op)
+        qstate.mark_cur_op_complete(op)
+
+    def run_node(self, n: torch.fx.Node) -> Any:
+        fqn, call_idx = n.meta.get(_OWNER_META_KEY, ("", 0))
+        owner = self.named_modules[fqn]
+        qstate = owner.__dict__.get("_auto_quant_state", None)
+        if qstate is not None and self.cur_call.get(fqn, None) != call_idx:
+            if fqn in self.cur_call:
+                qstate.validate_is_at_last_seen_idx()
+            qstate.reset_to_new_call()
+            self.cur_call[fqn] = call_idx
+        if qstate is None or n.op not in [
+            "call_module",
+            "call_function",
+            "call_method",
+        ]:
+            return super().run_node(n)
+
+        args, kwargs = self.fetch_args_kwargs_from_env(n)
+        if n.op == "call_module":
+            m = self.fetch_attr(n.target)
+            if qstate.cur_op_needs_hooks(m):
+                self._match(n, qstate, m, True)
+            return self.call_module(n.target, args, kwargs)
+
+        recorder = _TorchFunctionRecorder()
+        with recorder:
+            output = getattr(self, n.op)(n.target, args, kwargs)
+        calls = [
+            (func, func_args, func_kwargs)
+            for func, func_args, func_kwargs in recorder.calls
+            if get_torch_function_hook_type(owner, func) is HookType.OP_HOOKS
+            and not _add_has_scalar_tensor_input(func, func_args)
+        ]
+        if len(calls) == 0:
+            return output
+        func, func_args, func_kwargs = calls[0]
+        node_tensors = _flatten_tensors((args, kwargs))
+        func_tensors = _flatten_tensors((func_args, func_kwargs))
+        # the op can be replaced only if the node is the op itself
+        if (
+            len(calls) > 1
+            or len(node_tensors) != len(func_tensors)
+            or any(a is not b for a, b in zip(node_tensors, func_tensors))
+        ):
+            raise RuntimeError(
+                "node {} runs the quantizeable ops {} inside".format(
+                    n.format_node(), [c[0] for c in calls]
+                )
+            )
+        self._match(n, qstate, func, False)
+        return output
+
+
+class _ObservedOp(torch.nn.Module):
+    r"""
+    A quantizeable op of the calibration module. It runs the observers of the
+    op recorded at ``idx`` of ``qstate`` around the op, as the interception
+    path does, without tracing any other op.
+    """
+
+    def __init__(self, qstate, idx, op, kind, target):
+        super().__init__()
+        self.idx = idx
+        self.kind = kind
+        self.target = target
+        # not registered as submodules, they are owned by the prepared model
+        object.__setattr__(self, "qstate", qstate)
+        object.__setattr__(self, "op", op)
+
+    def _run(self, args, kwargs):
+        if self.kind == "call_module":
+            return self.op(*args, **kwargs)
+        if self.kind == "call_function":
+            return self.target(*args, **kwargs)
+        return getattr(args[0], self.target)(*args[1:], **kwargs)
+
+    def forward(self, *args, **kwargs):
+        qstate = self.qstate
+        # torch.nn.Module __setattr__ has overhead
+        object.__setattr__(qstate, "idx", self.idx)
+        is_lstm_packed_input = isinstance(self.op, torch.nn.LSTM) and isinstance(
+            args[0], PackedSequence
+        )
+        if is_lstm_packed_input:
+            args = _convert_PackedSequence_to_tuple_lstm(args)
+        args, kwargs = qstate.op_prepare_before_hook(self.op, args, kwargs)
+        if is_lstm_packed_input:
+            args = _convert_tuple_to_PackedSequence_lstm(args)
+        output = self._run(args, kwargs)
+        if is_lstm_packed_input:
+            output = _convert_PackedSequence_to_tuple_lstm(output)
+        output = qstate.op_prepare_after_hook(self.op, output, args, [0])
+        if is_lstm_packed_input:
+            output = _convert_tuple_to_PackedSequence_lstm(output)
+        return output
+
+    def extra_repr(self) -> str:
+        return "fqn={}, idx={}, op={}".format(
+            self.qstate.fqn, self.idx, self.qstate.idx_to_seen_q_op_infos[self.idx].type
+        )
+
+
+def build_calibration_module(
+    model: torch.nn.Module,
+    example_inputs: Optional[Tuple[Any]],
+    example_kwarg_inputs: Optional[Dict[Any, Any]],
+) -> Optional[torch.fx.GraphModule]:
+    r"""
+    Builds a hook-free calibration module of a prepared model, whose
+    ``AutoQuantizationState`` have recorded the ops and inserted the
+    observers on the first call.
+
+    The model is traced by FX, and each node of a quantizeable op is matched
+    with the op recorded for it by running the example inputs. The nodes are
+    replaced by ``_ObservedOp`` calling the recorded observers, so calibration
+    runs the other ops natively and updates the same observers as the
+    interception path. Returns None if the model can't be traced or the traced
+    graph doesn't match the recorded ops, e.g., due to dynamic control flow.
+    """
+    qstates = list(model._fqn_to_auto_quant_state_map.values())
+    orig_nn_sequential_forward = torch.nn.Sequential.forward
+    torch.nn.Sequential.forward = _nn_sequential_patched_forward  # type: ignore[assignment]
+    try:
+        tracer = _CalibrationTracer()
+        graph = tracer.trace(model)
+        gm = torch.fx.GraphModule(model, graph, model.__class__.__bases__[0].__name__)
+        placeholders = [n.target for n in graph.nodes if n.op == "placeholder"]
+        bound = inspect.signature(model.forward).bind(
+            *(example_inputs if example_inputs is not None else ()),
+            **(example_kwarg_inputs if example_kwarg_inputs is not None else {}),
+        )
+        bound.apply_defaults()
+        attributor = _OpAttributor(gm, model)
+        with torch.no_grad():
+            attributor.run(*[bound.arguments[p] for p in placeholders])
+        for qstate in qstates:
+            qstate.validate_is_at_last_seen_idx()
+    except Exception as e:
+        logger.warning(
+            "Failed to build the fast calibration module, "
+            + "fall back to the calibration by the interception path due to: {}".format(
+                e
+            ),
+            _type=WarningType.NotSupported,
+        )
+        return None
+    finally:
+        torch.nn.Sequential.forward = orig_nn_sequential_forward  # type: ignore[assignment]
+        for qstate in qstates:
+            qstate.reset_to_new_call()
+
+    for i, (node, (qstate, idx, op)) in enumerate(attributor.node_to_op.items()):
+        name = "_observed_op_{}".format(i)
+        gm.add_submodule(name, _ObservedOp(qstate, idx, op, node.op, node.target))
+        with gm.graph.inserting_before(node):
+            observed = gm.graph.call_module(name, node.args, node.kwargs)
+        node.replace_all_uses_with(observed)
+        gm.graph.erase_node(node)
+    gm.recompile()
+    return gm
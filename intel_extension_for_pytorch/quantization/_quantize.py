@@ -28,6 +28,7 @@ def prepare(
     inplace=False,
     bn_folding=True,
     example_kwarg_inputs=None,
+    fast_calibration=False,
 ):
     r"""
     Prepare an FP32 torch.nn.Module model to do calibration or to convert to quantized model.
@@ -48,6 +49,12 @@ def prepare(
         example_kwarg_inputs (dict):  A dict of example inputs that will be passed to the function while
             running to init quantization state. Only one of this argument or ``example_inputs`` should be
             specified.
+        fast_calibration (bool): Whether to run calibration by a hook-free module for static quantization.
+            The ops and observers are recorded with the example inputs as usual, then the model is traced
+            by ``torch.fx`` into a module calling the observers around the quantizeable ops only, so the
+            calibration runs close to the speed of the FP32 model and produces the same qconf_summary.
+            It falls back to the default calibration with a warning if the model can't be traced,
+            e.g., due to dynamic control flow. The default value is ``False``.
 
     Returns:
         torch.nn.Module
@@ -114,7 +121,13 @@ def prepare(
         assert isinstance(
             example_kwarg_inputs, Dict
         ), "IPEX quantization.prepare: example_kwarg_inputs must be type of Dict."
-    return auto_prepare(prepare_model, configure, example_inputs, example_kwarg_inputs)
+    return auto_prepare(
+        prepare_model,
+        configure,
+        example_inputs,
+        example_kwarg_inputs,
+        fast_calibration,
+    )
 
 
 def _may_insert_deepspeed_modules(
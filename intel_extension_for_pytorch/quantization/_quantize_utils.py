@@ -75,6 +75,7 @@ def auto_prepare(
     configure: QConfig,
     example_inputs: Optional[Tuple[Any]],
     example_kwarg_inputs: Optional[Dict[Any, Any]],
+    fast_calibration: bool = False,
 ) -> torch.nn.Module:
     def convert_to_interception_proxy(x):
         if isinstance(x, torch.Tensor):
@@ -271,6 +272,9 @@ def auto_prepare(
         """
 
         def __call__(self, *args, **kwargs):
+            if "_calibration_module" in self.__dict__:
+                # hook-free calibration module built after the first call
+                return self.__dict__["_calibration_module"](*args, **kwargs)
             new_args = map_aggregate(args, convert_to_interception_proxy)
             new_kwargs = map_aggregate(kwargs, convert_to_interception_proxy)
             orig_module_call = torch.nn.Module.__call__
@@ -503,11 +507,22 @@ def auto_prepare(
                 "IPEX quantization.prepare: example_inputs and example_kwarg_inputs cannot be set at same time "
                 "for static quantization.",
             )
+        if fast_calibration:
+            from ._fast_calibration import build_calibration_module
+
+            calibration_module = build_calibration_module(
+                model, example_inputs, example_kwarg_inputs
+            )
+            if calibration_module is not None:
+                # not registered as a submodule to keep the state_dict unchanged
+                model.__dict__["_calibration_module"] = calibration_module
     return model
 
 
 def copy_prepared_model(model):
     copied_model = copy.deepcopy(model)
+    # the calibration module refers to the quant states of the original model
+    copied_model.__dict__.pop("_calibration_module", None)
     copied_model.q_config = model.q_config
     if isinstance(copied_model.q_config.activation(), PlaceholderObserver):
         return copied_model
@@ -782,6 +797,7 @@ def auto_convert(
                 v.weight_tensor_id_to_observer.clear()
 
     # Attach quant_info to parent each module
+    module.__dict__.pop("_calibration_module", None)
     attach_op_convert_info_to_model(module)
     swap_child_modules(module)
     module.__class__ = QuantizationDispatchModule
@@ -9,6 +9,9 @@ if has_cpu():
         shard_lm_head_weights,
         shard_mha_weights,
         shard_mlp_weights,
+        shard_moe_weights,
+        shard_model_weights,
+        get_heads_info,
         update_heads_info,
         TensorParallelColumnLinear,
         TensorParallelRowLinear,
@@ -0,0 +1,494 @@
+import torch
+from torch import nn
+import time
+from typing import Optional, Union, List
+from transformers.generation.stopping_criteria import StoppingCriteriaList
+from transformers.generation.logits_process import LogitsProcessorList
+from transformers.generation.streamers import BaseStreamer
+from ...utils._logger import logger
+from .greedy_search import _greedy_search, GreedySearchDecoderOnlyOutput
+from .sample import SampleDecoderOnlyOutput
+from .utils import (
+    _get_iakv_cache_manager,
+    _get_iakv_cache_max_length,
+    _rewind_iakv_cache,
+)
+
+# decoder-only backbones whose IPEX-optimized forward can take several new
+# tokens on top of the IAKV cache
+_ASSISTED_DECODING_BACKBONES = [
+    "GPTJForCausalLM",
+    "LlamaForCausalLM",
+    "GPTNeoXForCausalLM",
+    "OPTForCausalLM",
+    "FalconForCausalLM",
+    "RWForCausalLM",
+    "BloomForCausalLM",
+    "CodeGenForCausalLM",
+    "BaichuanForCausalLM",
+    "ChatGLMModel",
+    "GPTBigCodeForCausalLM",
+    "MistralForCausalLM",
+    "MixtralForCausalLM",
+    "MptForCausalLM",
+    "StableLmForCausalLM",
+    "QWenLMHeadModel",
+    "PhiForCausalLM",
+    "Phi3ForCausalLM",
+]
+
+
+def _uses_iakv(model):
+    return (
+        model is not None
+        and hasattr(model, "config")
+        and getattr(model.config, "architectures", None) is not None
+        and model.config.architectures[0] in _ASSISTED_DECODING_BACKBONES
+        and getattr(getattr(model, "greedy_search", None), "__func__", None)
+        is _greedy_search
+    )
+
+
+def _get_num_hidden_layers(config):
+    for name in ["n_layer", "num_hidden_layers", "num_layers", "n_layers"]:
+        if hasattr(config, name):
+            return getattr(config, name)
+
+
+class _SpeculativeDecodingStats:
+    r"""
+    Acceptance and throughput counters of an assisted generate() call.
+    """
+
+    def __init__(self):
+        self.draft_tokens = 0
+        self.accepted_tokens = 0
+        self.steps = 0
+        self.new_tokens = 0
+        self.elapsed = 0.0
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted_tokens / self.draft_tokens if self.draft_tokens else 0.0
+
+    @property
+    def tokens_per_step(self):
+        return self.new_tokens / self.steps if self.steps else 0.0
+
+    @property
+    def tokens_per_second(self):
+        return self.new_tokens / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return (
+            "accepted {}/{} draft tokens (acceptance rate {:.2f}), "
+            "{:.2f} tokens per target forward, {} tokens in {:.3f} s ({:.2f} tokens/s)"
+        ).format(
+            self.accepted_tokens,
+            self.draft_tokens,
+            self.acceptance_rate,
+            self.tokens_per_step,
+            self.new_tokens,
+            self.elapsed,
+            self.tokens_per_second,
+        )
+
+
+class _IAKVForward:
+    r"""
+    Runs an IPEX-optimized decoder-only model over the tokens of ``input_ids``
+    that are not in its IAKV cache yet, and returns the logits of them. Tokens
+    are dropped from the cache by rewinding seq_info and beam_idx, the
+    key/value buffers are never copied.
+    """
+
+    def __init__(self, model, attention_mask, max_length):
+        self.model = model
+        self.attention_mask = attention_mask
+        self.max_length = max_length
+        self.kv_cache_manager = _get_iakv_cache_manager(model)
+        self.past_key_values = None
+
+    @property
+    def cache_length(self):
+        if self.past_key_values is None:
+            return 0
+        return self.past_key_values[0][0].size(-2)
+
+    def rewind(self, length):
+        if self.past_key_values is not None and length < self.cache_length:
+            self.past_key_values = _rewind_iakv_cache(self.past_key_values, length)
+
+    def release(self):
+        self.kv_cache_manager.release(self.past_key_values)
+        self.past_key_values = None
+
+    def __call__(self, input_ids):
+        model = self.model
+        first_token = self.past_key_values is None
+        cache_length = self.cache_length
+        attention_mask = self.attention_mask
+        if attention_mask.shape[-1] < input_ids.shape[-1]:
+            attention_mask = torch.cat(
+                [
+                    attention_mask,
+                    attention_mask.new_ones(
+                        (
+                            attention_mask.shape[0],
+                            input_ids.shape[-1] - attention_mask.shape[-1],
+                        )
+                    ),
+                ],
+                dim=-1,
+            )
+        model_inputs = model.prepare_inputs_for_generation(
+            input_ids,
+            past_key_values=self.past_key_values,
+            attention_mask=attention_mask,
+            use_cache=True,
+        )
+        if first_token:
+            beam_idx_tmp = self.kv_cache_manager.new_beam_idx(
+                int(input_ids.shape[0]), self.max_length
+            )
+            model_inputs["past_key_values"] = (
+                self.kv_cache_manager.init_past_key_values(
+                    _get_num_hidden_layers(model.config), beam_idx_tmp
+                )
+            )
+        else:
+            # prepare_inputs_for_generation of some models only keeps the last
+            # token once there is a cache
+            model_inputs["input_ids"] = input_ids[:, cache_length:]
+            if model_inputs.get("position_ids", None) is not None:
+                position_ids = attention_mask.long().cumsum(-1) - 1
+                position_ids.masked_fill_(attention_mask == 0, 1)
+                model_inputs["position_ids"] = position_ids[:, cache_length:]
+        if hasattr(model, "trace_graph"):
+            model_inputs.pop("use_cache", None)
+            model_inputs.pop("token_type_ids", None)
+            if "return_last_logit" in model_inputs:
+                model_inputs["return_last_logit"] = torch.tensor(first_token)
+            if first_token and hasattr(model, "trace_graph_first"):
+                outputs = model.trace_graph_first(**model_inputs)
+            else:
+                outputs = model.trace_graph(**model_inputs)
+        else:
+            # the logits of all the new tokens are needed to verify the draft
+            lm_head_generation = getattr(model.config, "lm_head_generation", None)
+            if lm_head_generation is not None:
+                model.config.lm_head_generation = first_token and lm_head_generation
+            try:
+                outputs = model(**model_inputs, return_dict=True)
+            finally:
+                if lm_head_generation is not None:
+                    model.config.lm_head_generation = lm_head_generation
+        if isinstance(outputs, dict):
+            logits, self.past_key_values = outputs.logits, outputs.past_key_values
+        else:
+            logits, self.past_key_values = outputs[0], outputs[1]
+        return logits
+
+
+def _assisted_decoding(
+    self,
+    input_ids: torch.LongTensor,
+    assistant_model: Optional["PreTrainedModel"] = None,  # noqa: F821
+    candidate_generator: Optional["CandidateGenerator"] = None,  # noqa: F821
+    do_sample: bool = False,
+    logits_processor: Optional[LogitsProcessorList] = None,
+    logits_warper: Optional[LogitsProcessorList] = None,
+    stopping_criteria: Optional[StoppingCriteriaList] = None,
+    pad_token_id: Optional[int] = None,
+    eos_token_id: Optional[Union[int, List[int]]] = None,
+    output_attentions: Optional[bool] = None,
+    output_hidden_states: Optional[bool] = None,
+    output_scores: Optional[bool] = None,
+    return_dict_in_generate: Optional[bool] = None,
+    synced_gpus: Optional[bool] = False,
+    streamer: Optional["BaseStreamer"] = None,
+    **model_kwargs,
+):
+    r"""
+    Speculative decoding for IPEX-optimized models. The draft model (the
+    assistant model of HF generate(), or another candidate generator such as
+    prompt lookup) proposes the next tokens, and the target model verifies all
+    of them in a single multi-token forward over its IAKV cache. The cache
+    entries of the rejected tokens are dropped by rewinding seq_info and
+    beam_idx of both models. Falls back to the HF implementation when either
+    model is not IPEX-optimized or the request is not supported (batch size >
+    1, attentions or hidden states in the output, synced GPUs).
+    """
+    draft_model = (
+        assistant_model
+        if assistant_model is not None
+        else getattr(candidate_generator, "assistant_model", None)
+    )
+    if (
+        not _uses_iakv(self)
+        or (draft_model is not None and not _uses_iakv(draft_model))
+        or (draft_model is None and candidate_generator is None)
+        or input_ids.shape[0] != 1
+        or output_attentions
+        or output_hidden_states
+        or synced_gpus
+    ):
+        from transformers.generation.utils import GenerationMixin
+
+        return GenerationMixin.assisted_decoding(
+            self,
+            input_ids,
+            assistant_model=assistant_model,
+            candidate_generator=candidate_generator,
+            do_sample=do_sample,
+            logits_processor=logits_processor,
+            logits_warper=logits_warper,
+            stopping_criteria=stopping_criteria,
+            pad_token_id=pad_token_id,
+            eos_token_id=eos_token_id,
+            output_attentions=output_attentions,
+            output_hidden_states=output_hidden_states,
+            output_scores=output_scores,
+            return_dict_in_generate=return_dict_in_generate,
+            synced_gpus=synced_gpus,
+            streamer=streamer,
+            **model_kwargs,
+        )
+    token_latency = (
+        self.config.token_latency if hasattr(self.config, "token_latency") else False
+    )
+    latency_list = []
+    model_kwargs.pop("output_logits", None)
+    logits_processor = (
+        logits_processor if logits_processor is not None else LogitsProcessorList()
+    )
+    logits_warper = (
+        logits_warper if logits_warper is not None else LogitsProcessorList()
+    )
+    stopping_criteria = (
+        stopping_criteria if stopping_criteria is not None else StoppingCriteriaList()
+    )
+    pad_token_id = (
+        pad_token_id
+        if pad_token_id is not None
+        else self.generation_config.pad_token_id
+    )
+    eos_token_id = (
+        eos_token_id
+        if eos_token_id is not None
+        else self.generation_config.eos_token_id
+    )
+    if eos_token_id is not None and pad_token_id is None:
+        raise ValueError(
+            "If `eos_token_id` is defined, make sure that `pad_token_id` is defined."
+        )
+    if isinstance(eos_token_id, int):
+        eos_token_id = [eos_token_id]
+    eos_token_id_tensor = (
+        torch.tensor(eos_token_id).to(input_ids.device)
+        if eos_token_id is not None
+        else None
+    )
+    output_scores = (
+        output_scores
+        if output_scores is not None
+        else self.generation_config.output_scores
+    )
+    return_dict_in_generate = (
+        return_dict_in_generate
+        if return_dict_in_generate is not None
+        else self.generation_config.return_dict_in_generate
+    )
+    scores = () if (return_dict_in_generate and output_scores) else None
+
+    def is_eos(tokens):
+        if eos_token_id_tensor is None:
+            return False
+        return bool(torch.isin(tokens, eos_token_id_tensor).any())
+
+    def select_tokens(token_scores):
+        if do_sample:
+            probs = nn.functional.softmax(token_scores, dim=-1)
+            return torch.multinomial(probs, num_samples=1).squeeze(1)
+        return torch.argmax(token_scores, dim=-1)
+
+    if draft_model is not None:
+        num_draft_tokens = (
+            candidate_generator.num_assistant_tokens
+            if hasattr(candidate_generator, "num_assistant_tokens")
+            else draft_model.generation_config.num_assistant_tokens
+        )
+    kv_cache_max_length = _get_iakv_cache_max_length(self, input_ids, stopping_criteria)
+    max_length = getattr(stopping_criteria, "max_length", None)
+    if max_length is None:
+        max_length = kv_cache_max_length
+    attention_mask = model_kwargs.get("attention_mask", None)
+    if attention_mask is None:
+        attention_mask = torch.ones_like(input_ids)
+    target = _IAKVForward(self, attention_mask, kv_cache_max_length)
+    draft = (
+        _IAKVForward(draft_model, attention_mask, kv_cache_max_length)
+        if draft_model is not None
+        else None
+    )
+    stats = _SpeculativeDecodingStats()
+
+    # the target model processes the prompt and picks the first new token,
+    # after that its cache always holds all the tokens but the last one
+    tic = time.time()
+    start = tic
+    next_token_scores = target(input_ids)[:, -1, :]
+    next_token_scores = logits_processor(input_ids, next_token_scores)
+    if do_sample:
+        next_token_scores = logits_warper(input_ids, next_token_scores)
+    next_tokens = select_tokens(next_token_scores)
+    if scores is not None:
+        scores += (next_token_scores,)
+    input_ids = torch.cat([input_ids, next_tokens[:, None]], dim=-1)
+    if streamer is not None:
+        streamer.put(next_tokens.cpu())
+    stats.new_tokens += 1
+    latency_list.append(time.time() - tic)
+    finished = is_eos(next_tokens) or stopping_criteria(input_ids, scores)
+
+    while not finished:
+        tic = time.time()
+        cur_len = input_ids.shape[-1]
+
+        # 1. propose the draft tokens, no more than max_length - 1 so that the
+        # target model can add one token on top of them
+        candidate_logits = None
+        if draft is not None:
+            candidate_ids = input_ids
+            candidate_logits = []
+            for _ in range(min(int(num_draft_tokens), max_length - cur_len - 1)):
+                draft_scores = draft(candidate_ids)[:, -1, :]
+                draft_scores = logits_processor(candidate_ids, draft_scores)
+                if do_sample:
+                    draft_scores = logits_warper(candidate_ids, draft_scores)
+                draft_tokens = select_tokens(draft_scores)
+                candidate_logits.append(draft_scores)
+                candidate_ids = torch.cat(
+                    [candidate_ids, draft_tokens[:, None]], dim=-1
+                )
+                if is_eos(draft_tokens):
+                    break
+            candidate_logits = (
+                torch.stack(candidate_logits, dim=1) if candidate_logits else None
+            )
+        else:
+            candidate_ids, candidate_logits = candidate_generator.get_candidates(
+                input_ids
+            )
+            candidate_ids = candidate_ids[:, : max_length - 1]
+            if candidate_logits is not None:
+                candidate_logits = candidate_logits[
+                    :, : candidate_ids.shape[-1] - cur_len
+                ]
+        candidate_length = candidate_ids.shape[-1] - cur_len
+        candidate_tokens = candidate_ids[:, cur_len:]
+
+        # 2. verify the last token and all the draft tokens in one forward
+        new_logits = target(candidate_ids)[:, -candidate_length - 1 :, :]
+        new_logits = new_logits.to(torch.float32)
+        for i in range(candidate_length + 1):
+            new_logits[:, i, :] = logits_processor(
+                candidate_ids[:, : cur_len + i], new_logits[:, i, :]
+            )
+            if do_sample:
+                new_logits[:, i, :] = logits_warper(
+                    candidate_ids[:, : cur_len + i], new_logits[:, i, :]
+                )
+
+        # 3. keep the draft tokens until the first rejected one, plus the token
+        # of the target model after them
+        if do_sample and candidate_logits is not None and candidate_length > 0:
+            # speculative sampling (https://arxiv.org/pdf/2211.17192.pdf)
+            p = nn.functional.softmax(new_logits, dim=-1)
+            q = nn.functional.softmax(candidate_logits.to(torch.float32), dim=-1)
+            positions = torch.arange(candidate_length)
+            p_i = p[0, positions, candidate_tokens[0]]
+            q_i = q[0, positions, candidate_tokens[0]]
+            is_accepted = torch.rand_like(p_i) <= p_i / q_i
+            n_matches = int(((~is_accepted).cumsum(dim=-1) < 1).sum())
+            if n_matches < candidate_length:
+                p_prime = torch.clamp(p[:, n_matches] - q[:, n_matches], min=0)
+                p_prime.div_(p_prime.sum())
+            else:
+                p_prime = p[:, n_matches]
+            selected_tokens = torch.cat(
+                [
+                    candidate_tokens[:, :n_matches],
+                    torch.multinomial(p_prime, num_samples=1),
+                ],
+                dim=-1,
+            )
+        else:
+            if do_sample:
+                selected_tokens = torch.multinomial(
+                    nn.functional.softmax(new_logits[0], dim=-1), num_samples=1
+                ).view(1, -1)
+            else:
+                selected_tokens = new_logits.argmax(dim=-1)
+            n_matches = int(
+                (
+                    (~(candidate_tokens == selected_tokens[:, :-1])).cumsum(dim=-1) < 1
+                ).sum()
+            )
+        # do not generate beyond the eos token or max_length
+        if n_matches == candidate_length and is_eos(candidate_tokens[:, -1:]):
+            n_matches -= 1
+        n_matches = min(n_matches, max_length - cur_len - 1)
+        valid_tokens = selected_tokens[:, : n_matches + 1]
+
+        # 4. append the valid tokens and drop the rejected ones from the caches
+        input_ids = torch.cat([input_ids, valid_tokens], dim=-1)
+        new_cur_len = input_ids.shape[-1]
+        target.rewind(new_cur_len - 1)
+        if draft is not None:
+            draft.rewind(min(draft.cache_length, cur_len + n_matches))
+        if hasattr(candidate_generator, "update_candidate_strategy"):
+            candidate_generator.update_candidate_strategy(
+                input_ids, new_logits, n_matches
+            )
+            if draft is not None and hasattr(
+                candidate_generator, "num_assistant_tokens"
+            ):
+                num_draft_tokens = candidate_generator.num_assistant_tokens
+        if streamer is not None:
+            streamer.put(valid_tokens.cpu())
+        if scores is not None:
+            scores += tuple(new_logits[:, i, :] for i in range(n_matches + 1))
+
+        stats.steps += 1
+        stats.draft_tokens += candidate_length
+        stats.accepted_tokens += n_matches
+        stats.new_tokens += valid_tokens.shape[-1]
+        step_latency = time.time() - tic
+        latency_list.extend(
+            [step_latency / valid_tokens.shape[-1]] * valid_tokens.shape[-1]
+        )
+        finished = is_eos(input_ids[:, -1]) or stopping_criteria(input_ids, scores)
+
+    stats.elapsed = time.time() - start
+    self._ipex_assisted_decoding_stats = stats
+    logger.info("assisted decoding: {}".format(stats))
+    target.release()
+    if draft is not None:
+        draft.release()
+
+    if streamer is not None:
+        streamer.end()
+
+    if return_dict_in_generate:
+        output_class = (
+            SampleDecoderOnlyOutput if do_sample else GreedySearchDecoderOnlyOutput
+        )
+        output_result = output_class(sequences=input_ids, scores=scores)
+    else:
+        output_result = input_ids
+
+    if token_latency:
+        return (output_result, latency_list)
+    else:
+        return output_result
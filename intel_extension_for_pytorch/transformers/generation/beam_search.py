@@ -10,6 +10,7 @@ from transformers.generation.stopping_criteria import (
 from transformers.generation.logits_process import LogitsProcessorList
 from transformers.generation.beam_search import BeamScorer
 from transformers.utils import ModelOutput
+from .utils import _get_iakv_cache_manager, _get_iakv_cache_max_length
 import time
 
 
@@ -153,6 +154,8 @@ def _beam_search(
     beam_scores[:, 1:] = -1e9
     beam_scores = beam_scores.view((batch_size * num_beams,))
     this_peer_finished = False  # used by synced_gpus only
+    kv_cache_manager = _get_iakv_cache_manager(self)
+    kv_cache_max_length = _get_iakv_cache_max_length(self, input_ids, stopping_criteria)
     while True:
         tic = time.time()
         if synced_gpus:
@@ -200,9 +203,9 @@ def _beam_search(
                 first_token = True
                 if self.model_backbone == "T5ForConditionalGeneration":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = kv_cache_manager.new_beam_idx(
+                        int(batch_size * num_beams), kv_cache_max_length
+                    )
                     model_inputs["past_key_values"] = tuple(
                         [
                             (
@@ -250,9 +253,9 @@ def _beam_search(
                     )
                 elif self.model_backbone == "GitForCausalLM":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = kv_cache_manager.new_beam_idx(
+                        int(batch_size * num_beams), kv_cache_max_length
+                    )
                     num_head = self.git.encoder.layer[
                         0
                     ].attention.self.num_attention_heads
@@ -283,19 +286,11 @@ def _beam_search(
                     num_hidden_layers = self.config.num_layers
                 elif hasattr(self.config, "n_layers"):
                     num_hidden_layers = self.config.n_layers
-                beam_idx_tmp = torch.zeros(
-                    (2048, int(batch_size * num_beams)), dtype=torch.long
-                ).contiguous()
-                model_inputs["past_key_values"] = tuple(
-                    [
-                        (
-                            torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                            torch.zeros([1, 1, 1, 1]).contiguous(),
-                            torch.zeros([1, 1, 1, 1]).contiguous(),
-                            beam_idx_tmp,
-                        )
-                        for i in range(num_hidden_layers)
-                    ]
+                beam_idx_tmp = kv_cache_manager.new_beam_idx(
+                    int(batch_size * num_beams), kv_cache_max_length
+                )
+                model_inputs["past_key_values"] = kv_cache_manager.init_past_key_values(
+                    num_hidden_layers, beam_idx_tmp
                 )
                 new_attention_mask = model_inputs["attention_mask"][:batch_size].clone()
                 new_input_ids = model_inputs["input_ids"][:batch_size].clone()
@@ -458,6 +453,8 @@ def _beam_search(
             else:
                 this_peer_finished = True
 
+    kv_cache_manager.release(model_kwargs.get("past_key_values", None))
+
     sequence_outputs = beam_scorer.finalize(
         input_ids,
         beam_scores,
@@ -10,6 +10,7 @@ from transformers.generation.stopping_criteria import (
 from transformers.generation.logits_process import LogitsProcessorList
 from transformers.generation.streamers import BaseStreamer
 from transformers.utils import ModelOutput
+from .utils import _get_iakv_cache_manager, _get_iakv_cache_max_length
 import time
 
 
@@ -138,6 +139,8 @@ def _sample(
 
     this_peer_finished = False  # used by synced_gpus only
     # auto-regressive generation
+    kv_cache_manager = _get_iakv_cache_manager(self)
+    kv_cache_max_length = _get_iakv_cache_max_length(self, input_ids, stopping_criteria)
     while True:
         tic = time.time()
         if synced_gpus:
@@ -187,9 +190,9 @@ def _sample(
                 first_token = True
                 if self.model_backbone == "T5ForConditionalGeneration":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(input_bs)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = kv_cache_manager.new_beam_idx(
+                        int(input_bs), kv_cache_max_length
+                    )
                     model_inputs["past_key_values"] = tuple(
                         [
                             (
@@ -244,9 +247,9 @@ def _sample(
                     num_hidden_layers = self.config.num_layers
                 elif hasattr(self.config, "n_layers"):
                     num_hidden_layers = self.config.n_layers
-                beam_idx_tmp = torch.zeros(
-                    (2048, int(input_bs)), dtype=torch.long
-                ).contiguous()
+                beam_idx_tmp = kv_cache_manager.new_beam_idx(
+                    int(input_bs), kv_cache_max_length
+                )
                 if self.model_backbone == "GitForCausalLM":
                     num_head = self.git.encoder.layer[
                         0
@@ -270,16 +273,10 @@ def _sample(
                         ]
                     )
                 else:
-                    model_inputs["past_key_values"] = tuple(
-                        [
-                            (
-                                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                torch.zeros([1, 1, 1, 1]).contiguous(),
-                                beam_idx_tmp,
-                            )
-                            for i in range(num_hidden_layers)
-                        ]
+                    model_inputs["past_key_values"] = (
+                        kv_cache_manager.init_past_key_values(
+                            num_hidden_layers, beam_idx_tmp
+                        )
                     )
             if self.model_backbone == "LlavaLlamaForCausalLM" and hasattr(
                 self, "prepare_inputs_labels_for_multimodal"
@@ -393,6 +390,8 @@ def _sample(
         if this_peer_finished and not synced_gpus:
             break
 
+    kv_cache_manager.release(model_kwargs.get("past_key_values", None))
+
     if streamer is not None:
         streamer.end()
 
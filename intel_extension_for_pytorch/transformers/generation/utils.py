@@ -1,3 +1,5 @@
+import torch
+from ...utils._logger import logger
 from transformers.utils import ModelOutput
 
 
@@ -22,3 +24,121 @@ def _extract_past_from_model_output(
             past_key_values, batch_size=batch_size
         )
     return past_key_values
+
+
+def _is_iakv_cache(past_key_values):
+    return isinstance(past_key_values, (tuple, list)) and all(
+        isinstance(layer_past, (tuple, list))
+        and len(layer_past) >= 4
+        and isinstance(layer_past[3], torch.Tensor)
+        and layer_past[3].dtype == torch.long
+        and layer_past[3].dim() == 2
+        for layer_past in past_key_values
+    )
+
+
+def _rewind_iakv_cache(past_key_values, length):
+    r"""
+    Drops the tokens after ``length`` from the IAKV cache without copying the
+    key/value buffers: seq_info is replaced by a placeholder of the new length,
+    so the next forward overwrites the dropped entries, and the beam_idx rows
+    of the dropped tokens are reset to the initial beam mapping.
+    """
+    seq_info = torch.empty(1, length, length, 1, dtype=torch.long).contiguous()
+    rewound = []
+    for layer_past in past_key_values:
+        layer_past[3][length:] = layer_past[3][0]
+        rewound.append((seq_info,) + tuple(layer_past[1:]))
+    return tuple(rewound)
+
+
+class _IAKVCacheManager:
+    r"""
+    Manages the buffers of the indirect access KV cache (IAKV) used by the
+    IPEX-optimized models in generate().
+
+    The first dim of the beam_idx placeholder passed at the first token tells
+    the masked MHA kernel how many tokens to allocate key/value caches for, so
+    it is sized from the prompt length plus max_new_tokens. When a request
+    outgrows it, the kernel doubles the caches. If ``pool_size`` > 0, the
+    key/value buffers of finished requests are kept and handed back to the
+    kernel by the next requests of the same batch size, which reuses them
+    instead of allocating new ones when they are large enough.
+
+    Args:
+        pool_size (int): max number of batch sizes whose buffers are kept.
+    """
+
+    def __init__(self, pool_size=0):
+        self.pool_size = pool_size
+        self.pool = {}
+        self.peak_memory = 0
+
+    def new_beam_idx(self, beam_batch, max_length):
+        return torch.zeros((max_length, beam_batch), dtype=torch.long).contiguous()
+
+    def init_past_key_values(self, num_layers, beam_idx):
+        buffers = self.pool.pop(beam_idx.size(1), None)
+        if buffers is None or len(buffers) != num_layers:
+            buffers = [
+                (
+                    torch.zeros([1, 1, 1, 1]).contiguous(),
+                    torch.zeros([1, 1, 1, 1]).contiguous(),
+                )
+                for _ in range(num_layers)
+            ]
+        return tuple(
+            [
+                (
+                    torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
+                    key_cache,
+                    value_cache,
+                    beam_idx,
+                )
+                for key_cache, value_cache in buffers
+            ]
+        )
+
+    def release(self, past_key_values):
+        r"""
+        Records the KV cache memory of the finished request and keeps its
+        buffers for the next requests.
+        """
+        if not _is_iakv_cache(past_key_values):
+            return
+        self.peak_memory = sum(
+            layer_past[i].numel() * layer_past[i].element_size()
+            for layer_past in past_key_values
+            for i in (1, 2, 3)
+        )
+        logger.info(
+            "peak KV cache memory of the request: {:.2f} MB".format(
+                self.peak_memory / 1024**2
+            )
+        )
+        if self.pool_size <= 0:
+            return
+        beam_batch = past_key_values[0][3].size(1)
+        self.pool.pop(beam_batch, None)
+        if len(self.pool) >= self.pool_size:
+            self.pool.pop(next(iter(self.pool)))
+        self.pool[beam_batch] = [
+            (layer_past[1], layer_past[2]) for layer_past in past_key_values
+        ]
+
+
+def _get_iakv_cache_manager(self):
+    if not hasattr(self, "_ipex_iakv_cache_manager"):
+        self._ipex_iakv_cache_manager = _IAKVCacheManager(
+            self.config.kv_cache_pool_size
+            if hasattr(self.config, "kv_cache_pool_size")
+            else 0
+        )
+    return self._ipex_iakv_cache_manager
+
+
+def _get_iakv_cache_max_length(self, input_ids, stopping_criteria):
+    max_length = getattr(stopping_criteria, "max_length", None)
+    if max_length is None:
+        max_length = self.generation_config.max_length
+    return max(int(max_length), input_ids.shape[-1] + 1)
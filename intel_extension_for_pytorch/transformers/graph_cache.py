@@ -0,0 +1,245 @@
+import contextlib
+import enum
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import time
+import torch
+import torch.distributed as dist
+from ..utils._logger import logger
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+def _tensor_fingerprint(t):
+    # shape, dtype and a strided sample of the values, cheap enough to run on
+    # every start even for the weights of large models
+    fingerprint = [list(t.shape), str(t.dtype)]
+    if t.device.type != "meta" and t.numel() > 0 and not t.is_quantized:
+        flat = t.detach().reshape(-1)
+        sample = flat[:: max(1, flat.numel() // 64)][:64]
+        fingerprint.append(sample.float().tolist())
+    return fingerprint
+
+
+def _inputs_fingerprint(x):
+    if isinstance(x, torch.Tensor):
+        return [list(x.shape), str(x.dtype)]
+    if isinstance(x, (list, tuple)):
+        return [_inputs_fingerprint(i) for i in x]
+    if isinstance(x, dict):
+        return {k: _inputs_fingerprint(v) for k, v in sorted(x.items())}
+    return repr(x)
+
+
+def _checkpoint_fingerprint(x):
+    if isinstance(x, torch.Tensor):
+        return _tensor_fingerprint(x)
+    if isinstance(x, str) and os.path.exists(x):
+        # path of a checkpoint read lazily, the names, sizes and mtimes of its files
+        files = (
+            [os.path.join(x, f) for f in sorted(os.listdir(x))]
+            if os.path.isdir(x)
+            else [x]
+        )
+        return [
+            (os.path.basename(f), os.path.getsize(f), os.path.getmtime(f))
+            for f in files
+        ]
+    if isinstance(x, (list, tuple)):
+        return [_checkpoint_fingerprint(i) for i in x]
+    if isinstance(x, dict):
+        return {str(k): _checkpoint_fingerprint(v) for k, v in sorted(x.items())}
+    return repr(x)
+
+
+def _qualified_name(x):
+    return "{}.{}".format(
+        getattr(x, "__module__", None), getattr(x, "__qualname__", type(x).__name__)
+    )
+
+
+def _config_fingerprint(x):
+    # stable across processes, unlike the repr of the observer partials and
+    # callables in the qconfig, which may contain their addresses
+    if x is None or isinstance(x, (bool, int, float, str)):
+        return x
+    if isinstance(x, (torch.dtype, torch.qscheme, torch.device)):
+        return str(x)
+    if isinstance(x, enum.Enum):
+        return _qualified_name(type(x)) + "." + x.name
+    if isinstance(x, torch.Tensor):
+        return [list(x.shape), str(x.dtype), x.detach().float().reshape(-1).tolist()]
+    if isinstance(x, tuple) and hasattr(x, "_asdict"):
+        # the namedtuple qconfigs, e.g., QConfig, QConfigSmoothQuant, QConfigWoq
+        return [_qualified_name(type(x)), _config_fingerprint(x._asdict())]
+    if isinstance(x, (list, tuple)):
+        return [_config_fingerprint(i) for i in x]
+    if isinstance(x, dict):
+        return [
+            [_config_fingerprint(k), _config_fingerprint(v)]
+            for k, v in sorted(x.items(), key=lambda kv: str(kv[0]))
+        ]
+    if isinstance(x, functools.partial):
+        return [
+            _qualified_name(x.func),
+            _config_fingerprint(x.args),
+            _config_fingerprint(x.keywords),
+        ]
+    if hasattr(x, "p") and isinstance(x.p, functools.partial):
+        # torch.ao.quantization.observer._PartialWrapper of with_args
+        return [
+            _config_fingerprint(x.p),
+            _config_fingerprint(getattr(x, "callable_args", {})),
+        ]
+    if callable(x) and hasattr(x, "__qualname__"):
+        return _qualified_name(x)
+    if hasattr(x, "to_dict"):
+        # QConfigMapping
+        return [_qualified_name(type(x)), _config_fingerprint(x.to_dict())]
+    if hasattr(x, "__dict__"):
+        return [_qualified_name(type(x)), _config_fingerprint(vars(x))]
+    return _qualified_name(type(x))
+
+
+def _file_fingerprint(path):
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def graph_cache_key(
+    model,
+    dtype,
+    quantization_config=None,
+    low_precision_checkpoint=None,
+    sample_inputs=None,
+    deployment_mode=True,
+    qconfig_summary_file=None,
+):
+    r"""
+    Content-addressed key of the graphs traced by ``optimize_transformers``
+    for the given model and options. It covers the model config and weights,
+    the dtype and quantization recipe (and low precision checkpoint), the
+    content of the static quantization config json file, the IPEX / PyTorch /
+    transformers versions, the ISA of the CPU and the rank in distributed
+    inference.
+    """
+    import transformers
+    import intel_extension_for_pytorch as ipex
+
+    meta = {
+        "config": model.config.to_dict() if hasattr(model, "config") else None,
+        "weights": [
+            (name, _tensor_fingerprint(t)) for name, t in model.state_dict().items()
+        ],
+        "dtype": str(dtype),
+        "quantization_config": _config_fingerprint(quantization_config),
+        # the scales and zero points of the static quantization recalibrated
+        # into the same file must not hit the graphs of the old ones
+        "qconfig_summary": _file_fingerprint(qconfig_summary_file),
+        "low_precision_checkpoint": _checkpoint_fingerprint(low_precision_checkpoint),
+        "sample_inputs": _inputs_fingerprint(sample_inputs),
+        "deployment_mode": deployment_mode,
+        "ipex": ipex.__version__,
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+        "isa": ipex._C._get_current_isa_level(),
+        "world_size": dist.get_world_size() if dist.is_initialized() else 1,
+        "rank": dist.get_rank() if dist.is_initialized() else 0,
+    }
+    content = json.dumps(meta, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class GraphCache(object):
+    r"""
+    Persistent on-disk cache of the frozen TorchScript graphs (including the
+    prepacked weights folded into them) traced by ``optimize_transformers``,
+    so that the next process with the same model and options loads them
+    instead of tracing again.
+
+    The graphs are stored under ``<cache_dir>/<key>/``. Files are written to a
+    temporary file and atomically renamed, and the trace of a missing graph
+    holds an exclusive file lock, so the parallel instances of a multi-instance
+    launch trace each graph once and the others wait and load it.
+
+    Args:
+        cache_dir (str): directory of the cache.
+        key (str): key of the model and options, see ``graph_cache_key``.
+    """
+
+    def __init__(self, cache_dir, key):
+        self.dir = os.path.join(cache_dir, key)
+        os.makedirs(self.dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, name):
+        return os.path.join(self.dir, name + ".pt")
+
+    @contextlib.contextmanager
+    def _lock(self, name):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.dir, name + ".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _save(self, name, graph):
+        fd, tmp_path = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            torch.jit.save(graph, tmp_path)
+            os.replace(tmp_path, self._path(name))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load_or_trace(self, name, trace_fn):
+        r"""
+        Returns the cached graph ``name``, or traces it by ``trace_fn`` and
+        stores it in the cache.
+        """
+        path = self._path(name)
+        with self._lock(name):
+            if os.path.exists(path):
+                start = time.time()
+                try:
+                    graph = torch.jit.load(path)
+                    self.hits += 1
+                    logger.info(
+                        "loaded graph {} from {} in {:.2f} s".format(
+                            name, path, time.time() - start
+                        )
+                    )
+                    return graph
+                except Exception as e:
+                    logger.warning(
+                        "failed to load graph {} from {} due to: {}, trace it again".format(
+                            name, path, e
+                        )
+                    )
+            self.misses += 1
+            start = time.time()
+            graph = trace_fn()
+            trace_time = time.time() - start
+            start = time.time()
+            self._save(name, graph)
+            logger.info(
+                "traced graph {} in {:.2f} s and saved it to {} in {:.2f} s".format(
+                    name, trace_time, path, time.time() - start
+                )
+            )
+            return graph
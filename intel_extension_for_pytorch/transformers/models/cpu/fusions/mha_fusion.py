@@ -409,6 +409,87 @@ class _IPEXVarlenScaledDotProductCPU(nn.Module):
         assert gen_ is None, "ipex do not support custom random generator"
         assert zero_tensors is False, "ipex varlen_fwd do not support zero tensors"
 
+        _, num_head, head_size = query.size()
+        num_head_k = key.size(1)
+        assert (
+            num_head % num_head_k == 0
+        ), "varlen attention requires num_head to be a multiple of num_head_k"
+        # Query heads [h * group, (h + 1) * group) attend to kv head h.
+        group = num_head // num_head_k
+        cu_seqlens_q = seqlen_q.tolist()
+        cu_seqlens_k = seqlen_k.tolist()
+        batch_size = len(cu_seqlens_q) - 1
+
+        # Walk the packed sequences directly instead of padding them to
+        # max_seqlen_q/max_seqlen_k; every slice below is a view.
+        for i in range(batch_size):
+            q_start, q_end = cu_seqlens_q[i], cu_seqlens_q[i + 1]
+            k_start, k_end = cu_seqlens_k[i], cu_seqlens_k[i + 1]
+            q_len = q_end - q_start
+            k_len = k_end - k_start
+            if q_len == 0:
+                continue
+            if k_len == 0:
+                out[q_start:q_end].zero_()
+                continue
+            # [q_len, num_head, head_size] -> [num_head_k, group, q_len, head_size]
+            q = (
+                query[q_start:q_end]
+                .view(q_len, num_head_k, group, head_size)
+                .permute(1, 2, 0, 3)
+            )
+            # [k_len, num_head_k, head_size] -> [num_head_k, group, k_len, head_size]
+            # with a zero stride on the group dim, so GQA kv heads are not copied.
+            k = (
+                key[k_start:k_end]
+                .permute(1, 0, 2)
+                .unsqueeze(1)
+                .expand(num_head_k, group, k_len, head_size)
+            )
+            v = (
+                value[k_start:k_end]
+                .permute(1, 0, 2)
+                .unsqueeze(1)
+                .expand(num_head_k, group, k_len, head_size)
+            )
+            out_ = torch.nn.functional.scaled_dot_product_attention(
+                q,
+                k,
+                v,
+                dropout_p=pdropout,
+                is_causal=is_causal,
+                scale=softmax_scale,
+            )
+            out[q_start:q_end].view(q_len, num_head_k, group, head_size).copy_(
+                out_.permute(2, 0, 1, 3)
+            )
+        return out
+
+    @classmethod
+    def padded_apply_function(
+        cls,
+        query,  # [total_q, num_head, head_size]
+        key,  # [total_k, num_head_k, head_size]
+        value,  # [total_k, num_head_k, head_size]
+        out,  # [total_q, num_head, head_size]
+        seqlen_q,  # [batch_size + 1]
+        seqlen_k,  # [batch_size + 1]
+        max_seqlen_q,
+        max_seqlen_k,
+        pdropout=0.0,
+        softmax_scale=None,
+        zero_tensors=False,
+        is_causal=True,
+        return_softmax=False,
+        gen_=None,
+    ):
+        # Reference implementation which pads every sequence to
+        # max_seqlen_q/max_seqlen_k and runs one batched SDPA. Kept for
+        # accuracy checks and benchmarking against `apply_function`.
+        assert return_softmax is False, "ipex do not support return_softmax option"
+        assert gen_ is None, "ipex do not support custom random generator"
+        assert zero_tensors is False, "ipex varlen_fwd do not support zero tensors"
+
         # Repeat kv if it is GQA.
         key = cls.repeat_kv(key, int(query.shape[1] / key.shape[1]))
         value = cls.repeat_kv(value, int(query.shape[1] / value.shape[1]))
@@ -466,7 +547,9 @@ class _IPEXVarlenScaledDotProductCPU(nn.Module):
             pad_k,
             pad_v,
             attn_mask=attn_mask if not is_causal else None,
+            dropout_p=pdropout,
             is_causal=is_causal,
+            scale=softmax_scale,
         )
         out_ = out_.permute(0, 2, 1, 3)
         out.copy_(out_[q_mask])
@@ -8,6 +8,7 @@ from ...cpu.fusions.linear_fusion import (
     _IPEXlinearMulCPU,
     _IPEXlinearSiluMulCPU,
 )
+from ...reference.modules.decoder import _mixtral_experts_weights
 
 
 class _IPEXDecoderLayerCPU(nn.Module):
@@ -155,6 +156,11 @@ class _IPEXDecoderLayerCPU(nn.Module):
                 self.mha_linear_add = _IPEXlinearAddCPU(
                     module.mha_linear_add.linear, tpp=tpp, woq=woq
                 )
+            # the experts are prepacked / quantized and sharded by now, so the
+            # lists of weights taken by the grouped MoE ops are built only once
+            self.block_sparse_moe.experts_weights = _mixtral_experts_weights(
+                self.block_sparse_moe
+            )
         elif self.model_backbone == "GitForCausalLM":
             if not self.distributed:
                 if hasattr(module, "mha_linear_add"):
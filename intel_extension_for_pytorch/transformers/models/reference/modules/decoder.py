@@ -12,6 +12,10 @@ from ...reference.fusions.linear_fusion import (
 )
 from torch.nn import functional as F
 from .....utils._logger import logger, WarningType
+from .....utils.utils import has_cpu
+
+if has_cpu():
+    from .....cpu import comm as ipex_comm
 
 
 def LlamaDecoderLayer_forward(
@@ -692,6 +696,29 @@ def MistralDecoderLayer_forward(
     return outputs
 
 
+def _mixtral_experts_weights(block_sparse_moe):
+    # Gathers the per-expert weights (or the prepacked / WOQ handles) taken by
+    # the grouped MoE ops, returned as (kind, args of the op).
+    experts = block_sparse_moe.experts
+    w1 = experts[0].w1
+    if w1.weight.dtype in [torch.qint8, torch.int8, torch.uint8]:
+        return "woq", [
+            [getattr(e, name)._op_context.get_data_handle() for e in experts]
+            for name in ["w1", "w3", "w2"]
+        ]
+    if hasattr(w1, "use_dnnl") and w1.use_dnnl:
+        weights = []
+        for name in ["w1", "w3", "w2"]:
+            weights.append([getattr(e, name)._get_forward_weight() for e in experts])
+            weights.append([getattr(e, name).ctx.get_data_handle() for e in experts])
+        return "dnnl", weights
+    weights = [
+        [getattr(e, name).weight for e in experts] for name in ["w1", "w3", "w2"]
+    ]
+    weights.append(w1.tpp_fallback if hasattr(w1, "tpp_fallback") else True)
+    return "tpp", weights
+
+
 def MixtralDecoderLayer_forward(
     self,
     hidden_states: torch.Tensor,
@@ -763,67 +790,52 @@ def MixtralDecoderLayer_forward(
     # we cast back to the input dtype
     routing_weights = routing_weights.to(hidden_states.dtype)
 
-    final_hidden_states = torch.zeros(
-        (batch_size * sequence_length, hidden_dim),
-        dtype=hidden_states.dtype,
-        device=hidden_states.device,
-    )
-
-    # One hot encode the selected experts to create an expert mask
-    # this will be used to easily index which expert is going to be sollicitated
-    expert_mask = torch.nn.functional.one_hot(
-        selected_experts, num_classes=self.block_sparse_moe.num_experts
-    ).permute(2, 1, 0)
-
-    # Loop over all available experts in the model and perform the computation on each expert
-    for expert_idx in range(self.block_sparse_moe.num_experts):
-        expert_layer = self.block_sparse_moe.experts[expert_idx]
-        idx, top_x = torch.where(expert_mask[expert_idx])
-        if expert_layer.w1.weight.dtype in [torch.qint8, torch.int8, torch.uint8]:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe_woq(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1._op_context.get_data_handle(),
-                expert_layer.w3._op_context.get_data_handle(),
-                expert_layer.w2._op_context.get_data_handle(),
-                routing_weights,
-                final_hidden_states,
-                self.distributed,
-            )
-        elif hasattr(expert_layer.w1, "use_dnnl") and expert_layer.w1.use_dnnl:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1._get_forward_weight(),
-                expert_layer.w1.ctx.get_data_handle(),
-                expert_layer.w3._get_forward_weight(),
-                expert_layer.w3.ctx.get_data_handle(),
-                expert_layer.w2._get_forward_weight(),
-                expert_layer.w2.ctx.get_data_handle(),
-                hasattr(expert_layer.w1, "use_dnnl") and expert_layer.w1.use_dnnl,
-                routing_weights,
-                final_hidden_states,
-                self.distributed,
-            )
-        else:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe_tpp(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1.weight,
-                expert_layer.w3.weight,
-                expert_layer.w2.weight,
-                (
-                    expert_layer.w1.tpp_fallback
-                    if hasattr(expert_layer.w1, "tpp_fallback")
-                    else True
-                ),
-                routing_weights,
-                final_hidden_states,
-                self.distributed,
-            )
+    # Tokens are bucketed by expert inside the grouped MoE op, so experts which
+    # received no token are skipped without any per-expert python dispatch.
+    # With native tensor parallel, each rank owns the experts of local_experts
+    # and sums the partial results once over the ranks after the grouped op.
+    # The experts owned by the other ranks are mapped to -1 and skipped.
+    tp_allreduce = getattr(self.block_sparse_moe, "tp_allreduce", False)
+    if tp_allreduce:
+        expert_start, expert_end = self.block_sparse_moe.local_experts
+        selected_experts = torch.where(
+            (selected_experts >= expert_start) & (selected_experts < expert_end),
+            selected_experts - expert_start,
+            -1,
+        )
+    op_allreduce = self.distributed and not tp_allreduce
+    # the lowered layers gather the expert weights once, see _IPEXDecoderLayerCPU
+    experts_weights = getattr(self.block_sparse_moe, "experts_weights", None)
+    if experts_weights is None:
+        experts_weights = _mixtral_experts_weights(self.block_sparse_moe)
+    kind, weights = experts_weights
+    if kind == "woq":
+        final_hidden_states = torch.ops.torch_ipex.grouped_mixtral_moe_woq(
+            hidden_states,
+            selected_experts,
+            routing_weights,
+            *weights,
+            op_allreduce,
+        )
+    elif kind == "dnnl":
+        final_hidden_states = torch.ops.torch_ipex.grouped_mixtral_moe(
+            hidden_states,
+            selected_experts,
+            routing_weights,
+            *weights,
+            True,
+            op_allreduce,
+        )
+    else:
+        final_hidden_states = torch.ops.torch_ipex.grouped_mixtral_moe_tpp(
+            hidden_states,
+            selected_experts,
+            routing_weights,
+            *weights,
+            op_allreduce,
+        )
+    if tp_allreduce:
+        ipex_comm.allreduce_add(final_hidden_states)
     final_hidden_states = final_hidden_states.reshape(
         batch_size, sequence_length, hidden_dim
     )
@@ -1,6 +1,7 @@
 import torch
 import copy
 import re
+import time
 import warnings
 from ..utils._logger import logger, WarningType
 import pkg_resources
@@ -19,10 +20,8 @@ if has_cpu():
     )
 
 from .tensor_parallel import (
-    shard_lm_head_weights,
-    shard_mha_weights,
-    shard_mlp_weights,
-    update_heads_info,
+    _head_range,
+    shard_model_weights,
 )
 
 
@@ -133,6 +132,7 @@ def model_convert_reference(_model):
         _greedy_search,
         _sample,
         _beam_sample,
+        _assisted_decoding,
     )
 
     # model wise optimization for MHA module
@@ -209,6 +209,7 @@ def model_convert_reference(_model):
     convert_function(_model, "greedy_search", _greedy_search)
     convert_function(_model, "sample", _sample)
     convert_function(_model, "beam_sample", _beam_sample)
+    convert_function(_model, "assisted_decoding", _assisted_decoding)
     convert_function(
         _model,
         "_extract_past_from_model_output",
@@ -351,7 +352,7 @@ def model_convert_reference(_model):
     if _model.device.type == "cpu":
         from ..cpu import comm as ipex_comm
 
-        if ipex_comm.has_ccl():
+        if ipex_comm.is_available():
             world_size = ipex_comm.get_world_size()
             rank = ipex_comm.get_rank()
             if world_size > 1:
@@ -373,51 +374,25 @@ def model_convert_reference(_model):
         transformers.models.gpt_bigcode.modeling_gpt_bigcode.GPTBigCodeAttention,
         transformers.models.t5.modeling_t5.T5Attention,
     ]
-    ipex_tp_supported_mha_classes = [
-        transformers.models.llama.modeling_llama.LlamaAttention,
-        transformers.models.gptj.modeling_gptj.GPTJAttention,
-    ]
-    ipex_tp_supported_mlp_classes = [
-        transformers.models.llama.modeling_llama.LlamaMLP,
-        transformers.models.gptj.modeling_gptj.GPTJMLP,
-    ]
-    ipex_tp_supported_model_classes = [
-        transformers.models.llama.modeling_llama.LlamaForCausalLM,
-        transformers.models.gptj.modeling_gptj.GPTJForCausalLM,
-    ]
-    yuan_attention = None
-    if _model.config.architectures[0] == "YuanForCausalLM":
-        yuan_attention = type(_model.model.layers[0].self_attn)
     if _model.config.architectures[0] in [
         "YuanForCausalLM",
         "PhiForCausalLM",
     ]:
         supported_mha_classes.append(type(_model.model.layers[0].self_attn))
-        ipex_tp_supported_mha_classes.append(type(_model.model.layers[0].self_attn))
-        ipex_tp_supported_mlp_classes.append(type(_model.model.layers[0].mlp))
-        ipex_tp_supported_model_classes.append(type(_model))
+    if need_ipex_tp:
+        # shard the weights before the modules are converted, so that the fused
+        # modules are built from the sharded weights and the local head numbers
+        if not shard_model_weights(_model, rank, world_size):
+            logger.warning(
+                "native tensor parallel does not support {} yet, fallback to run the whole model on each rank".format(
+                    _model.config.architectures[0]
+                ),
+                _type=WarningType.NotSupported,
+            )
+            need_ipex_tp = False
+            distributed = False
     # model-wise optimizations - MHA module
     for supported_mha_class in supported_mha_classes:
-        if need_ipex_tp and supported_mha_class in ipex_tp_supported_mha_classes:
-            num_heads = _model.config.num_attention_heads
-            num_kv_heads = num_heads
-            for name in ["num_key_value_heads"]:
-                if hasattr(_model.config, name):
-                    num_kv_heads = getattr(_model.config, name)
-            head_dim = _model.config.hidden_size // num_heads
-            value_with_share_qk = supported_mha_class == yuan_attention
-            shard_local_filtering = supported_mha_class == yuan_attention
-            shard_mha_weights(
-                _model,
-                supported_mha_class,
-                num_heads,
-                num_kv_heads,
-                head_dim,
-                rank,
-                world_size,
-                value_with_share_qk,
-                shard_local_filtering,
-            )
         convert_class(
             _model,
             supported_mha_class,
@@ -425,29 +400,6 @@ def model_convert_reference(_model):
             _model.config,
             distributed=distributed,
         )
-    if need_ipex_tp:
-        for supported_mlp_class in ipex_tp_supported_mlp_classes:
-            shard_mlp_weights(
-                _model,
-                supported_mlp_class,
-                num_heads,
-                num_kv_heads,
-                head_dim,
-                rank,
-                world_size,
-            )
-        for supported_model_class in ipex_tp_supported_model_classes:
-            if isinstance(_model, supported_model_class):
-                shard_lm_head_weights(
-                    _model,
-                    supported_model_class,
-                    num_heads,
-                    num_kv_heads,
-                    head_dim,
-                    rank,
-                    world_size,
-                )
-                update_heads_info(_model, rank, world_size)
 
     # model-wise optimizations - Feedforward/Decoder layer modules
     for supported_decoder_class in [
@@ -537,12 +489,19 @@ def model_convert_reference(_model):
             distributed=distributed,
         )
         if hasattr(_model.model, "first_run"):  # baichuan 13b
+            future_mask = _gen_baichuan_alibi_mask(
+                _model.model.n_head,
+                _model.model.max_cache_pos,
+            ).to(_model.config.torch_dtype)
+            if need_ipex_tp:
+                # keep the alibi of the heads of this rank
+                q_head_start, q_head_end, _, _ = _head_range(
+                    _model.model.n_head, _model.model.n_head, rank, world_size
+                )
+                future_mask = future_mask[q_head_start:q_head_end]
             _model.model.register_buffer(
                 "future_mask",
-                _gen_baichuan_alibi_mask(
-                    _model.model.n_head,
-                    _model.model.max_cache_pos,
-                ).to(_model.config.torch_dtype),
+                future_mask,
                 persistent=False,
             )
             _model.model.first_run = False
@@ -1023,6 +982,33 @@ def ipex_quantization_flow(
     return convert_model
 
 
+def _log_cold_start(graph_cache, start_time):
+    if graph_cache is not None:
+        logger.info(
+            "optimize_transformers finished in {:.2f} s, {} graph(s) loaded from and {} graph(s) saved to {}".format(
+                time.time() - start_time,
+                graph_cache.hits,
+                graph_cache.misses,
+                graph_cache.dir,
+            )
+        )
+
+
+def _trace_and_freeze(_model, sample_inputs, graph_cache=None, name="trace_model"):
+    def trace():
+        trace_model = torch.jit.trace(
+            _model,
+            example_kwarg_inputs=sample_inputs,
+            strict=False,
+            check_trace=False,
+        )
+        return torch.jit.freeze(trace_model)
+
+    if graph_cache is None:
+        return trace()
+    return graph_cache.load_or_trace(name, trace)
+
+
 def model_convert_lowering(
     _model,
     device,
@@ -1031,6 +1017,7 @@ def model_convert_lowering(
     deployment_mode,
     is_quantization=False,
     woq=False,
+    graph_cache=None,
 ):
     from .models.reference.modules.attentions import _IPEXAttentionRef
     from .models.reference.modules.decoder import _IPEXDecoderLayerRef
@@ -1145,13 +1132,9 @@ def model_convert_lowering(
                 enabled=True if dtype in [torch.bfloat16, torch.half] else False,
                 dtype=dtype,
             ):
-                trace_model = torch.jit.trace(
-                    _model,
-                    example_kwarg_inputs=sample_inputs,
-                    strict=False,
-                    check_trace=False,
+                trace_model = _trace_and_freeze(
+                    _model, sample_inputs, graph_cache, "trace_model"
                 )
-                trace_model = torch.jit.freeze(trace_model)
                 if _model.config.architectures[0] == "YuanForCausalLM":
                     sample_inputs.pop("past_key_values", None)
                     batch_size = (
@@ -1168,13 +1151,9 @@ def model_convert_lowering(
                     sample_inputs["position_ids"] = sample_inputs[
                         "position_ids"
                     ].repeat(batch_size, 1)
-                    trace_model_first = torch.jit.trace(
-                        _model,
-                        example_kwarg_inputs=sample_inputs,
-                        strict=False,
-                        check_trace=False,
+                    trace_model_first = _trace_and_freeze(
+                        _model, sample_inputs, graph_cache, "trace_model_first"
                     )
-                    trace_model_first = torch.jit.freeze(trace_model_first)
                     _model = _set_optimized_model_for_generation(
                         _model,
                         optimized_model=trace_model,
@@ -1380,6 +1359,7 @@ def optimize_transformers(
     low_precision_checkpoint=None,
     sample_inputs=None,
     deployment_mode=True,
+    graph_cache_dir=None,
 ):
     r"""
     Apply optimizations at Python frontend to the given transformers model (nn.Module).
@@ -1400,10 +1380,15 @@ def optimize_transformers(
         qconfig_summary_file (str): Path to the IPEX static quantization config json file. (only works on CPU)
             Default value is ``None``. Work with quantization_config under static quantization use case.
             Need to do IPEX static quantization calibration and generate this file. (only works on CPU)
-        low_precision_checkpoint (dict or tuple of dict): For weight only quantization with INT4 weights.
+        low_precision_checkpoint (dict or str or tuple): For weight only quantization with INT4 weights.
             If it's a dict, it should be the state_dict of checkpoint (`.pt`) generated by GPTQ, etc.
+            If it's a str, it should be the path of the checkpoint file, or of the directory of its
+            shards (`.bin`, `.pt` or `.safetensors`, with an optional `*.index.json`). The tensors are read
+            lazily one layer at a time, so the model can be created on the meta device by
+            ``ipex.OnDevice(dtype, device="meta")`` to convert large models without materializing them.
+            In this case the checkpoint should also contain the tensors of the modules which are not quantized.
             If a tuple is provided, it should be `(checkpoint, checkpoint config)`,
-            where `checkpoint` is the state_dict and `checkpoint config` is dict specifying
+            where `checkpoint` is the state_dict or the path and `checkpoint config` is dict specifying
             keys of groups in the state_dict.
             The default config is { groups: '-1' }. Change the values of the dict to make a custom config.
             Weights shape should be N by K and they are quantized to UINT4 and compressed along K, then stored as
@@ -1415,6 +1400,11 @@ def optimize_transformers(
             Default value is ``None``, and for well supported model, we provide this sample inputs automaticlly. (only works on CPU)
         deployment_mode (bool): Whether to apply the optimized model for deployment of model generation.
             It means there is no need to further apply optimization like torchscirpt. Default value is ``True``. (only works on CPU)
+        graph_cache_dir (str): Directory of the persistent cache of the traced and frozen graphs (with the prepacked
+            weights folded into them). If set, the graphs are saved there on the first run, keyed by the model config
+            and weights, dtype, quantization recipe, IPEX/PyTorch/transformers versions and CPU ISA, and loaded on the
+            next runs instead of being traced again. Parallel instances can share the directory.
+            Default value is ``None``, meaning no cache. (only works on CPU)
 
     Returns:
         optimized model object for model.generate(), also workable with model.forward
@@ -1500,6 +1490,24 @@ def optimize_transformers(
             )
             return model
 
+        start_time = time.time()
+        graph_cache = None
+        if graph_cache_dir is not None and device == "cpu":
+            from .graph_cache import GraphCache, graph_cache_key
+
+            graph_cache = GraphCache(
+                graph_cache_dir,
+                graph_cache_key(
+                    model,
+                    dtype,
+                    quantization_config,
+                    low_precision_checkpoint,
+                    sample_inputs,
+                    deployment_mode,
+                    qconfig_summary_file,
+                ),
+            )
+
         if not inplace:
             _model = copy.deepcopy(model)
         else:
@@ -1525,13 +1533,13 @@ def optimize_transformers(
                 if isinstance(low_precision_checkpoint, tuple):
                     assert (
                         len(low_precision_checkpoint) == 2
-                        and isinstance(low_precision_checkpoint[0], dict)
+                        and isinstance(low_precision_checkpoint[0], (dict, str))
                         and isinstance(low_precision_checkpoint[1], dict)
                     ), "Invalid low_precision_checkpoint"
                     state_dict, config = low_precision_checkpoint
                 else:
                     assert isinstance(
-                        low_precision_checkpoint, dict
+                        low_precision_checkpoint, (dict, str)
                     ), "Invalid low_precision_checkpoint argument"
                     state_dict = low_precision_checkpoint
                 _model = _convert_woq_with_low_precision_checkpoint(
@@ -1600,13 +1608,9 @@ def optimize_transformers(
                         ),
                         dtype=dtype,
                     ):
-                        trace_model = torch.jit.trace(
-                            _model,
-                            example_kwarg_inputs=sample_inputs,
-                            strict=False,
-                            check_trace=False,
+                        trace_model = _trace_and_freeze(
+                            _model, sample_inputs, graph_cache, "trace_model"
                         )
-                        trace_model = torch.jit.freeze(trace_model)
                         if _model.config.architectures[0] == "YuanForCausalLM":
                             sample_inputs.pop("past_key_values", None)
                             batch_size = (
@@ -1623,13 +1627,12 @@ def optimize_transformers(
                             sample_inputs["position_ids"] = sample_inputs[
                                 "position_ids"
                             ].repeat(batch_size, 1)
-                            trace_model_first = torch.jit.trace(
+                            trace_model_first = _trace_and_freeze(
                                 _model,
-                                example_kwarg_inputs=sample_inputs,
-                                strict=False,
-                                check_trace=False,
+                                sample_inputs,
+                                graph_cache,
+                                "trace_model_first",
                             )
-                            trace_model_first = torch.jit.freeze(trace_model_first)
                             _model = _set_optimized_model_for_generation(
                                 _model,
                                 optimized_model=trace_model,
@@ -1639,6 +1642,7 @@ def optimize_transformers(
                             _model = _set_optimized_model_for_generation(
                                 _model, optimized_model=trace_model
                             )
+                    _log_cold_start(graph_cache, start_time)
                     return _model
                 else:
                     print(
@@ -1667,7 +1671,9 @@ def optimize_transformers(
             deployment_mode,
             is_quantization,
             is_woq if device == "cpu" else xpu_woq,
+            graph_cache,
         )
+        _log_cold_start(graph_cache, start_time)
         if device == "cpu":
             # do not register output hook when doing calibration in static int8
             if not (is_quantization and not is_woq and qconfig_summary_file is None):
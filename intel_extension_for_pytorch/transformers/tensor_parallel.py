@@ -102,6 +102,46 @@ def shard_local_filtering_Conv2d_weights(model, target_m, rank, world_size):
         shard_local_filtering_Conv2d_weights(sub_m, target_m, rank, world_size)
 
 
+def _head_range(num_heads, num_kv_heads, rank, world_size):
+    r"""
+    Returns the ``[start, end)`` of the query heads and of the key/value heads
+    owned by ``rank``. The key/value heads are split across the ranks together
+    with their groups of query heads. With more ranks than key/value heads
+    (e.g., MQA), the query heads of each group are split across
+    ``world_size // num_kv_heads`` ranks, and each of them keeps a replica of
+    the key/value head of the group.
+    """
+    kv_group_size = num_heads // num_kv_heads
+    if world_size <= num_kv_heads:
+        kv_head_range = [0]  # [)
+        for i in range(world_size - 1, -1, -1):
+            kv_head_this_rank = num_kv_heads // world_size
+            if i < num_kv_heads % world_size:
+                kv_head_this_rank += 1
+            kv_head_range.append(kv_head_range[-1] + kv_head_this_rank)
+        kv_head_start, kv_head_end = kv_head_range[rank], kv_head_range[rank + 1]
+        return (
+            kv_head_start * kv_group_size,
+            kv_head_end * kv_group_size,
+            kv_head_start,
+            kv_head_end,
+        )
+    ranks_per_kv_head = world_size // num_kv_heads
+    if world_size % num_kv_heads != 0 or kv_group_size % ranks_per_kv_head != 0:
+        raise RuntimeError(
+            f"world_size {world_size} can not evenly split {num_heads} query heads "
+            f"of {num_kv_heads} key/value heads"
+        )
+    kv_head = rank // ranks_per_kv_head
+    q_heads_per_rank = kv_group_size // ranks_per_kv_head
+    return (
+        rank * q_heads_per_rank,
+        (rank + 1) * q_heads_per_rank,
+        kv_head,
+        kv_head + 1,
+    )
+
+
 class TensorParallellLinear(nn.Module):
     def __init__(
         self,
@@ -114,6 +154,8 @@ class TensorParallellLinear(nn.Module):
         shard_by_head,
         shard_by_col,
         value_with_share_qk=False,
+        qkv_layout="concat",
+        num_chunks=1,
     ):
         super().__init__()
         self.num_kv_heads = num_kv_heads
@@ -123,6 +165,8 @@ class TensorParallellLinear(nn.Module):
         self.world_size = world_size
         self.shard_by_head = shard_by_head
         self.shard_by_col = shard_by_col
+        self.qkv_layout = qkv_layout
+        self.num_chunks = num_chunks
         self.cols_per_rank = None
         self.shard_weights(linear, value_with_share_qk)
 
@@ -135,79 +179,87 @@ class TensorParallellLinear(nn.Module):
         rank,
         world_size,
         shard_by_col=True,
+        qkv_layout="concat",
     ):
         if shard_by_col:
             total_size = linear.weight.shape[0]
         else:
             total_size = linear.weight.shape[1]
-        q_bias = None
-        k_bias = None
-        v_bias = None
-        bias_data = None
-        concat_qkv = total_size > num_heads * head_dim
-        kv_group_size = num_heads // num_kv_heads
-        kv_head_per_rank = num_kv_heads // world_size
         if world_size == 1:
             return
-        if world_size > num_kv_heads:
-            RuntimeError(
-                f"world_size {world_size} is larger than num_kv_heads {num_kv_heads}"
-            )
-        kv_head_range = [0]  # [)
-        for i in range(world_size - 1, -1, -1):
-            kv_head_this_rank = kv_head_per_rank
-            if i < num_kv_heads % world_size:
-                kv_head_this_rank += 1
-            kv_head_range.append(kv_head_range[-1] + kv_head_this_rank)
+        fused_qkv = total_size > num_heads * head_dim
         cols_per_rank = [0]
         for i in range(world_size):
-            q_head_start = kv_head_range[i] * kv_group_size
-            q_head_end = (
-                q_head_start + (kv_head_range[i + 1] - kv_head_range[i]) * kv_group_size
+            q_head_start, q_head_end, _, _ = _head_range(
+                num_heads, num_kv_heads, i, world_size
             )
             cols_per_rank.append(
                 cols_per_rank[-1] + (q_head_end - q_head_start) * head_dim
             )
-        weight_data = linear.weight.data
-        q_head_start = kv_head_range[rank] * kv_group_size
-        q_head_end = (
-            q_head_start
-            + (kv_head_range[rank + 1] - kv_head_range[rank]) * kv_group_size
+        q_head_start, q_head_end, kv_head_start, kv_head_end = _head_range(
+            num_heads, num_kv_heads, rank, world_size
         )
-        if shard_by_col:
-            q = weight_data[q_head_start * head_dim : q_head_end * head_dim]
-            if linear.bias is not None:
-                q_bias = linear.bias.data[
-                    q_head_start * head_dim : q_head_end * head_dim
-                ]
-        else:
-            q = weight_data[:, q_head_start * head_dim : q_head_end * head_dim]
-            if linear.bias is not None:
-                q_bias = linear.bias.data / float(world_size)
-        if not concat_qkv:
-            return torch.nn.Parameter(q), torch.nn.Parameter(q_bias), cols_per_rank
-
-        k_head_start = num_heads + kv_head_range[rank]
-        k_head_end = k_head_start + (kv_head_range[rank + 1] - kv_head_range[rank])
-        v_head_start = num_heads + num_kv_heads + kv_head_range[rank]
-        v_head_end = v_head_start + (kv_head_range[rank + 1] - kv_head_range[rank])
-        if shard_by_col:
-            k = weight_data[k_head_start * head_dim : k_head_end * head_dim]
-            v = weight_data[v_head_start * head_dim : v_head_end * head_dim]
-            if linear.bias is not None:
-                k_bias = linear.bias.data[
-                    k_head_start * head_dim : k_head_end * head_dim
-                ]
-                v_bias = linear.bias.data[
-                    v_head_start * head_dim : v_head_end * head_dim
-                ]
-                bias_data = torch.cat([q_bias, k_bias, v_bias], dim=0)
-        else:
-            k = weight_data[:, k_head_start * head_dim : k_head_end * head_dim]
-            v = weight_data[:, v_head_start * head_dim : v_head_end * head_dim]
-            if linear.bias is not None:
-                bias_data = linear.bias.data
-        weight_data = torch.cat([q, k, v], dim=0)
+        weight_data = linear.weight.data
+        bias_data = linear.bias.data if linear.bias is not None else None
+        if not shard_by_col:
+            weight_data = weight_data[
+                :, q_head_start * head_dim : q_head_end * head_dim
+            ]
+            if bias_data is not None:
+                bias_data = bias_data / float(world_size)
+            return (
+                torch.nn.Parameter(weight_data),
+                torch.nn.Parameter(bias_data),
+                cols_per_rank,
+            )
+        if not fused_qkv:
+            # the query projection, or the key / value projection with "kv" layout
+            head_start, head_end = q_head_start, q_head_end
+            if qkv_layout == "kv":
+                head_start, head_end = kv_head_start, kv_head_end
+            weight_data = weight_data[head_start * head_dim : head_end * head_dim]
+            if bias_data is not None:
+                bias_data = bias_data[head_start * head_dim : head_end * head_dim]
+            return (
+                torch.nn.Parameter(weight_data),
+                torch.nn.Parameter(bias_data),
+                cols_per_rank,
+            )
+
+        def shard_qkv(t):
+            # t is the weight or bias of the fused qkv linear, sharded along dim 0
+            if qkv_layout == "interleaved":
+                # [num_heads, 3, head_dim], e.g., Bloom, GPT-NeoX
+                return t.view(num_heads, 3 * head_dim, *t.shape[1:])[
+                    q_head_start:q_head_end
+                ].flatten(0, 1)
+            if qkv_layout == "grouped":
+                # [num_kv_heads, num_heads // num_kv_heads + 2, head_dim], e.g., Falcon
+                kv_group_size = num_heads // num_kv_heads
+                t = t.view(num_kv_heads, kv_group_size + 2, head_dim, *t.shape[1:])
+                q_offset = q_head_start - kv_head_start * kv_group_size
+                q_count = (q_head_end - q_head_start) // (kv_head_end - kv_head_start)
+                t = t[kv_head_start:kv_head_end]
+                t = torch.cat(
+                    [t[:, q_offset : q_offset + q_count], t[:, kv_group_size:]], dim=1
+                )
+                return t.flatten(0, 2)
+            # [q of num_heads, k of num_kv_heads, v of num_kv_heads], e.g., GQA of Llama
+            k_head_start = num_heads + kv_head_start
+            v_head_start = num_heads + num_kv_heads + kv_head_start
+            kv_heads = kv_head_end - kv_head_start
+            return torch.cat(
+                [
+                    t[q_head_start * head_dim : q_head_end * head_dim],
+                    t[k_head_start * head_dim : (k_head_start + kv_heads) * head_dim],
+                    t[v_head_start * head_dim : (v_head_start + kv_heads) * head_dim],
+                ],
+                dim=0,
+            )
+
+        weight_data = shard_qkv(weight_data)
+        if bias_data is not None:
+            bias_data = shard_qkv(bias_data)
         return (
             torch.nn.Parameter(weight_data),
             torch.nn.Parameter(bias_data),
@@ -215,12 +267,15 @@ class TensorParallellLinear(nn.Module):
         )
 
     def shard_weights_by_block(
-        self, linear, rank, world_size, shard_by_col=True, block_size=64
+        self, linear, rank, world_size, shard_by_col=True, block_size=64, num_chunks=1
     ):
         if shard_by_col:
             total_size = linear.weight.shape[0]
         else:
             total_size = linear.weight.shape[1]
+        # Fused linears, e.g., gate and up projections, are sharded per chunk so that
+        # each rank keeps the same layout of the chunks.
+        total_size = total_size // num_chunks
         bias_data = None
         cols_per_rank = [0]
         for i in range(world_size - 1, -1, -1):
@@ -235,15 +290,25 @@ class TensorParallellLinear(nn.Module):
                 if i < total_size % world_size:
                     cols += 1
                 cols_per_rank.append(cols_per_rank[-1] + cols)
+
+        def shard(t, dim):
+            chunks = [
+                c.narrow(
+                    dim,
+                    cols_per_rank[rank],
+                    cols_per_rank[rank + 1] - cols_per_rank[rank],
+                )
+                for c in t.chunk(num_chunks, dim=dim)
+            ]
+            return chunks[0] if num_chunks == 1 else torch.cat(chunks, dim=dim)
+
         weight_data = linear.weight.data
         if shard_by_col:
-            weight_data = weight_data[cols_per_rank[rank] : cols_per_rank[rank + 1]]
+            weight_data = shard(weight_data, 0)
             if linear.bias is not None:
-                bias_data = linear.bias.data[
-                    cols_per_rank[rank] : cols_per_rank[rank + 1]
-                ]
+                bias_data = shard(linear.bias.data, 0)
         else:
-            weight_data = weight_data[:, cols_per_rank[rank] : cols_per_rank[rank + 1]]
+            weight_data = shard(weight_data, 1)
             if linear.bias is not None:
                 bias_data = linear.bias.data / float(world_size)
         return (
@@ -371,6 +436,7 @@ class TensorParallellLinear(nn.Module):
                 self.rank,
                 self.world_size,
                 self.shard_by_col,
+                self.qkv_layout,
             )
         else:
             weight, bias, self.cols_per_rank = self.shard_weights_by_block(
@@ -378,6 +444,7 @@ class TensorParallellLinear(nn.Module):
                 self.rank,
                 self.world_size,
                 self.shard_by_col,
+                num_chunks=self.num_chunks,
             )
         self.linear = nn.Linear(
             weight.shape[1], weight.shape[0], bias=linear.bias is not None
@@ -403,6 +470,8 @@ class TensorParallelColumnLinear(TensorParallellLinear):
         world_size,
         shard_by_head=True,
         value_with_share_qk=False,
+        qkv_layout="concat",
+        num_chunks=1,
     ):
         super().__init__(
             linear,
@@ -414,6 +483,8 @@ class TensorParallelColumnLinear(TensorParallellLinear):
             shard_by_head,
             shard_by_col=True,
             value_with_share_qk=value_with_share_qk,
+            qkv_layout=qkv_layout,
+            num_chunks=num_chunks,
         )
 
 
@@ -498,6 +569,7 @@ def shard_mha_weights(
     world_size,
     value_with_share_qk=False,
     shard_local_filtering=False,
+    qkv_layout="concat",
 ):
     if shard_local_filtering:
         shard_local_filtering_Conv2d_weights(model, target_m, rank, world_size)
@@ -522,11 +594,12 @@ def shard_mha_weights(
                     TPLinear = TensorParallelColumnLinear(
                         l_sub_m,
                         num_kv_heads,
-                        num_kv_heads,
+                        num_heads,
                         head_dim,
                         rank,
                         world_size,
                         shard_by_head=True,
+                        qkv_layout="kv",
                     )
                     # del sub_m.__dict__["_modules"][l_name]
                     setattr(sub_m, l_name, TPLinear)
@@ -534,16 +607,30 @@ def shard_mha_weights(
                     TPLinear = TensorParallelColumnLinear(
                         l_sub_m,
                         num_kv_heads,
-                        num_kv_heads,
+                        num_heads,
                         head_dim,
                         rank,
                         world_size,
                         True,
                         value_with_share_qk,
+                        qkv_layout="kv",
                     )
                     # del sub_m.__dict__["_modules"][l_name]
                     setattr(sub_m, l_name, TPLinear)
-                if l_name in ["out_proj", "dense"]:
+                if l_name in ["query_key_value", "c_attn", "W_pack"]:
+                    # fused qkv linear of the layout qkv_layout
+                    TPLinear = TensorParallelColumnLinear(
+                        l_sub_m,
+                        num_kv_heads,
+                        num_heads,
+                        head_dim,
+                        rank,
+                        world_size,
+                        shard_by_head=True,
+                        qkv_layout=qkv_layout,
+                    )
+                    setattr(sub_m, l_name, TPLinear)
+                if l_name in ["out_proj", "dense", "c_proj"]:
                     TPLinear = TensorParallelRowLinear(
                         l_sub_m,
                         num_kv_heads,
@@ -564,7 +651,7 @@ def shard_mha_weights(
                         rank,
                         world_size,
                         shard_by_head=True,
-                        value_with_share_qk=True,
+                        value_with_share_qk=value_with_share_qk,
                     )
                     # del sub_m.__dict__["_modules"][l_name]
                     setattr(sub_m, l_name, TPLinear)
@@ -578,18 +665,36 @@ def shard_mha_weights(
             rank,
             world_size,
             value_with_share_qk,
+            qkv_layout=qkv_layout,
         )
 
 
 def shard_mlp_weights(
-    model, target_m, num_heads, num_kv_heads, head_dim, rank, world_size
+    model,
+    target_m,
+    num_heads,
+    num_kv_heads,
+    head_dim,
+    rank,
+    world_size,
+    fused_gate_up=False,
 ):
     if world_size == 1:
         return
     for _, sub_m in model.named_children():
         if isinstance(sub_m, target_m):
             for l_name, l_sub_m in sub_m.named_children():
-                if l_name in ["gate_proj", "up_proj", "fc_in", "fc1"]:
+                if l_name in [
+                    "gate_proj",
+                    "up_proj",
+                    "fc_in",
+                    "fc1",
+                    "dense_h_to_4h",
+                    "w1",
+                    "w2",
+                ]:
+                    # ChatGLM packs [gate | up] in a single dense_h_to_4h
+                    num_chunks = 2 if fused_gate_up and l_name == "dense_h_to_4h" else 1
                     TPLinear = TensorParallelColumnLinear(
                         l_sub_m,
                         num_kv_heads,
@@ -598,9 +703,10 @@ def shard_mlp_weights(
                         rank,
                         world_size,
                         shard_by_head=False,
+                        num_chunks=num_chunks,
                     )
                     setattr(sub_m, l_name, TPLinear.linear)
-                if l_name in ["down_proj", "fc_out", "fc2"]:
+                if l_name in ["down_proj", "fc_out", "fc2", "dense_4h_to_h", "c_proj"]:
                     TPLinear = TensorParallelRowLinear(
                         l_sub_m,
                         num_kv_heads,
@@ -612,10 +718,58 @@ def shard_mlp_weights(
                     )
                     setattr(sub_m, l_name, TPLinear)
         shard_mlp_weights(
-            sub_m, target_m, num_heads, num_kv_heads, head_dim, rank, world_size
+            sub_m,
+            target_m,
+            num_heads,
+            num_kv_heads,
+            head_dim,
+            rank,
+            world_size,
+            fused_gate_up,
         )
 
 
+def shard_moe_weights(model, target_m, rank, world_size):
+    # Shards the experts of the sparse MoE blocks (e.g., MixtralSparseMoeBlock).
+    # When the experts divide evenly, each rank keeps whole experts and
+    # ``local_experts`` records the [start, end) range of the global expert ids
+    # it owns; otherwise each expert is sharded by the intermediate size as a
+    # dense MLP. The partial results are summed over the ranks once per block
+    # after all the experts (``tp_allreduce``), instead of once per expert.
+    if world_size == 1:
+        return
+    for _, sub_m in model.named_children():
+        if isinstance(sub_m, target_m):
+            num_experts = len(sub_m.experts)
+            if num_experts % world_size == 0:
+                experts_per_rank = num_experts // world_size
+                start = rank * experts_per_rank
+                sub_m.experts = torch.nn.ModuleList(
+                    sub_m.experts[start : start + experts_per_rank]
+                )
+                sub_m.local_experts = (start, start + experts_per_rank)
+            else:
+                for expert in sub_m.experts:
+                    for l_name in ["w1", "w3"]:
+                        TPLinear = TensorParallelColumnLinear(
+                            getattr(expert, l_name),
+                            1,
+                            1,
+                            1,
+                            rank,
+                            world_size,
+                            shard_by_head=False,
+                        )
+                        setattr(expert, l_name, TPLinear.linear)
+                    TPLinear = TensorParallelRowLinear(
+                        expert.w2, 1, 1, 1, rank, world_size, shard_by_head=False
+                    )
+                    expert.w2 = TPLinear.linear
+                sub_m.local_experts = (0, num_experts)
+            sub_m.tp_allreduce = True
+        shard_moe_weights(sub_m, target_m, rank, world_size)
+
+
 def shard_lm_head_weights(
     model, supported_model_class, num_heads, num_kv_heads, head_dim, rank, world_size
 ):
@@ -626,7 +780,10 @@ def shard_lm_head_weights(
     for name, sub_m in model.named_children():
         lm_head_shard_policy = os.getenv("LM_HEAD_SHARD_POLICY", "row")
         shard_by_col = lm_head_shard_policy == "col"
-        if name in ["lm_head"]:
+        if name in ["lm_head", "output_layer", "embed_out"]:
+            # customized heads, e.g., NormHead of Baichuan2, are kept replicated
+            if not isinstance(sub_m, nn.Linear):
+                return
             TPLinear = TensorParallelLMhead(
                 sub_m,
                 num_kv_heads,
@@ -649,45 +806,220 @@ def shard_lm_head_weights(
         )
 
 
+def get_heads_info(config):
+    r"""
+    Returns ``(num_heads, num_kv_heads, head_dim)`` of the attention of the
+    model of ``config``, covering the MHA, GQA and MQA variants of the
+    decoder families.
+    """
+    num_heads = config.num_attention_heads
+    num_kv_heads = num_heads
+    head_dim = config.hidden_size // num_heads
+    if getattr(config, "multi_query_attention", False):
+        # ChatGLM
+        num_kv_heads = config.multi_query_group_num
+    elif getattr(config, "new_decoder_architecture", False):
+        # Falcon
+        num_kv_heads = config.num_kv_heads
+    elif getattr(config, "multi_query", False):
+        # Falcon
+        num_kv_heads = 1
+    elif getattr(config, "num_key_value_heads", None) is not None:
+        num_kv_heads = config.num_key_value_heads
+    if getattr(config, "kv_channels", None) is not None:
+        head_dim = config.kv_channels
+    return num_heads, num_kv_heads, head_dim
+
+
 def update_heads_info(_model, rank, world_size):
     # update the head number of config after sharding
-    num_heads = _model.config.num_attention_heads
-    num_kv_heads = num_heads
-    head_dim = _model.config.hidden_size // num_heads
-    for name in ["num_key_value_heads"]:
-        if hasattr(_model.config, name):
-            num_kv_heads = getattr(_model.config, name)
-    group_size = num_heads // num_kv_heads
-    kv_head_per_rank = num_kv_heads // world_size
-    assert world_size <= num_kv_heads
-    kv_heads_range = [0]
-    for i in range(world_size - 1, -1, -1):
-        kv_heads_this_rank = kv_head_per_rank
-        if i < num_kv_heads % world_size:
-            kv_heads_this_rank += 1
-        kv_heads_range.append(kv_heads_range[-1] + kv_heads_this_rank)
-
-    def update(_model, group_size, kv_head_range):
+    num_heads, num_kv_heads, head_dim = get_heads_info(_model.config)
+    q_head_start, q_head_end, kv_head_start, kv_head_end = _head_range(
+        num_heads, num_kv_heads, rank, world_size
+    )
+    target_q_head = q_head_end - q_head_start
+    target_kv_head = kv_head_end - kv_head_start
+
+    def update(_model):
         for _, sub_m in _model.named_children():
             # update number of query heads
-            target_kv_head = kv_heads_range[rank + 1] - kv_heads_range[rank]
             for name in ["num_attention_heads", "num_heads"]:
                 if hasattr(sub_m, "config") and hasattr(sub_m.config, name):
-                    setattr(sub_m.config, name, group_size * target_kv_head)
+                    setattr(sub_m.config, name, target_q_head)
                 if hasattr(sub_m, name):
-                    setattr(sub_m, name, group_size * target_kv_head)
+                    setattr(sub_m, name, target_q_head)
             # update number of key/value heads
-            for name in ["num_key_value_heads", "num_key_value_heads"]:
+            for name in [
+                "num_key_value_heads",
+                "num_kv_heads",
+                "multi_query_group_num",
+            ]:
                 if hasattr(sub_m, "config") and hasattr(sub_m.config, name):
                     setattr(sub_m.config, name, target_kv_head)
                 if hasattr(sub_m, name):
                     setattr(sub_m, name, target_kv_head)
+            if hasattr(sub_m, "num_key_value_groups"):
+                sub_m.num_key_value_groups = target_q_head // target_kv_head
             # update hidden_size
             for name in ["hidden_size"]:
                 if hasattr(sub_m, "config") and hasattr(sub_m.config, name):
-                    setattr(sub_m.config, name, group_size * target_kv_head * head_dim)
+                    setattr(sub_m.config, name, target_q_head * head_dim)
                 if hasattr(sub_m, name):
-                    setattr(sub_m, name, group_size * target_kv_head * head_dim)
-            update(sub_m, group_size, kv_head_range)
+                    setattr(sub_m, name, target_q_head * head_dim)
+            # update the per partition sizes of the attention modules
+            if any(
+                hasattr(sub_m, name)
+                for name in ["q_proj", "query_key_value", "c_attn", "W_pack"]
+            ):
+                for name in ["num_attention_heads_per_partition"]:
+                    if hasattr(sub_m, name):
+                        setattr(sub_m, name, target_q_head)
+                for name in ["num_kv", "num_multi_query_groups_per_partition"]:
+                    if hasattr(sub_m, name):
+                        setattr(sub_m, name, target_kv_head)
+                for name in ["embed_dim", "split_size", "projection_size"]:
+                    if hasattr(sub_m, name):
+                        setattr(sub_m, name, target_q_head * head_dim)
+            update(sub_m)
+
+    update(_model)
+
+
+def _build_alibi_tensor_of_heads(
+    build_alibi_tensor, num_heads, q_head_start, q_head_end
+):
+    # alibi slopes depend on the total number of heads, build them for all the
+    # heads and keep the heads of this rank
+    def build(attention_mask, _num_heads, dtype):
+        alibi = build_alibi_tensor(attention_mask, num_heads, dtype)
+        batch_size = attention_mask.shape[0]
+        alibi = alibi.view(batch_size, num_heads, 1, -1)[:, q_head_start:q_head_end]
+        return alibi.reshape(batch_size * (q_head_end - q_head_start), 1, -1)
 
-    update(_model, group_size, kv_heads_range)
+    return build
+
+
+def _tensor_parallel_rules(model):
+    # Returns how to shard the decoder family of model with native tensor
+    # parallel, or None if the family is not supported.
+    arch = model.config.architectures[0]
+    rules = {
+        "mha": None,
+        "mlp": None,
+        "moe": None,
+        "qkv_layout": "concat",
+        "fused_gate_up": False,
+        "value_with_share_qk": False,
+        "shard_local_filtering": False,
+    }
+    if arch in [
+        "LlamaForCausalLM",
+        "MistralForCausalLM",
+        "MixtralForCausalLM",
+        "YuanForCausalLM",
+        "PhiForCausalLM",
+        "BaichuanForCausalLM",
+    ]:
+        layer = model.model.layers[0]
+        rules["mha"] = type(layer.self_attn)
+        if arch == "MixtralForCausalLM":
+            rules["moe"] = type(layer.block_sparse_moe)
+        else:
+            rules["mlp"] = type(layer.mlp)
+        if arch == "YuanForCausalLM":
+            rules["value_with_share_qk"] = True
+            rules["shard_local_filtering"] = True
+    elif arch == "GPTJForCausalLM":
+        rules["mha"] = type(model.transformer.h[0].attn)
+        rules["mlp"] = type(model.transformer.h[0].mlp)
+    elif arch == "OPTForCausalLM":
+        layer = model.model.decoder.layers[0]
+        rules["mha"] = type(layer.self_attn)
+        # fc1 and fc2 are the children of the decoder layer
+        rules["mlp"] = type(layer)
+    elif arch == "BloomForCausalLM":
+        rules["mha"] = type(model.transformer.h[0].self_attention)
+        rules["mlp"] = type(model.transformer.h[0].mlp)
+        rules["qkv_layout"] = "interleaved"
+    elif arch in ["FalconForCausalLM", "RWForCausalLM"]:
+        if getattr(model.config, "alibi", False):
+            return None
+        rules["mha"] = type(model.transformer.h[0].self_attention)
+        rules["mlp"] = type(model.transformer.h[0].mlp)
+        if getattr(model.config, "new_decoder_architecture", False):
+            rules["qkv_layout"] = "grouped"
+        elif not getattr(model.config, "multi_query", False):
+            rules["qkv_layout"] = "interleaved"
+    elif arch == "GPTNeoXForCausalLM":
+        rules["mha"] = type(model.gpt_neox.layers[0].attention)
+        rules["mlp"] = type(model.gpt_neox.layers[0].mlp)
+        rules["qkv_layout"] = "interleaved"
+    elif arch == "ChatGLMModel":
+        layer = model.transformer.encoder.layers[0]
+        rules["mha"] = type(layer.self_attention)
+        rules["mlp"] = type(layer.mlp)
+        rules["fused_gate_up"] = True
+        if not getattr(model.config, "multi_query_attention", False):
+            rules["qkv_layout"] = "interleaved"
+    elif arch == "QWenLMHeadModel":
+        rules["mha"] = type(model.transformer.h[0].attn)
+        rules["mlp"] = type(model.transformer.h[0].mlp)
+    else:
+        return None
+    return rules
+
+
+def shard_model_weights(model, rank, world_size):
+    r"""
+    Shards the weights of ``model`` across ``world_size`` ranks with native
+    tensor parallel (without DeepSpeed) and updates the head numbers of the
+    sharded attention modules. The attention is sharded by heads, with the
+    key/value heads of GQA / MQA replicated when there are more ranks than
+    key/value heads, the MLP is sharded by the intermediate size and the
+    experts of the MoE blocks are split across the ranks.
+
+    Returns False if the decoder family of ``model`` is not supported.
+    """
+    rules = _tensor_parallel_rules(model)
+    if rules is None:
+        return False
+    if world_size == 1:
+        return True
+    num_heads, num_kv_heads, head_dim = get_heads_info(model.config)
+    shard_mha_weights(
+        model,
+        rules["mha"],
+        num_heads,
+        num_kv_heads,
+        head_dim,
+        rank,
+        world_size,
+        rules["value_with_share_qk"],
+        rules["shard_local_filtering"],
+        qkv_layout=rules["qkv_layout"],
+    )
+    if rules["mlp"] is not None:
+        shard_mlp_weights(
+            model,
+            rules["mlp"],
+            num_heads,
+            num_kv_heads,
+            head_dim,
+            rank,
+            world_size,
+            rules["fused_gate_up"],
+        )
+    if rules["moe"] is not None:
+        shard_moe_weights(model, rules["moe"], rank, world_size)
+    shard_lm_head_weights(
+        model, type(model), num_heads, num_kv_heads, head_dim, rank, world_size
+    )
+    update_heads_info(model, rank, world_size)
+    if model.config.architectures[0] == "BloomForCausalLM":
+        q_head_start, q_head_end, _, _ = _head_range(
+            num_heads, num_kv_heads, rank, world_size
+        )
+        model.transformer.build_alibi_tensor = _build_alibi_tensor_of_heads(
+            model.transformer.build_alibi_tensor, num_heads, q_head_start, q_head_end
+        )
+    return True
@@ -1,7 +1,12 @@
 import copy
+import glob
+import json
+import os
+import time
 import torch
 from torch.ao.quantization import PlaceholderObserver, QConfigMapping
 from intel_extension_for_pytorch.utils.utils import has_cpu
+from ._logger import logger, WarningType
 
 if has_cpu():
     from intel_extension_for_pytorch.nn.modules import WeightOnlyQuantizedLinear
@@ -147,6 +152,137 @@ def _get_linear_parameters(attr_name, state_dict, checkpoint_config):
     return qweight, scales, qzeros, bias, group_size, g_idx
 
 
+def _open_checkpoint_file(path):
+    if path.endswith(".safetensors"):
+        from safetensors import safe_open
+
+        # reads each tensor from the file when it is requested
+        return safe_open(path, framework="pt", device="cpu")
+    try:
+        # the storages are mapped from the file instead of being read
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except (TypeError, RuntimeError):
+        # torch without mmap support or a checkpoint of the legacy format
+        return torch.load(path, map_location="cpu")
+
+
+def _checkpoint_file_get(handle, key):
+    if isinstance(handle, dict):
+        return handle[key]
+    return handle.get_tensor(key)
+
+
+class _LazyCheckpoint(object):
+    r"""
+    Read-only view of a low precision checkpoint on disk, which reads the
+    tensors when they are requested instead of loading the whole checkpoint.
+    ``path`` is a checkpoint file (``.pt``, ``.bin`` or ``.safetensors``) or a
+    directory of checkpoint shards, with or without a ``*.index.json`` of the
+    shard of each tensor. The shards are memory mapped if possible, and a
+    shard is closed once all its tensors are released.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._key_to_file = {}
+        if os.path.isdir(path):
+            index_files = glob.glob(os.path.join(path, "*.index.json"))
+            if index_files:
+                for index_file in index_files:
+                    with open(index_file) as f:
+                        weight_map = json.load(f)["weight_map"]
+                    for key, file in weight_map.items():
+                        self._key_to_file[key] = os.path.join(path, file)
+            else:
+                files = []
+                for ext in ["*.safetensors", "*.bin", "*.pt"]:
+                    files += sorted(glob.glob(os.path.join(path, ext)))
+                assert len(files) > 0, "no checkpoint file is found in {}".format(path)
+                for file in files:
+                    for key in _open_checkpoint_file(file).keys():
+                        self._key_to_file[key] = file
+        else:
+            for key in _open_checkpoint_file(path).keys():
+                self._key_to_file[key] = path
+        self._unreleased = {}
+        for key, file in self._key_to_file.items():
+            self._unreleased.setdefault(file, set()).add(key)
+        self._handles = {}
+
+    def keys(self):
+        return self._key_to_file.keys()
+
+    def __contains__(self, key):
+        return key in self._key_to_file
+
+    def get(self, key, default=None):
+        file = self._key_to_file.get(key, None)
+        if file is None:
+            return default
+        if file not in self._handles:
+            self._handles[file] = _open_checkpoint_file(file)
+        return _checkpoint_file_get(self._handles[file], key)
+
+    def items(self):
+        for key in self.keys():
+            yield key, self.get(key)
+
+    def release(self, keys):
+        for key in keys:
+            file = self._key_to_file.get(key, None)
+            if file is None:
+                continue
+            unreleased = self._unreleased[file]
+            unreleased.discard(key)
+            if not unreleased:
+                self._handles.pop(file, None)
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        # peak instead of current RSS, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _meta_tensor_owners(model):
+    # (module, name) of each meta parameter and buffer, tied tensors have several owners
+    owners = {}
+    for mod in model.modules():
+        for tensors in [mod._parameters, mod._buffers]:
+            for name, t in tensors.items():
+                if t is not None and t.is_meta:
+                    owners.setdefault(id(t), []).append((mod, name))
+    return owners
+
+
+def _load_meta_tensors(mod, attr_name, state_dict, owners):
+    # Materialize the meta parameters and buffers of mod from the checkpoint.
+    loaded_keys = []
+    for tensors in [mod._parameters, mod._buffers]:
+        for name, t in list(tensors.items()):
+            if t is None or not t.is_meta:
+                continue
+            key = attr_name + "." + name if attr_name != "" else name
+            value = state_dict.get(key, None)
+            if value is None:
+                continue
+            value = value.to(t.dtype)
+            if isinstance(t, torch.nn.Parameter):
+                value = torch.nn.Parameter(value, requires_grad=False)
+            for owner, owner_name in owners.get(id(t), [(mod, name)]):
+                if owner_name in owner._parameters:
+                    owner._parameters[owner_name] = value
+                else:
+                    owner._buffers[owner_name] = value
+            loaded_keys.append(key)
+    return loaded_keys
+
+
 def _convert_woq_with_low_precision_checkpoint(
     model,
     qconfig_mapping,
@@ -159,7 +295,9 @@ def _convert_woq_with_low_precision_checkpoint(
     Args:
         model: original model
         qconfig_mapping: QConfigMapping object containing observer info, lowp mode, etc.
-        low_precision_checkpoint (dict): checkpoint generated by GPTQ, etc.
+        low_precision_checkpoint (dict or str): checkpoint generated by GPTQ, etc. Either the
+            state_dict, or the path of the checkpoint file or of the directory of its shards,
+            which is read lazily, see below.
         checkpoint_config (dict): custom config to load the checkpoint. Use default if None
         inplace: do conversion in-place or make a copy of original model
     Return:
@@ -171,22 +309,39 @@ def _convert_woq_with_low_precision_checkpoint(
     Default format:
     - Weights and zero points in UINT4 and compressed as INT32, scales in FP16.
     - Keys are 'packed_weight', 'scale', 'packed_zp'
+
+    To convert large models without materializing the float model, create the model on the
+    meta device and pass the path of the checkpoint:
+
+        >>> with ipex.OnDevice(dtype=torch.float, device="meta"):
+        >>>     model = AutoModelForCausalLM.from_config(config)
+        >>> model = _convert_woq_with_low_precision_checkpoint(model, qconfig_mapping, "/path/to/checkpoint")
+
+    The modules are converted one at a time: the tensors of each linear are read from the
+    checkpoint, the `WeightOnlyQuantizedLinear` is built and the tensors are released. The
+    other meta parameters and buffers are loaded from the checkpoint as well, so the
+    checkpoint should contain them. The peak RSS during the conversion is logged.
     """
 
     assert isinstance(
-        low_precision_checkpoint, dict
-    ), "low_precision_checkpoint should be a state_dict"
+        low_precision_checkpoint, (dict, str, _LazyCheckpoint)
+    ), "low_precision_checkpoint should be a state_dict or the path of a checkpoint"
     assert checkpoint_config is None or isinstance(
         checkpoint_config, dict
     ), "checkpoint_config should be a dict"
     if checkpoint_config is None:
         checkpoint_config = _default_lowp_checkpoint_config()
 
+    if isinstance(low_precision_checkpoint, str):
+        low_precision_checkpoint = _LazyCheckpoint(low_precision_checkpoint)
     state_dict = low_precision_checkpoint
+    lazy = isinstance(state_dict, _LazyCheckpoint)
     # Check that keys can be found in the state dict. Bias and g_idx are optional.
-    weight_key, scales_key, zeros_key, _, _ = _get_keys_from_config(checkpoint_config)
+    weight_key, scales_key, zeros_key, bias_key, g_idx_key = _get_keys_from_config(
+        checkpoint_config
+    )
     keys_found = [False] * 3
-    for k, _ in state_dict.items():
+    for k in state_dict.keys():
         if k.endswith("." + weight_key):
             keys_found[0] = True
         if k.endswith("." + scales_key):
@@ -197,6 +352,15 @@ def _convert_woq_with_low_precision_checkpoint(
             break
     assert all(keys_found), "Error: Format of checkpoint and config do not match"
 
+    start_time = time.time()
+    start_rss = _rss_bytes()
+    stats = {"peak_rss": start_rss, "num_linears": 0}
+
+    def _release(keys):
+        if lazy:
+            state_dict.release(keys)
+        stats["peak_rss"] = max(stats["peak_rss"], _rss_bytes())
+
     def _convert(mod, attr_name):
         if isinstance(mod, torch.nn.Linear) and has_cpu():
             mod.qconfig = qconfig_mapping.global_qconfig
@@ -204,13 +368,25 @@ def _convert_woq_with_low_precision_checkpoint(
                 attr_name, state_dict, checkpoint_config
             )
             if any(i is None for i in [qweight, scales, qzeros]):
+                # not quantized in the checkpoint
+                _release(_load_meta_tensors(mod, attr_name, state_dict, owners))
                 return mod
             mod_new = WeightOnlyQuantizedLinear.from_float_and_int4_weight(
                 mod, qweight, scales, qzeros, bias, group_size=group_size, g_idx=g_idx
             )
+            del qweight, scales, qzeros, bias, g_idx
+            stats["num_linears"] += 1
+            _release(
+                [
+                    attr_name + "." + key
+                    for key in [weight_key, scales_key, zeros_key, bias_key, g_idx_key]
+                ]
+            )
             return mod_new
 
         mod_new = mod
+        if has_meta:
+            _release(_load_meta_tensors(mod, attr_name, state_dict, owners))
 
         for name, child in mod.named_children():
             attr = attr_name + "." + name if attr_name != "" else name
@@ -221,4 +397,30 @@ def _convert_woq_with_low_precision_checkpoint(
         model_new = copy.deepcopy(model)
     else:
         model_new = model
-    return _convert(model_new, "")
+    owners = _meta_tensor_owners(model_new)
+    has_meta = len(owners) > 0
+    model_new = _convert(model_new, "")
+    if has_meta:
+        missing = [
+            name
+            for name, t in list(model_new.named_parameters())
+            + list(model_new.named_buffers())
+            if t.is_meta
+        ]
+        if missing:
+            logger.warning(
+                "The following tensors are still on meta device since they are not found in the "
+                + "low precision checkpoint: {}".format(missing),
+                _type=WarningType.MissingArgument,
+            )
+    logger.info(
+        "converted {} linears with the low precision checkpoint in {:.2f} s, "
+        "RSS {:.2f} GB at start, peak {:.2f} GB, {:.2f} GB at end".format(
+            stats["num_linears"],
+            time.time() - start_time,
+            start_rss / 1024**3,
+            stats["peak_rss"] / 1024**3,
+            _rss_bytes() / 1024**3,
+        )
+    )
+    return model_new
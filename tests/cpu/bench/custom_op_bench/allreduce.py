@@ -0,0 +1,65 @@
+import torch
+import intel_extension_for_pytorch as ipex
+import argparse
+import time
+
+
+def run_bench(comm, t, num_warmup, num_iter):
+    for _ in range(num_warmup):
+        comm.allreduce_add(t)
+    comm.barrier()
+    latency = []
+    for _ in range(num_iter):
+        start = time.time()
+        comm.allreduce_add(t)
+        latency.append((time.time() - start) * 1e6)
+    latency.sort()
+    return latency[len(latency) // 2]
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="latency and bandwidth of the allreduce of tensor parallel on CPU"
+    )
+    parser.add_argument("--backend", type=str, default=None, choices=["ccl", "shm"])
+    parser.add_argument("--hidden-sizes", type=str, default="4096,5120,8192")
+    parser.add_argument("--batch-sizes", type=str, default="1,4,16,64,256")
+    parser.add_argument("--num-warmup", type=int, default=20)
+    parser.add_argument("--num-iter", type=int, default=200)
+    args = parser.parse_args()
+    comm = ipex.cpu.comm
+    if args.backend is not None:
+        comm.set_backend(args.backend)
+    assert comm.is_available(), "run it with several ranks, e.g., by the launcher"
+    rank, world_size = comm.get_rank(), comm.get_world_size()
+    if rank == 0:
+        print("backend: {}, world size: {}".format(comm.get_backend(), world_size))
+        print(
+            "{:<6}{:>8}{:>8}{:>12}{:>14}{:>14}".format(
+                "dtype", "hidden", "batch", "size (KB)", "p50 (us)", "busbw (GB/s)"
+            )
+        )
+    for dtype in [torch.float32, torch.bfloat16]:
+        for hidden_size in [int(h) for h in args.hidden_sizes.split(",")]:
+            for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+                # the output of the row sharded linear of a decode step
+                t = torch.ones(batch_size, hidden_size).to(dtype)
+                p50 = run_bench(comm, t, args.num_warmup, args.num_iter)
+                nbytes = t.numel() * t.element_size()
+                # bytes moved per rank by a ring allreduce, comparable across backends
+                busbw = nbytes * 2 * (world_size - 1) / world_size / (p50 * 1e-6) / 1e9
+                if rank == 0:
+                    print(
+                        "{:<6}{:>8}{:>8}{:>12.1f}{:>14.1f}{:>14.2f}".format(
+                            "fp32" if dtype == torch.float32 else "bf16",
+                            hidden_size,
+                            batch_size,
+                            nbytes / 1024,
+                            p50,
+                            busbw,
+                        )
+                    )
+
+
+if __name__ == "__main__":
+    run()
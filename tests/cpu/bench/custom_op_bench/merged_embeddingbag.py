@@ -33,13 +33,16 @@ class EmbeddingBagList(torch.nn.Module):
         mode="sum",
     ):
         super(EmbeddingBagList, self).__init__()
+        # num_dim and dtype are either shared by all tables or lists of each table
+        num_dims = num_dim if isinstance(num_dim, list) else [num_dim] * ntables
+        dtypes = dtype if isinstance(dtype, list) else [dtype] * ntables
         self.list = torch.nn.ModuleList()
-        for _ in range(ntables):
+        for i in range(ntables):
             self.list.append(
                 torch.nn.EmbeddingBag(
                     1000,
-                    num_dim,
-                    dtype=dtype,
+                    num_dims[i],
+                    dtype=dtypes[i],
                     mode=mode,
                     include_last_offset=include_last_offset,
                     sparse=sparse,
@@ -190,6 +193,21 @@ def merged_emb_cat_bench(args, input):
             )
 
 
+def enable_dedup_and_cache(args, merged_emb):
+    if args.hot_row_cache > 0:
+        merged_emb.enable_hot_row_cache(args.hot_row_cache, policy=args.cache_policy)
+    elif args.dedup:
+        merged_emb.enable_index_dedup()
+
+
+def print_cache_stats(merged_emb):
+    stats = merged_emb.cache_stats()
+    if stats:
+        hits = sum(s["hits"] for s in stats)
+        lookups = hits + sum(s["misses"] for s in stats)
+        print("hot row cache hit rate: {:.2%}".format(hits / lookups))
+
+
 def merged_emb_with_sgd(args, input):
     for dtype in [torch.float32, torch.bfloat16]:
         if dtype == torch.bfloat16:
@@ -203,6 +221,7 @@ def merged_emb_with_sgd(args, input):
         if dtype == torch.bfloat16:
             m.merged_emb.to_bfloat16_train()
             ref_m, opt = ipex.optimize(ref_m, dtype=torch.bfloat16, optimizer=opt)
+        enable_dedup_and_cache(args, m.merged_emb)
         if args.inference:
             with torch.no_grad():
                 run_bench(
@@ -229,6 +248,7 @@ def merged_emb_with_sgd(args, input):
                 optimizer=opt,
                 training=True,
             )
+        print_cache_stats(m.merged_emb)
 
 
 def merged_emb_with_adagrad(args, input):
@@ -244,6 +264,7 @@ def merged_emb_with_adagrad(args, input):
         if dtype == torch.bfloat16:
             m.merged_emb.to_bfloat16_train()
             ref_m, opt = ipex.optimize(ref_m, dtype=torch.bfloat16, optimizer=opt)
+        enable_dedup_and_cache(args, m.merged_emb)
         if args.inference:
             with torch.no_grad():
                 run_bench(
@@ -270,6 +291,7 @@ def merged_emb_with_adagrad(args, input):
                 optimizer=opt,
                 training=True,
             )
+        print_cache_stats(m.merged_emb)
 
 
 def get_data(batch_size):
@@ -328,6 +350,19 @@ def run():
     parser.add_argument("--batch-size", type=int, default=7168)
     parser.add_argument("--vector-size", type=int, default=128)
     parser.add_argument("--with-cat", action="store_true", default=False)
+    parser.add_argument("--dedup", action="store_true", default=False)
+    parser.add_argument(
+        "--hot-row-cache",
+        type=int,
+        default=0,
+        help="number of cached rows per table, 0 to disable the hot row cache",
+    )
+    parser.add_argument(
+        "--cache-policy",
+        type=str,
+        default="lru",
+        choices=["lru", "lfu"],
+    )
     parser.add_argument(
         "--optimizer",
         type=str,
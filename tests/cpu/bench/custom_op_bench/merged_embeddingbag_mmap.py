@@ -0,0 +1,111 @@
+import torch
+import intel_extension_for_pytorch as ipex
+import argparse
+import resource
+import tempfile
+import time
+
+
+def get_batches(args):
+    torch.manual_seed(args.seed)
+    batches = []
+    for _ in range(args.num_iter + 1):
+        # power law indices over the whole table
+        indices = [
+            (
+                torch.distributions.Exponential(args.exp_rate)
+                .sample((args.batch_size * args.pooling,))
+                .long()
+                % args.num_embeddings
+            )
+            for _ in range(args.num_tables)
+        ]
+        offsets = [
+            torch.arange(0, args.batch_size * args.pooling, args.pooling)
+            for _ in range(args.num_tables)
+        ]
+        batches.append((indices, offsets))
+    return batches
+
+
+def page_faults():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_majflt, usage.ru_minflt
+
+
+def run_bench(name, module, batches, prefetch=False):
+    latency = []
+    major_start, minor_start = page_faults()
+    with torch.no_grad():
+        for i in range(len(batches) - 1):
+            start = time.time()
+            module(*batches[i])
+            if prefetch:
+                module.prefetch_rows(batches[i + 1][0])
+            latency.append((time.time() - start) * 1000)
+    major_end, minor_end = page_faults()
+    latency.sort()
+    print(
+        "{}: mean {:.3f} ms, p50 {:.3f} ms, p99 {:.3f} ms, major faults {}, minor faults {}".format(
+            name,
+            sum(latency) / len(latency),
+            latency[len(latency) // 2],
+            latency[min(len(latency) - 1, int(len(latency) * 0.99))],
+            major_end - major_start,
+            minor_end - minor_start,
+        )
+    )
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="benchmark for memory mapped tables of ipex MergedEmbeddingBag"
+    )
+    parser.add_argument("--num-tables", type=int, default=8)
+    parser.add_argument("--num-embeddings", type=int, default=1000000)
+    parser.add_argument("--vector-size", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--pooling", type=int, default=8)
+    parser.add_argument("--exp-rate", type=float, default=1e-4)
+    parser.add_argument("--num-iter", type=int, default=100)
+    parser.add_argument("--hot-row-cache", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--mmap-dir",
+        type=str,
+        default=None,
+        help="directory of the exported tables, put it on the storage under test",
+    )
+    args = parser.parse_args()
+    batches = get_batches(args)
+    specs = [
+        ipex.nn.modules.EmbeddingSpec(
+            num_embeddings=args.num_embeddings,
+            embedding_dim=args.vector_size,
+            pooling_mode="sum",
+            dtype=torch.float32,
+            weight=torch.randn(args.num_embeddings, args.vector_size),
+            sparse=False,
+            include_last_offset=False,
+        )
+        for _ in range(args.num_tables)
+    ]
+    resident = ipex.nn.modules.MergedEmbeddingBag(specs)
+    with tempfile.TemporaryDirectory(dir=args.mmap_dir) as tmp:
+        ipex.nn.modules.save_mmap_tables(resident, tmp)
+        run_bench("resident tables", resident, batches)
+        del resident
+        # Drop the page cache between the runs (echo 3 > /proc/sys/vm/drop_caches)
+        # for cold-start numbers of the memory mapped tables.
+        mapped = ipex.nn.modules.MergedEmbeddingBag.from_mmap_tables(tmp)
+        run_bench("mmap tables", mapped, batches)
+        mapped = ipex.nn.modules.MergedEmbeddingBag.from_mmap_tables(tmp)
+        run_bench("mmap tables with prefetch", mapped, batches, prefetch=True)
+        if args.hot_row_cache > 0:
+            mapped = ipex.nn.modules.MergedEmbeddingBag.from_mmap_tables(tmp)
+            mapped.enable_hot_row_cache(args.hot_row_cache)
+            run_bench("mmap tables with hot row cache", mapped, batches)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,133 @@
+import torch
+import intel_extension_for_pytorch as ipex
+import argparse
+import time
+
+
+def get_batches(args):
+    torch.manual_seed(args.seed)
+    batches = []
+    for _ in range(args.num_iter):
+        indices = [
+            torch.randint(args.num_embeddings, (args.batch_size * args.pooling,))
+            for _ in range(args.num_tables)
+        ]
+        offsets = [
+            torch.arange(0, args.batch_size * args.pooling, args.pooling)
+            for _ in range(args.num_tables)
+        ]
+        batches.append((indices, offsets))
+    return batches
+
+
+def run_bench(module, batches, num_warmup):
+    latency = []
+    with torch.no_grad():
+        for i in range(num_warmup):
+            module(*batches[i % len(batches)])
+        for batch in batches:
+            start = time.time()
+            module(*batch)
+            latency.append((time.time() - start) * 1000)
+    latency.sort()
+    return sum(latency) / len(latency), latency[len(latency) // 2]
+
+
+def accuracy(module, ref_module, batches):
+    # max abs error and relative error of the outputs against the fp32 tables
+    max_abs, err, norm = 0.0, 0.0, 0.0
+    with torch.no_grad():
+        for batch in batches[:10]:
+            for out, ref in zip(module(*batch), ref_module(*batch)):
+                diff = out.float() - ref
+                max_abs = max(max_abs, diff.abs().max().item())
+                err += diff.norm().item() ** 2
+                norm += ref.norm().item() ** 2
+    return max_abs, (err / norm) ** 0.5
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="benchmark for row-wise quantized tables of ipex MergedEmbeddingBag"
+    )
+    parser.add_argument("--num-tables", type=int, default=26)
+    parser.add_argument("--num-embeddings", type=int, default=1000000)
+    parser.add_argument("--vector-size", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--pooling", type=int, default=8)
+    parser.add_argument("--mode", type=str, default="sum", choices=["sum", "mean"])
+    parser.add_argument("--num-warmup", type=int, default=10)
+    parser.add_argument("--num-iter", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    batches = get_batches(args)
+    specs = [
+        ipex.nn.modules.EmbeddingSpec(
+            num_embeddings=args.num_embeddings,
+            embedding_dim=args.vector_size,
+            pooling_mode=args.mode,
+            dtype=torch.float32,
+            weight=torch.randn(args.num_embeddings, args.vector_size),
+            sparse=False,
+            include_last_offset=False,
+        )
+        for _ in range(args.num_tables)
+    ]
+    fp32 = ipex.nn.modules.MergedEmbeddingBag(specs)
+    bf16 = ipex.nn.modules.MergedEmbeddingBag(
+        [
+            spec._replace(dtype=torch.bfloat16, weight=spec.weight.bfloat16())
+            for spec in specs
+        ]
+    )
+    modules = [("fp32", fp32), ("bf16", bf16)]
+    for bits in [8, 4]:
+        modules.append(
+            (
+                "int{}".format(bits),
+                ipex.nn.modules.RowwiseQuantizedMergedEmbeddingBag.from_merged_embeddingbag(
+                    fp32, bits=bits
+                ),
+            )
+        )
+    fp32_nbytes = sum(w.numel() * w.element_size() for w in fp32.weights)
+    fp32_latency = None
+    print(
+        "{:<6}{:>12}{:>10}{:>12}{:>12}{:>10}{:>14}{:>10}".format(
+            "dtype",
+            "size (MB)",
+            "ratio",
+            "mean (ms)",
+            "p50 (ms)",
+            "speedup",
+            "max abs err",
+            "rel err",
+        )
+    )
+    for name, module in modules:
+        if isinstance(module, ipex.nn.modules.RowwiseQuantizedMergedEmbeddingBag):
+            nbytes = sum(q.numel() for q in module.qweights) + sum(
+                sb.numel() * sb.element_size() for sb in module.scale_biases
+            )
+        else:
+            nbytes = sum(w.numel() * w.element_size() for w in module.weights)
+        mean, p50 = run_bench(module, batches, args.num_warmup)
+        if fp32_latency is None:
+            fp32_latency = mean
+        max_abs, rel = accuracy(module, fp32, batches)
+        print(
+            "{:<6}{:>12.1f}{:>10.2f}{:>12.3f}{:>12.3f}{:>10.2f}{:>14.4f}{:>10.4f}".format(
+                name,
+                nbytes / 1024 / 1024,
+                fp32_nbytes / nbytes,
+                mean,
+                p50,
+                fp32_latency / mean,
+                max_abs,
+                rel,
+            )
+        )
+
+
+if __name__ == "__main__":
+    run()
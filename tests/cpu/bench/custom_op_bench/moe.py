@@ -0,0 +1,106 @@
+import torch
+import intel_extension_for_pytorch as ipex  # noqa F401
+import argparse
+import time
+
+
+def per_expert_moe(hidden_states, selected_experts, routing_weights, gate, up, down):
+    output = torch.zeros_like(hidden_states)
+    expert_mask = torch.nn.functional.one_hot(
+        selected_experts, num_classes=len(gate)
+    ).permute(2, 1, 0)
+    for expert_idx in range(len(gate)):
+        idx, top_x = torch.where(expert_mask[expert_idx])
+        output = torch.ops.torch_ipex.mixtral_moe_tpp(
+            hidden_states,
+            top_x,
+            idx,
+            gate[expert_idx],
+            up[expert_idx],
+            down[expert_idx],
+            True,
+            routing_weights,
+            output,
+            False,
+        )
+    return output
+
+
+def grouped_moe(hidden_states, selected_experts, routing_weights, gate, up, down):
+    return torch.ops.torch_ipex.grouped_mixtral_moe_tpp(
+        hidden_states,
+        selected_experts,
+        routing_weights,
+        gate,
+        up,
+        down,
+        True,
+        False,
+    )
+
+
+def run_bench(fn, inputs, num_warmup, num_iter):
+    with torch.no_grad():
+        for _ in range(num_warmup):
+            fn(*inputs)
+        start = time.time()
+        for _ in range(num_iter):
+            fn(*inputs)
+        end = time.time()
+    return (end - start) / num_iter * 1000
+
+
+def run():
+    parser = argparse.ArgumentParser(description="benchmark for ipex grouped moe")
+    parser.add_argument("--batch-sizes", type=str, default="1,4,16,64,256")
+    parser.add_argument("--top-ks", type=str, default="1,2")
+    parser.add_argument("--num-experts", type=int, default=8)
+    parser.add_argument("--hidden-size", type=int, default=4096)
+    parser.add_argument("--intermediate-size", type=int, default=14336)
+    parser.add_argument("--num-warmup", type=int, default=10)
+    parser.add_argument("--num-iter", type=int, default=100)
+    parser.add_argument("--bf16", action="store_true", default=False)
+    args = parser.parse_args()
+    dtype = torch.bfloat16 if args.bf16 else torch.float32
+    gate = [
+        torch.randn(args.intermediate_size, args.hidden_size).to(dtype)
+        for _ in range(args.num_experts)
+    ]
+    up = [
+        torch.randn(args.intermediate_size, args.hidden_size).to(dtype)
+        for _ in range(args.num_experts)
+    ]
+    down = [
+        torch.randn(args.hidden_size, args.intermediate_size).to(dtype)
+        for _ in range(args.num_experts)
+    ]
+    print("batch_size\ttop_k\tper-expert(ms)\tgrouped(ms)\tspeedup")
+    for top_k in [int(k) for k in args.top_ks.split(",")]:
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            hidden_states = torch.randn(batch_size, args.hidden_size).to(dtype)
+            routing_weights = torch.nn.functional.softmax(
+                torch.randn(batch_size, args.num_experts), dim=1
+            )
+            routing_weights, selected_experts = torch.topk(
+                routing_weights, top_k, dim=-1
+            )
+            routing_weights /= routing_weights.sum(dim=-1, keepdim=True)
+            inputs = [
+                hidden_states,
+                selected_experts,
+                routing_weights.to(dtype),
+                gate,
+                up,
+                down,
+            ]
+            ref = run_bench(per_expert_moe, inputs, args.num_warmup, args.num_iter)
+            grouped = run_bench(grouped_moe, inputs, args.num_warmup, args.num_iter)
+            print(
+                "{}\t{}\t{:.3f}\t{:.3f}\t{:.2f}x".format(
+                    batch_size, top_k, ref, grouped, ref / grouped
+                )
+            )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,105 @@
+import torch
+import intel_extension_for_pytorch as ipex
+import argparse
+import random
+import time
+
+
+class VariableCostNet(torch.nn.Module):
+    # The cost of each sample is proportional to its number of steps,
+    # like the sequence length of a sample in NLP models.
+    def __init__(self, hidden_size):
+        super(VariableCostNet, self).__init__()
+        self.linear = torch.nn.Linear(hidden_size, hidden_size)
+
+    def forward(self, x, steps):
+        outputs = []
+        for i in range(x.size(0)):
+            y = x[i : i + 1]
+            for _ in range(int(steps[i])):
+                y = torch.relu(self.linear(y))
+            outputs.append(y)
+        return torch.cat(outputs)
+
+
+def get_inputs(args):
+    random.seed(args.seed)
+    x = torch.randn(args.batch_size, args.hidden_size)
+    inputs = []
+    for _ in range(args.num_iter):
+        # Long-tailed cost: most samples are cheap and a few are expensive.
+        steps = [
+            args.max_steps if random.random() < args.heavy_ratio else args.min_steps
+            for _ in range(args.batch_size)
+        ]
+        inputs.append((x, torch.tensor(steps)))
+    return inputs
+
+
+def run_bench(model, inputs, num_warmup):
+    latency = []
+    with torch.no_grad():
+        for _ in range(num_warmup):
+            model(*inputs[0])
+        for x, steps in inputs:
+            start = time.time()
+            model(x, steps)
+            latency.append((time.time() - start) * 1000)
+    latency.sort()
+    return (
+        sum(latency) / len(latency),
+        latency[len(latency) // 2],
+        latency[min(len(latency) - 1, int(len(latency) * 0.99))],
+    )
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="benchmark for work stealing of MultiStreamModule"
+    )
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--hidden-size", type=int, default=1024)
+    parser.add_argument("--min-steps", type=int, default=1)
+    parser.add_argument("--max-steps", type=int, default=32)
+    parser.add_argument("--heavy-ratio", type=float, default=0.1)
+    parser.add_argument("--num-streams", type=int, default=4)
+    parser.add_argument("--chunks-per-stream", type=int, default=4)
+    parser.add_argument("--num-warmup", type=int, default=5)
+    parser.add_argument("--num-iter", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    inputs = get_inputs(args)
+    model = torch.jit.script(VariableCostNet(args.hidden_size).eval())
+    cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+    hint = ipex.cpu.runtime.MultiStreamModuleHint(0, 0)
+    static = ipex.cpu.runtime.MultiStreamModule(
+        model,
+        num_streams=args.num_streams,
+        cpu_pool=cpu_pool,
+        input_split_hint=hint,
+    )
+    stealing = ipex.cpu.runtime.MultiStreamModule(
+        model,
+        num_streams=args.num_streams,
+        cpu_pool=cpu_pool,
+        input_split_hint=hint,
+        work_stealing=True,
+        chunks_per_stream=args.chunks_per_stream,
+    )
+    static_latency = run_bench(static, inputs, args.num_warmup)
+    stealing_latency = run_bench(stealing, inputs, args.num_warmup)
+    print(
+        "batch size: {}, heavy sample ratio: {:.2%}".format(
+            args.batch_size, args.heavy_ratio
+        )
+    )
+    for name, latency in [
+        ("static splitting", static_latency),
+        ("work stealing", stealing_latency),
+    ]:
+        print("{}: mean {:.3f} ms, p50 {:.3f} ms, p99 {:.3f} ms".format(name, *latency))
+    print("p99 speedup: {:.2f}x".format(static_latency[2] / stealing_latency[2]))
+
+
+if __name__ == "__main__":
+    run()
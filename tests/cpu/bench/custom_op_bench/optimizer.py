@@ -1,6 +1,7 @@
 import torch
 import time
 import math
+import itertools
 
 a = torch.ones(256 * 1024 * 1024 // 4, dtype=torch.float)
 b = torch.ones(256 * 1024 * 1024 // 4, dtype=torch.float)
@@ -97,6 +98,38 @@ def non_fused_adam(
     param.addcdiv_(exp_avg, denom, value=-step_size)
 
 
+def non_fused_adamw(
+    param,
+    exp_avg,
+    exp_avg_sq,
+    max_exp_avg_sq,
+    grad,
+    amsgrad,
+    step,
+    beta1,
+    beta2,
+    lr,
+    weight_decay,
+    eps,
+):
+    # decoupled weight decay
+    param.mul_(1 - lr * weight_decay)
+    non_fused_adam(
+        param,
+        exp_avg,
+        exp_avg_sq,
+        max_exp_avg_sq,
+        grad,
+        amsgrad,
+        step,
+        beta1,
+        beta2,
+        lr,
+        0,
+        eps,
+    )
+
+
 def run_bench(bench_name, func, *params):
     for _ in range(1000):
         flush()
@@ -299,10 +332,10 @@ def adagrad_bench():
         )
 
 
-def adam_bench():
-    print("Running benchmark for Adam update step")
-    fused = torch.ops.torch_ipex.adam_fused_step
-    non_fused = non_fused_adam
+def adam_bench(name="Adam", fused=None, non_fused=None):
+    print("Running benchmark for {} update step".format(name))
+    fused = torch.ops.torch_ipex.adam_fused_step if fused is None else fused
+    non_fused = non_fused_adam if non_fused is None else non_fused
 
     step = 10
     beta1 = 0.8
@@ -323,7 +356,7 @@ def adam_bench():
 
         print("For parameter size", param_size)
         run_bench(
-            "fused Adam",
+            "fused {}".format(name),
             fused,
             param,
             exp_avg,
@@ -340,7 +373,7 @@ def adam_bench():
             eps,
         )
         run_bench(
-            "fused split Adam",
+            "fused split {}".format(name),
             fused,
             param.bfloat16(),
             exp_avg,
@@ -357,7 +390,7 @@ def adam_bench():
             eps,
         )
         run_bench(
-            "non fused Adam",
+            "non fused {}".format(name),
             non_fused,
             param,
             exp_avg,
@@ -374,6 +407,58 @@ def adam_bench():
         )
 
 
+def adamw_bench():
+    adam_bench("AdamW", torch.ops.torch_ipex.adamw_fused_step, non_fused_adamw)
+
+
+def flat_arena_bench():
+    # the step of many small params, dominated by the per-param overhead
+    import intel_extension_for_pytorch as ipex
+
+    print("Running benchmark for Adam/AdamW step with flat arena")
+    num_layers = 512
+    hidden_size = 64
+    for optimizer_cls, (dtype, split) in itertools.product(
+        [torch.optim.Adam, torch.optim.AdamW],
+        [(torch.float, False), (torch.bfloat16, False), (torch.bfloat16, True)],
+    ):
+        results = []
+        for flat_arena in [False, True]:
+            model = torch.nn.Sequential(
+                *[torch.nn.Linear(hidden_size, hidden_size) for _ in range(num_layers)]
+            ).train()
+            optimizer = optimizer_cls(model.parameters(), lr=1e-3, weight_decay=0.01)
+            # prepacked weights are not packed into the flat arena
+            model, optimizer = ipex.optimize(
+                model,
+                dtype=dtype,
+                optimizer=optimizer,
+                weights_prepack=False,
+                split_master_weight_for_bf16=split,
+            )
+            if flat_arena:
+                optimizer = ipex.optim.enable_flat_arena(optimizer)
+            with torch.cpu.amp.autocast(enabled=dtype is torch.bfloat16):
+                model(torch.randn(8, hidden_size)).sum().backward()
+            optimizer.step()
+            start = time.time()
+            for _ in range(100):
+                optimizer.step()
+            results.append((time.time() - start) / 100 * 1000)
+        print(
+            "{} {}{} with {} params: per param fused step {:.3f} ms, "
+            "flat arena {:.3f} ms, speedup {:.2f}x".format(
+                optimizer_cls.__name__,
+                dtype,
+                " split" if split else "",
+                num_layers * 2,
+                results[0],
+                results[1],
+                results[0] / results[1],
+            )
+        )
+
+
 def run():
     import argparse
 
@@ -383,11 +468,13 @@ def run():
         "lamb": lamb_bench,
         "adagrad": adagrad_bench,
         "adam": adam_bench,
+        "adamw": adamw_bench,
+        "flat_arena": flat_arena_bench,
     }
     parser.add_argument(
         "--optimizer",
         type=str,
-        choices=["sgd", "lamb", "adagrad", "adam"],
+        choices=["sgd", "lamb", "adagrad", "adam", "adamw", "flat_arena"],
         default="sgd",
     )
     args = parser.parse_args()
@@ -0,0 +1,86 @@
+import torch
+import intel_extension_for_pytorch as ipex  # noqa F401
+from intel_extension_for_pytorch.transformers.models.cpu.fusions.mha_fusion import (
+    _IPEXVarlenScaledDotProductCPU,
+)
+import argparse
+import random
+import time
+
+
+def get_inputs(args, dtype):
+    random.seed(args.seed)
+    seqlens = [
+        random.randint(args.min_seqlen, args.max_seqlen) for _ in range(args.batch_size)
+    ]
+    cu_seqlens = torch.tensor([0] + seqlens).cumsum(0).to(torch.int32)
+    total = sum(seqlens)
+    query = torch.randn(total, args.num_head, args.head_size).to(dtype)
+    key = torch.randn(total, args.num_head_k, args.head_size).to(dtype)
+    value = torch.randn(total, args.num_head_k, args.head_size).to(dtype)
+    out = torch.empty_like(query)
+    return [
+        query,
+        key,
+        value,
+        out,
+        cu_seqlens,
+        cu_seqlens,
+        max(seqlens),
+        max(seqlens),
+        0.0,
+        None,
+        False,
+        True,
+        False,
+        None,
+    ], seqlens
+
+
+def run_bench(fn, inputs, num_warmup, num_iter):
+    with torch.no_grad():
+        for _ in range(num_warmup):
+            fn(*inputs)
+        start = time.time()
+        for _ in range(num_iter):
+            fn(*inputs)
+        end = time.time()
+    return (end - start) / num_iter * 1000
+
+
+def run():
+    parser = argparse.ArgumentParser(description="benchmark for ipex varlen attention")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--min-seqlen", type=int, default=32)
+    parser.add_argument("--max-seqlen", type=int, default=2048)
+    parser.add_argument("--num-head", type=int, default=32)
+    parser.add_argument("--num-head-k", type=int, default=8)
+    parser.add_argument("--head-size", type=int, default=128)
+    parser.add_argument("--num-warmup", type=int, default=5)
+    parser.add_argument("--num-iter", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bf16", action="store_true", default=False)
+    args = parser.parse_args()
+    dtype = torch.bfloat16 if args.bf16 else torch.float32
+    inputs, seqlens = get_inputs(args, dtype)
+    padding_ratio = 1 - sum(seqlens) / (max(seqlens) * len(seqlens))
+    padded = run_bench(
+        _IPEXVarlenScaledDotProductCPU.padded_apply_function,
+        inputs,
+        args.num_warmup,
+        args.num_iter,
+    )
+    varlen = run_bench(
+        _IPEXVarlenScaledDotProductCPU.apply_function,
+        inputs,
+        args.num_warmup,
+        args.num_iter,
+    )
+    print("seqlens: {}, padding ratio: {:.2%}".format(seqlens, padding_ratio))
+    print("padded varlen attention: {:.3f} ms".format(padded))
+    print("padding-free varlen attention: {:.3f} ms".format(varlen))
+    print("speedup: {:.2f}x".format(padded / varlen))
+
+
+if __name__ == "__main__":
+    run()
@@ -7,3 +7,9 @@ do
     export W_SIZE=$w_size
     python -m intel_extension_for_pytorch.cpu.launch --ccl_worker_count=1 --nproc_per_node=$W_SIZE --distributed --nnodes 1 $DISTRIBUTED_EMB
 done
+TENSOR_PARALLEL=${DIR}/test_ipex_tensor_parallel.py
+for w_size in 2 4
+do
+    export W_SIZE=$w_size
+    python -m intel_extension_for_pytorch.cpu.launch --ccl_worker_count=1 --nproc_per_node=$W_SIZE --distributed --nnodes 1 $TENSOR_PARALLEL -v
+done
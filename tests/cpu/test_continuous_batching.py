@@ -0,0 +1,215 @@
+import copy
+import os
+import random
+import unittest
+
+import torch
+import intel_extension_for_pytorch as ipex
+from common_utils import TestCase
+from intel_extension_for_pytorch.llm.serving import (
+    BlockManager,
+    ContinuousBatchingEngine,
+    PagedKVCache,
+    PagedLlamaAdapter,
+    paged_attention,
+)
+
+try:
+    import transformers
+    from transformers import AutoConfig
+
+    HAS_TRANSFORMERS = True
+except ImportError:
+    HAS_TRANSFORMERS = False
+skipIfNoTransformers = unittest.skipIf(not HAS_TRANSFORMERS, "no transformers")
+
+curpath = os.path.abspath(os.path.dirname(__file__))
+
+
+class PagedDecoder(torch.nn.Module):
+    def __init__(
+        self,
+        vocab_size=128,
+        hidden_size=64,
+        num_heads=4,
+        num_kv_heads=2,
+        num_layers=2,
+        max_positions=256,
+    ):
+        super().__init__()
+        self.num_heads = num_heads
+        self.num_kv_heads = num_kv_heads
+        self.head_size = hidden_size // num_heads
+        self.embed = torch.nn.Embedding(vocab_size, hidden_size)
+        self.pos_embed = torch.nn.Embedding(max_positions, hidden_size)
+        self.layers = torch.nn.ModuleList()
+        for _ in range(num_layers):
+            layer = torch.nn.Module()
+            layer.q = torch.nn.Linear(hidden_size, num_heads * self.head_size)
+            layer.k = torch.nn.Linear(hidden_size, num_kv_heads * self.head_size)
+            layer.v = torch.nn.Linear(hidden_size, num_kv_heads * self.head_size)
+            layer.o = torch.nn.Linear(hidden_size, hidden_size)
+            self.layers.append(layer)
+        self.lm_head = torch.nn.Linear(hidden_size, vocab_size)
+
+    def _qkv(self, layer, hidden_states):
+        num_tokens = hidden_states.size(0)
+        query = layer.q(hidden_states).view(num_tokens, self.num_heads, -1)
+        key = layer.k(hidden_states).view(num_tokens, self.num_kv_heads, -1)
+        value = layer.v(hidden_states).view(num_tokens, self.num_kv_heads, -1)
+        return query, key, value
+
+    def forward(self, input_ids, positions, kv_caches, metadata):
+        hidden_states = self.embed(input_ids) + self.pos_embed(positions)
+        for layer, (key_cache, value_cache) in zip(self.layers, kv_caches):
+            query, key, value = self._qkv(layer, hidden_states)
+            attn_output = paged_attention(
+                query,
+                key,
+                value,
+                key_cache,
+                value_cache,
+                metadata,
+                self.head_size**-0.5,
+            )
+            hidden_states = hidden_states + layer.o(
+                attn_output.reshape(hidden_states.shape)
+            )
+        return self.lm_head(hidden_states)
+
+    def forward_dense(self, input_ids):
+        # recompute the whole sequence with a causal SDPA
+        positions = torch.arange(input_ids.size(0))
+        hidden_states = self.embed(input_ids) + self.pos_embed(positions)
+        group = self.num_heads // self.num_kv_heads
+        for layer in self.layers:
+            query, key, value = self._qkv(layer, hidden_states)
+            key = key.repeat_interleave(group, dim=1)
+            value = value.repeat_interleave(group, dim=1)
+            attn_output = torch.nn.functional.scaled_dot_product_attention(
+                query.transpose(0, 1),
+                key.transpose(0, 1),
+                value.transpose(0, 1),
+                is_causal=True,
+            ).transpose(0, 1)
+            hidden_states = hidden_states + layer.o(
+                attn_output.reshape(hidden_states.shape)
+            )
+        return self.lm_head(hidden_states)
+
+    def generate_dense(self, prompt, max_new_tokens):
+        tokens = list(prompt)
+        for _ in range(max_new_tokens):
+            logits = self.forward_dense(torch.tensor(tokens))
+            tokens.append(int(logits[-1].argmax()))
+        return tokens[len(prompt) :]
+
+
+class ContinuousBatchingTester(TestCase):
+    def test_block_manager(self):
+        block_manager = BlockManager(num_blocks=4, block_size=4)
+        self.assertTrue(block_manager.can_allocate(16))
+        self.assertFalse(block_manager.can_allocate(17))
+        slots = block_manager.allocate(0, 5)
+        self.assertEqual(len(block_manager.get_block_table(0)), 2)
+        self.assertEqual(len(set(slots)), 5)
+        self.assertEqual(block_manager.get_num_free_blocks(), 2)
+        for position in range(5, 8):
+            slots.append(block_manager.append_slot(0, position))
+        self.assertEqual(block_manager.get_num_free_blocks(), 2)
+        slots.append(block_manager.append_slot(0, 8))
+        self.assertEqual(block_manager.get_num_free_blocks(), 1)
+        self.assertEqual(len(set(slots)), 9)
+        block_manager.free(0)
+        self.assertEqual(block_manager.get_num_free_blocks(), 4)
+
+    def _test_engine(self, num_blocks, max_num_seqs):
+        torch.manual_seed(0)
+        random.seed(0)
+        model = PagedDecoder().eval()
+        kv_cache = PagedKVCache(
+            num_layers=len(model.layers),
+            num_blocks=num_blocks,
+            block_size=8,
+            num_kv_heads=model.num_kv_heads,
+            head_size=model.head_size,
+        )
+        engine = ContinuousBatchingEngine(
+            model, kv_cache, max_num_seqs=max_num_seqs, max_num_batched_tokens=256
+        )
+        prompts = [
+            [random.randint(0, 127) for _ in range(random.randint(1, 40))]
+            for _ in range(8)
+        ]
+        max_new_tokens = [random.randint(1, 16) for _ in range(8)]
+        requests = [
+            engine.add_request(prompt, n) for prompt, n in zip(prompts, max_new_tokens)
+        ]
+        while engine.has_unfinished_requests():
+            engine.step()
+        self.assertEqual(
+            kv_cache.num_blocks, engine.block_manager.get_num_free_blocks()
+        )
+        with torch.no_grad():
+            for request, prompt, n in zip(requests, prompts, max_new_tokens):
+                self.assertEqual(
+                    request.output_token_ids, model.generate_dense(prompt, n)
+                )
+                self.assertEqual(len(request.get_token_latencies()), n)
+        return requests
+
+    def test_continuous_batching(self):
+        self._test_engine(num_blocks=64, max_num_seqs=4)
+
+    def test_continuous_batching_preemption(self):
+        # the pool only holds a couple of sequences, so running requests
+        # are preempted and recomputed
+        requests = self._test_engine(num_blocks=8, max_num_seqs=8)
+        self.assertTrue(any(r.num_preemptions > 0 for r in requests))
+
+    @skipIfNoTransformers
+    def test_paged_llama_adapter(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        config.hidden_size = 256
+        config.intermediate_size = 512
+        config.num_attention_heads = 4
+        config.num_key_value_heads = 2
+        config.num_hidden_layers = 2
+        config.vocab_size = 128
+        # the engine stops at max_new_tokens only
+        config.eos_token_id = None
+        torch.manual_seed(0)
+        random.seed(0)
+        m = transformers.models.llama.modeling_llama.LlamaForCausalLM(config).eval()
+        ref_m = copy.deepcopy(m)
+        model = PagedLlamaAdapter(
+            ipex.llm.optimize(m, dtype=torch.float, deployment_mode=False, inplace=True)
+        )
+        # the pool only holds a few sequences, so requests may be preempted
+        kv_cache = model.get_kv_cache(num_blocks=12, block_size=8)
+        engine = ContinuousBatchingEngine(
+            model, kv_cache, max_num_seqs=4, max_num_batched_tokens=256
+        )
+        prompts = [
+            [random.randint(2, 127) for _ in range(random.randint(1, 24))]
+            for _ in range(6)
+        ]
+        max_new_tokens = [random.randint(1, 8) for _ in range(6)]
+        requests = [
+            engine.add_request(prompt, n) for prompt, n in zip(prompts, max_new_tokens)
+        ]
+        while engine.has_unfinished_requests():
+            engine.step()
+        with torch.no_grad():
+            for request, prompt, n in zip(requests, prompts, max_new_tokens):
+                input_ids = torch.tensor([prompt])
+                ref_res = ref_m.generate(input_ids, do_sample=False, max_new_tokens=n)
+                self.assertEqual(
+                    request.output_token_ids, ref_res[0, len(prompt) :].tolist()
+                )
+
+
+if __name__ == "__main__":
+    test = unittest.main()
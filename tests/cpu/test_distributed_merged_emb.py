@@ -8,6 +8,8 @@ from bench.custom_op_bench.merged_embeddingbag import (
 import intel_extension_for_pytorch as ipex
 import copy
 import os
+import socket
+import torch.multiprocessing as mp
 
 try:
     import oneccl_bindings_for_pytorch  # noqa: F401
@@ -18,6 +20,96 @@ except (ImportError, RuntimeError):
 skipIfNoTORCHCCL = unittest.skipIf(not HAS_TORCHCCL, "torch-ccl is no installed")
 
 
+def _find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run_sparse_all2all(rank, world_size, port):
+    import torch.distributed as dist
+    from intel_extension_for_pytorch.nn.modules.merged_embeddingbag import (
+        sparse_all2all,
+        sparse_all2all_async,
+        _SparseAll2AllBufferPool,
+    )
+
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", world_size=world_size, rank=rank)
+    emb_dim = 7
+    ofs_size = 5
+    pool = _SparseAll2AllBufferPool()
+    for index_type in [torch.int32, torch.int64]:
+        for val_type in [torch.bfloat16, torch.float32, torch.float64]:
+            for step in range(3):
+                # rank src sends (src + dst + step) rows to rank dst
+                send_idx, send_buf, send_ofs = [], [], []
+                for dst in range(world_size):
+                    n = rank + dst + step
+                    send_idx.append(torch.arange(n).to(index_type) + rank * 100 + dst)
+                    send_buf.append(
+                        torch.full((n, emb_dim), rank * 10 + dst).to(val_type)
+                    )
+                    send_ofs.append(torch.arange(ofs_size) * (rank + 1) + dst)
+                handle = sparse_all2all_async(
+                    world_size, send_idx, send_buf, send_ofs, pool
+                )
+                recv_idx, recv_buf, recv_ofs = handle.wait()
+                ref = sparse_all2all(world_size, send_idx, send_buf, send_ofs)
+                for src in range(world_size):
+                    n = src + rank + step
+                    expected_idx = torch.arange(n).to(index_type) + src * 100 + rank
+                    assert recv_idx[src].dtype == index_type
+                    assert torch.equal(recv_idx[src], expected_idx)
+                    assert recv_buf[src].dtype == val_type
+                    assert torch.equal(
+                        recv_buf[src],
+                        torch.full((n, emb_dim), src * 10 + rank).to(val_type),
+                    )
+                    assert torch.equal(
+                        recv_ofs[src], torch.arange(ofs_size) * (src + 1) + rank
+                    )
+                    assert torch.equal(ref[0][src], recv_idx[src])
+                    assert torch.equal(ref[1][src], recv_buf[src])
+                    assert torch.equal(ref[2][src], recv_ofs[src])
+                handle.release()
+    # the send and recv buffers are reused across the steps
+    assert len(pool.free) <= 2
+    dist.destroy_process_group()
+
+
+def _run_dist_merged_emb_prefetch(rank, world_size, port):
+    import torch.distributed as dist
+
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", world_size=world_size, rank=rank)
+    torch.manual_seed(0)
+    num_table = 4
+    batch_size = 8
+    emb_list = EmbeddingBagList(num_table, 16, torch.float32, mode="sum")
+    distributed_emb = (
+        ipex.nn.modules.DistMergeEmbeddingBagWithAdaGrad.from_embeddingbag_list(
+            copy.deepcopy(emb_list.list), lr=1
+        )
+    )
+    batches = []
+    for _ in range(3):
+        indices = [torch.randint(1000, (batch_size * 2,)) for _ in range(num_table)]
+        offsets = [torch.arange(0, batch_size * 2, 2) for _ in range(num_table)]
+        batches.append((indices, offsets))
+    with torch.no_grad():
+        ref = [distributed_emb(indices, offsets) for indices, offsets in batches]
+        distributed_emb.prefetch(*batches[0])
+        for i, (indices, offsets) in enumerate(batches):
+            out = distributed_emb(indices, offsets)
+            if i + 1 < len(batches):
+                distributed_emb.prefetch(*batches[i + 1])
+            assert torch.equal(out, ref[i])
+    dist.destroy_process_group()
+
+
 class DistMergedEmbeddingTester(TestCase):
     multi_hot = [
         3,
@@ -149,5 +241,25 @@ class DistMergedEmbeddingTester(TestCase):
         dist.destroy_process_group()
 
 
+class SparseAll2AllTester(TestCase):
+    def test_sparse_all2all(self):
+        world_size = 2
+        mp.spawn(
+            _run_sparse_all2all,
+            args=(world_size, _find_free_port()),
+            nprocs=world_size,
+            join=True,
+        )
+
+    def test_dist_merged_emb_prefetch(self):
+        world_size = 2
+        mp.spawn(
+            _run_dist_merged_emb_prefetch,
+            args=(world_size, _find_free_port()),
+            nprocs=world_size,
+            join=True,
+        )
+
+
 if __name__ == "__main__":
     test = unittest.main()
@@ -2,6 +2,7 @@ import tempfile
 import torch
 
 import copy
+import json
 import os
 import unittest
 import transformers
@@ -124,6 +125,101 @@ class GPTQLLMTester(TestCase):
                     # the optimized model is ipex_m.trace_graph
                     model(*example_inputs)
 
+    def test_gptq_batched_calibration(self):
+        from intel_extension_for_pytorch.quantization.GPTQ import _gptq
+
+        curpath = os.path.abspath(os.path.dirname(__file__))
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        gptj = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        torch.manual_seed(0)
+        dataset = [(torch.randint(config.vocab_size, [1, 64]),) for _ in range(8)]
+        with tempfile.TemporaryDirectory() as work_dir:
+            ckpts = []
+            # per sample and sequential as the reference
+            for micro_batch_size, num_workers in [(1, 1), (4, 1), (8, 2)]:
+                path = os.path.join(
+                    work_dir, "gptq_{}_{}.pt".format(micro_batch_size, num_workers)
+                )
+                _gptq(
+                    copy.deepcopy(gptj),
+                    dataset,
+                    path,
+                    wbits=4,
+                    group_size=32,
+                    micro_batch_size=micro_batch_size,
+                    num_workers=num_workers,
+                )
+                ckpts.append(torch.load(path))
+            for ckpt in ckpts[1:]:
+                self.assertEqual(ckpt.keys(), ckpts[0].keys())
+                for key in ckpt:
+                    if key.endswith(".qweight") or key.endswith(".qzeros"):
+                        # rounding of a few elements may flip with the batched GEMMs
+                        mismatch = (ckpt[key] != ckpts[0][key]).float().mean()
+                        self.assertLess(mismatch.item(), 0.01)
+                    else:
+                        self.assertEqual(ckpt[key], ckpts[0][key], atol=1e-2, rtol=1e-2)
+
+    def test_gptq_resume(self):
+        from intel_extension_for_pytorch.quantization.GPTQ import _gptq
+
+        curpath = os.path.abspath(os.path.dirname(__file__))
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        gptj = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        self.assertGreater(len(gptj.transformer.h), 1)
+        torch.manual_seed(0)
+        dataset = [(torch.randint(config.vocab_size, [1, 64]),) for _ in range(4)]
+
+        def interrupt(module, args):
+            raise KeyboardInterrupt
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            ref_path = os.path.join(work_dir, "ref.pt")
+            _gptq(copy.deepcopy(gptj), dataset, ref_path, wbits=4, group_size=32)
+            ref = torch.load(ref_path)
+            for offload_activations in [False, True]:
+                run_dir = os.path.join(work_dir, "run_%d" % offload_activations)
+                path = os.path.join(work_dir, "resumed.pt")
+                model = copy.deepcopy(gptj)
+                # interrupted in the second block
+                model.transformer.h[1].register_forward_pre_hook(interrupt)
+                with self.assertRaises(KeyboardInterrupt):
+                    _gptq(
+                        model,
+                        dataset,
+                        path,
+                        wbits=4,
+                        group_size=32,
+                        work_dir=run_dir,
+                        offload_activations=offload_activations,
+                    )
+                self.assertFalse(os.path.exists(path))
+                self.assertTrue(os.path.exists(os.path.join(run_dir, "block_0.pt")))
+                self.assertFalse(os.path.exists(os.path.join(run_dir, "block_1.pt")))
+                with open(os.path.join(run_dir, "progress.json")) as f:
+                    self.assertEqual(json.load(f)["block"], 1)
+                # resumed from the second block
+                _gptq(
+                    copy.deepcopy(gptj),
+                    dataset,
+                    path,
+                    wbits=4,
+                    group_size=32,
+                    work_dir=run_dir,
+                    offload_activations=offload_activations,
+                )
+                resumed = torch.load(path)
+                self.assertEqual(resumed.keys(), ref.keys())
+                for key in ref:
+                    self.assertEqual(resumed[key], ref[key])
+                self.assertFalse(os.path.exists(os.path.join(run_dir, "progress.json")))
+                block = torch.load(os.path.join(run_dir, "block_1.pt"))
+                self.assertTrue(any(key.endswith(".g_idx") for key in block))
+
 
 if __name__ == "__main__":
     test = unittest.main()
@@ -2,6 +2,7 @@ import unittest
 import copy
 import os
 import tempfile
+import time
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -125,6 +126,81 @@ class TestGraphCapture(TestCase):
         self.assertEqual(y1, y2_bf16, prec=0.01)
         self.assertTrue(y2_bf16.dtype == torch.bfloat16)
 
+    def test_inference_graph_mode_shape_cache(self):
+        model = Conv_Bn_Relu().to(memory_format=torch.channels_last).eval()
+        model = ipex.optimize(model, graph_mode=True)
+        graph_capture = model.forward.graph_capture
+        graph_capture.cache_size = 2
+        with torch.no_grad():
+            for batch_size in [1, 2, 1, 3, 4, 1]:
+                x = torch.randn(batch_size, 6, 10, 10).to(
+                    memory_format=torch.channels_last
+                )
+                self.assertEqual(model(x), graph_capture.model(x))
+        stats = graph_capture.cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 5)
+        self.assertEqual(stats["compiles"], 5)
+        self.assertEqual(stats["evictions"], 3)
+        self.assertEqual(stats["size"], 2)
+        self.assertTrue(stats["compile_time"] > 0)
+
+    def test_inference_graph_mode_shape_bucket(self):
+        model = Conv_Bn_Relu().to(memory_format=torch.channels_last).eval()
+        model = ipex.optimize(model, graph_mode=True)
+        graph_capture = model.forward.graph_capture
+        graph_capture.bucket_dims = {0: "pow2"}
+        graph_capture.pad_to_bucket = True
+        with torch.no_grad():
+            for batch_size in [5, 6, 7, 8, 3]:
+                x = torch.randn(batch_size, 6, 10, 10).to(
+                    memory_format=torch.channels_last
+                )
+                y = model(x)
+                self.assertEqual(y.size(0), batch_size)
+                self.assertEqual(y, graph_capture.model(x))
+        stats = graph_capture.cache_stats()
+        # batch sizes 5 ~ 8 are padded to 8, 3 is padded to 4
+        self.assertEqual(stats["compiles"], 2)
+        self.assertEqual(stats["hits"], 3)
+
+    def test_inference_graph_mode_shape_bucket_no_padding(self):
+        model = Conv_Bn_Relu().to(memory_format=torch.channels_last).eval()
+        model = ipex.optimize(model, graph_mode=True)
+        graph_capture = model.forward.graph_capture
+        graph_capture.bucket_dims = {0: "pow2"}
+        with torch.no_grad():
+            for batch_size in [5, 7, 5]:
+                x = torch.randn(batch_size, 6, 10, 10).to(
+                    memory_format=torch.channels_last
+                )
+                y = model(x)
+                self.assertEqual(y.size(0), batch_size)
+                self.assertEqual(y, graph_capture.model(x))
+        stats = graph_capture.cache_stats()
+        # the graph traced with 5 is not reused for 7 of the same bucket
+        self.assertEqual(stats["compiles"], 2)
+        self.assertEqual(stats["hits"], 1)
+
+    def test_inference_graph_mode_background_compile(self):
+        model = Conv_Bn_Relu().to(memory_format=torch.channels_last).eval()
+        x = torch.randn(3, 6, 10, 10).to(memory_format=torch.channels_last)
+        y1 = model(x)
+        model = ipex.optimize(model, graph_mode=True)
+        graph_capture = model.forward.graph_capture
+        graph_capture.background_compile = True
+        with torch.no_grad():
+            # served in eager mode while the graph is compiled
+            self.assertEqual(model(x), y1)
+            for _ in range(100):
+                if graph_capture.cache_stats()["size"] == 1:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(model(x), y1)
+        stats = graph_capture.cache_stats()
+        self.assertEqual(stats["compiles"], 1)
+        self.assertEqual(stats["hits"], 1)
+
     def test_inference_trace_graph_mode(self):
         model = Conv_Bn_Relu().to(memory_format=torch.channels_last).eval()
         x = torch.randn(3, 6, 10, 10).to(memory_format=torch.channels_last)
@@ -430,6 +430,60 @@ class TestLLMModules(TestCase):
             ipex_out = ipex.llm.functional.silu_mul(x_, x_)
             self.assertEqual(ref_out, ipex_out)
 
+    def test_varlen_attention(self):
+        # reference: pad each packed sequence and run one batched SDPA
+        from intel_extension_for_pytorch.transformers.models.cpu.fusions.mha_fusion import (
+            _IPEXVarlenScaledDotProductCPU,
+        )
+
+        seqlens = [3, 17, 1, 8]
+        cu_seqlens = torch.tensor([0] + seqlens).cumsum(0).to(torch.int32)
+        max_seqlen = max(seqlens)
+        total = sum(seqlens)
+        head_size = 64
+        for dtype in [torch.float, torch.bfloat16]:
+            for num_head, num_head_k in [(8, 8), (8, 2), (8, 1)]:
+                for is_causal in [True, False]:
+                    for softmax_scale in [None, 0.5]:
+                        query = torch.randn(total, num_head, head_size).to(dtype)
+                        key = torch.randn(total, num_head_k, head_size).to(dtype)
+                        value = torch.randn(total, num_head_k, head_size).to(dtype)
+                        ref_out = torch.empty_like(query)
+                        _IPEXVarlenScaledDotProductCPU.padded_apply_function(
+                            query,
+                            key,
+                            value,
+                            ref_out,
+                            cu_seqlens,
+                            cu_seqlens,
+                            max_seqlen,
+                            max_seqlen,
+                            0.0,
+                            softmax_scale,
+                            False,
+                            is_causal,
+                            False,
+                            None,
+                        )
+                        out = torch.empty_like(query)
+                        ipex.llm.functional.varlen_attention(
+                            query,
+                            key,
+                            value,
+                            out,
+                            cu_seqlens,
+                            cu_seqlens,
+                            max_seqlen,
+                            max_seqlen,
+                            0.0,
+                            softmax_scale,
+                            False,
+                            is_causal,
+                            False,
+                            None,
+                        )
+                        self.assertEqual(out, ref_out)
+
 
 if __name__ == "__main__":
     test = unittest.main()
@@ -445,6 +445,158 @@ class OptimizeTransformersTester(TestCase):
                 ref_res = ref_m.generate(input_ids, **generate_kwargs)
                 self.assertEqual(ipex_res, ref_res)
 
+    def test_graph_cache(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        input_ids = torch.ones(8).unsqueeze(0).to(torch.long)
+        generate_kwargs = dict(do_sample=False, max_new_tokens=4, min_new_tokens=4)
+        with tempfile.TemporaryDirectory() as work_dir:
+            ipex_m = ipex.llm.optimize(
+                m, dtype=torch.float, deployment_mode=True, graph_cache_dir=work_dir
+            )
+            graphs = [
+                os.path.join(root, f)
+                for root, _, files in os.walk(work_dir)
+                for f in files
+                if f.endswith(".pt")
+            ]
+            self.assertEqual(len(graphs), 1)
+            mtime = os.path.getmtime(graphs[0])
+            # the second run loads the graph instead of tracing it
+            cached_m = ipex.llm.optimize(
+                m, dtype=torch.float, deployment_mode=True, graph_cache_dir=work_dir
+            )
+            self.assertEqual(os.path.getmtime(graphs[0]), mtime)
+            self.assertTrue(
+                isinstance(cached_m.trace_graph.optimized_model, torch.jit.ScriptModule)
+            )
+            with torch.inference_mode(), torch.no_grad():
+                self.assertEqual(
+                    cached_m.generate(input_ids, **generate_kwargs),
+                    ipex_m.generate(input_ids, **generate_kwargs),
+                )
+            # a different dtype does not hit the cache
+            ipex.llm.optimize(
+                m,
+                dtype=torch.bfloat16,
+                deployment_mode=True,
+                graph_cache_dir=work_dir,
+            )
+            self.assertEqual(len(os.listdir(work_dir)), 2)
+
+    def test_graph_cache_key(self):
+        from intel_extension_for_pytorch.transformers.graph_cache import (
+            graph_cache_key,
+        )
+
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+
+        def key(qconfig, qconfig_summary_file=None):
+            return graph_cache_key(
+                m,
+                torch.float,
+                qconfig,
+                qconfig_summary_file=qconfig_summary_file,
+            )
+
+        # the qconfigs built separately have the same key
+        self.assertEqual(
+            key(ipex.quantization.get_smooth_quant_qconfig_mapping(alpha=0.5)),
+            key(ipex.quantization.get_smooth_quant_qconfig_mapping(alpha=0.5)),
+        )
+        self.assertNotEqual(
+            key(ipex.quantization.get_smooth_quant_qconfig_mapping(alpha=0.5)),
+            key(ipex.quantization.get_smooth_quant_qconfig_mapping(alpha=0.6)),
+        )
+        self.assertEqual(
+            key(ipex.quantization.get_weight_only_quant_qconfig_mapping()),
+            key(ipex.quantization.get_weight_only_quant_qconfig_mapping()),
+        )
+        # the recalibrated scales in the same qconfig summary file change the key
+        qconfig = ipex.quantization.default_static_qconfig_mapping
+        with tempfile.TemporaryDirectory() as work_dir:
+            qconfig_summary_file = os.path.join(work_dir, "qconfig.json")
+            with open(qconfig_summary_file, "w") as f:
+                f.write('{"scale": 0.1}')
+            key0 = key(qconfig, qconfig_summary_file)
+            self.assertEqual(key(qconfig, qconfig_summary_file), key0)
+            self.assertNotEqual(key(qconfig), key0)
+            with open(qconfig_summary_file, "w") as f:
+                f.write('{"scale": 0.2}')
+            self.assertNotEqual(key(qconfig, qconfig_summary_file), key0)
+
+    def test_assisted_decoding(self):
+        from unittest import mock
+        from intel_extension_for_pytorch.transformers.generation.assisted_decoding import (
+            _IAKVForward,
+        )
+
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        config.hidden_size = 256
+        config.intermediate_size = 512
+        config.num_attention_heads = 4
+        config.vocab_size = 128
+        torch.manual_seed(0)
+        m = transformers.models.llama.modeling_llama.LlamaForCausalLM(config).eval()
+        # a draft model with other weights proposes mostly wrong tokens
+        torch.manual_seed(1)
+        other_m = transformers.models.llama.modeling_llama.LlamaForCausalLM(
+            config
+        ).eval()
+        ref_m = copy.deepcopy(m)
+        ipex_m = ipex.llm.optimize(
+            m, dtype=torch.float, deployment_mode=False, inplace=True
+        )
+        input_ids = torch.arange(2, 10).unsqueeze(0).to(torch.long)
+        generate_kwargs = dict(do_sample=False, max_new_tokens=16, min_new_tokens=16)
+        with torch.inference_mode(), torch.no_grad():
+            ref_res = ref_m.generate(input_ids, **generate_kwargs)
+
+        rewinds = []
+        rewind = _IAKVForward.rewind
+
+        def checked_rewind(forward, length):
+            dropped = length < forward.cache_length
+            rewind(forward, length)
+            if dropped:
+                rewinds.append((length, forward.past_key_values))
+
+        for draft_m, all_accepted in [(copy.deepcopy(ref_m), True), (other_m, False)]:
+            draft_m = ipex.llm.optimize(
+                draft_m, dtype=torch.float, deployment_mode=False, inplace=True
+            )
+            rewinds.clear()
+            with torch.inference_mode(), torch.no_grad(), mock.patch.object(
+                _IAKVForward, "rewind", checked_rewind
+            ):
+                ipex_res = ipex_m.generate(
+                    input_ids, assistant_model=draft_m, **generate_kwargs
+                )
+            # the draft tokens never change the greedy output
+            self.assertEqual(ipex_res, ref_res)
+            stats = ipex_m._ipex_assisted_decoding_stats
+            self.assertEqual(stats.new_tokens, 16)
+            self.assertTrue(stats.steps > 0 and stats.draft_tokens > 0)
+            self.assertTrue(stats.steps < 16 if all_accepted else stats.steps > 1)
+            self.assertEqual(stats.accepted_tokens == stats.draft_tokens, all_accepted)
+            # the rejected tokens are dropped from the caches: seq_info holds
+            # the kept length and the beam_idx rows after it are reset
+            self.assertEqual(len(rewinds) > 0, not all_accepted)
+            for length, past_key_values in rewinds:
+                for layer_past in past_key_values:
+                    self.assertEqual(layer_past[0].size(-2), length)
+                    beam_idx = layer_past[3]
+                    self.assertEqual(
+                        beam_idx[length:], beam_idx[:1].expand_as(beam_idx[length:])
+                    )
+
 
 if __name__ == "__main__":
     test = unittest.main()
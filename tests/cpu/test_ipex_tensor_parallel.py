@@ -5,15 +5,19 @@ import sys
 import subprocess
 import os
 import copy
+import time
 from intel_extension_for_pytorch.transformers import (
     shard_mha_weights,
     shard_mlp_weights,
     shard_lm_head_weights,
+    shard_model_weights,
     update_heads_info,
+    TensorParallelColumnLinear,
     TensorParallelRowLinear,
     TensorParallelLMhead,
     TensorParallelConv2d,
 )
+from intel_extension_for_pytorch.transformers.tensor_parallel import _head_range
 from intel_extension_for_pytorch.cpu import comm as ipex_comm
 
 try:
@@ -34,6 +38,9 @@ curpath = os.path.abspath(os.path.dirname(__file__))
 
 from hf_configs.yuan.yuan_hf_model import YuanForCausalLM
 from hf_configs.phi.modeling_phi import PhiForCausalLM
+from hf_configs.baichuan.modeling_baichuan import BaichuanForCausalLM
+from hf_configs.chatglm.modeling_chatglm import ChatGLMForConditionalGeneration
+from hf_configs.qwen.modeling_qwen import QWenLMHeadModel
 
 has_ccl = ipex_comm.has_ccl()
 world_size = 0 if not has_ccl else ipex_comm.get_world_size()
@@ -107,7 +114,7 @@ class TensorParallelTester(TestCase):
                 update_heads_info(model, rank, world_size)
         return model
 
-    def tensor_parallel_with_optimize_transformers(self, model):
+    def tensor_parallel_with_optimize_transformers(self, model, has_position_ids=True):
         input_ids = torch.ones(10).to(torch.long)
         attention_mask = torch.ones(len(input_ids))
         position_ids = torch.arange(len(input_ids))
@@ -116,7 +123,8 @@ class TensorParallelTester(TestCase):
             "attention_mask": attention_mask.unsqueeze(0),
             "use_cache": True,
         }
-        input_dict["position_ids"] = position_ids.unsqueeze(0)
+        if has_position_ids:
+            input_dict["position_ids"] = position_ids.unsqueeze(0)
         ref_m = copy.deepcopy(model)
         for dtype in [torch.float32, torch.bfloat16]:
             ipex_model = ipex.optimize_transformers(model, dtype=dtype)
@@ -207,6 +215,233 @@ class TensorParallelTester(TestCase):
         self.assertTrue(tp_model.lm_head, TensorParallelLMhead)
         self.tensor_parallel_with_optimize_transformers(model)
 
+    def _native_tp_check(self, name, model_class, row_linears, has_position_ids=True):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/{name}", return_dict=False, trust_remote_code=True
+        )
+        model = model_class(config).eval()
+        if name == "falcon":
+            with torch.no_grad():
+                ipex.nn.utils._model_convert.replace_customized_linear_with_linear(
+                    model.eval()
+                )
+        tp_model = copy.deepcopy(model)
+        self.assertTrue(
+            shard_model_weights(
+                tp_model, ipex_comm.get_rank(), ipex_comm.get_world_size()
+            )
+        )
+        for m in row_linears(tp_model):
+            self.assertTrue(isinstance(m, TensorParallelRowLinear))
+        # the logits of the sharded model match the ones of the whole model
+        self.tensor_parallel_with_optimize_transformers(model, has_position_ids)
+
+    def test_tensor_parallel_replace_check_mistral(self):
+        self._native_tp_check(
+            "mistral",
+            transformers.models.mistral.modeling_mistral.MistralForCausalLM,
+            lambda m: [
+                m.model.layers[0].self_attn.o_proj,
+                m.model.layers[0].mlp.down_proj,
+            ],
+        )
+
+    def test_tensor_parallel_replace_check_mixtral(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/mixtral", return_dict=False
+        )
+        model = transformers.models.mixtral.modeling_mixtral.MixtralForCausalLM(
+            config
+        ).eval()
+        rank = ipex_comm.get_rank()
+        world_size = ipex_comm.get_world_size()
+        tp_model = copy.deepcopy(model)
+        self.assertTrue(shard_model_weights(tp_model, rank, world_size))
+        moe = tp_model.model.layers[0].block_sparse_moe
+        self.assertTrue(moe.tp_allreduce)
+        if config.num_local_experts % world_size == 0:
+            experts_per_rank = config.num_local_experts // world_size
+            self.assertEqual(len(moe.experts), experts_per_rank)
+            self.assertEqual(
+                moe.local_experts,
+                (rank * experts_per_rank, (rank + 1) * experts_per_rank),
+            )
+        self.tensor_parallel_with_optimize_transformers(model)
+
+    def test_tensor_parallel_replace_check_falcon(self):
+        self._native_tp_check(
+            "falcon",
+            transformers.models.falcon.modeling_falcon.FalconForCausalLM,
+            lambda m: [
+                m.transformer.h[0].self_attention.dense,
+                m.transformer.h[0].mlp.dense_4h_to_h,
+            ],
+        )
+
+    def test_tensor_parallel_replace_check_bloom(self):
+        self._native_tp_check(
+            "bloom",
+            transformers.models.bloom.modeling_bloom.BloomForCausalLM,
+            lambda m: [
+                m.transformer.h[0].self_attention.dense,
+                m.transformer.h[0].mlp.dense_4h_to_h,
+            ],
+            has_position_ids=False,
+        )
+
+    def test_tensor_parallel_replace_check_opt(self):
+        self._native_tp_check(
+            "opt",
+            transformers.models.opt.modeling_opt.OPTForCausalLM,
+            lambda m: [
+                m.model.decoder.layers[0].self_attn.out_proj,
+                m.model.decoder.layers[0].fc2,
+            ],
+            has_position_ids=False,
+        )
+
+    def test_tensor_parallel_replace_check_gptneox(self):
+        self._native_tp_check(
+            "gptneox",
+            transformers.models.gpt_neox.modeling_gpt_neox.GPTNeoXForCausalLM,
+            lambda m: [
+                m.gpt_neox.layers[0].attention.dense,
+                m.gpt_neox.layers[0].mlp.dense_4h_to_h,
+            ],
+        )
+
+    def test_tensor_parallel_replace_check_chatglm(self):
+        self._native_tp_check(
+            "chatglm",
+            ChatGLMForConditionalGeneration,
+            lambda m: [
+                m.transformer.encoder.layers[0].self_attention.dense,
+                m.transformer.encoder.layers[0].mlp.dense_4h_to_h,
+            ],
+        )
+
+    def test_tensor_parallel_replace_check_qwen(self):
+        self._native_tp_check(
+            "qwen",
+            QWenLMHeadModel,
+            lambda m: [m.transformer.h[0].attn.c_proj, m.transformer.h[0].mlp.c_proj],
+        )
+
+    def test_tensor_parallel_replace_check_baichuan(self):
+        self._native_tp_check(
+            "baichuan",
+            BaichuanForCausalLM,
+            lambda m: [
+                m.model.layers[0].self_attn.o_proj,
+                m.model.layers[0].mlp.down_proj,
+            ],
+        )
+
+    def test_tensor_parallel_throughput(self):
+        # reports the tokens/s of each rank, run_distributed_test.sh runs it
+        # with several world sizes to show the scaling
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        model = transformers.models.llama.modeling_llama.LlamaForCausalLM(config).eval()
+        ipex_model = ipex.optimize_transformers(model, dtype=torch.bfloat16)
+        input_ids = torch.ones(1, 32).to(torch.long)
+        max_new_tokens = 32
+        with torch.no_grad(), torch.cpu.amp.autocast():
+            ipex_model.generate(input_ids, max_new_tokens=4, min_new_tokens=4)
+            start = time.time()
+            ipex_model.generate(
+                input_ids, max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens
+            )
+            elapsed = time.time() - start
+        print(
+            "rank {} of world size {}: {:.2f} tokens/s".format(
+                ipex_comm.get_rank(),
+                ipex_comm.get_world_size(),
+                max_new_tokens / elapsed,
+            )
+        )
+
+
+class HeadRangeTester(TestCase):
+    def test_head_range_gqa(self):
+        # each query head is owned by one rank, with the key/value head of its group
+        for num_heads, num_kv_heads, world_size in [
+            (16, 8, 2),
+            (16, 8, 3),
+            (16, 2, 4),
+            (16, 1, 8),
+        ]:
+            group_size = num_heads // num_kv_heads
+            q_heads = []
+            for rank in range(world_size):
+                q_start, q_end, kv_start, kv_end = _head_range(
+                    num_heads, num_kv_heads, rank, world_size
+                )
+                q_heads.extend(range(q_start, q_end))
+                for q in range(q_start, q_end):
+                    self.assertTrue(kv_start <= q // group_size < kv_end)
+            self.assertEqual(q_heads, list(range(num_heads)))
+        with self.assertRaises(RuntimeError):
+            _head_range(16, 2, 0, 3)
+
+    def test_shard_fused_qkv(self):
+        num_heads, num_kv_heads, head_dim, world_size = 8, 2, 4, 4
+        hidden_size = num_heads * head_dim
+        for qkv_layout, out_features in [
+            ("concat", (num_heads + 2 * num_kv_heads) * head_dim),
+            ("grouped", (num_heads + 2 * num_kv_heads) * head_dim),
+        ]:
+            linear = torch.nn.Linear(hidden_size, out_features)
+            x = torch.randn(2, hidden_size)
+            ref = linear(x)
+            if qkv_layout == "concat":
+                ref_q, ref_k, ref_v = ref.split(
+                    [hidden_size, num_kv_heads * head_dim, num_kv_heads * head_dim],
+                    dim=-1,
+                )
+                ref_q = ref_q.view(2, num_heads, head_dim)
+                ref_k = ref_k.view(2, num_kv_heads, head_dim)
+                ref_v = ref_v.view(2, num_kv_heads, head_dim)
+            else:
+                ref = ref.view(2, num_kv_heads, num_heads // num_kv_heads + 2, head_dim)
+                ref_q = ref[:, :, :-2].flatten(1, 2)
+                ref_k = ref[:, :, -2]
+                ref_v = ref[:, :, -1]
+            for rank in range(world_size):
+                q_start, q_end, kv_start, kv_end = _head_range(
+                    num_heads, num_kv_heads, rank, world_size
+                )
+                tp_linear = TensorParallelColumnLinear(
+                    copy.deepcopy(linear),
+                    num_kv_heads,
+                    num_heads,
+                    head_dim,
+                    rank,
+                    world_size,
+                    shard_by_head=True,
+                    qkv_layout=qkv_layout,
+                )
+                out = tp_linear(x)
+                local_q, local_kv = q_end - q_start, kv_end - kv_start
+                if qkv_layout == "concat":
+                    q, k, v = out.split(
+                        [local_q * head_dim, local_kv * head_dim, local_kv * head_dim],
+                        dim=-1,
+                    )
+                else:
+                    out = out.view(2, local_kv, local_q // local_kv + 2, head_dim)
+                    q, k, v = out[:, :, :-2], out[:, :, -2], out[:, :, -1]
+                self.assertEqual(
+                    q.reshape(2, local_q, head_dim), ref_q[:, q_start:q_end]
+                )
+                self.assertEqual(
+                    k.reshape(2, local_kv, head_dim), ref_k[:, kv_start:kv_end]
+                )
+                self.assertEqual(
+                    v.reshape(2, local_kv, head_dim), ref_v[:, kv_start:kv_end]
+                )
+
 
 if __name__ == "__main__":
     test = unittest.main()
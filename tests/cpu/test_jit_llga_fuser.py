@@ -1,5 +1,6 @@
 import os
 import subprocess
+import threading
 import unittest
 import itertools
 import torch
@@ -1065,6 +1066,89 @@ class TestAPI(JitLlgaTestCase):
         # set the value back to the default one
         ipex._C._jit_set_llga_weight_cache_enabled(weight_cache_enabled_default_value)
 
+    def test_compiled_partition_cache_api(self):
+        capacity_default_value = ipex._C._jit_llga_compiled_partition_cache_capacity()
+        self.assertEqual(capacity_default_value, 7500)
+        ipex._C._jit_set_llga_compiled_partition_cache_capacity(64)
+        self.assertEqual(ipex._C._jit_llga_compiled_partition_cache_capacity(), 64)
+        with self.assertRaises(RuntimeError):
+            ipex._C._jit_set_llga_compiled_partition_cache_capacity(-1)
+
+        ipex._C._jit_reset_llga_compiled_partition_cache_stats()
+        stats = ipex._C._jit_llga_compiled_partition_cache_stats()
+        self.assertEqual(
+            set(stats.keys()),
+            {"hits", "misses", "evictions", "compile_time_us", "size", "capacity"},
+        )
+        self.assertEqual(stats["hits"], 0)
+        self.assertEqual(stats["misses"], 0)
+        self.assertEqual(stats["evictions"], 0)
+        self.assertEqual(stats["capacity"], 64)
+
+        ipex._C._jit_clear_llga_compiled_partition_cache()
+        self.assertEqual(ipex._C._jit_llga_compiled_partition_cache_stats()["size"], 0)
+        # set the value back to the default one
+        ipex._C._jit_set_llga_compiled_partition_cache_capacity(capacity_default_value)
+
+    @llga_fp32_bf16_test_env
+    def test_compiled_partition_cache_shared_by_threads(self):
+        class M(nn.Module):
+            def __init__(self):
+                super(M, self).__init__()
+                self.conv = nn.Conv2d(3, 8, 3)
+
+            def forward(self, x):
+                return F.relu(self.conv(x))
+
+        m = M().eval()
+        example_inputs = [torch.rand(bs, 3, 16, 16) for bs in [1, 2, 4]]
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(m, example_inputs[0]))
+        ipex._C._jit_clear_llga_compiled_partition_cache()
+        ipex._C._jit_reset_llga_compiled_partition_cache_stats()
+        stats = ipex.cpu.onednn_fusion.warm_up_llga_partitions(traced, example_inputs)
+        self.assertGreater(stats["misses"], 0)
+        self.assertGreater(stats["size"], 0)
+        self.assertGreater(stats["compile_time_us"], 0)
+
+        # the inference threads use the partitions compiled by the warm-up
+        ipex._C._jit_reset_llga_compiled_partition_cache_stats()
+        num_threads = torch.get_num_threads()
+        results = {}
+
+        def infer(idx):
+            torch.set_num_threads(num_threads)
+            with torch.no_grad():
+                results[idx] = [traced(x) for x in example_inputs for _ in range(3)]
+
+        threads = [threading.Thread(target=infer, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = ipex._C._jit_llga_compiled_partition_cache_stats()
+        self.assertEqual(stats["misses"], 0)
+        self.assertGreater(stats["hits"], 0)
+        with torch.no_grad():
+            ref = [m(x) for x in example_inputs for _ in range(3)]
+        for i in range(4):
+            self.assertEqual(results[i], ref)
+
+        # no partition is kept with the zero capacity
+        capacity_default_value = ipex._C._jit_llga_compiled_partition_cache_capacity()
+        ipex._C._jit_set_llga_compiled_partition_cache_capacity(0)
+        stats = ipex._C._jit_llga_compiled_partition_cache_stats()
+        self.assertEqual(stats["size"], 0)
+        self.assertGreater(stats["evictions"], 0)
+        ipex._C._jit_reset_llga_compiled_partition_cache_stats()
+        with torch.no_grad():
+            self.assertEqual(traced(example_inputs[0]), m(example_inputs[0]))
+        stats = ipex._C._jit_llga_compiled_partition_cache_stats()
+        self.assertEqual(stats["hits"], 0)
+        self.assertGreater(stats["misses"], 0)
+        self.assertEqual(stats["size"], 0)
+        ipex._C._jit_set_llga_compiled_partition_cache_capacity(capacity_default_value)
+
 
 class TestDebugLog(JitLlgaTestCase):
     def test_fusion_group_name(self):
@@ -785,6 +785,194 @@ class MaskedMHATest(TestCase):
         self._test_mha(torchcompile=False)
         self._test_mha_fp16(torchcompile=False)
 
+    def test_iakv_buffer_sizing(self):
+        batch_size = 2
+        seq_len = 10
+        head_num = 4
+        head_size = 64
+        mha = MaskedMHA(
+            hidden_size=head_num * head_size,
+            n_head=head_num,
+            n_head_kv=head_num,
+            head_dim=head_size,
+        )
+        input_t = torch.randn(batch_size, seq_len, head_num * head_size)
+        attention_mask = torch.zeros(batch_size, 1, seq_len, seq_len)
+        placeholder = torch.zeros([1, 1, 1, 1])
+        with torch.inference_mode(), torch.no_grad():
+            # the rows of the beam_idx placeholder size the kv cache
+            output, _, key_cache, value_cache, beam_idx = mha(
+                input_t,
+                placeholder,
+                placeholder,
+                2048,
+                attention_mask,
+                torch.zeros(40, batch_size, dtype=torch.long),
+                True,
+                torch.tensor(0),
+            )
+            self.assertEqual(key_cache.size(0), 40)
+            self.assertEqual(value_cache.size(0), 40)
+            self.assertEqual(beam_idx.size(0), 40)
+            # without hint, max_position is used
+            _, _, key_cache_default, _, beam_idx_default = mha(
+                input_t,
+                placeholder,
+                placeholder,
+                16,
+                attention_mask,
+                torch.zeros(1, batch_size, dtype=torch.long),
+                True,
+                torch.tensor(0),
+            )
+            self.assertEqual(key_cache_default.size(0), 16)
+            self.assertEqual(beam_idx_default.size(0), 16)
+            # large enough buffers are reused
+            reused_output, _, reused_key_cache, reused_value_cache, _ = mha(
+                input_t,
+                key_cache,
+                value_cache,
+                2048,
+                attention_mask,
+                torch.zeros(20, batch_size, dtype=torch.long),
+                True,
+                torch.tensor(0),
+            )
+            self.assertEqual(reused_key_cache.data_ptr(), key_cache.data_ptr())
+            self.assertEqual(reused_value_cache.data_ptr(), value_cache.data_ptr())
+            self.assertEqual(reused_output, output)
+
+    def test_iakv_multi_token_decode(self):
+        # several new tokens on top of the cache, e.g., the draft tokens
+        # verified by the target model in speculative decoding
+        head_num = 16
+        head_num_kv = 4
+        head_size = 64
+        prompt_len = 10
+        draft_len = 4
+        mha = MaskedMHA(
+            hidden_size=head_num * head_size,
+            n_head=head_num,
+            n_head_kv=head_num_kv,
+            head_dim=head_size,
+        )
+        prompt = torch.randn(1, prompt_len, head_num * head_size)
+        draft = torch.randn(1, draft_len, head_num * head_size)
+        redraft = torch.randn(1, 2, head_num * head_size)
+
+        def causal_mask(query_len, key_len):
+            return (
+                torch.full((query_len, key_len), -1e6)
+                .triu(key_len - query_len + 1)
+                .view(1, 1, query_len, key_len)
+            )
+
+        def ref_mha(input_t):
+            output, _, _, _, _ = mha(
+                input_t,
+                None,
+                None,
+                2048,
+                causal_mask(input_t.size(1), input_t.size(1)),
+                None,
+            )
+            return output
+
+        placeholder = torch.zeros([1, 1, 1, 1])
+        with torch.inference_mode(), torch.no_grad():
+            _, _, key_cache, value_cache, beam_idx = mha(
+                prompt,
+                placeholder,
+                placeholder,
+                2048,
+                torch.zeros(1, 1, prompt_len, prompt_len),
+                torch.zeros(32, 1, dtype=torch.long),
+                True,
+                torch.tensor(0),
+            )
+            output, _, key_cache, value_cache, beam_idx = mha(
+                draft,
+                key_cache,
+                value_cache,
+                2048,
+                torch.zeros(1, 1, draft_len, prompt_len + draft_len),
+                beam_idx,
+                True,
+                torch.tensor(prompt_len),
+            )
+            ref_output = ref_mha(torch.cat([prompt, draft], dim=1))
+            self.assertEqual(output, ref_output[:, :, prompt_len:], prec=1e-5)
+            # only the first draft token is kept, the next tokens overwrite the
+            # cache of the rejected ones
+            offset = prompt_len + 1
+            output, _, _, _, _ = mha(
+                redraft,
+                key_cache,
+                value_cache,
+                2048,
+                torch.zeros(1, 1, 2, offset + 2),
+                beam_idx,
+                True,
+                torch.tensor(offset),
+            )
+            ref_output = ref_mha(torch.cat([prompt, draft[:, :1], redraft], dim=1))
+            self.assertEqual(output, ref_output[:, :, offset:], prec=1e-5)
+
+    def test_iakv_multi_token_decode_grow(self):
+        # the new tokens outgrow twice the cache, which is then grown to hold
+        # all of them instead of being doubled
+        head_num = 16
+        head_size = 64
+        prompt_len = 10
+        draft_len = 40
+        mha = MaskedMHA(
+            hidden_size=head_num * head_size,
+            n_head=head_num,
+            n_head_kv=head_num,
+            head_dim=head_size,
+        )
+        prompt = torch.randn(1, prompt_len, head_num * head_size)
+        draft = torch.randn(1, draft_len, head_num * head_size)
+        total_len = prompt_len + draft_len
+        placeholder = torch.zeros([1, 1, 1, 1])
+        with torch.inference_mode(), torch.no_grad():
+            ref_output, _, _, _, _ = mha(
+                torch.cat([prompt, draft], dim=1),
+                None,
+                None,
+                2048,
+                torch.full((total_len, total_len), -1e6)
+                .triu(1)
+                .view(1, 1, total_len, total_len),
+                None,
+            )
+            # the cache is sized for 16 tokens by the beam_idx placeholder
+            _, _, key_cache, value_cache, beam_idx = mha(
+                prompt,
+                placeholder,
+                placeholder,
+                2048,
+                torch.zeros(1, 1, prompt_len, prompt_len),
+                torch.zeros(16, 1, dtype=torch.long),
+                True,
+                torch.tensor(0),
+            )
+            self.assertEqual(key_cache.size(0), 16)
+            output, _, key_cache, value_cache, beam_idx = mha(
+                draft,
+                key_cache,
+                value_cache,
+                2048,
+                torch.zeros(1, 1, draft_len, total_len),
+                beam_idx,
+                True,
+                torch.tensor(prompt_len),
+            )
+            self.assertEqual(key_cache.size(0), total_len)
+            self.assertEqual(value_cache.size(0), total_len)
+            self.assertEqual(beam_idx.size(0), total_len)
+            self.assertEqual(output, ref_output[:, :, prompt_len:], prec=1e-5)
+
 
 if __name__ == "__main__":
     test = unittest.main()
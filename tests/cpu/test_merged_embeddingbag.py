@@ -11,6 +11,7 @@ from bench.custom_op_bench.merged_embeddingbag import (
 )
 import intel_extension_for_pytorch as ipex
 import copy
+import tempfile
 
 
 class TestMergedEmbedding(TestCase):
@@ -83,22 +84,22 @@ class TestMergedEmbedding(TestCase):
         out = m(*inputs)
         ref_out = refm(*inputs)
         self.assertEqual(out, ref_out)
-        sum(out).sum().backward()
-        sum(ref_out).sum().backward()
+        sum(o.sum() for o in out).backward()
+        sum(o.sum() for o in ref_out).backward()
         if fused_update_test:
             opt.step()
-        if m.merged_emb.weights[0].dtype in (torch.float16, torch.bfloat16):
-            rtol, atol = 0.1, 0.1
-            """
-            Mismatched elements: 3328 / 128000 (2.6%)
-            Greatest absolute difference: 0.03125 at index (378, 0) (up to 0.016 allowed)
-            Greatest relative difference: 0.01275634765625 at index (297, 0) (up to 1e-05 allowed)
-
-            The aten's embedding bag do not use float as accumulate type for grad in backward
-            """
-        else:
-            rtol, atol = 1e-5, 0.016
         for i in range(len(out)):
+            if m.merged_emb.weights[i].dtype in (torch.float16, torch.bfloat16):
+                rtol, atol = 0.1, 0.1
+                """
+                Mismatched elements: 3328 / 128000 (2.6%)
+                Greatest absolute difference: 0.03125 at index (378, 0) (up to 0.016 allowed)
+                Greatest relative difference: 0.01275634765625 at index (297, 0) (up to 1e-05 allowed)
+
+                The aten's embedding bag do not use float as accumulate type for grad in backward
+                """
+            else:
+                rtol, atol = 1e-5, 0.016
             if fused_update_test:
                 self.assertEqual(
                     m.merged_emb.weights[i], refm.list[i].weight, rtol=rtol, atol=atol
@@ -230,6 +231,213 @@ class TestMergedEmbedding(TestCase):
                                 )
                             self._test_training(m, ref_m, (indices, offsets), opt=opt)
 
+    def test_index_dedup_and_hot_row_cache(self):
+        B = 256
+        NUM_TABLE = 4
+        NUM_DIM = 64
+        # power law indices with many duplicated rows
+        indices = [
+            (torch.distributions.Exponential(0.05).sample((B * 4,)).long() % 1000)
+            for _ in range(NUM_TABLE)
+        ]
+        offsets = [torch.arange(0, B * 4, 4) for _ in range(NUM_TABLE)]
+        inputs = (indices, offsets)
+        emb_list = EmbeddingBagList(NUM_TABLE, NUM_DIM, torch.float32)
+
+        # inference
+        m = MergedEmb(copy.deepcopy(emb_list))
+        m.merged_emb.enable_hot_row_cache(32, policy="lfu")
+        m.eval()
+        with torch.no_grad():
+            self.assertEqual(m(*inputs), emb_list(*inputs))
+            self.assertEqual(m(*inputs), emb_list(*inputs))
+        for stats in m.merged_emb.cache_stats():
+            self.assertGreater(stats["hits"], 0)
+            self.assertLessEqual(stats["size"], 32)
+
+        # dense gradients
+        m = MergedEmb(copy.deepcopy(emb_list))
+        m.merged_emb.enable_index_dedup()
+        self._test_training(m, copy.deepcopy(emb_list), inputs)
+
+        # fused updates, with and without the hot row cache
+        for capacity in [0, 32]:
+            m = MergedEmbSGD(copy.deepcopy(emb_list), lr=0.1)
+            ref_m = copy.deepcopy(emb_list)
+            opt = torch.optim.SGD(ref_m.parameters(), lr=0.1)
+            if capacity > 0:
+                m.merged_emb.enable_hot_row_cache(capacity)
+            else:
+                m.merged_emb.enable_index_dedup()
+            self._test_training(m, ref_m, inputs, opt=opt)
+            # the cached rows see the update
+            self._test_training(m, ref_m, inputs, opt=opt)
+
+            m = MergedEmbAdaGrad(copy.deepcopy(emb_list), lr=0.01)
+            ref_m = copy.deepcopy(emb_list)
+            opt = torch.optim.Adagrad(ref_m.parameters(), lr=0.01)
+            if capacity > 0:
+                m.merged_emb.enable_hot_row_cache(capacity)
+            else:
+                m.merged_emb.enable_index_dedup()
+            self._test_training(m, ref_m, inputs, opt=opt)
+            self._test_training(m, ref_m, inputs, opt=opt)
+
+    def test_mixed_dims_and_dtypes(self):
+        B = 257
+        NUM_TABLE = 6
+        NUM_DIMS = [16, 128, 32, 64, 129, 16]
+        DTYPES = [
+            torch.float32,
+            torch.bfloat16,
+            torch.float32,
+            torch.float64,
+            torch.bfloat16,
+            torch.bfloat16,
+        ]
+        indices = [
+            torch.randint(1000, (B * self.multi_hot[i],)) for i in range(NUM_TABLE)
+        ]
+        offsets = [
+            torch.arange(0, B * self.multi_hot[i], self.multi_hot[i])
+            for i in range(NUM_TABLE)
+        ]
+        inputs = (indices, offsets)
+        for mode in ["mean", "sum"]:
+            emb_list = EmbeddingBagList(NUM_TABLE, NUM_DIMS, DTYPES, mode=mode)
+            m = MergedEmb(copy.deepcopy(emb_list))
+            self.assertIsNone(m.merged_emb.embedding_dim)
+            self.assertIsNone(m.merged_emb.dtype)
+            # outputs are in the order of the tables
+            self._test_inference(m, copy.deepcopy(emb_list), inputs)
+            self._test_training(m, copy.deepcopy(emb_list), inputs)
+
+        # fused updates run once per group of tables with the same dim and dtype
+        emb_list = EmbeddingBagList(
+            NUM_TABLE,
+            NUM_DIMS,
+            [torch.float32, torch.float64] * 3,
+        )
+        m = MergedEmbSGD(copy.deepcopy(emb_list), lr=0.1)
+        ref_m = copy.deepcopy(emb_list)
+        opt = torch.optim.SGD(ref_m.parameters(), lr=0.1)
+        self._test_training(m, ref_m, inputs, opt=opt)
+        m = MergedEmbAdaGrad(copy.deepcopy(emb_list), lr=0.01)
+        ref_m = copy.deepcopy(emb_list)
+        opt = torch.optim.Adagrad(ref_m.parameters(), lr=0.01)
+        self._test_training(m, ref_m, inputs, opt=opt)
+
+        # a single concatenated output with tables of different dims
+        emb_list = EmbeddingBagList(NUM_TABLE, NUM_DIMS, torch.float32)
+        dense = torch.randn(B, 13)
+        m = MergedEmbCatDense(emb_list)
+        out = m(indices, offsets, dense)
+        self.assertEqual(out.shape, (B, 13 + sum(NUM_DIMS)))
+        self._test_inference(
+            m, EmbeddingBagListCatDense(emb_list), (indices, offsets, dense)
+        )
+
+    def test_rowwise_quantized(self):
+        B = 257
+        NUM_TABLE = 4
+        NUM_DIM = 64
+        for mode in ["mean", "sum"]:
+            for index_type in [torch.int32, torch.int64]:
+                indices = [
+                    torch.randint(1000, (B * self.multi_hot[i],)).to(index_type)
+                    for i in range(NUM_TABLE)
+                ]
+                for include_last_offset in [True, False]:
+                    n_offset = B + 1 if include_last_offset else B
+                    offsets = [
+                        torch.arange(
+                            0, n_offset * self.multi_hot[i], self.multi_hot[i]
+                        ).to(index_type)
+                        for i in range(NUM_TABLE)
+                    ]
+                    inputs = (indices, offsets)
+                    emb_list = EmbeddingBagList(
+                        NUM_TABLE,
+                        NUM_DIM,
+                        torch.float32,
+                        include_last_offset=include_last_offset,
+                        mode=mode,
+                    )
+                    for bits in [8, 4, [8, 4, 4, 8]]:
+                        qm = ipex.nn.modules.RowwiseQuantizedMergedEmbeddingBag.from_embeddingbag_list(
+                            emb_list.list, bits=bits
+                        )
+                        # same as the lookup of the dequantized tables
+                        ref_m = copy.deepcopy(emb_list)
+                        for i, emb in enumerate(ref_m.list):
+                            emb.weight.data = ipex.nn.modules.dequantize_rowwise(
+                                qm.qweights[i], qm.scale_biases[i], qm.bits[i]
+                            )
+                        with torch.no_grad():
+                            out = qm(*inputs)
+                            self.assertEqual(out, ref_m(*inputs), rtol=1e-4, atol=1e-4)
+                            # and close to the float tables
+                            ref_out = emb_list(*inputs)
+                            for o, ref_o, b in zip(out, ref_out, qm.bits):
+                                # error of a row is up to half a step of its range
+                                atol = 0.05 if b == 8 else 0.8
+                                self.assertEqual(o, ref_o, rtol=0, atol=atol)
+                            jit_m = torch.jit.freeze(torch.jit.trace(qm.eval(), inputs))
+                            self.assertEqual(jit_m(*inputs), out)
+
+        # 4x and 8x smaller tables
+        m = MergedEmb(EmbeddingBagList(NUM_TABLE, NUM_DIM, torch.float32)).merged_emb
+        nbytes = sum(w.numel() * w.element_size() for w in m.weights)
+        for bits, ratio in [(8, 4), (4, 8)]:
+            qm = ipex.nn.modules.RowwiseQuantizedMergedEmbeddingBag.from_merged_embeddingbag(
+                m, bits=bits
+            )
+            qnbytes = sum(q.numel() for q in qm.qweights)
+            self.assertEqual(nbytes, qnbytes * ratio)
+
+    def test_mmap_tables(self):
+        B = 128
+        NUM_TABLE = 4
+        indices = [torch.randint(1000, (B * 3,)) for _ in range(NUM_TABLE)]
+        offsets = [torch.arange(0, B * 3, 3) for _ in range(NUM_TABLE)]
+        inputs = (indices, offsets)
+        for dtype in [torch.float32, torch.bfloat16]:
+            emb_list = EmbeddingBagList(NUM_TABLE, 64, dtype)
+            m = ipex.nn.modules.MergedEmbeddingBag.from_embeddingbag_list(
+                copy.deepcopy(emb_list.list)
+            )
+            with tempfile.TemporaryDirectory() as tmp:
+                ipex.nn.modules.save_mmap_tables(m, tmp)
+                mmap_m = ipex.nn.modules.MergedEmbeddingBag.from_mmap_tables(tmp)
+                self.assertEqual(mmap_m.weights[0].dtype, dtype)
+                mmap_m.prefetch_rows(indices)
+                with torch.no_grad():
+                    self.assertEqual(mmap_m(*inputs), m(*inputs))
+
+                # read-only tables can't be trained by the fused optimizers
+                ro_m = ipex.nn.modules.MergedEmbeddingBagWithSGD.from_mmap_tables(
+                    tmp, lr=0.1
+                )
+                with self.assertRaises(RuntimeError):
+                    ro_m(*inputs)
+
+            if dtype == torch.float32:
+                # copy-on-write tables for fine-tuning, the file is unchanged
+                with tempfile.TemporaryDirectory() as tmp:
+                    ipex.nn.modules.save_mmap_tables(m, tmp)
+                    cow_m = MergedEmbSGD(copy.deepcopy(emb_list), lr=0.1)
+                    cow_m.merged_emb = (
+                        ipex.nn.modules.MergedEmbeddingBagWithSGD.from_mmap_tables(
+                            tmp, mmap_mode="c", lr=0.1
+                        )
+                    )
+                    ref_m = copy.deepcopy(emb_list)
+                    opt = torch.optim.SGD(ref_m.parameters(), lr=0.1)
+                    self._test_training(cow_m, ref_m, inputs, opt=opt)
+                    reloaded = ipex.nn.modules.MergedEmbeddingBag.from_mmap_tables(tmp)
+                    for w, ref_w in zip(reloaded.weights, m.weights):
+                        self.assertEqual(w, ref_w)
+
 
 if __name__ == "__main__":
     test = unittest.main()
@@ -0,0 +1,218 @@
+import torch
+import torch.nn as nn
+import intel_extension_for_pytorch as ipex
+from common_utils import TestCase
+import unittest
+
+
+class Expert(nn.Module):
+    def __init__(self, hidden_size, intermediate_size):
+        super().__init__()
+        self.w1 = nn.Linear(hidden_size, intermediate_size, bias=False)
+        self.w2 = nn.Linear(intermediate_size, hidden_size, bias=False)
+        self.w3 = nn.Linear(hidden_size, intermediate_size, bias=False)
+
+    def forward(self, x):
+        return self.w2(nn.functional.silu(self.w1(x)) * self.w3(x))
+
+
+class Experts(nn.Module):
+    def __init__(self, hidden_size, intermediate_size, num_experts):
+        super().__init__()
+        self.experts = nn.ModuleList(
+            [Expert(hidden_size, intermediate_size) for _ in range(num_experts)]
+        )
+
+    def forward(self, x):
+        return sum(expert(x) for expert in self.experts)
+
+
+def route(hidden_states, num_experts, top_k, num_local_experts=None):
+    router_logits = torch.randn(hidden_states.size(0), num_experts)
+    routing_weights = torch.nn.functional.softmax(
+        router_logits, dim=1, dtype=torch.float
+    )
+    routing_weights, selected_experts = torch.topk(routing_weights, top_k, dim=-1)
+    routing_weights /= routing_weights.sum(dim=-1, keepdim=True)
+    if num_local_experts is not None:
+        # the experts owned by the other ranks are mapped to -1, as the
+        # decoder does with tensor parallel
+        selected_experts = torch.where(
+            selected_experts < num_local_experts, selected_experts, -1
+        )
+    return routing_weights.to(hidden_states.dtype), selected_experts
+
+
+def moe_ref(hidden_states, selected_experts, num_experts, expert_fn):
+    # per-expert ops, as the decoder ran them before the grouped ops
+    output = torch.zeros_like(hidden_states)
+    for expert_idx in range(num_experts):
+        # the (token, slot) pairs of the expert, -1 is never selected
+        idx, top_x = torch.where(selected_experts.t() == expert_idx)
+        output = expert_fn(expert_idx, top_x, idx, output)
+    return output
+
+
+class GroupedMoETester(TestCase):
+    hidden_size = 64
+    intermediate_size = 128
+    num_experts = 8
+
+    def _test_grouped_moe(self, dtype, ref_expert_fn, grouped_fn):
+        for num_tokens in [1, 7, 32]:
+            for top_k in [1, 2]:
+                for num_local_experts in [None, self.num_experts // 2]:
+                    hidden_states = torch.randn(num_tokens, self.hidden_size).to(dtype)
+                    routing_weights, selected_experts = route(
+                        hidden_states, self.num_experts, top_k, num_local_experts
+                    )
+                    with torch.no_grad():
+                        ref = moe_ref(
+                            hidden_states,
+                            selected_experts,
+                            self.num_experts,
+                            lambda e, top_x, idx, output: ref_expert_fn(
+                                hidden_states, e, top_x, idx, routing_weights, output
+                            ),
+                        )
+                        out = grouped_fn(
+                            hidden_states, selected_experts, routing_weights
+                        )
+                    self.assertEqual(out, ref)
+
+    def test_grouped_mixtral_moe_tpp(self):
+        for dtype in [torch.float32, torch.bfloat16]:
+            gate = [
+                torch.randn(self.intermediate_size, self.hidden_size).to(dtype)
+                for _ in range(self.num_experts)
+            ]
+            up = [
+                torch.randn(self.intermediate_size, self.hidden_size).to(dtype)
+                for _ in range(self.num_experts)
+            ]
+            down = [
+                torch.randn(self.hidden_size, self.intermediate_size).to(dtype)
+                for _ in range(self.num_experts)
+            ]
+
+            def ref_expert_fn(hidden_states, e, top_x, idx, routing_weights, output):
+                return torch.ops.torch_ipex.mixtral_moe_tpp(
+                    hidden_states,
+                    top_x,
+                    idx,
+                    gate[e],
+                    up[e],
+                    down[e],
+                    True,
+                    routing_weights,
+                    output,
+                    False,
+                )
+
+            def grouped_fn(hidden_states, selected_experts, routing_weights):
+                return torch.ops.torch_ipex.grouped_mixtral_moe_tpp(
+                    hidden_states,
+                    selected_experts,
+                    routing_weights,
+                    gate,
+                    up,
+                    down,
+                    True,
+                    False,
+                )
+
+            self._test_grouped_moe(dtype, ref_expert_fn, grouped_fn)
+
+    def test_grouped_mixtral_moe(self):
+        m = Experts(self.hidden_size, self.intermediate_size, self.num_experts).eval()
+        try:
+            for dtype, auto_kernel_selection in [
+                (torch.float32, True),
+                (torch.bfloat16, False),
+            ]:
+                experts = ipex.optimize(
+                    m, dtype=dtype, auto_kernel_selection=auto_kernel_selection
+                ).experts
+                self.assertTrue(all(e.w1.use_dnnl for e in experts))
+
+                def ref_expert_fn(
+                    hidden_states, e, top_x, idx, routing_weights, output
+                ):
+                    expert = experts[e]
+                    return torch.ops.torch_ipex.mixtral_moe(
+                        hidden_states,
+                        top_x,
+                        idx,
+                        expert.w1._get_forward_weight(),
+                        expert.w1.ctx.get_data_handle(),
+                        expert.w3._get_forward_weight(),
+                        expert.w3.ctx.get_data_handle(),
+                        expert.w2._get_forward_weight(),
+                        expert.w2.ctx.get_data_handle(),
+                        True,
+                        routing_weights,
+                        output,
+                        False,
+                    )
+
+                def grouped_fn(hidden_states, selected_experts, routing_weights):
+                    return torch.ops.torch_ipex.grouped_mixtral_moe(
+                        hidden_states,
+                        selected_experts,
+                        routing_weights,
+                        [e.w1._get_forward_weight() for e in experts],
+                        [e.w1.ctx.get_data_handle() for e in experts],
+                        [e.w3._get_forward_weight() for e in experts],
+                        [e.w3.ctx.get_data_handle() for e in experts],
+                        [e.w2._get_forward_weight() for e in experts],
+                        [e.w2.ctx.get_data_handle() for e in experts],
+                        True,
+                        False,
+                    )
+
+                self._test_grouped_moe(dtype, ref_expert_fn, grouped_fn)
+        finally:
+            ipex._disable_dnnl()
+
+    def test_grouped_mixtral_moe_woq(self):
+        m = Experts(self.hidden_size, self.intermediate_size, self.num_experts).eval()
+        qconfig_mapping = ipex.quantization.get_weight_only_quant_qconfig_mapping()
+        prepared_model = ipex.quantization.prepare(
+            m,
+            qconfig_mapping,
+            example_inputs=torch.rand(4, self.hidden_size),
+            inplace=False,
+        )
+        with torch.no_grad():
+            experts = ipex.quantization.convert(prepared_model).experts
+
+        def ref_expert_fn(hidden_states, e, top_x, idx, routing_weights, output):
+            expert = experts[e]
+            return torch.ops.torch_ipex.mixtral_moe_woq(
+                hidden_states,
+                top_x,
+                idx,
+                expert.w1._op_context.get_data_handle(),
+                expert.w3._op_context.get_data_handle(),
+                expert.w2._op_context.get_data_handle(),
+                routing_weights,
+                output,
+                False,
+            )
+
+        def grouped_fn(hidden_states, selected_experts, routing_weights):
+            return torch.ops.torch_ipex.grouped_mixtral_moe_woq(
+                hidden_states,
+                selected_experts,
+                routing_weights,
+                [e.w1._op_context.get_data_handle() for e in experts],
+                [e.w3._op_context.get_data_handle() for e in experts],
+                [e.w2._op_context.get_data_handle() for e in experts],
+                False,
+            )
+
+        self._test_grouped_moe(torch.float32, ref_expert_fn, grouped_fn)
+
+
+if __name__ == "__main__":
+    test = unittest.main()
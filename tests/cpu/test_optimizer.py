@@ -8,13 +8,20 @@ import unittest
 from torch.testing._internal.common_utils import TestCase
 from common_utils import TestModule, _empty_weight_bias_parameter_names
 import bench.custom_op_bench.optimizer
-from torch.optim import Adadelta, AdamW, Adamax, ASGD, RMSprop, Rprop
+from torch.optim import Adadelta, Adamax, ASGD, RMSprop, Rprop
 import copy
 
 
 class TestOptimizers(TestCase):
     def _test_update(
-        self, module, optimizer, dtype, split_master_weight_for_bf16, set_to_none, fused
+        self,
+        module,
+        optimizer,
+        dtype,
+        split_master_weight_for_bf16,
+        set_to_none,
+        fused,
+        flat_arena=False,
     ):
         atol, rtol = None, None
         if dtype == torch.bfloat16:
@@ -30,6 +37,8 @@ class TestOptimizers(TestCase):
             split_master_weight_for_bf16=split_master_weight_for_bf16,
             fuse_update_step=fused,
         )
+        if flat_arena:
+            ipex_optimizer = ipex.optim.enable_flat_arena(ipex_optimizer)
         for i in range(2):
             with torch.cpu.amp.autocast(enabled=True, dtype=dtype):
                 # torch optmizer
@@ -313,6 +322,212 @@ class TestOptimizers(TestCase):
                 M, adam, dtype, split_master_weight_for_bf16, set_to_none, fused
             )
 
+    def test_adamw(self):
+        M = TestModule()
+        dtypes = [torch.float, torch.bfloat16]
+        if core.onednn_has_fp16_support():
+            dtypes.append(torch.float16)
+        options = itertools.product(
+            [True, False],
+            [True, False],
+            [True, False],
+            dtypes,
+            [(0.1, 0.111), (0.9, 0.999)],
+            [1e-8],
+            [0, 0.1],
+            [True, False],
+            [True, False],
+            [True, False],
+        )
+        for (
+            set_to_none,
+            split_master_weight_for_bf16,
+            amsgrad,
+            dtype,
+            betas,
+            eps,
+            weight_decay,
+            maximize,
+            fused,
+            flat_arena,
+        ) in options:
+            if flat_arena and not fused:
+                continue
+            adamw = torch.optim.AdamW(
+                M.parameters(),
+                lr=0.001,
+                betas=betas,
+                eps=eps,
+                weight_decay=weight_decay,
+                amsgrad=amsgrad,
+                maximize=maximize,
+            )
+            self._test_update(
+                M,
+                adamw,
+                dtype,
+                split_master_weight_for_bf16,
+                set_to_none,
+                fused,
+                flat_arena,
+            )
+
+    def test_flat_arena(self):
+        def train(model, optimizer, dtype, steps):
+            for _ in range(steps):
+                with torch.cpu.amp.autocast(enabled=dtype is torch.bfloat16):
+                    y = model(*model.input).sum()
+                optimizer.zero_grad()
+                y.backward()
+                optimizer.step()
+
+        options = itertools.product(
+            [torch.optim.Adam, torch.optim.AdamW],
+            [torch.float, torch.bfloat16],
+            [True, False],
+            [True, False],
+        )
+        for optimizer_cls, dtype, split_master_weight_for_bf16, amsgrad in options:
+            M = TestModule().train()
+            models, optimizers = [], []
+            for flat_arena in [False, True]:
+                model = copy.deepcopy(M)
+                optimizer = optimizer_cls(
+                    model.parameters(), lr=0.01, weight_decay=0.1, amsgrad=amsgrad
+                )
+                model, optimizer = ipex.optimize(
+                    model,
+                    dtype=dtype,
+                    optimizer=optimizer,
+                    split_master_weight_for_bf16=split_master_weight_for_bf16,
+                )
+                if flat_arena:
+                    optimizer = ipex.optim.enable_flat_arena(optimizer)
+                models.append(model)
+                optimizers.append(optimizer)
+            for model, optimizer in zip(models, optimizers):
+                train(model, optimizer, dtype, 3)
+            self.assertEqual(models[0].state_dict(), models[1].state_dict())
+            self.assertEqual(optimizers[0].state_dict(), optimizers[1].state_dict())
+            # the params not prepacked are views of the flat buffers, the
+            # prepacked ones use the per tensor step
+            arena = optimizers[1].flat_arena
+            params = optimizers[1].param_groups[0]["params"]
+            loose_params = [id(p) for p in arena.loose_params[0]]
+            self.assertTrue(0 < len(loose_params) < len(params))
+            buffers = [b.param.untyped_storage().data_ptr() for b in arena.buckets[0]]
+            for p in params:
+                if id(p) not in loose_params:
+                    self.assertTrue(p.untyped_storage().data_ptr() in buffers)
+
+            # the buffers are rebuilt after loading the state dict
+            state_dict = copy.deepcopy(optimizers[0].state_dict())
+            for optimizer in optimizers:
+                optimizer.load_state_dict(state_dict)
+            self.assertTrue(arena.buckets is None)
+            for model, optimizer in zip(models, optimizers):
+                train(model, optimizer, dtype, 2)
+            self.assertEqual(models[0].state_dict(), models[1].state_dict())
+            self.assertEqual(optimizers[0].state_dict(), optimizers[1].state_dict())
+
+    def test_fused_unscale_clip(self):
+        def train(model, optimizer, scaler, mode, max_norm, dtype, steps):
+            params = [p for group in optimizer.param_groups for p in group["params"]]
+            grad_norms = []
+            for i in range(steps):
+                with torch.cpu.amp.autocast(
+                    enabled=dtype is torch.float16, dtype=torch.float16
+                ):
+                    y = model(*model.input).sum()
+                optimizer.zero_grad()
+                scaler.scale(y).backward()
+                if i == 1:
+                    # the step is skipped and the scale is backed off, the
+                    # grads of the fp16 training are on the fp16 params
+                    grad = next(
+                        p.grad for p in model.parameters() if p.grad is not None
+                    )
+                    grad.view(-1)[0] = float("inf")
+                if mode != "fused":
+                    # the fused step skips the unscale and the grad sync done
+                    # by an explicit unscale_
+                    scaler.unscale_(optimizer)
+                if mode == "ref":
+                    grad_norm = torch.nn.utils.clip_grad_norm_(params, max_norm)
+                scaler.step(optimizer)
+                scaler.update()
+                if mode != "ref":
+                    grad_norm = optimizer.grad_norm
+                grad_norms.append(grad_norm)
+            return grad_norms
+
+        dtypes = [torch.float]
+        if core.onednn_has_fp16_support():
+            dtypes.append(torch.float16)
+        options = itertools.product(
+            [
+                torch.optim.SGD,
+                torch.optim.Adam,
+                torch.optim.AdamW,
+                ipex.optim._lamb.Lamb,
+            ],
+            dtypes,
+            [False, True],
+            [0.1, 1e4],
+        )
+        for optimizer_cls, dtype, flat_arena, max_norm in options:
+            if flat_arena and optimizer_cls not in [
+                torch.optim.Adam,
+                torch.optim.AdamW,
+            ]:
+                continue
+            M = TestModule().train()
+            results = []
+            for mode in ["ref", "fused", "fused_unscaled"]:
+                model = copy.deepcopy(M)
+                optimizer = optimizer_cls(model.parameters(), lr=0.01, weight_decay=0.1)
+                model, optimizer = ipex.optimize(
+                    model, dtype=dtype, optimizer=optimizer
+                )
+                if flat_arena:
+                    optimizer = ipex.optim.enable_flat_arena(optimizer)
+                if mode != "ref":
+                    optimizer = ipex.optim.enable_fused_unscale_clip(
+                        optimizer, max_norm
+                    )
+                scaler = torch.cpu.amp.GradScaler(init_scale=2.0**8)
+                grad_norms = train(model, optimizer, scaler, mode, max_norm, dtype, 4)
+                results.append((model, grad_norms, scaler.get_scale()))
+            ref_model, ref_grad_norms, ref_scale = results[0]
+            for model, grad_norms, scale in results[1:]:
+                self.assertEqual(ref_model.state_dict(), model.state_dict())
+                self.assertEqual(ref_grad_norms, grad_norms)
+                self.assertEqual(ref_scale, scale)
+                self.assertEqual(scale, 2.0**7)
+
+        # the bf16 training without GradScaler
+        M = TestModule().train()
+        results = []
+        for fused in [False, True]:
+            model = copy.deepcopy(M)
+            optimizer = torch.optim.AdamW(model.parameters(), lr=0.01)
+            model, optimizer = ipex.optimize(
+                model, dtype=torch.bfloat16, optimizer=optimizer
+            )
+            if fused:
+                optimizer = ipex.optim.enable_fused_unscale_clip(optimizer, 0.1)
+            with torch.cpu.amp.autocast():
+                y = model(*model.input).sum()
+            optimizer.zero_grad()
+            y.backward()
+            if not fused:
+                torch.nn.utils.clip_grad_norm_(model.parameters(), 0.1)
+            optimizer.step()
+            results.append(model)
+        self.assertEqual(
+            results[0].state_dict(), results[1].state_dict(), rtol=1e-2, atol=1e-2
+        )
+
     def test_grad_scaling_unscale(self):
         inv_scale = torch.full((1,), 0.25, dtype=torch.float)
         found_inf = torch.full((1,), 0.0, dtype=torch.float)
@@ -916,6 +1131,138 @@ class TestFusedSteps(TestCase):
         self.assertEqual(exp_avg_sq, exp_avg_sq2)
         self.assertEqual(max_exp_avg_sq, max_exp_avg_sq2)
 
+    def test_adamw_step(self):
+        fused = torch.ops.torch_ipex.adamw_fused_step
+        non_fused = bench.custom_op_bench.optimizer.non_fused_adamw
+
+        param = torch.randn(31, 33)
+        grad = torch.randn(31, 33)
+        exp_avg = torch.randn(31, 33).abs()
+        exp_avg_sq = torch.randn(31, 33).abs()
+        max_exp_avg_sq = torch.randn(31, 33).abs()
+        trail = torch.Tensor()
+        step = 10
+        beta1 = 0.8
+        beta2 = 0.9
+        learning_rate = 0.1
+        weight_decay = 0.3
+        eps = 0.001
+        for amsgrad in [True, False]:
+            # fused fp32, fused bf16 (master weight split), fused bf16 (master
+            # weight) and non-fused fp32
+            param2, trail2 = torch.ops.torch_ipex.split_float_bfloat16(param)
+            param3 = param.clone()
+            bf16_param = param3.bfloat16()
+            param4 = param.clone()
+            args = [
+                (param, grad, trail),
+                (param2, grad.bfloat16(), trail2),
+                (param3, grad.bfloat16(), bf16_param),
+                (param4, grad.clone(), None),
+            ]
+            states = [
+                (exp_avg.clone(), exp_avg_sq.clone(), max_exp_avg_sq.clone())
+                for _ in args
+            ]
+            for (p, g, p2), state in zip(args, states):
+                if p2 is None:
+                    non_fused(
+                        p,
+                        *state,
+                        g,
+                        amsgrad,
+                        step,
+                        beta1,
+                        beta2,
+                        learning_rate,
+                        weight_decay,
+                        eps,
+                    )
+                else:
+                    fused(
+                        p,
+                        *state,
+                        g,
+                        p2,
+                        amsgrad,
+                        step,
+                        beta1,
+                        beta2,
+                        learning_rate,
+                        weight_decay,
+                        eps,
+                    )
+            # compare fused and non-fused
+            self.assertEqual(param, param4)
+            for s1, s2 in zip(states[0], states[3]):
+                self.assertEqual(s1, s2)
+            # compare fused fp32 and fused bf16
+            param2 = torch.ops.torch_ipex.cat_bfloat16_float(param2, trail2)
+            self.assertEqual(param, param2, rtol=1e-4, atol=1e-1)
+            self.assertEqual(param3, param2, rtol=1e-4, atol=1e-1)
+            for s1, s2 in zip(states[0], states[1]):
+                self.assertEqual(s1, s2, rtol=1e-4, atol=1e-1)
+            # make sure bf16_param are updated
+            self.assertEqual(bf16_param, param3.bfloat16())
+
+    def test_adam_step_with_grad_scale(self):
+        param = torch.randn(31, 33)
+        grad = torch.randn(31, 33)
+        exp_avg = torch.randn(31, 33).abs()
+        exp_avg_sq = torch.randn(31, 33).abs()
+        max_exp_avg_sq = torch.randn(31, 33).abs()
+        trail = torch.Tensor()
+        grad_scale = 0.125
+        options = itertools.product(
+            [torch.float, torch.bfloat16], [True, False], [True, False]
+        )
+        for dtype, amsgrad, decoupled_weight_decay in options:
+            fused = (
+                torch.ops.torch_ipex.adamw_fused_step
+                if decoupled_weight_decay
+                else torch.ops.torch_ipex.adam_fused_step
+            )
+            params = [param.clone(), param.clone()]
+            states = [
+                (exp_avg.clone(), exp_avg_sq.clone(), max_exp_avg_sq.clone())
+                for _ in params
+            ]
+            g = grad.to(dtype)
+            args = (amsgrad, 10, 0.8, 0.9, 0.1, 0.3, 0.001)
+            fused(params[0], *states[0], g * grad_scale, trail, *args)
+            torch.ops.torch_ipex.adam_fused_step_with_grad_scale(
+                params[1],
+                *states[1],
+                g,
+                trail,
+                *args,
+                decoupled_weight_decay,
+                grad_scale,
+            )
+            self.assertEqual(params[0], params[1])
+            for s1, s2 in zip(states[0], states[1]):
+                self.assertEqual(s1, s2)
+
+    def test_grad_norm_and_found_inf(self):
+        grad_norm_and_found_inf = torch.ops.torch_ipex.grad_norm_and_found_inf
+        for dtype in [torch.float, torch.double, torch.bfloat16, torch.half]:
+            # the grads smaller and larger than a chunk of the reduction
+            grads = [torch.randn(size, dtype=dtype) for size in [1, 7, 33 * 31, 70000]]
+            grads.append(torch.randn(64, 64, dtype=dtype).t())
+            norm, found_inf = grad_norm_and_found_inf(grads)
+            ref = torch.norm(torch.stack([torch.norm(g.double()) for g in grads]))
+            self.assertEqual(norm.dtype, torch.float)
+            self.assertEqual(norm, ref.float(), rtol=1e-5, atol=1e-5)
+            self.assertEqual(found_inf, torch.zeros(1))
+            for bad in [float("inf"), float("-inf"), float("nan")]:
+                grads[-2][12345] = bad
+                _, found_inf = grad_norm_and_found_inf(grads)
+                self.assertEqual(found_inf, torch.ones(1))
+                grads[-2][12345] = 0
+        norm, found_inf = grad_norm_and_found_inf([])
+        self.assertEqual(norm, torch.tensor(0.0))
+        self.assertEqual(found_inf, torch.zeros(1))
+
     def test_adagrad_step(self):
         fused = torch.ops.torch_ipex.adagrad_fused_step
         non_fused = bench.custom_op_bench.optimizer.non_fused_adagrad
@@ -1240,7 +1587,7 @@ class TestPatchedMethod(TestCase):
             return count
 
         M = TestModule().train()
-        optimizers_list = [Adadelta, AdamW, Adamax, ASGD, RMSprop, Rprop]
+        optimizers_list = [Adadelta, Adamax, ASGD, RMSprop, Rprop]
         for optimizer, set_to_none in itertools.product(optimizers_list, [True, False]):
             ori_model = copy.deepcopy(M)
             ori_optimizer = optimizer(ori_model.parameters(), lr=0.1)
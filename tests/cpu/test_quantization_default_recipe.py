@@ -1,4 +1,6 @@
 import itertools
+import json
+import os
 import tempfile
 import torch
 import torch.nn as nn
@@ -227,6 +229,197 @@ class TestDefaultRecipe(JitLlgaTestCase):
                 prepared_model(torch.rand(4, 4))
             assert check_model_obsever_has_run(prepared_model)
 
+    def test_fast_calibration(self):
+        class Block(nn.Module):
+            def __init__(self) -> None:
+                super().__init__()
+                self.conv = nn.Conv2d(4, 4, 3, padding=1)
+                self.linear = nn.Linear(8, 8)
+
+            def forward(self, x):
+                y = self.conv(x)
+                y = torch.nn.functional.relu(y) + x
+                return self.linear(y)
+
+        class M(nn.Module):
+            def __init__(self) -> None:
+                super().__init__()
+                self.block = Block()
+                self.blocks = nn.Sequential(Block(), Block())
+                self.pool = nn.AdaptiveAvgPool2d(2)
+
+            def forward(self, x):
+                # the block is called twice
+                x = self.block(self.block(x))
+                x = self.blocks(x)
+                return torch.flatten(self.pool(x), 1) * 2
+
+        class DynamicM(nn.Module):
+            def __init__(self) -> None:
+                super().__init__()
+                self.linear = nn.Linear(8, 8)
+
+            def forward(self, x):
+                if x.sum() > 0:
+                    x = self.linear(x)
+                return x
+
+        qconfig_mapping = ipex.quantization.default_static_qconfig_mapping
+        x = torch.rand(2, 4, 8, 8)
+        calib_dataset = [torch.randn(2, 4, 8, 8) for _ in range(4)]
+        m = M().eval()
+        qconf_summaries = []
+        for fast_calibration in [False, True]:
+            prepared_model = prepare(
+                m, qconfig_mapping, x, fast_calibration=fast_calibration
+            )
+            self.assertEqual(
+                "_calibration_module" in prepared_model.__dict__, fast_calibration
+            )
+            with torch.no_grad():
+                for data in calib_dataset:
+                    y = prepared_model(data)
+                self.assertEqual(y, m(calib_dataset[-1]))
+            with tempfile.NamedTemporaryFile() as fp:
+                prepared_model.save_qconf_summary(qconf_summary=fp.name)
+                with open(fp.name, "r") as f:
+                    qconf_summaries.append(json.load(f))
+            convert(prepared_model)
+        self.assertEqual(qconf_summaries[0], qconf_summaries[1])
+
+        # fall back to the interception path for dynamic control flow
+        prepared_model = prepare(
+            DynamicM().eval(), qconfig_mapping, torch.rand(2, 8), fast_calibration=True
+        )
+        assert "_calibration_module" not in prepared_model.__dict__
+        prepared_model(torch.rand(2, 8))
+
+    def test_data_parallel_calibration(self):
+        class M(nn.Module):
+            def __init__(self):
+                super(M, self).__init__()
+                self.conv = nn.Conv2d(3, 8, 3)
+                self.linear = nn.Linear(6, 16)
+
+            def forward(self, x):
+                return self.linear(torch.relu(self.conv(x)))
+
+        def run_fn(model, batch):
+            model(batch["x"])
+
+        m = M().eval()
+        x = torch.rand(2, 3, 8, 8)
+        calib_dataset = [{"x": torch.randn(2, 3, 8, 8) * (i + 1)} for i in range(7)]
+        minmax_qconfig_mapping = QConfigMapping().set_global(
+            QConfig(
+                activation=MinMaxObserver.with_args(
+                    qscheme=torch.per_tensor_affine, dtype=torch.quint8
+                ),
+                weight=PerChannelMinMaxObserver.with_args(
+                    dtype=torch.qint8, qscheme=torch.per_channel_symmetric
+                ),
+            )
+        )
+        for qconfig_mapping, exact in [
+            (minmax_qconfig_mapping, True),
+            (ipex.quantization.default_static_qconfig_mapping, False),
+        ]:
+            qconf_summaries = []
+            for num_workers in [1, 2, 3]:
+                prepared_model = prepare(m, qconfig_mapping, x)
+                stats = ipex.quantization.calibrate(
+                    prepared_model,
+                    calib_dataset,
+                    run_fn=run_fn,
+                    cpu_pools=[
+                        ipex.cpu.runtime.CPUPool(core_ids=[0])
+                        for _ in range(num_workers)
+                    ],
+                )
+                self.assertEqual(stats["num_workers"], num_workers)
+                self.assertEqual(stats["num_batches"], len(calib_dataset))
+                with tempfile.NamedTemporaryFile() as fp:
+                    prepared_model.save_qconf_summary(qconf_summary=fp.name)
+                    with open(fp.name, "r") as f:
+                        qconf_summaries.append(json.load(f))
+            for qconf_summary in qconf_summaries[1:]:
+                if exact:
+                    # min/max observers are bit-identical to serial calibration
+                    self.assertEqual(qconf_summary, qconf_summaries[0])
+                else:
+                    self.assertEqual(qconf_summary.keys(), qconf_summaries[0].keys())
+
+        # the per-channel statistics of SmoothQuant
+        ic_min_vals = []
+        for num_workers in [1, 2]:
+            prepared_model = prepare(
+                m, ipex.quantization.get_smooth_quant_qconfig_mapping(), x
+            )
+            ipex.quantization.calibrate(
+                prepared_model,
+                calib_dataset,
+                run_fn=run_fn,
+                cpu_pools=[
+                    ipex.cpu.runtime.CPUPool(core_ids=[0]) for _ in range(num_workers)
+                ],
+            )
+            ic_min_vals.append(
+                [
+                    obs.ic_obs.min_val.clone()
+                    for _, obs in ipex.quantization._calibrate._iterate_observers(
+                        prepared_model
+                    )
+                ]
+            )
+            ipex.quantization.convert(prepared_model)
+        self.assertEqual(ic_min_vals[0], ic_min_vals[1])
+
+        # a DataLoader is sharded, each worker only loads its own batches
+        class CountingDataset(torch.utils.data.Dataset):
+            def __init__(self):
+                self.loaded = []
+
+            def __len__(self):
+                return 14
+
+            def __getitem__(self, index):
+                self.loaded.append(index)
+                return {"x": torch.randn(3, 8, 8) * (index + 1)}
+
+        dataset = CountingDataset()
+        loader = torch.utils.data.DataLoader(dataset, batch_size=2)
+        for rank in range(3):
+            batches, sharded = ipex.quantization._calibrate._shard_dataset(
+                loader, rank, 3
+            )
+            self.assertTrue(sharded)
+            self.assertEqual(len(list(batches)), len(range(rank, 7, 3)))
+        self.assertEqual(sorted(dataset.loaded), list(range(14)))
+        prepared_model = prepare(m, minmax_qconfig_mapping, x)
+        stats = ipex.quantization.calibrate(
+            prepared_model,
+            loader,
+            run_fn=run_fn,
+            cpu_pools=[ipex.cpu.runtime.CPUPool(core_ids=[0]) for _ in range(3)],
+        )
+        self.assertEqual(stats["num_batches"], 7)
+
+        # a worker killed during the calibration is reported instead of
+        # blocking the calibration
+        def killed_run_fn(model, batch):
+            if "exit" in batch:
+                os._exit(1)
+            model(batch["x"])
+
+        prepared_model = prepare(m, minmax_qconfig_mapping, x)
+        with self.assertRaisesRegex(RuntimeError, "worker 1 exited with code 1"):
+            ipex.quantization.calibrate(
+                prepared_model,
+                calib_dataset[:1] + [{"x": x, "exit": True}] + calib_dataset[2:],
+                run_fn=killed_run_fn,
+                cpu_pools=[ipex.cpu.runtime.CPUPool(core_ids=[0]) for _ in range(2)],
+            )
+
     def test_smooth_quant(self):
         N, IC, OC = 4, 4, 4
         x_data = [(i + 1) ** 3 for i in range(N)]
@@ -1605,6 +1798,86 @@ class WeightOnlyQuantizationTester(TestCase):
                 # Dequantized weights should be close
                 torch.testing.assert_close(dqw, dqw_2)
 
+    def test_woq_conversion_with_lazy_checkpoint(self):
+        from intel_extension_for_pytorch.utils.weight_only_quantization import (
+            _convert_woq_with_low_precision_checkpoint,
+            _legacy_lowp_checkpoint_config,
+        )
+
+        class Mod(nn.Module):
+            def __init__(self):
+                super(Mod, self).__init__()
+                self.emb = torch.nn.Embedding(64, 64)
+                self.linear1 = torch.nn.Linear(64, 128)
+                self.norm = torch.nn.LayerNorm(128)
+                self.linear2 = torch.nn.Linear(128, 64)
+                # not quantized in the checkpoint
+                self.head = torch.nn.Linear(64, 32, bias=False)
+
+            def forward(self, x):
+                return self.head(self.linear2(self.norm(self.linear1(self.emb(x)))))
+
+        m = Mod().eval()
+        state_dict = m.state_dict()
+        for k in ["linear1", "linear2"]:
+            N, K = state_dict[k + ".weight"].shape
+            del state_dict[k + ".weight"]
+            state_dict[k + ".packed_weight"] = torch.randint(
+                -(2**31), 2**31 - 1, (N, K // 8), dtype=torch.int32
+            )
+            state_dict[k + ".scale"] = torch.rand((N, 1), dtype=torch.half) * 0.1
+            state_dict[k + ".packed_zp"] = torch.ones((N, 1), dtype=torch.int32) * 4
+        config = _legacy_lowp_checkpoint_config()
+        qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping(
+            lowp_mode=ipex.quantization.WoqLowpMode.INT8
+        )
+        x = torch.randint(64, (4, 8))
+        ref_m = _convert_woq_with_low_precision_checkpoint(
+            copy.deepcopy(m), qconfig, state_dict, config
+        )
+        with torch.no_grad():
+            y_ref = ref_m(x)
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            # a single checkpoint file
+            single_file = work_dir + "/checkpoint.pt"
+            torch.save(state_dict, single_file)
+            # and sharded checkpoint with an index
+            shard_dir = work_dir + "/shards"
+            os.makedirs(shard_dir)
+            keys = list(state_dict.keys())
+            weight_map = {}
+            for i, shard_keys in enumerate([keys[::2], keys[1::2]]):
+                name = "pytorch_model-{:05d}-of-00002.bin".format(i + 1)
+                torch.save(
+                    {k: state_dict[k] for k in shard_keys},
+                    os.path.join(shard_dir, name),
+                )
+                weight_map.update({k: name for k in shard_keys})
+            with open(
+                os.path.join(shard_dir, "pytorch_model.bin.index.json"), "w"
+            ) as f:
+                json.dump({"weight_map": weight_map}, f)
+
+            for path in [single_file, shard_dir]:
+                # the float model is never materialized
+                with ipex.OnDevice(dtype=torch.float, device="meta"):
+                    meta_m = Mod().eval()
+                woq_m = _convert_woq_with_low_precision_checkpoint(
+                    meta_m, qconfig, path, config
+                )
+                self.assertIsInstance(
+                    woq_m.linear1, ipex.nn.modules.WeightOnlyQuantizedLinear
+                )
+                self.assertFalse(
+                    any(
+                        t.is_meta
+                        for t in list(woq_m.parameters()) + list(woq_m.buffers())
+                    )
+                )
+                with torch.no_grad():
+                    torch.testing.assert_close(woq_m(x), y_ref)
+
 
 class QuantizedOpsTester(TestCase):
     def test_matmul_i8i8i32(self):
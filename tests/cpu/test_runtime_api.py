@@ -1,3 +1,5 @@
+import asyncio
+import time
 import unittest
 import torch
 import intel_extension_for_pytorch as ipex
@@ -247,6 +249,88 @@ class TestRuntimeAPI(TestCase):
         self.assertEqual(y, y_runtime)
         self.assertEqual(y, y_runtime2)
 
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_task_asyncio_api(self):
+        model = SimpleNet()
+        model.eval()
+        traced_model = torch.jit.trace(model, torch.rand(1, 64, 3, 3))
+        x = torch.rand(64, 64, 3, 3)
+        # Calculate the reference result
+        y = model(x)
+
+        # Create task
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        task = ipex.cpu.runtime.Task(model, cpu_pool)
+        traced_task = ipex.cpu.runtime.Task(traced_model, cpu_pool)
+
+        async def run():
+            y_runtime = await task.run_async_aio(x)
+            y_runtime2 = await traced_task.run_async_aio(x)
+            return y_runtime, y_runtime2
+
+        y_runtime, y_runtime2 = asyncio.run(run())
+        self.assertEqual(y, y_runtime)
+        self.assertEqual(y, y_runtime2)
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_async_task_pool(self):
+        model = SimpleNet()
+        model.eval()
+        traced_model = torch.jit.trace(model, torch.rand(1, 64, 3, 3))
+        inputs = [torch.rand(4, 64, 3, 3) for _ in range(16)]
+        # Calculate the reference result
+        y = [model(x) for x in inputs]
+
+        cpu_pools = [
+            ipex.cpu.runtime.CPUPool(core_ids=[0]),
+            ipex.cpu.runtime.CPUPool(core_ids=[1]),
+        ]
+        pool = ipex.cpu.runtime.AsyncTaskPool(traced_model, cpu_pools)
+
+        async def run():
+            return await asyncio.gather(*[pool(x) for x in inputs])
+
+        y_runtime = asyncio.run(run())
+        for ref, res in zip(y, y_runtime):
+            self.assertEqual(ref, res)
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_async_task_pool_inflight_module(self):
+        class SlowNet(torch.nn.Module):
+            def forward(self, x, scale=1.0):
+                # keep the executor busy, so the next calls are queued on the
+                # same Task before this one returns
+                time.sleep(0.1)
+                return x * scale
+
+        inputs = [torch.full((2, 3), float(i)) for i in range(4)]
+        cpu_pools = [ipex.cpu.runtime.CPUPool(core_ids=[0])]
+        pool = ipex.cpu.runtime.AsyncTaskPool(
+            SlowNet(), cpu_pools, max_inflight_per_task=4
+        )
+
+        async def run():
+            return await asyncio.gather(
+                *[pool(x, scale=i + 1.0) for i, x in enumerate(inputs)]
+            )
+
+        # each call gets the output of its own inputs
+        y_runtime = asyncio.run(run())
+        for i, (x, res) in enumerate(zip(inputs, y_runtime)):
+            self.assertEqual(x * (i + 1.0), res)
+
 
 class TestMultiStreamModule(TestCase):
     @unittest.skipIf(
@@ -471,6 +555,111 @@ class TestMultiStreamModule(TestCase):
         self.assertEqual(y_runtime2[1].size(0), 1)
         self.assertEqual(y_runtime2[2].size(0), 1)
 
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_multi_stream_module_work_stealing(self):
+        model = SimpleNet()
+        model.eval()
+        traced_model = torch.jit.trace(model, torch.rand(1, 64, 3, 3))
+        num_streams = 2
+        batch_size = 11
+        x = torch.rand(batch_size, 64, 3, 3)
+        # Calculate the reference result
+        y = model(x)
+
+        # Batchsize 11, stream Number is 2, 8 micro-chunks of size 2 or 1
+        cpu_pool = ipex.cpu.runtime.CPUPool(core_ids=[0, 1])
+        multi_stream_model = ipex.cpu.runtime.MultiStreamModule(
+            traced_model,
+            num_streams=num_streams,
+            cpu_pool=cpu_pool,
+            work_stealing=True,
+        )
+        multi_stream_model2 = ipex.cpu.runtime.MultiStreamModule(
+            traced_model,
+            num_streams=num_streams,
+            cpu_pool=cpu_pool,
+            concat_output=False,
+            work_stealing=True,
+        )
+
+        for _ in range(3):
+            y_runtime = multi_stream_model(x)
+            self.assertEqual(y, y_runtime)
+        y_runtime2 = multi_stream_model2(x)
+        self.assertEqual(y, torch.cat(y_runtime2))
+        self.assertEqual(len(y_runtime2), 8)
+        self.assertEqual(y_runtime2[0].size(0), 2)
+        self.assertEqual(y_runtime2[7].size(0), 1)
+
+        # Batchsize less than the number of micro-chunks
+        x = torch.rand(3, 64, 3, 3)
+        self.assertEqual(model(x), multi_stream_model(x))
+
+
+class TestDynamicBatchingModule(TestCase):
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_dynamic_batching_module(self):
+        model = SimpleNet()
+        model.eval()
+        traced_model = torch.jit.trace(model, torch.rand(1, 64, 3, 3))
+        inputs = [torch.rand(1, 64, 3, 3) for _ in range(32)]
+        # Calculate the reference result
+        y = [model(x) for x in inputs]
+
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        with ipex.cpu.runtime.DynamicBatchingModule(
+            traced_model,
+            num_streams=2,
+            cpu_pool=cpu_pool,
+            max_batch_size=8,
+            max_wait_time=0.05,
+        ) as batching_model:
+            futures = [batching_model(x) for x in inputs]
+            y_runtime = [f.result() for f in futures]
+            stats = batching_model.stats()
+        for ref, res in zip(y, y_runtime):
+            self.assertEqual(ref, res)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["requests"], 32)
+        self.assertEqual(
+            sum(k * v for k, v in stats["batch_size_histogram"].items()), 32
+        )
+        self.assertLess(stats["batches"], 32)
+        self.assertEqual(len(stats["stream_utilization"]), 2)
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_dynamic_batching_module_latency_target(self):
+        model = SimpleNet()
+        model.eval()
+        traced_model = torch.jit.trace(model, torch.rand(1, 64, 3, 3))
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        # An unreachable latency target keeps the batch size at 1.
+        with ipex.cpu.runtime.DynamicBatchingModule(
+            traced_model,
+            num_streams=1,
+            cpu_pool=cpu_pool,
+            max_batch_size=8,
+            latency_target=1e-9,
+        ) as batching_model:
+            futures = [batching_model(torch.rand(1, 64, 3, 3)) for _ in range(16)]
+            for f in futures:
+                f.result()
+            stats = batching_model.stats()
+        self.assertEqual(stats["batch_size"], 1)
+        self.assertEqual(stats["batch_size_histogram"], {1: 16})
+
 
 class TestModuleMultiStreamModuleHint(TestCase):
     # For the inputs format which can't be jit.trace
@@ -0,0 +1,59 @@
+import os
+import unittest
+import torch
+import torch.multiprocessing as mp
+import intel_extension_for_pytorch as ipex
+from common_utils import TestCase
+
+has_shm = ipex.cpu.comm.has_shm()
+
+
+def _run_shm_collectives(rank, world_size, name):
+    comm = ipex.cpu.comm
+    # a small buffer so that the large tensors are reduced chunk by chunk
+    comm.init_shm(rank, world_size, name=name, buffer_size=64 * 1024)
+    assert comm.get_backend() == "shm"
+    assert comm.get_rank() == rank
+    assert comm.get_world_size() == world_size
+    for dtype in [torch.float32, torch.bfloat16, torch.float16]:
+        for size in [1, 4096, 4096 * 7 + 3, 1024 * 1024]:
+            torch.manual_seed(size)
+            inputs = [torch.randn(size).to(dtype) for _ in range(world_size)]
+            expected = torch.stack([t.float() for t in inputs]).sum(0).to(dtype)
+            t = inputs[rank].clone()
+            out = comm.allreduce_add(t)
+            assert out.data_ptr() == t.data_ptr()
+            torch.testing.assert_close(t, expected, rtol=1e-2, atol=1e-2)
+        # non contiguous input is reduced in place as well
+        t = torch.full((8, 16), rank + 1.0).to(dtype).t()
+        comm.allreduce_add(t)
+        assert torch.equal(
+            t, torch.full((16, 8), world_size * (world_size + 1) / 2).to(dtype)
+        )
+        cols_per_rank = [0]
+        for r in range(world_size):
+            cols_per_rank.append(cols_per_rank[-1] + r + 1)
+        t = torch.full((3, rank + 1), float(rank)).to(dtype)
+        out = comm.allgather(t, cols_per_rank, world_size)
+        expected = torch.cat(
+            [torch.full((3, r + 1), float(r)).to(dtype) for r in range(world_size)],
+            dim=-1,
+        )
+        assert torch.equal(out, expected)
+        comm.barrier()
+
+
+@unittest.skipIf(not has_shm, "shm communicator is not built")
+class ShmCommTester(TestCase):
+    def test_shm_collectives(self):
+        for world_size in [2, 3]:
+            mp.spawn(
+                _run_shm_collectives,
+                args=(world_size, "/ipex_shm_comm_test_{}".format(os.getpid())),
+                nprocs=world_size,
+                join=True,
+            )
+
+
+if __name__ == "__main__":
+    test = unittest.main()